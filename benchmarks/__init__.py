@@ -0,0 +1,10 @@
+"""PayPy Benchmarks
+
+Each stage of the serialize, send and parse path is timed on its own.
+Results are saved as JSON so a run can be compared against a baseline:
+
+    python -m benchmarks run -o baseline.json
+    python -m benchmarks run -o current.json
+    python -m benchmarks compare baseline.json current.json
+
+"""
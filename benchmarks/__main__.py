@@ -0,0 +1,56 @@
+"""Benchmark runner, see ``python -m benchmarks --help``."""
+
+import optparse
+import sys
+
+from benchmarks import harness
+
+USAGE = """%prog run [-k pattern] [-r repeat] [-o results.json]
+       %prog compare baseline.json results.json [-t threshold]"""
+
+def report(name, result):
+    print '%-45s %10s %10s %10d' % (name, harness.format_time(result['best']), harness.format_time(result['median']), result['loops'])
+    sys.stdout.flush()
+
+def main(argv):
+    parser = optparse.OptionParser(usage=USAGE)
+    
+    parser.add_option('-k', '--pattern',   default=None,  help='only run benchmarks matching a glob, e.g. "parsing.*"')
+    parser.add_option('-r', '--repeat',    default=5,     type='int')
+    parser.add_option('-m', '--min-time',  default=0.2,   type='float', help='seconds each timing sample takes at least')
+    parser.add_option('-o', '--output',    default=None,  help='save the results as JSON')
+    parser.add_option('-t', '--threshold', default=0.1,   type='float', help='relative change reported as a regression')
+    
+    options, arguments = parser.parse_args(argv)
+    
+    if not arguments or arguments[0] not in ('run', 'compare'):
+        parser.error('expected a command, run or compare')
+    
+    if arguments[0] == 'run':
+        print '%-45s %10s %10s %10s' % ('benchmark', 'best', 'median', 'loops')
+        
+        document = harness.run(options.pattern, options.repeat, options.min_time, report)
+        
+        if options.output:
+            harness.save(document, options.output)
+        
+        return 0
+    
+    if len(arguments) != 3:
+        parser.error('compare takes a baseline and a results file')
+    
+    rows        = harness.compare(harness.load(arguments[1]), harness.load(arguments[2]), options.threshold)
+    regressions = 0
+    
+    print '%-45s %10s %10s %8s' % ('benchmark', 'baseline', 'current', 'ratio')
+    
+    for name, before, after, ratio, verdict in rows:
+        print '%-45s %10s %10s %7.2fx %s' % (name, harness.format_time(before), harness.format_time(after), ratio, verdict)
+        
+        if verdict == 'slower':
+            regressions += 1
+    
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,162 @@
+"""Benchmark Fixtures
+
+Schemas and gateway responses shared by the benchmark modules.
+
+"""
+
+import datetime
+
+from paypy.schemas.payment     import SCreditCard
+from paypy.schemas.billing     import SBilling
+from paypy.schemas.shipping    import SShipping
+from paypy.schemas.authnet     import SMerchantAuthentication, SAuthnetTransaction
+from paypy.schemas.authnet.aim import SAim
+from paypy.schemas.authnet.arb import SArb, SSchedule, SAuthnetSubscriptionCreate
+from paypy.schemas.authnet.cim import SCim, SBillingList, SAuthnetProfileCreate, SAuthnetProfileRetrieve
+
+ANET_XMLNS = 'AnetApi/xml/v1/schema/AnetApiSchema.xsd'
+
+def credentials():
+    auth       = SMerchantAuthentication()
+    auth.key   = u'auth_key'
+    auth.login = u'auth_login'
+    
+    return auth
+
+def credit_card():
+    cc            = SCreditCard()
+    cc.number     = u'4111111111111111'
+    cc.expiration = datetime.datetime(2018, 4, 1)
+    cc.ccv        = u'123'
+    
+    return cc
+
+def address(cls):
+    address             = cls()
+    address.firstname   = u'Richard'
+    address.lastname    = u'Branson'
+    address.address     = u'91 North Ridge'
+    address.city        = u'Carlsbad'
+    address.state       = u'California'
+    address.postal_code = u'92009'
+    address.country     = u'USA'
+    address.phone       = u'(111) 932-1312'
+    
+    return address
+
+def transaction(invoice=u'423'):
+    trans             = SAuthnetTransaction()
+    trans.testing     = True
+    trans.amount      = u'10.00'
+    trans.payment     = credit_card()
+    trans.billing     = address(SBilling)
+    trans.shipping    = address(SShipping)
+    trans.invoice     = invoice
+    trans.description = u'Transaction description'
+    
+    return trans
+
+def aim():
+    schema                = SAim()
+    schema.authentication = credentials()
+    schema.transaction    = transaction()
+    
+    return schema
+
+def arb():
+    sub          = SAuthnetSubscriptionCreate()
+    sub.amount   = u'10.00'
+    sub.payment  = credit_card()
+    sub.billing  = address(SBilling)
+    sub.schedule = SSchedule()
+    
+    schema                = SArb()
+    schema.authentication = credentials()
+    schema.subscription   = sub
+    
+    return schema
+
+def profile_create(payment_profiles=2):
+    billing = []
+    
+    for x in range(payment_profiles):
+        bill         = address(SBillingList)
+        bill.payment = credit_card()
+        billing.append(bill)
+    
+    profile             = SAuthnetProfileCreate()
+    profile.customer_id = u'24'
+    profile.email       = u'richard@example.com'
+    profile.billing     = billing
+    profile.shipping    = [address(SShipping)]
+    profile.validation  = u'testMode'
+    
+    schema                = SCim()
+    schema.authentication = credentials()
+    schema.profile        = profile
+    
+    return schema
+
+def profile_retrieve(profile_id=1000):
+    profile    = SAuthnetProfileRetrieve()
+    profile.id = profile_id
+    
+    schema                = SCim()
+    schema.authentication = credentials()
+    schema.profile        = profile
+    
+    return schema
+
+ADDRESS = {'firstname'   : u'Richard',
+           'lastname'    : u'Branson',
+           'address'     : u'91 North Ridge',
+           'city'        : u'Carlsbad',
+           'state'       : u'California',
+           'postal_code' : u'92009',
+           'country'     : u'USA',
+           'phone'       : u'(111) 932-1312'}
+
+def credit_card_mapping():
+    return {'number' : u'4111111111111111', 'expiration' : datetime.datetime(2018, 4, 1), 'ccv' : u'123'}
+
+def aim_mapping():
+    """The aim() schema as a mapping, for from_mapping."""
+    
+    return {'authentication' : {'key' : u'auth_key', 'login' : u'auth_login'},
+            'transaction'    : {'testing'     : True,
+                                'amount'      : u'10.00',
+                                'payment'     : credit_card_mapping(),
+                                'billing'     : dict(ADDRESS),
+                                'shipping'    : dict(ADDRESS),
+                                'invoice'     : u'423',
+                                'description' : u'Transaction description'}}
+
+def profile_create_mapping(payment_profiles=2):
+    """The profile_create() schema as a mapping, for from_mapping."""
+    
+    return {'authentication' : {'key' : u'auth_key', 'login' : u'auth_login'},
+            'profile'        : {'customer_id' : u'24',
+                                'email'       : u'richard@example.com',
+                                'billing'     : [dict(ADDRESS, payment=credit_card_mapping()) for x in range(payment_profiles)],
+                                'shipping'    : [dict(ADDRESS)],
+                                'validation'  : u'testMode'}}
+
+def transaction_response(delimiter='|'):
+    """An approved AIM response."""
+    
+    fields = ['1', '1', '1', 'This transaction has been approved.', 'AB12CD', 'Y', '2149186775', '423',
+              'Transaction description', '10.00', 'CC', 'auth_capture', '24', 'Richard', 'Branson', '',
+              '91 North Ridge', 'Carlsbad', 'California', '92009', 'USA', '(111) 932-1312', '', '']
+    
+    return delimiter.join(fields + [''] * (68 - len(fields)))
+
+PAYMENT_PROFILE = """<paymentProfiles><customerType>individual</customerType><billTo><firstName>Richard</firstName><lastName>Branson</lastName><address>91 North Ridge</address><city>Carlsbad</city><state>California</state><zip>92009</zip><country>USA</country><phoneNumber>(111) 932-1312</phoneNumber></billTo><customerPaymentProfileId>%d</customerPaymentProfileId><payment><creditCard><cardNumber>XXXX1111</cardNumber><expirationDate>XXXX</expirationDate></creditCard></payment></paymentProfiles>"""
+
+def profile_response(payment_profiles):
+    """A getCustomerProfileResponse with the given number of payment profiles."""
+    
+    return ('<?xml version="1.0" encoding="utf-8"?>'
+            '<getCustomerProfileResponse xmlns="%s"><messages><resultCode>Ok</resultCode><message><code>I00001</code><text>Successful.</text></message></messages>'
+            '<profile><merchantCustomerId>24</merchantCustomerId><email>richard@example.com</email><customerProfileId>1000</customerProfileId>%s'
+            '<shipToList><firstName>Richard</firstName><address>91 North Ridge</address><customerAddressId>2000</customerAddressId></shipToList>'
+            '</profile></getCustomerProfileResponse>') % (ANET_XMLNS, ''.join([PAYMENT_PROFILE % (3000 + x) for x in range(payment_profiles)]))
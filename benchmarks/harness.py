@@ -0,0 +1,143 @@
+"""Benchmark Harness
+
+Benchmark modules define ``cases()``, returning (name, function) pairs,
+and optionally ``teardown()``. A function is called repeatedly and
+timed, unless it is marked ``timed`` in which case it measures itself
+and returns the seconds one operation took.
+
+"""
+
+import datetime
+import fnmatch
+import json
+import platform
+import time
+
+# Benchmark modules, run in this order
+MODULES = ('serializers', 'parsing', 'replay', 'schemas', 'roundtrip', 'startup')
+
+def timed(function):
+    """Mark a benchmark function as returning its own timing."""
+    
+    function.timed = True
+    return function
+
+def collect(pattern=None):
+    """Yield (module, [(name, function)]) for the benchmarks matching a glob pattern."""
+    
+    for name in MODULES:
+        module = __import__('benchmarks.%s' % name, fromlist=['cases'])
+        cases  = [('%s.%s' % (name, case), function) for case, function in module.cases()]
+        cases  = [x for x in cases if pattern is None or fnmatch.fnmatch(x[0], pattern)]
+        
+        if cases:
+            yield module, cases
+        
+        elif hasattr(module, 'teardown'):
+            module.teardown()
+
+def measure(function, repeat=5, min_time=0.2):
+    """Time a function, return its best and median seconds per call and the loop count."""
+    
+    if getattr(function, 'timed', False):
+        loops   = 1
+        samples = sorted([function() for x in range(repeat)])
+    else:
+        loops = 1
+        
+        # Calibrate the loop count so a sample takes at least min_time
+        while True:
+            started = time.time()
+            for x in xrange(loops):
+                function()
+            elapsed = time.time() - started
+            
+            if elapsed >= min_time:
+                break
+            
+            loops *= 10 if elapsed < min_time / 10 else 2
+        
+        samples = []
+        
+        for sample in range(repeat):
+            started = time.time()
+            for x in xrange(loops):
+                function()
+            samples.append((time.time() - started) / loops)
+        
+        samples.sort()
+    
+    return {'best'   : samples[0],
+            'median' : samples[len(samples) // 2],
+            'loops'  : loops,
+            'repeat' : repeat}
+
+def run(pattern=None, repeat=5, min_time=0.2, report=None):
+    """Run the benchmarks matching a pattern and return the results document."""
+    
+    results = {}
+    
+    for module, cases in collect(pattern):
+        try:
+            for name, function in cases:
+                results[name] = measure(function, repeat, min_time)
+                
+                if report is not None:
+                    report(name, results[name])
+        finally:
+            if hasattr(module, 'teardown'):
+                module.teardown()
+    
+    return {'meta'    : {'python'   : platform.python_version(),
+                         'platform' : platform.platform(),
+                         'date'     : datetime.datetime.utcnow().isoformat()},
+            'results' : results}
+
+def save(document, path):
+    handle = open(path, 'w')
+    try:
+        json.dump(document, handle, indent=2, sort_keys=True)
+    finally:
+        handle.close()
+
+def load(path):
+    handle = open(path)
+    try:
+        return json.load(handle)
+    finally:
+        handle.close()
+
+def compare(baseline, current, threshold=0.1):
+    """Compare two results documents, return (name, baseline, current, ratio, verdict) rows.
+    
+    A benchmark whose best time grew by more than ``threshold`` is a
+    regression, one that shrank by as much an improvement.
+    
+    """
+    
+    rows = []
+    
+    for name in sorted(set(baseline['results']) & set(current['results'])):
+        before = baseline['results'][name]['best']
+        after  = current['results'][name]['best']
+        ratio  = after / before if before else float('inf')
+        
+        if ratio > 1 + threshold:
+            verdict = 'slower'
+        elif ratio < 1 - threshold:
+            verdict = 'faster'
+        else:
+            verdict = ''
+        
+        rows.append((name, before, after, ratio, verdict))
+    
+    return rows
+
+def format_time(seconds):
+    """Format a duration with a readable unit."""
+    
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '%.2f%s' % (seconds / scale, unit)
+    
+    return '%.0fns' % (seconds / 1e-9)
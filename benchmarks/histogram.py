@@ -0,0 +1,77 @@
+"""Latency Histogram
+
+A sparse log-linear histogram in the style of HdrHistogram: values up
+to ``2 ** bits`` are counted exactly and larger ones in buckets whose
+width keeps the relative error below ``2 ** -(bits - 1)``, under 1% by
+default. Histograms are plain data, so they can be pickled across
+processes and merged.
+
+"""
+
+class Histogram(object):
+    """Record integer values (e.g. microseconds) and report percentiles."""
+    
+    def __init__(self, bits=8):
+        self.bits   = bits
+        self.counts = {}
+        self.total  = 0
+        self.sum    = 0
+        self.max    = 0
+        self.min    = None
+    
+    def _key(self, value):
+        shift = max(value.bit_length() - self.bits, 0)
+        return shift, value >> shift
+    
+    def record(self, value, count=1):
+        """Record a value, ``count`` times."""
+        
+        value = max(int(value), 0)
+        key   = self._key(value)
+        
+        self.counts[key] = self.counts.get(key, 0) + count
+        self.total      += count
+        self.sum        += value * count
+        self.max         = max(self.max, value)
+        self.min         = value if self.min is None else min(self.min, value)
+    
+    def merge(self, other):
+        """Add another histogram's values to this one."""
+        
+        for key, count in other.counts.iteritems():
+            self.counts[key] = self.counts.get(key, 0) + count
+        
+        self.total += other.total
+        self.sum   += other.sum
+        self.max    = max(self.max, other.max)
+        
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        
+        return self
+    
+    def percentile(self, percent):
+        """Return the value at a percentile (0-100), the highest value its bucket holds."""
+        
+        if not self.total:
+            return 0
+        
+        rank = max(int(round(self.total * percent / 100.0)), 1)
+        seen = 0
+        
+        for shift, sub in sorted(self.counts, key=lambda x: x[1] << x[0]):
+            seen += self.counts[(shift, sub)]
+            
+            if seen >= rank:
+                return min(((sub + 1) << shift) - 1, self.max)
+        
+        return self.max
+    
+    def mean(self):
+        return float(self.sum) / self.total if self.total else 0.0
+    
+    def __len__(self):
+        return self.total
+    
+    def __repr__(self):
+        return '<%s at 0x%x %d values>' % (self.__class__.__name__, abs(id(self)), self.total)
@@ -0,0 +1,421 @@
+"""Open-Loop Load Generator
+
+Requests are issued on a fixed or Poisson schedule at a target rate,
+whatever the earlier requests are doing, and each latency is measured
+from when the request was scheduled to start rather than when it was
+sent. A stalled gateway or a backlog of queued requests then shows up
+in the percentiles instead of quietly slowing the load down
+(coordinated omission).
+
+    python -m benchmarks.load --rate 200 --duration 30 --mix charge:4,profile:1 --driver threads --simulate
+
+Requests are driven from a thread pool, from several processes each
+running a thread pool, or from a single thread through the adapters'
+asynchronous reactor. Schedules and latencies are timed on the
+monotonic clock, which every process on the host shares, so a step of
+the wall clock mid-run can't skew the percentiles.
+
+"""
+
+import collections
+import json
+import multiprocessing
+import optparse
+import random
+import socket
+import sys
+import threading
+import time
+import Queue
+
+from benchmarks                        import fixtures
+from benchmarks.histogram              import Histogram
+from paypy.payment                     import Payment
+from paypy.profile                     import Profile
+from paypy.adapters.authnet            import asynchronous
+from paypy.adapters.authnet.connection import ENDPOINT_AIM_TEST, ENDPOINT_XML_TEST
+from paypy.instrument                  import monotonic
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+def charge(endpoints):
+    """Charge a card through Payment.process, return the (blocking, asynchronous) calls."""
+    
+    schema = fixtures.aim()
+    
+    return (lambda: Payment(schema, endpoint=endpoints['aim']).process(),
+            lambda: Payment(schema, endpoint=endpoints['aim']).process_async())
+
+def profile(endpoints):
+    """Create a customer profile through Profile.create, return the (blocking, asynchronous) calls."""
+    
+    schema = fixtures.profile_create(1)
+    
+    return (lambda: Profile(schema, endpoint=endpoints['xml']).create(),
+            lambda: Profile(schema, endpoint=endpoints['xml']).create_async())
+
+OPERATIONS = {'charge'  : charge,
+              'profile' : profile}
+
+def fixed(rate, rng):
+    """Evenly spaced arrivals."""
+    
+    return lambda: 1.0 / rate
+
+def poisson(rate, rng):
+    """Exponentially distributed gaps between arrivals."""
+    
+    return lambda: rng.expovariate(rate)
+
+SCHEDULES = {'fixed'   : fixed,
+             'poisson' : poisson}
+
+def plan(rate, duration, mix, schedule='poisson', seed=None):
+    """Return the (offset in seconds, operation name) of every request to send."""
+    
+    rng      = random.Random(seed)
+    gap      = SCHEDULES[schedule](rate, rng)
+    total    = float(sum([weight for name, weight in mix]))
+    requests = []
+    offset   = 0.0
+    
+    while True:
+        offset += gap()
+        
+        if offset >= duration:
+            break
+        
+        pick = rng.random() * total
+        
+        for name, weight in mix:
+            pick -= weight
+            
+            if pick < 0:
+                break
+        
+        requests.append((offset, name))
+    
+    return requests
+
+class Stats(object):
+    """Latency and outcome counts for one operation.
+    
+    ``latency`` is measured from the scheduled start, ``service`` from
+    when the request was actually sent; both are in microseconds.
+    
+    """
+    
+    def __init__(self):
+        self.latency = Histogram()
+        self.service = Histogram()
+        self.errors  = collections.defaultdict(int)
+    
+    def record(self, scheduled, started, finished, error=None):
+        self.latency.record((finished - scheduled) * 1e6)
+        self.service.record((finished - started) * 1e6)
+        
+        if error is not None:
+            self.errors[type(error).__name__] += 1
+    
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.service.merge(other.service)
+        
+        for name, count in other.errors.items():
+            self.errors[name] += count
+        
+        return self
+    
+    def __getstate__(self):
+        return self.latency, self.service, dict(self.errors)
+    
+    def __setstate__(self, state):
+        self.latency, self.service, errors = state
+        self.errors = collections.defaultdict(int, errors)
+
+def drive_threads(requests, operations, start, concurrency=32):
+    """Send the requests from a pool of threads, return the Stats per operation."""
+    
+    stats = collections.defaultdict(Stats)
+    lock  = threading.Lock()
+    tasks = Queue.Queue()
+    
+    def worker():
+        while True:
+            task = tasks.get()
+            
+            if task is None:
+                return
+            
+            scheduled, name = task
+            started         = monotonic()
+            error           = None
+            
+            try:
+                operations[name][0]()
+            except Exception, e:
+                error = e
+            
+            finished = monotonic()
+            
+            lock.acquire()
+            try:
+                stats[name].record(scheduled, started, finished, error)
+            finally:
+                lock.release()
+    
+    threads = [threading.Thread(target=worker) for x in range(concurrency)]
+    
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    
+    # Never wait on the workers: a busy pool queues requests, and the
+    # time they spend queued counts toward their latency
+    for offset, name in requests:
+        delay = start + offset - monotonic()
+        
+        if delay > 0:
+            time.sleep(delay)
+        
+        tasks.put((start + offset, name))
+    
+    for thread in threads:
+        tasks.put(None)
+    
+    for thread in threads:
+        thread.join()
+    
+    return dict(stats)
+
+def drive_async(requests, operations, start):
+    """Send the requests from this thread through the asynchronous reactor, return the Stats per operation."""
+    
+    reactor = asynchronous.reactor
+    stats   = collections.defaultdict(Stats)
+    pending = []
+    
+    def recorder(scheduled, started, name):
+        def record(value, error=None):
+            stats[name].record(scheduled, started, monotonic(), error)
+        
+        return record, lambda error: record(None, error)
+    
+    for offset, name in requests:
+        due = start + offset
+        
+        while True:
+            delay = due - monotonic()
+            
+            if delay <= 0:
+                break
+            
+            if reactor.map:
+                reactor.poll(min(delay, 0.05))
+            else:
+                time.sleep(delay)
+        
+        started = monotonic()
+        
+        try:
+            result = operations[name][1]()
+        except Exception, e:
+            stats[name].record(due, started, monotonic(), e)
+            continue
+        
+        result.add_callback(*recorder(due, started, name))
+        pending.append(result)
+    
+    for result in pending:
+        if not result.done():
+            try:
+                reactor.run(result)
+            except Exception:
+                pass
+    
+    return dict(stats)
+
+def _process_worker(requests, mix, endpoints, start, concurrency, results):
+    operations = dict([(name, OPERATIONS[name](endpoints)) for name, weight in mix])
+    
+    results.put(drive_threads(requests, operations, start, concurrency))
+
+def drive_processes(requests, mix, endpoints, start, processes=4, concurrency=32):
+    """Share the requests between processes each running a thread pool, return the merged Stats per operation."""
+    
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_process_worker, args=(requests[x::processes], mix, endpoints, start, concurrency, results)) for x in range(processes)]
+    
+    for process in workers:
+        process.start()
+    
+    stats = {}
+    
+    for process in workers:
+        for name, value in results.get().items():
+            if name in stats:
+                stats[name].merge(value)
+            else:
+                stats[name] = value
+    
+    for process in workers:
+        process.join()
+    
+    return stats
+
+def run(rate, duration, mix, endpoints, driver='threads', schedule='poisson', concurrency=32, processes=4, seed=None):
+    """Generate load and return a report: the Stats per operation and the elapsed time."""
+    
+    requests = plan(rate, duration, mix, schedule, seed)
+    
+    # Give the workers a moment to start before the first request is due
+    start = monotonic() + 0.5
+    
+    if driver == 'processes':
+        stats = drive_processes(requests, mix, endpoints, start, processes, concurrency)
+    else:
+        operations = dict([(name, OPERATIONS[name](endpoints)) for name, weight in mix])
+        
+        if driver == 'async':
+            stats = drive_async(requests, operations, start)
+        else:
+            stats = drive_threads(requests, operations, start, concurrency)
+    
+    return {'stats' : stats, 'elapsed' : monotonic() - start, 'requests' : len(requests)}
+
+def summary(report):
+    """Summarise a report per operation: counts, error rate, throughput and latency percentiles in milliseconds."""
+    
+    operations = {}
+    
+    for name, stats in sorted(report['stats'].items()):
+        count  = len(stats.latency)
+        errors = sum(stats.errors.values())
+        
+        operations[name] = {'count'      : count,
+                            'errors'     : dict(stats.errors),
+                            'error_rate' : float(errors) / count if count else 0.0,
+                            'throughput' : count / report['elapsed'],
+                            'latency'    : dict([(str(p), stats.latency.percentile(p) / 1000.0) for p in PERCENTILES] + [('max', stats.latency.max / 1000.0)]),
+                            'service'    : dict([(str(p), stats.service.percentile(p) / 1000.0) for p in PERCENTILES] + [('max', stats.service.max / 1000.0)])}
+    
+    return operations
+
+def print_summary(operations):
+    print '%-10s %7s %7s %8s %9s %9s %9s %9s %9s' % ('operation', 'count', 'err %', 'req/s', 'p50 ms', 'p99 ms', 'p99.9 ms', 'max ms', 'svc p99')
+    
+    for name, values in sorted(operations.items()):
+        latency = values['latency']
+        
+        print '%-10s %7d %7.2f %8.1f %9.2f %9.2f %9.2f %9.2f %9.2f' % (name, values['count'], values['error_rate'] * 100, values['throughput'],
+                                                                      latency['50'], latency['99'], latency['99.9'], latency['max'], values['service']['99'])
+        
+        for error, count in sorted(values['errors'].items()):
+            print '%-10s %7d %s' % ('', count, error)
+
+def parse_mix(spec):
+    """Parse an operation mix, e.g. "charge:4,profile:1"."""
+    
+    mix = []
+    
+    for part in spec.split(','):
+        name, _, weight = part.partition(':')
+        
+        if name not in OPERATIONS:
+            raise ValueError('unknown operation %r, expected one of %s' % (name, ', '.join(sorted(OPERATIONS))))
+        
+        mix.append((name, float(weight or 1)))
+    
+    return mix
+
+def _simulate(port, options):
+    from paypy.adapters.authnet.simulator import Simulator, parse_latency
+    
+    latency = parse_latency(options['latency']) if options['latency'] else None
+    
+    Simulator(port=port, latency=latency, decline_rate=options['decline_rate'], error_rate=options['error_rate'], throttle_rate=options['throttle_rate']).serve_forever()
+
+def start_simulator(options):
+    """Run the gateway simulator in its own process, return (process, endpoints)."""
+    
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port  = probe.getsockname()[1]
+    probe.close()
+    
+    process        = multiprocessing.Process(target=_simulate, args=(port, options))
+    process.daemon = True
+    process.start()
+    
+    # Wait for it to accept connections
+    for attempt in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.1).close()
+            break
+        except socket.error:
+            time.sleep(0.05)
+    
+    host = '127.0.0.1:%d' % port
+    
+    return process, {'aim' : ('http', host, ENDPOINT_AIM_TEST[2]),
+                     'xml' : ('http', host, ENDPOINT_XML_TEST[2])}
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options]', description='Generate open-loop load against a gateway or the bundled simulator.')
+    
+    parser.add_option('--rate',          default=50.0,      type='float', help='requests per second')
+    parser.add_option('--duration',      default=10.0,      type='float', help='seconds')
+    parser.add_option('--mix',           default='charge',  help='weighted operations, e.g. charge:4,profile:1')
+    parser.add_option('--schedule',      default='poisson', choices=sorted(SCHEDULES))
+    parser.add_option('--driver',        default='threads', choices=('threads', 'processes', 'async'))
+    parser.add_option('--concurrency',   default=32,        type='int',   help='threads per process')
+    parser.add_option('--processes',     default=4,         type='int')
+    parser.add_option('--seed',          default=None,      type='int')
+    parser.add_option('--endpoint',      default=None,      help='gateway host:port, sent over https')
+    parser.add_option('--simulate',      default=False,     action='store_true', help='run the gateway simulator in a separate process')
+    parser.add_option('--latency',       default=None,      help='simulator latency, see the simulator\'s --latency')
+    parser.add_option('--decline-rate',  default=0.0,       type='float')
+    parser.add_option('--error-rate',    default=0.0,       type='float')
+    parser.add_option('--throttle-rate', default=0.0,       type='float')
+    parser.add_option('--output',        default=None,      help='save the summary as JSON')
+    
+    options, arguments = parser.parse_args(argv)
+    
+    try:
+        mix = parse_mix(options.mix)
+    except ValueError, e:
+        parser.error(str(e))
+    
+    simulator = None
+    
+    if options.simulate:
+        simulator, endpoints = start_simulator({'latency'       : options.latency,
+                                                'decline_rate'  : options.decline_rate,
+                                                'error_rate'    : options.error_rate,
+                                                'throttle_rate' : options.throttle_rate})
+    elif options.endpoint:
+        endpoints = {'aim' : ('https', options.endpoint, ENDPOINT_AIM_TEST[2]),
+                     'xml' : ('https', options.endpoint, ENDPOINT_XML_TEST[2])}
+    else:
+        endpoints = {'aim' : ENDPOINT_AIM_TEST,
+                     'xml' : ENDPOINT_XML_TEST}
+    
+    try:
+        report = run(options.rate, options.duration, mix, endpoints, options.driver, options.schedule, options.concurrency, options.processes, options.seed)
+    finally:
+        if simulator is not None:
+            simulator.terminate()
+    
+    operations = summary(report)
+    
+    print_summary(operations)
+    
+    if options.output:
+        handle = open(options.output, 'w')
+        try:
+            json.dump({'rate' : options.rate, 'duration' : options.duration, 'driver' : options.driver, 'operations' : operations}, handle, indent=2, sort_keys=True)
+        finally:
+            handle.close()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,248 @@
+"""Memory Benchmark
+
+Measure the memory a batch of pending charges holds, built from the
+schema reifiers and from their compact variants. Run from the
+repository root:
+
+    python -m benchmarks.memory [count]
+
+Sizes are summed with sys.getsizeof over everything the batch
+references, so values shared by every record (e.g. the same unicode
+literal) are counted once.
+
+The operations mode measures the memory each gateway operation's
+result holds, answered from a recorded simulator response:
+
+    python -m benchmarks.memory operations [count]
+
+Retained bytes are the growth of the malloc heap over ``count`` kept
+results, so the lxml trees, which sys.getsizeof can't see, are
+counted; they are measured with the result classes retaining their
+documents and with them released (XMLResult.retain). Allocated bytes
+are the peak an operation grows the malloc heap by before its result
+is dropped, the heap sampled on every Python and C call and return.
+Small objects the interpreter places in memory it already holds
+aren't seen, so it is a lower bound, and can come out below the
+retained bytes.
+
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import sys
+import types
+
+from benchmarks                       import fixtures
+from paypy.payment                    import PaymentClient
+from paypy.profile                    import ProfileClient
+from paypy.subscription               import SubscriptionClient
+from paypy.adapters.authnet.response  import XMLResult
+from paypy.adapters.authnet.simulator import Simulator
+from paypy.adapters.authnet.transport import MemoryTransport, RecordingTransport, ReplayTransport
+from paypy.schemas.authnet            import SAuthnetTransaction, CAuthnetTransaction
+
+# Schema classes to build the batch from: (label, transaction class)
+VARIANTS = (('reifier', SAuthnetTransaction),
+            ('compact', CAuthnetTransaction))
+
+def deep_size(root):
+    """Return the bytes an object and everything it references hold, leaving out classes and modules."""
+    
+    seen  = set()
+    stack = [root]
+    total = 0
+    
+    while stack:
+        obj = stack.pop()
+        
+        if id(obj) in seen or isinstance(obj, (type, types.ClassType, types.ModuleType)):
+            continue
+        
+        seen.add(id(obj))
+        
+        total += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    
+    return total
+
+def batch(cls, count):
+    """Build ``count`` pending charges from mappings."""
+    
+    return [cls.from_mapping(fixtures.aim_mapping()['transaction']) for x in range(count)]
+
+def measure(count=10000):
+    """Return {label : bytes per record} for each variant."""
+    
+    sizes = {}
+    
+    for label, cls in VARIANTS:
+        records      = batch(cls, count)
+        sizes[label] = (deep_size(records) - sys.getsizeof(records)) / float(count)
+    
+    return sizes
+
+class _mallinfo(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_int) for name in ('arena', 'ordblks', 'smblks', 'hblks', 'hblkhd', 'usmblks', 'fsmblks', 'uordblks', 'fordblks', 'keepcost')]
+
+def _heap():
+    """Return a function returning the bytes malloc has handed out, or None without glibc."""
+    
+    try:
+        mallinfo = ctypes.CDLL(ctypes.util.find_library('c')).mallinfo
+    except (OSError, AttributeError):
+        return None
+    
+    mallinfo.restype = _mallinfo
+    
+    def heap():
+        info = mallinfo()
+        return info.uordblks + info.hblkhd
+    
+    return heap
+
+heap = _heap()
+
+def _aim(transport):
+    client = PaymentClient(None, transport=transport)
+    schema = fixtures.aim()
+    
+    return lambda: client.process(schema)
+
+def _cim_retrieve(size):
+    def build(transport):
+        client  = ProfileClient(None, transport=transport)
+        created = client.create(fixtures.profile_create(size))
+        request = fixtures.profile_retrieve(int(str(created)))
+        
+        return lambda: client.retrieve(request)
+    
+    return build
+
+def _arb_create(transport):
+    client = SubscriptionClient(None, transport=transport)
+    schema = fixtures.arb()
+    
+    return lambda: client.create(schema)
+
+# Operations measured, (label, builder): a builder takes a transport and returns a function making one request
+OPERATIONS = (('aim.auth_capture',  _aim),
+              ('cim.retrieve_1',    _cim_retrieve(1)),
+              ('cim.retrieve_10',   _cim_retrieve(10)),
+              ('cim.retrieve_100',  _cim_retrieve(100)),
+              ('arb.create',        _arb_create))
+
+# The most runs allocated bytes are averaged over
+ALLOCATED_RUNS = 100
+
+def replayed(build):
+    """Return an operation answered with the responses the simulator gave it once, so the gateway holds nothing new."""
+    
+    recorder = RecordingTransport(MemoryTransport(Simulator(seed=1).respond))
+    build(recorder)()
+    
+    return build(ReplayTransport(recorder.exchanges))
+
+def retained(operation, count):
+    """Return the bytes each of ``count`` results of an operation holds."""
+    
+    operation()
+    gc.collect()
+    
+    if heap is None:
+        results = [operation() for x in xrange(count)]
+        return (deep_size(results) - sys.getsizeof(results)) / float(count)
+    
+    results = [None] * count
+    before  = heap()
+    
+    for x in xrange(count):
+        results[x] = operation()
+    
+    gc.collect()
+    
+    return (heap() - before) / float(count)
+
+def allocated(operation, count):
+    """Return the peak bytes each of ``count`` runs of an operation grows the heap by, or None without glibc."""
+    
+    if heap is None:
+        return None
+    
+    operation()
+    gc.collect()
+    
+    total = 0
+    
+    for x in xrange(count):
+        before = heap()
+        peak   = [before]
+        
+        def sample(frame, event, arg):
+            used = heap()
+            
+            if used > peak[0]:
+                peak[0] = used
+        
+        sys.setprofile(sample)
+        try:
+            result = operation()
+        finally:
+            sys.setprofile(None)
+        
+        total += max(peak[0], heap()) - before
+        
+        del result
+    
+    return total / float(count)
+
+def measure_operations(count=1000):
+    """Return {label : (allocated, retained, released) bytes per operation}.
+    
+    Sampling the heap is slow, so allocated bytes are averaged over at
+    most ALLOCATED_RUNS runs.
+    
+    """
+    
+    sizes = {}
+    
+    for label, build in OPERATIONS:
+        operation = replayed(build)
+        
+        XMLResult.retain = False
+        try:
+            released = retained(operation, count)
+        finally:
+            XMLResult.retain = True
+        
+        sizes[label] = (allocated(operation, min(count, ALLOCATED_RUNS)), retained(operation, count), released)
+    
+    return sizes
+
+def operations(argv):
+    count = int(argv[0]) if argv else 1000
+    sizes = measure_operations(count)
+    
+    print '%-20s %14s %14s %14s' % ('operation', 'allocated B/op', 'retained B/op', 'released B/op')
+    
+    for label, build in OPERATIONS:
+        allocated, retained, released = sizes[label]
+        
+        print '%-20s %14s %14.0f %14.0f' % (label, '-' if allocated is None else '%.0f' % allocated, retained, released)
+
+def main(argv):
+    if argv and argv[0] == 'operations':
+        return operations(argv[1:])
+    
+    count = int(argv[0]) if argv else 10000
+    sizes = measure(count)
+    
+    print '%-10s %14s' % ('schemas', 'bytes/record')
+    
+    for label, cls in VARIANTS:
+        print '%-10s %14.0f' % (label, sizes[label])
+    
+    print '%d records: %.1fMB reifier, %.1fMB compact' % (count, sizes['reifier'] * count / 2 ** 20, sizes['compact'] * count / 2 ** 20)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,62 @@
+"""Response parsing: AIM transaction results and CIM profile documents.
+
+The ``profile_fields`` cases compare reading a profile's fields with
+the precompiled, namespaced XPath the XML results use against
+rewriting the namespace out of the document and using find().
+
+"""
+
+from lxml                            import etree as ET
+
+from benchmarks                      import fixtures
+from paypy.adapters.authnet.aim      import TransactionResult
+from paypy.adapters.authnet.cim      import RetrieveProfileResult
+from paypy.adapters.authnet.response import RESULT_CODE, MESSAGE_CODE, MESSAGE_TEXT, text, element
+
+# Payment profiles per retrieved customer profile
+PROFILE_SIZES = (1, 10, 100)
+
+PROFILE     = element('anet:profile')
+PROFILE_ID  = text('anet:customerProfileId')
+CUSTOMER_ID = text('anet:merchantCustomerId')
+EMAIL       = text('anet:email')
+PAYMENT_ID  = text('anet:paymentProfiles/anet:customerPaymentProfileId')
+FIRSTNAME   = text('anet:shipToList/anet:firstName')
+
+def _transaction(data):
+    result = TransactionResult(data)
+    return result.code, result.reason, result.transaction_id, result.amount
+
+def profile_fields_find(data):
+    """Read a profile's fields with find() from the document with its namespace rewritten out."""
+    
+    root    = ET.XML(data.replace(' xmlns="AnetApi/xml/v1/schema/AnetApiSchema.xsd"', ''))
+    profile = root.find('profile')
+    
+    return (root.findtext('messages/resultCode'), root.findtext('messages/message/code'), root.findtext('messages/message/text'),
+            profile.findtext('customerProfileId'), profile.findtext('merchantCustomerId'), profile.findtext('email'),
+            profile.findtext('paymentProfiles/customerPaymentProfileId'), profile.findtext('shipToList/firstName'))
+
+def profile_fields_xpath(data):
+    """Read a profile's fields with the precompiled, namespaced XPath."""
+    
+    root    = ET.XML(data)
+    profile = PROFILE(root)
+    
+    return (RESULT_CODE(root), MESSAGE_CODE(root), MESSAGE_TEXT(root),
+            PROFILE_ID(profile), CUSTOMER_ID(profile), EMAIL(profile),
+            PAYMENT_ID(profile), FIRSTNAME(profile))
+
+def cases():
+    data  = fixtures.transaction_response()
+    cases = [('transaction_result', lambda: _transaction(data))]
+    
+    for size in PROFILE_SIZES:
+        cases.append(('retrieve_profile_%d' % size, lambda data=fixtures.profile_response(size): RetrieveProfileResult(data).results))
+    
+    profile = fixtures.profile_response(1)
+    
+    cases.append(('profile_fields_find',  lambda: profile_fields_find(profile)))
+    cases.append(('profile_fields_xpath', lambda: profile_fields_xpath(profile)))
+    
+    return cases
@@ -0,0 +1,105 @@
+"""Recorded traffic: parsing responses replayed from a cassette.
+
+Set PAYPY_CASSETTE to a cassette written by CassetteRecorder, e.g.
+against production, to parse its responses; otherwise one is recorded
+from the gateway simulator. Each parsing case parses every recorded
+response of its kind once per call.
+
+"""
+
+import os
+import re
+import tempfile
+import urlparse
+
+from benchmarks                       import fixtures
+from paypy.payment                    import PaymentClient
+from paypy.profile                    import ProfileClient
+from paypy.adapters.authnet.aim       import TransactionResult
+from paypy.adapters.authnet.cim       import CreateProfileResult, RetrieveProfileResult
+from paypy.adapters.authnet.simulator import Simulator
+from paypy.adapters.authnet.transport import MemoryTransport, CassetteRecorder, CassetteTransport
+
+# XML response root elements and the results parsing them
+RESULTS = {'createCustomerProfileResponse' : ('create_profile_result',   CreateProfileResult),
+           'getCustomerProfileResponse'    : ('retrieve_profile_result', RetrieveProfileResult)}
+
+ROOT = re.compile(r'<(\w+Response)\b')
+
+_cassette = None
+_recorded = None
+
+def record(path):
+    """Record a charge and creating and retrieving profiles of several sizes from the simulator."""
+    
+    recorder = CassetteRecorder(path, MemoryTransport(Simulator(seed=1).respond))
+    
+    try:
+        payments = PaymentClient(fixtures.credentials(), transport=recorder)
+        profiles = ProfileClient(None, transport=recorder)
+        
+        for invoice in range(10):
+            payments.process(fixtures.transaction(unicode(invoice)))
+        
+        for size in (1, 10, 100):
+            created = profiles.create(fixtures.profile_create(size))
+            profiles.retrieve(fixtures.profile_retrieve(int(str(created))))
+    finally:
+        recorder.close()
+
+def _transaction(request):
+    """Return a function parsing an AIM response with the delimiters its request asked for."""
+    
+    fields    = urlparse.parse_qs(request)
+    delimiter = fields.get('x_delim_char', ['|'])[0]
+    encap     = fields.get('x_encap_char', [None])[0]
+    
+    return lambda data: TransactionResult(data, delimiter, encap)
+
+def _parse_all(parsers):
+    def parse():
+        for parse, data in parsers:
+            parse(data)
+    
+    return parse
+
+def cases():
+    global _cassette, _recorded
+    
+    path = os.environ.get('PAYPY_CASSETTE')
+    
+    if path is None:
+        path = _recorded = tempfile.mktemp(suffix='.cassette')
+        record(path)
+    
+    _cassette = CassetteTransport(path)
+    
+    kinds   = {}
+    entries = list(_cassette.entries())
+    
+    for endpoint, request, response in entries:
+        root = ROOT.search(response)
+        
+        if root is None:
+            kinds.setdefault('transaction_result', []).append((_transaction(request), response))
+        elif root.group(1) in RESULTS:
+            name, result = RESULTS[root.group(1)]
+            kinds.setdefault(name, []).append((result, response))
+    
+    endpoint, request, response = entries[0]
+    
+    cases = [(name, _parse_all(parsers)) for name, parsers in sorted(kinds.items())]
+    cases.append(('transport', lambda: _cassette.request(endpoint, request)))
+    
+    return cases
+
+def teardown():
+    global _cassette, _recorded
+    
+    if _cassette is not None:
+        _cassette.close()
+        _cassette = None
+    
+    if _recorded is not None:
+        os.remove(_recorded)
+        _recorded = None
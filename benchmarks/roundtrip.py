@@ -0,0 +1,38 @@
+"""Full round trips, serialize, send and parse, against the local gateway simulator."""
+
+from benchmarks                        import fixtures
+from paypy.cache                       import ProfileCache
+from paypy.payment                     import PaymentClient
+from paypy.profile                     import ProfileClient
+from paypy.adapters.authnet.connection import pool
+from paypy.adapters.authnet.simulator  import Simulator
+from paypy.adapters.authnet.transport  import MemoryTransport
+
+_simulator = None
+
+def cases():
+    global _simulator
+    
+    _simulator = Simulator(seed=1).start()
+    
+    payments = PaymentClient(None, endpoint=_simulator.aim_endpoint)
+    profiles = ProfileClient(None, endpoint=_simulator.xml_endpoint)
+    cached   = ProfileClient(None, endpoint=_simulator.xml_endpoint, cache=ProfileCache())
+    memory   = PaymentClient(None, transport=MemoryTransport(_simulator.respond))
+    
+    aim      = fixtures.aim()
+    created  = profiles.create(fixtures.profile_create(10))
+    retrieve = fixtures.profile_retrieve(int(str(created)))
+    
+    return [('aim',                 lambda: payments.process(aim)),
+            ('aim_in_memory',       lambda: memory.process(aim)),
+            ('cim_retrieve',        lambda: profiles.retrieve(retrieve)),
+            ('cim_retrieve_cached', lambda: cached.retrieve(retrieve))]
+
+def teardown():
+    global _simulator
+    
+    if _simulator is not None:
+        pool.clear()
+        _simulator.stop()
+        _simulator = None
@@ -0,0 +1,21 @@
+"""Schema construction, field by field and in bulk from a mapping, and whole-schema validation."""
+
+from zope.schema               import getValidationErrors
+
+from benchmarks                import fixtures
+from paypy.schemas.authnet.aim import IAim, SAim
+from paypy.schemas.authnet.cim import ICim, SCim
+
+def cases():
+    aim = fixtures.aim()
+    cim = fixtures.profile_create(2)
+    
+    aim_mapping = fixtures.aim_mapping()
+    cim_mapping = fixtures.profile_create_mapping(2)
+    
+    return [('aim_construct',    fixtures.aim),
+            ('cim_construct',    lambda: fixtures.profile_create(2)),
+            ('aim_from_mapping', lambda: SAim.from_mapping(aim_mapping)),
+            ('cim_from_mapping', lambda: SCim.from_mapping(cim_mapping)),
+            ('aim_validate',     lambda: getValidationErrors(IAim, aim)),
+            ('cim_validate',     lambda: getValidationErrors(ICim, cim))]
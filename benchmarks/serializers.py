@@ -0,0 +1,17 @@
+"""Request serialization: AIM name-value pairs and ARB/CIM XML documents."""
+
+from benchmarks                import fixtures
+from paypy.serializers.authnet import aim, arb, cim
+
+def cases():
+    aim_schema = fixtures.aim()
+    arb_schema = fixtures.arb()
+    cim_schema = fixtures.profile_create(2)
+    
+    arb_serializer = arb.Serialize(arb_schema)
+    cim_serializer = cim.Serialize(cim_schema)
+    
+    return [('aim',           lambda: aim.Serialize(aim_schema).result),
+            ('arb_to_xml',    lambda: arb_serializer._to_xml(arb_schema)),
+            ('cim_to_xml',    lambda: cim_serializer._to_xml(cim_schema)),
+            ('cim_serialize', lambda: str(cim.Serialize(cim_schema)))]
@@ -0,0 +1,64 @@
+"""Startup Benchmark
+
+Time importing each facade, and resolving its Authorize.net adapter,
+in a fresh interpreter. Run from the repository root:
+
+    python -m benchmarks.startup [repeat]
+
+"""
+
+import subprocess
+import sys
+
+from benchmarks.harness import timed
+
+# Facades to time: (module, registry API)
+FACADES = (('paypy.payment',      'payment'),
+           ('paypy.profile',      'profile'),
+           ('paypy.subscription', 'subscription'))
+
+TIMER = """
+import time
+started = time.time()
+import %(module)s
+imported = time.time()
+from paypy.registry import registry
+registry.resolve('%(api)s', 'authnet')
+print imported - started, time.time() - started
+"""
+
+def sample(module, api):
+    """Return the (import, import and resolve) times in seconds in a fresh interpreter."""
+    
+    output = subprocess.check_output([sys.executable, '-c', TIMER % {'module' : module, 'api' : api}])
+    
+    return tuple([float(value) for value in output.split()])
+
+def measure(module, api, repeat=10):
+    """Return the best (import, import and resolve) times in seconds over ``repeat`` fresh interpreters."""
+    
+    timings = [sample(module, api) for x in range(repeat)]
+    
+    return min([x[0] for x in timings]), min([x[1] for x in timings])
+
+def cases():
+    return [(api, timed(lambda module=module, api=api: sample(module, api)[1])) for module, api in FACADES]
+
+def run(repeat=10):
+    """Return the startup timings for every facade, keyed by module."""
+    
+    return dict([(module, measure(module, api, repeat)) for module, api in FACADES])
+
+def main(argv):
+    repeat  = int(argv[0]) if argv else 10
+    results = run(repeat)
+    
+    print '%-20s %10s %10s' % ('module', 'import ms', 'adapter ms')
+    
+    for module, api in FACADES:
+        imported, resolved = results[module]
+        
+        print '%-20s %10.2f %10.2f' % (module, imported * 1000, resolved * 1000)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
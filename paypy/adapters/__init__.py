@@ -1,5 +1,17 @@
+import itertools
+import logging
+
+from paypy.instrument import CONNECT, GATEWAY
+from paypy.log        import redact
+from paypy.metrics    import record
+
 # Standard fields common to all gateways - individual gateways may have additional fields.
-__all__ = ['STANDARD_FIELDS', 'Result', 'Adapter']
+__all__ = ['STANDARD_FIELDS', 'Result', 'Adapter', 'Transport']
+
+log = logging.getLogger(__name__)
+
+# The code requests answered from a cache are counted under in the metrics
+CACHED = 'cached'
 
 STANDARD_FIELDS = ('card_num', 
                    'exp_date',
@@ -29,9 +41,295 @@ STANDARD_FIELDS = ('card_num',
 class Result(object):
     """Base result class."""
     
-    pass
+    __slots__ = ()
+
+class Transport(object):
+    """Base transport class.
+    
+    A transport POSTs request bytes to an endpoint, a (scheme, host,
+    path) triple, and returns the response bytes, raising on a failure
+    or a non-200 status. Adapters take one when they are created, so
+    the I/O stack can be swapped without touching them.
+    
+    """
+    
+    def request(self, endpoint, data, headers=None, timeout=None, deadline=None, trace=None):
+        """Send the request and return the response body.
+        
+        A transport may store the timings of its own phases, e.g. the
+        seconds spent connecting, in ``trace``, a dict, if one is given.
+        
+        """
+        
+        raise NotImplementedError
+    
+    def stream(self, endpoint, data, headers=None, timeout=None, chunk_size=16384, deadline=None, trace=None):
+        """Send the request and yield the response body in chunks, by default in one."""
+        
+        yield self.request(endpoint, data, headers, timeout, deadline, trace)
+    
+    def request_async(self, endpoint, data, headers=None, deadline=None):
+        """Send the request without blocking and return an AsyncResult for the response body."""
+        
+        raise NotImplementedError
 
 class Adapter(object):
-    """Base adapter class."""
+    """Base adapter class.
+    
+    An adapter holds only its configuration, the transport included,
+    and never changes after it is created. Each operation takes the
+    options schema of its request, e.g. ``adapter.process(schema)``; an
+    adapter created with an options schema sends that one when a call
+    gives none. Its blocking methods send through thread-safe
+    transports, so many threads may call them on one adapter at once.
+    Its ``*_async`` methods go through a reactor, which is
+    single-threaded: make those calls and drive their results from the
+    thread running the reactor.
+    
+    """
+    
+    # The interface options schemas provide, the exception raised for one that doesn't and its serializer
+    interface  = None
+    exception  = None
+    serializer = None
+    
+    # The options schema calls default to and its serializer, if the adapter was created with one
+    options    = None
+    serialized = None
+    
+    # A retry policy requests are sent under, e.g. paypy.adapters.authnet.retry.RetryPolicy
+    retry = None
+    
+    # A paypy.instrument.Instrument timing the phases of requests
+    instrument = None
+    
+    # A paypy.metrics.Recorder counting requests by operation, host and result code
+    metrics = None
+    
+    @classmethod
+    def schema(cls, credentials, request):
+        """Combine merchant credentials and a request schema into the adapter's options schema.
+        
+        Adapters that don't support clients take the request as is.
+        
+        """
+        
+        return request
+    
+    @staticmethod
+    def endpoint_for(testing):
+        """Return the gateway endpoint for test or production requests."""
+        
+        return None
+    
+    def code(self, result):
+        """Return the code a result is counted under in the metrics."""
+        
+        return None
+    
+    def _bind(self, options):
+        """Check the options schema the adapter is created with and serialize it once, if one is given."""
+        
+        if options is None:
+            return
+        
+        if not self.interface.providedBy(options):
+            raise self.exception('the options object must provide a valid schema interface')
+        
+        self.options    = options
+        self.serialized = self.serializer(options)
+    
+    def _options(self, options):
+        """Return the options schema of a call, the adapter's own if none is given."""
+        
+        if options is None:
+            options = self.options
+            
+            if options is None:
+                raise self.exception('an options schema must be given to the call or to the adapter')
+        
+        elif options is not self.options and not self.interface.providedBy(options):
+            raise self.exception('the options object must provide a valid schema interface')
+        
+        return options
+    
+    def _serialize(self, options):
+        """Return the request body of an options schema, serialized once for the adapter's own."""
+        
+        if options is self.options:
+            return str(self.serialized)
+        
+        return str(self.serializer(options))
+    
+    def _measured(self, operation, endpoint, call, *args, **kwargs):
+        """Return call(*args, **kwargs), a whole request to an endpoint, counted by its result code if the adapter has metrics."""
+        
+        metrics = self.metrics
+        
+        if metrics is None:
+            return call(*args, **kwargs)
+        
+        started = metrics.clock()
+        
+        try:
+            result = call(*args, **kwargs)
+        except Exception, e:
+            self._count(operation, endpoint, e.__class__.__name__, started)
+            raise
+        
+        self._count(operation, endpoint, self._code(result), started)
+        
+        return result
+    
+    def _measured_cached(self, operation, endpoint, call, *args):
+        """Return call(*args), a result answered from a cache, counted under the code ``cached`` if the adapter has metrics."""
+        
+        if self.metrics is None:
+            return call(*args)
+        
+        started = self.metrics.clock()
+        result  = call(*args)
+        
+        self._count(operation, endpoint, CACHED, started)
+        
+        return result
+    
+    def _measured_async(self, operation, endpoint, call, *args):
+        """Return call(*args), the AsyncResult of a whole request to an endpoint, counted once it completes if the adapter has metrics."""
+        
+        metrics = self.metrics
+        
+        if metrics is None:
+            return call(*args)
+        
+        started = metrics.clock()
+        
+        def completed(result):
+            self._count(operation, endpoint, self._code(result), started)
+        
+        def failed(e):
+            self._count(operation, endpoint, e.__class__.__name__, started)
+        
+        return call(*args).add_callback(completed, failed)
+    
+    def _code(self, result):
+        """Return the code of a result, or the exception's class name if reading it fails."""
+        
+        try:
+            return self.code(result)
+        except Exception, e:
+            return e.__class__.__name__
+    
+    def _count(self, operation, endpoint, code, started):
+        """Count a request to an endpoint started at ``started`` on the metrics clock under a code, never raising."""
+        
+        metrics = self.metrics
+        record(metrics.request, operation, endpoint[1], code, metrics.clock() - started)
+    
+    def _timed(self, operation, phase, call, *args):
+        """Return call(*args), timed as a phase of the operation if the adapter is instrumented."""
+        
+        instrument = self.instrument
+        
+        if instrument is None:
+            return call(*args)
+        
+        started = instrument.clock()
+        value   = call(*args)
+        
+        instrument.record(operation, phase, instrument.clock() - started, len(value) if isinstance(value, str) else None)
+        
+        return value
+    
+    def _exchange(self, operation, request, *args):
+        """Return the body a transport request returns, timing connecting and the gateway if the adapter is instrumented."""
+        
+        instrument = self.instrument
+        logged     = log.isEnabledFor(logging.DEBUG)
+        
+        if logged:
+            self._log('request', operation, args[0], args[1])
+        
+        if instrument is None:
+            body = request(*args)
+        else:
+            trace   = {}
+            started = instrument.clock()
+            body    = request(*args, trace=trace)
+            elapsed = instrument.clock() - started
+            
+            if CONNECT in trace:
+                instrument.record(operation, CONNECT, trace[CONNECT])
+                elapsed -= trace[CONNECT]
+            
+            instrument.record(operation, GATEWAY, elapsed, len(body))
+        
+        if logged:
+            self._log('response', operation, args[0], body)
+        
+        return body
+    
+    def _exchange_stream(self, operation, stream, *args, **kwargs):
+        """Return the chunks a transport stream yields, the first read here.
+        
+        Reading the first chunk sends the request, so a failure to
+        connect or to get an answer is raised here, under the retry
+        policy, and connecting and waiting for the first chunk are
+        timed if the adapter is instrumented.
+        
+        """
+        
+        instrument = self.instrument
+        logged     = log.isEnabledFor(logging.DEBUG)
+        trace      = {}
+        
+        if logged:
+            self._log('request', operation, args[0], args[1])
+        
+        started = instrument.clock() if instrument is not None else None
+        chunks  = stream(*args, trace=trace, **kwargs)
+        first   = next(chunks, '')
+        
+        if instrument is not None:
+            elapsed = instrument.clock() - started
+            
+            if CONNECT in trace:
+                instrument.record(operation, CONNECT, trace[CONNECT])
+                elapsed -= trace[CONNECT]
+            
+            instrument.record(operation, GATEWAY, elapsed, len(first))
+        
+        if logged:
+            self._log('response', operation, args[0], first)
+        
+        return itertools.chain([first], chunks)
+    
+    def _exchange_async(self, operation, request, *args):
+        """Return the AsyncResult of a transport request, timed from dispatch to response if the adapter is instrumented."""
+        
+        instrument = self.instrument
+        logged     = log.isEnabledFor(logging.DEBUG)
+        
+        if logged:
+            self._log('request', operation, args[0], args[1])
+        
+        if instrument is None and not logged:
+            return request(*args)
+        
+        started = instrument.clock() if instrument is not None else None
+        
+        def received(body):
+            if instrument is not None:
+                instrument.record(operation, GATEWAY, instrument.clock() - started, len(body))
+            
+            if logged:
+                self._log('response', operation, args[0], body)
+            
+            return body
+        
+        return request(*args).then(received)
     
-    pass
+    def _log(self, message, operation, endpoint, payload):
+        """Log a request or response payload at DEBUG, redacted."""
+        
+        log.debug(message, extra={'fields' : {'operation' : operation, 'endpoint' : endpoint[1], 'payload' : redact(payload)}})
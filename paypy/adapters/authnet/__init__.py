@@ -5,6 +5,9 @@ Payment module.
 
 """
 
-from aim import Transaction
-from arb import RecurringTransaction
-from cim import CustomerProfile
+from paypy.lazy import lazy
+
+# The submodules (and lxml) are only imported when an adapter is used
+lazy(__name__, {'Transaction'          : 'aim',
+                'RecurringTransaction' : 'arb',
+                'CustomerProfile'      : 'cim'})
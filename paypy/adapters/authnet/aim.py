@@ -1,73 +1,145 @@
-import urllib2
 import hashlib
 
-from paypy.adapters                import *
-from paypy.exceptions.authnet      import AIMException
+from paypy.adapters                    import *
+from paypy.adapters.authnet.connection import deadline_for, ENDPOINT_AIM_PRODUCTION, ENDPOINT_AIM_TEST
+from paypy.adapters.authnet.transport  import pooled
+from paypy.exceptions.authnet          import AIMException
+from paypy.instrument                  import SERIALIZE, PARSE
 
-from paypy.serializers.authnet.aim import Serialize
-from paypy.schemas.authnet.aim     import IAim
+from paypy.serializers.authnet.aim     import Serialize
+from paypy.schemas.authnet.aim         import IAim, SAim
+
+HEADERS = {'Content-Type' : 'application/x-www-form-urlencoded'}
+
+RESPONSE_CODES = {1 : 'approved',
+                  2 : 'declined',
+                  3 : 'error',
+                  4 : 'held for review'}
+
+# Reason codes of errors that ask for the transaction to be tried again
+RETRY_REASON_CODES = (19, 20, 21, 22, 23, 25, 26, 57, 58, 59, 60, 61, 62, 63)
+
+def _optional(value):
+    """Empty response fields are None."""
+    
+    if value == '':
+        return None
+    
+    return value
+
+def _raw(value):
+    return value
+
+# Response field index table: (attribute, position, decoder)
+RESULT_FIELDS = (('code',             0,  int),
+                 ('subcode',          1,  int),
+                 ('reason_code',      2,  int),
+                 ('reason',           3,  _raw),
+                 ('approval',         4,  _optional),
+                 ('avs',              5,  _optional),
+                 ('transaction_id',   6,  _optional),
+                 ('invoice_id',       7,  _optional),
+                 ('description',      8,  _optional),
+                 ('amount',           9,  _optional),
+                 ('method',           10, _optional),
+                 ('type',             11, _optional),
+                 ('customer_id',      12, _optional),
+                 ('firstname',        13, _optional),
+                 ('lastname',         14, _optional),
+                 ('company',          15, _optional),
+                 ('address',          16, _optional),
+                 ('city',             17, _optional),
+                 ('state',            18, _optional),
+                 ('zip',              19, _optional),
+                 ('country',          20, _optional),
+                 ('phone',            21, _optional),
+                 ('fax',              22, _optional),
+                 ('email',            23, _optional),
+                 ('ship_firstname',   24, _optional),
+                 ('ship_lastname',    25, _optional),
+                 ('ship_company',     26, _optional),
+                 ('ship_address',     27, _optional),
+                 ('ship_city',        28, _optional),
+                 ('ship_state',       29, _optional),
+                 ('ship_zip',         30, _optional),
+                 ('ship_country',     31, _optional),
+                 ('tax',              32, _optional),
+                 ('duty',             33, _optional),
+                 ('freight',          34, _optional),
+                 ('tax_exempt',       35, _optional),
+                 ('po_number',        36, _optional),
+                 ('hash',             37, _optional),
+                 ('ccr',              38, _optional),
+                 ('avr',              39, _optional),
+                 ('account_number',   40, _optional),
+                 ('card_type',        41, _optional),
+                 ('tender_id',        42, _optional),
+                 ('requested_amount', 43, _optional),
+                 ('balance',          44, _optional))
+
+# Marks a response field that hasn't been decoded yet
+_UNDECODED = object()
+
+def _field(index, decoder):
+    """Build a read-only attribute that decodes a response field on first access and keeps it."""
+    
+    def get(self):
+        decoded = self._decoded
+        
+        if decoded is None:
+            decoded = self._decoded = [_UNDECODED] * len(RESULT_FIELDS)
+        
+        value = decoded[index]
+        
+        if value is _UNDECODED:
+            response = self.response
+            value    = decoded[index] = decoder(response[index]) if index < len(response) else None
+        
+        return value
+    
+    return property(get)
+
+def split_response(data, delimiter='|', encap_char=None):
+    """Split a delimited response into a tuple of field values."""
+    
+    if not encap_char:
+        return tuple(data.split(delimiter))
+    
+    # Every field is wrapped in the encapsulation character
+    data = data.strip()
+    
+    if data[:1] == encap_char:
+        data = data[1:]
+    if data[-1:] == encap_char:
+        data = data[:-1]
+    
+    return tuple(data.split(encap_char + delimiter + encap_char))
 
 class TransactionResult(Result):
-    """Represent a transaction result as an object."""
-    
-    def __init__(self, data, delimiter='|'):
-        RESPONSE_CODES  = {
-            1: 'approved',
-            2: 'declined',
-            3: 'error',
-            4: 'held for review'
-        }
-        
-        fields = data.split(delimiter)
-        
-        self.code             = int(fields[0])
-        self.status           = RESPONSE_CODES[self.code]
-        self.subcode          = int(fields[1])
-        self.reason_code      = int(fields[2])
-        self.reason           = fields[3]
-        self.approval         = fields[4]  if fields[4]  != '' else None
-        self.avs              = fields[5]  if fields[5]  != '' else None
-        self.transaction_id   = fields[6]  if fields[6]  != '' else None
-        self.invoice_id       = fields[7]  if fields[7]  != '' else None
-        self.description      = fields[8]  if fields[8]  != '' else None
-        self.amount           = fields[9]  if fields[9]  != '' else None
-        self.method           = fields[10] if fields[10] != '' else None
-        self.type             = fields[11] if fields[11] != '' else None
-        self.customer_id      = fields[12] if fields[12] != '' else None
-        self.firstname        = fields[13] if fields[13] != '' else None
-        self.lastname         = fields[14] if fields[14] != '' else None
-        self.company          = fields[15] if fields[15] != '' else None
-        self.address          = fields[16] if fields[16] != '' else None
-        self.city             = fields[17] if fields[17] != '' else None
-        self.state            = fields[18] if fields[18] != '' else None
-        self.zip              = fields[19] if fields[19] != '' else None
-        self.country          = fields[20] if fields[20] != '' else None
-        self.phone            = fields[21] if fields[21] != '' else None
-        self.fax              = fields[22] if fields[22] != '' else None
-        self.email            = fields[23] if fields[23] != '' else None
-        self.ship_firstname   = fields[24] if fields[24] != '' else None
-        self.ship_lastname    = fields[25] if fields[25] != '' else None
-        self.ship_company     = fields[26] if fields[26] != '' else None
-        self.ship_address     = fields[27] if fields[27] != '' else None
-        self.ship_city        = fields[28] if fields[28] != '' else None
-        self.ship_state       = fields[29] if fields[29] != '' else None
-        self.ship_zip         = fields[30] if fields[30] != '' else None
-        self.ship_country     = fields[31] if fields[31] != '' else None
-        self.tax              = fields[32] if fields[32] != '' else None
-        self.duty             = fields[33] if fields[33] != '' else None
-        self.freight          = fields[34] if fields[34] != '' else None
-        self.tax_exempt       = fields[35] if fields[35] != '' else None
-        self.po_number        = fields[36] if fields[36] != '' else None
-        self.hash             = fields[37] if fields[37] != '' else None
-        self.ccr              = fields[38] if fields[38] != '' else None
-        self.avr              = fields[39] if fields[39] != '' else None
-        self.account_number   = fields[40] if fields[40] != '' else None
-        self.card_type        = fields[41] if fields[41] != '' else None
-        self.tender_id        = fields[42] if fields[42] != '' else None
-        self.requested_amount = fields[43] if fields[43] != '' else None
-        self.balance          = fields[44] if fields[44] != '' else None
-        
-        self.response         = fields
+    """Represent a transaction result as an object.
+    
+    Only the split response is stored; the named fields are decoded
+    from it through the RESULT_FIELDS index table on first access and
+    kept, so reading one again doesn't decode it again.
+    
+    """
+    
+    __slots__ = ('response', '_decoded')
+    
+    def __init__(self, data, delimiter='|', encap_char=None):
+        self.response = split_response(data, delimiter, encap_char)
+        self._decoded = None
+    
+    @property
+    def status(self):
+        return RESPONSE_CODES[self.code]
+    
+    def __getstate__(self):
+        return self.response
+    
+    def __setstate__(self, state):
+        self.response = state
+        self._decoded = None
     
     def validate(self, login, salt):
         """Validate a returned response with the given hash."""
@@ -75,6 +147,11 @@ class TransactionResult(Result):
         value = ''.join([salt, login, self.transaction_id, self.amount])
         return self.hash.upper() == hashlib.md5(value).hexdigest().upper()
     
+    def retryable(self):
+        """Does the gateway ask for the transaction to be tried again?"""
+        
+        return self.code == 3 and self.reason_code in RETRY_REASON_CODES
+    
     def __str__(self):
         """Return the response message."""
         
@@ -90,39 +167,106 @@ class TransactionResult(Result):
         
         return '<%s at 0x%x %s>' % (self.__class__.__name__, abs(id(self)), self.type)
 
+for name, index, decoder in RESULT_FIELDS:
+    setattr(TransactionResult, name, _field(index, decoder))
+
+del name, index, decoder
+
 class Transaction(Adapter):
     """Authorize.net AIM (Advanced Integration Method) transaction object adapter.
     
-    Represent an Authorize.net transaction and provide a method for
-    submission.
+    Submit Authorize.net transactions, each given to process() as an
+    AIM options schema, or the one the adapter was created with.
     
     """
     
-    def __init__(self, options):
-        ENDPOINT_AIM_PRODUCTION = 'secure.authorize.net/gateway/transact.dll'
-        ENDPOINT_AIM_TEST       = 'test.authorize.net/gateway/transact.dll'
+    interface  = IAim
+    exception  = AIMException
+    serializer = Serialize
+    
+    def __init__(self, options=None, endpoint=None, retry=None, transport=None, instrument=None, metrics=None):
+        self._bind(options)
+        
+        self.endpoint   = endpoint
+        self.retry      = retry
+        self.transport  = transport or pooled
+        self.instrument = instrument
+        self.metrics    = metrics
+    
+    @classmethod
+    def schema(cls, credentials, request):
+        """Wrap a transaction schema and merchant credentials in an AIM schema."""
+        
+        if IAim.providedBy(request):
+            return request
+        
+        schema                = SAim()
+        schema.authentication = credentials
+        schema.transaction    = request
+        
+        return schema
+    
+    @staticmethod
+    def endpoint_for(testing):
+        """Return the AIM endpoint for test or production requests."""
+        
+        return ENDPOINT_AIM_TEST if testing else ENDPOINT_AIM_PRODUCTION
+    
+    def process(self, options=None, timeout=None, deadline=None):
+        """Process a transaction and return a result.
+        
+        ``deadline``, in seconds or a Deadline, bounds the whole call,
+        retries included. Under a retry policy the transaction is only
+        retried if the gateway can reject the retry as a duplicate, i.e.
+        it has a duplicate window and an invoice number.
         
-        if not IAim.providedBy(options):
-            raise AIMException('the options object must provide a valid schema interface')
+        """
         
-        self.options    = options
-        self.serialized = Serialize(options)
+        options   = self._options(options)
+        operation = self.operation(options)
+        endpoint  = self._endpoint(options)
+        data      = self._timed(operation, SERIALIZE, self._serialize, options)
+        deadline  = deadline_for(deadline)
+        send      = lambda: self._exchange(operation, self.transport.request, endpoint, data, HEADERS, timeout, deadline)
+        parse     = lambda body: self._timed(operation, PARSE, self._result, options, body)
         
-        testing = options.transaction.testing
-        host    = ENDPOINT_AIM_TEST if testing else ENDPOINT_AIM_PRODUCTION
+        if self.retry is None:
+            return self._measured(operation, endpoint, lambda: parse(send()))
         
-        # Create the connection object
-        self.connection = urllib2.Request(url='https://' + host)
+        trans = options.transaction
+        
+        return self._measured(operation, endpoint, self.retry.run, endpoint, send, parse, idempotent=bool(trans.duplicate_window and trans.invoice), deadline=deadline)
     
-    def process(self):
-        """Process the transaction and return a result."""
+    def process_async(self, options=None, deadline=None):
+        """Submit a transaction without blocking and return an AsyncResult."""
+        
+        options   = self._options(options)
+        operation = self.operation(options)
+        endpoint  = self._endpoint(options)
+        data      = self._timed(operation, SERIALIZE, self._serialize, options)
         
-        data = str(self.serialized)
+        send      = lambda: self._exchange_async(operation, self.transport.request_async, endpoint, data, HEADERS, deadline_for(deadline))
         
-        self.connection.headers['Content-Length'] = str(len(data))
-        self.connection.data                      = data
+        return self._measured_async(operation, endpoint, lambda: send().then(lambda body: self._timed(operation, PARSE, self._result, options, body)))
+    
+    def operation(self, options=None):
+        """The operation a transaction's requests are labelled with, e.g. aim.auth_capture."""
+        
+        return 'aim.' + self._options(options).transaction.type.lower()
+    
+    def code(self, result):
+        """Count results by their status, e.g. approved."""
+        
+        return result.status
+    
+    def _endpoint(self, options):
+        """The configured endpoint, or the one the transaction's testing flag picks."""
+        
+        return self.endpoint or self.endpoint_for(options.transaction.testing)
+    
+    def _result(self, options, data):
+        """Parse the response with the delimiter and encapsulation character we asked for."""
         
-        request = urllib2.urlopen(self.connection)
-        result  = TransactionResult(request.read())
+        trans = options.transaction
         
-        return result
+        return TransactionResult(data, trans.delim_char, trans.encap_char)
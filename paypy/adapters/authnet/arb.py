@@ -1,45 +1,50 @@
-import urllib2
+from paypy.adapters                    import *
+from paypy.adapters.authnet.connection import deadline_for, ENDPOINT_XML_PRODUCTION, ENDPOINT_XML_TEST
+from paypy.adapters.authnet.transport  import pooled
+from paypy.adapters.authnet.response   import XMLResult, text
+from paypy.exceptions.authnet          import ARBException
+from paypy.instrument                  import VALIDATE, SERIALIZE, PARSE
+from paypy.schemas.authnet.arb         import IAuthnetSubscriptionCreate, IAuthnetSubscriptionUpdate, IAuthnetSubscriptionStatus, IAuthnetSubscriptionCancel
+from paypy.serializers.authnet.arb     import Serialize
+from paypy.schemas.authnet.arb         import IArb, SArb
 
-from lxml import etree as ET
-
-from paypy.adapters                import *
-from paypy.exceptions.authnet      import ARBException
-from paypy.schemas.authnet.arb     import IAuthnetSubscriptionCreate, IAuthnetSubscriptionUpdate, IAuthnetSubscriptionStatus, IAuthnetSubscriptionCancel
-from paypy.serializers.authnet.arb import Serialize
-from paypy.schemas.authnet.arb     import IArb
+HEADERS = {'Content-Type' : 'text/xml'}
 
 ARB_REQUEST_ELEMENTS    = {'create' : 'ARBCreateSubscriptionRequest',
                            'update' : 'ARBUpdateSubscriptionRequest',
                            'status' : 'ARBGetSubscriptionStatusRequest',
                            'cancel' : 'ARBCancelSubscriptionRequest'}
 
-class RecurringTransactionResult(Result):
+ARB_OPERATIONS          = {'create' : (IAuthnetSubscriptionCreate, 'a creation request must conform to the IAuthnetSubscriptionCreate interface'),
+                           'update' : (IAuthnetSubscriptionUpdate, 'an update request must conform to the IAuthnetSubscriptionUpdate interface'),
+                           'status' : (IAuthnetSubscriptionStatus, 'a status request must conform to the IAuthnetSubscriptionStatus interface'),
+                           'cancel' : (IAuthnetSubscriptionCancel, 'a cancel request must conform to the IAuthnetSubscriptionCancel interface')}
+
+SUBSCRIPTION_ID     = text('anet:subscriptionId')
+SUBSCRIPTION_STATUS = text('anet:status')
+
+class RecurringTransactionResult(XMLResult):
     """Represent a recurring (subscription) transaction result as an object."""
     
     def __init__(self, data):
         """Set the result items."""
         
-        ANET_XMLNS = ' xmlns="AnetApi/xml/v1/schema/AnetApiSchema.xsd"'
-        
-        data     = data.replace(ANET_XMLNS, '')
-        
-        root     = ET.XML(data)
-        messages = root.find('messages')
-        
-        self.result_code = messages.find('resultCode').text
-        self.code        = messages.find('message/code').text
-        self.reason      = messages.find('message/text').text
-        self.status      = None
+        super(RecurringTransactionResult, self).__init__(data)
         
+        self.status          = None
         self.subscription_id = None
-        subscription_id      = root.find('subscriptionId')
         
-        if root.tag == 'ARBCreateSubscriptionResponse' and subscription_id is not None:
-            self.subscription_id = subscription_id.text
+        if self.tag == 'ARBCreateSubscriptionResponse':
+            self.subscription_id = SUBSCRIPTION_ID(self.root)
         
         # GetSubscriptionStatusResponse specific
-        if root.tag == 'ARBGetSubscriptionStatusResponse':
-            self.status = root.find('Status').text.capitalize().strip()
+        if self.tag == 'ARBGetSubscriptionStatusResponse':
+            status = SUBSCRIPTION_STATUS(self.root)
+            
+            if status is not None:
+                self.status = status.capitalize().strip()
+        
+        self._extracted()
     
     def __str__(self):
         """Calling str on the object will return the subscription_id if successful (and it exists) or the the message."""
@@ -51,82 +56,157 @@ class RecurringTransactionResult(Result):
             return self.status
         
         return self.reason
-    
-    def __repr__(self):
-        """Object representation of the subscription result object."""
-        
-        return '<%s at 0x%x %s>' % (self.__class__.__name__, abs(id(self)), self.result_code)
 
 class RecurringTransaction(Adapter):
     """Authorize.net ARB (Automated Recurring Billing) transaction object adapter.
     
-    Represent an Authorize.net recurring transaction and provide
-    methods for submitting new subscriptions, updating subscriptions,
-    cancelling subscriptions, and retrieving the status of a
-    subscription.
+    Provide methods for submitting new subscriptions, updating
+    subscriptions, cancelling subscriptions, and retrieving the status
+    of a subscription, each given an ARB options schema, or the one the
+    adapter was created with.
     
     """
     
-    def __init__(self, options):
-        
-        ENDPOINT_XML_PRODUCTION = 'api.authorize.net/xml/v1/'
-        ENDPOINT_XML_TEST       = 'apitest.authorize.net/xml/v1/'
-        REQUEST_PATH            = 'request.api'
+    interface  = IArb
+    exception  = ARBException
+    serializer = Serialize
+    
+    def __init__(self, options=None, endpoint=None, retry=None, transport=None, instrument=None, metrics=None):
+        self._bind(options)
+        
+        self.endpoint   = endpoint
+        self.retry      = retry
+        self.transport  = transport or pooled
+        self.instrument = instrument
+        self.metrics    = metrics
+    
+    @classmethod
+    def schema(cls, credentials, request):
+        """Wrap a subscription schema and merchant credentials in an ARB schema."""
         
-        if not IArb.providedBy(options):
-            raise ARBException('the options object must provide a valid schema interface')
+        if IArb.providedBy(request):
+            return request
         
-        self.options    = options
-        self.serialized = Serialize(options)
+        schema                = SArb()
+        schema.authentication = credentials
+        schema.subscription   = request
         
-        testing = options.subscription.testing
-        host    = ENDPOINT_XML_TEST if testing else ENDPOINT_XML_PRODUCTION
+        return schema
+    
+    @staticmethod
+    def endpoint_for(testing):
+        """Return the XML API endpoint for test or production requests."""
         
-        self.connection = urllib2.Request(url='https://' + host + REQUEST_PATH, headers={'Content-Type' : 'text/xml'})
+        return ENDPOINT_XML_TEST if testing else ENDPOINT_XML_PRODUCTION
     
-    def create(self):
+    def create(self, options=None, deadline=None):
         """Create a new subscription."""
         
-        if not IAuthnetSubscriptionCreate.providedBy(self.options.subscription):
-            raise ARBException('a creation request must conform to the IAuthnetSubscriptionCreate interface')
+        options = self._check('create', options)
         
-        return RecurringTransactionResult(self._request())
+        return self._request('create', options, RecurringTransactionResult, deadline, idempotent=False)
     
-    def update(self):
+    def update(self, options=None, deadline=None):
         """Update a given subscription."""
         
-        if not IAuthnetSubscriptionUpdate.providedBy(self.options.subscription):
-            raise ARBException('an update request must conform to the IAuthnetSubscriptionUpdate interface')
+        options = self._check('update', options)
         
-        return RecurringTransactionResult(self._request())
+        return self._request('update', options, RecurringTransactionResult, deadline)
     
-    def status(self):
+    def status(self, options=None, deadline=None):
         """Retrieve the subscription's status."""
         
-        if not IAuthnetSubscriptionStatus.providedBy(self.options.subscription):
-            raise ARBException('a status request must conform to the IAuthnetSubscriptionStatus interface')
+        options = self._check('status', options)
         
-        return RecurringTransactionResult(self._request())
+        return self._request('status', options, RecurringTransactionResult, deadline)
     
-    def cancel(self):
+    def cancel(self, options=None, deadline=None):
         """Cancel the subscription object."""
         
-        if not IAuthnetSubscriptionCancel.providedBy(self.options.subscription):
-            raise ARBException('a cancel request must conform to the IAuthnetSubscriptionCancel interface')
+        options = self._check('cancel', options)
+        
+        return self._request('cancel', options, RecurringTransactionResult, deadline)
+    
+    def create_async(self, options=None, deadline=None):
+        """Create a new subscription without blocking, return an AsyncResult."""
+        
+        options = self._check('create', options)
         
-        return RecurringTransactionResult(self._request())
+        return self._request_async('create', options, RecurringTransactionResult, deadline)
     
-    def _request(self):
-        """Send the request to authorize.net."""
+    def update_async(self, options=None, deadline=None):
+        """Update a given subscription without blocking, return an AsyncResult."""
+        
+        options = self._check('update', options)
         
-        data = str(self.serialized)
+        return self._request_async('update', options, RecurringTransactionResult, deadline)
+    
+    def status_async(self, options=None, deadline=None):
+        """Retrieve the subscription's status without blocking, return an AsyncResult."""
         
-        print data
+        options = self._check('status', options)
+        
+        return self._request_async('status', options, RecurringTransactionResult, deadline)
+    
+    def cancel_async(self, options=None, deadline=None):
+        """Cancel the subscription without blocking, return an AsyncResult."""
+        
+        options = self._check('cancel', options)
+        
+        return self._request_async('cancel', options, RecurringTransactionResult, deadline)
+    
+    def operation(self, name):
+        """The label of an operation's requests, e.g. arb.create."""
+        
+        return 'arb.' + name
+    
+    def code(self, result):
+        """Count results by their result code, Ok or Error."""
+        
+        return result.result_code
+    
+    def _check(self, operation, options):
+        """Be sure the subscription schema matches the requested operation, return the call's options schema."""
+        
+        options            = self._options(options)
+        interface, message = ARB_OPERATIONS[operation]
+        
+        if not self._timed(self.operation(operation), VALIDATE, interface.providedBy, options.subscription):
+            raise ARBException(message)
+        
+        return options
+    
+    def _endpoint(self, options):
+        """The configured endpoint, or the one the subscription's testing flag picks."""
+        
+        return self.endpoint or self.endpoint_for(options.subscription.testing)
+    
+    def _request(self, operation, options, parse, deadline=None, idempotent=True):
+        """Send the request to authorize.net and parse the response, under the retry policy if there is one.
+        
+        A request that isn't idempotent, e.g. a creation, is never retried.
+        
+        """
+        
+        operation = self.operation(operation)
+        endpoint  = self._endpoint(options)
+        data      = self._timed(operation, SERIALIZE, self._serialize, options)
+        deadline  = deadline_for(deadline)
+        send      = lambda: self._exchange(operation, self.transport.request, endpoint, data, HEADERS, None, deadline)
+        parsed    = lambda body: self._timed(operation, PARSE, parse, body)
+        
+        if self.retry is None:
+            return self._measured(operation, endpoint, lambda: parsed(send()))
+        
+        return self._measured(operation, endpoint, self.retry.run, endpoint, send, parsed, idempotent=idempotent, deadline=deadline)
+    
+    def _request_async(self, operation, options, parse, deadline=None):
+        """Send the request to authorize.net without blocking, return an AsyncResult for the parsed response."""
         
-        self.connection.headers['Content-Length'] = str(len(data))
-        self.connection.data                      = data
+        operation = self.operation(operation)
+        endpoint  = self._endpoint(options)
+        data      = self._timed(operation, SERIALIZE, self._serialize, options)
         
-        request   = urllib2.urlopen(self.connection)
-        result    = request.read()
+        send      = lambda: self._exchange_async(operation, self.transport.request_async, endpoint, data, HEADERS, deadline_for(deadline))
         
-        return result
+        return self._measured_async(operation, endpoint, lambda: send().then(lambda body: self._timed(operation, PARSE, parse, body)))
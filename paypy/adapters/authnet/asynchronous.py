@@ -0,0 +1,593 @@
+"""Authorize.net Asynchronous Transport
+
+A non-blocking HTTP(S) client built on asyncore so a single thread can
+keep many gateway requests in flight at once. Requests return an
+``AsyncResult`` immediately; the reactor's event loop is driven with
+``run()`` (or ``poll()`` from an existing loop) and the results fire
+their callbacks as the responses arrive.
+
+The reactor is single-threaded: create, run and consume its results
+from the same thread. A request given a Deadline fails with a
+TimeoutException once it passes, wherever the request has got to.
+
+"""
+
+import asyncore
+import errno
+import select
+import socket
+import ssl
+import sys
+
+from paypy.adapters.authnet.connection import CONNECT, SEND, READ
+from paypy.exceptions.authnet          import ConnectionException, GatewayStatusException
+
+DEFAULT_PORTS = {'http' : 80, 'https' : 443}
+
+def split_host(scheme, host):
+    """Return the hostname and port of an endpoint host, the port defaulting by scheme."""
+    
+    if host.startswith('['):
+        hostname, rest = host[1:].split(']', 1)
+        port           = rest[1:] or DEFAULT_PORTS[scheme]
+    elif host.count(':') == 1:
+        hostname, port = host.split(':')
+    else:
+        hostname, port = host, DEFAULT_PORTS[scheme]
+    
+    return hostname, int(port)
+
+class AsyncResult(object):
+    """The eventual result of an asynchronous gateway request."""
+    
+    def __init__(self, reactor):
+        self.reactor    = reactor
+        self._done      = False
+        self._value     = None
+        self._error     = None
+        self._callbacks = []
+    
+    def done(self):
+        """Has the request completed, successfully or not?"""
+        
+        return self._done
+    
+    def result(self):
+        """Drive the reactor until the request completes and return its value."""
+        
+        if not self._done:
+            self.reactor.run(self)
+        
+        if self._error is not None:
+            raise self._error
+        
+        return self._value
+    
+    def exception(self):
+        """Return the exception the request failed with, if any."""
+        
+        return self._error
+    
+    def add_callback(self, callback, errback=None):
+        """Call callback(value) on success or errback(exception) on failure."""
+        
+        self._callbacks.append((callback, errback))
+        
+        if self._done:
+            self._fire()
+        
+        return self
+    
+    def then(self, function):
+        """Return a new result holding function(value) once this one completes."""
+        
+        chained = AsyncResult(self.reactor)
+        
+        def callback(value):
+            try:
+                chained.set_result(function(value))
+            except Exception, e:
+                chained.set_exception(e)
+        
+        self.add_callback(callback, chained.set_exception)
+        
+        return chained
+    
+    def set_result(self, value):
+        """Complete the request with a value."""
+        
+        self._value = value
+        self._done  = True
+        self._fire()
+    
+    def set_exception(self, error):
+        """Complete the request with an exception."""
+        
+        self._error = error
+        self._done  = True
+        self._fire()
+    
+    def _fire(self):
+        """Run and discard the registered callbacks."""
+        
+        callbacks, self._callbacks = self._callbacks, []
+        
+        for callback, errback in callbacks:
+            if self._error is None:
+                callback(self._value)
+            elif errback is not None:
+                errback(self._error)
+    
+    def __repr__(self):
+        state = 'done' if self._done else 'pending'
+        
+        return '<%s at 0x%x %s>' % (self.__class__.__name__, abs(id(self)), state)
+
+class ResponseParser(object):
+    """Incrementally parse an HTTP/1.x response."""
+    
+    def __init__(self):
+        self.buffer  = ''
+        self.status  = None
+        self.reason  = None
+        self.headers = None
+        self.body    = None
+        self.length  = None
+        self.chunked = False
+        self.close   = False
+        self.done    = False
+        self._chunks = []
+    
+    def feed(self, data):
+        """Consume data from the socket, return True once the response is complete."""
+        
+        self.buffer += data
+        
+        if self.headers is None:
+            end = self.buffer.find('\r\n\r\n')
+            
+            if end < 0:
+                return False
+            
+            self._headers(self.buffer[:end])
+            self.buffer = self.buffer[end + 4:]
+        
+        if self.chunked:
+            self._dechunk()
+        elif self.length is not None and len(self.buffer) >= self.length:
+            self.body = self.buffer[:self.length]
+            self.done = True
+        
+        return self.done
+    
+    def finish(self):
+        """The server closed the connection, complete a read-until-close body."""
+        
+        if self.headers is not None and self.length is None and not self.chunked:
+            self.body = self.buffer
+            self.done = True
+        
+        return self.done
+    
+    def _headers(self, data):
+        """Parse the status line and headers."""
+        
+        lines                 = data.split('\r\n')
+        version, status, rest = (lines[0].split(' ', 2) + [''])[:3]
+        
+        self.status  = int(status)
+        self.reason  = rest
+        self.headers = {}
+        
+        for line in lines[1:]:
+            name, value = line.split(':', 1)
+            self.headers[name.strip().lower()] = value.strip()
+        
+        connection   = self.headers.get('connection', '').lower()
+        self.close   = connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive')
+        self.chunked = self.headers.get('transfer-encoding', '').lower() == 'chunked'
+        
+        if not self.chunked and 'content-length' in self.headers:
+            self.length = int(self.headers['content-length'])
+        elif not self.chunked:
+            self.close = True
+    
+    def _dechunk(self):
+        """Decode as many complete chunks as are buffered."""
+        
+        while True:
+            end = self.buffer.find('\r\n')
+            
+            if end < 0:
+                return
+            
+            size = int(self.buffer[:end].split(';')[0], 16)
+            
+            if size == 0:
+                # Wait for the (empty) trailer
+                if self.buffer.find('\r\n\r\n', end) < 0:
+                    return
+                
+                self.body = ''.join(self._chunks)
+                self.done = True
+                return
+            
+            if len(self.buffer) < end + 2 + size + 2:
+                return
+            
+            self._chunks.append(self.buffer[end + 2:end + 2 + size])
+            self.buffer = self.buffer[end + 2 + size + 2:]
+
+class Channel(asyncore.dispatcher):
+    """A single non-blocking HTTP(S) connection to an endpoint host.
+    
+    ``address`` is the (family, sockaddr) pair the host resolved to, so
+    connecting never waits on DNS inside the event loop.
+    
+    """
+    
+    def __init__(self, reactor, scheme, host, address):
+        asyncore.dispatcher.__init__(self, map=reactor.map)
+        
+        family, sockaddr = address
+        
+        self.reactor     = reactor
+        self.key         = (scheme, host)
+        self.hostname    = split_host(scheme, host)[0]
+        self.secure      = scheme == 'https'
+        self.handshaking = False
+        self.want_write  = False
+        self.outbuf      = ''
+        self.written     = 0
+        self.parser      = None
+        self.pending     = None
+        self.deadline    = None
+        self.requests    = 0
+        
+        self.create_socket(family, socket.SOCK_STREAM)
+        
+        try:
+            self.connect(sockaddr)
+        except socket.error:
+            self.close()
+            raise
+    
+    def send_request(self, path, data, headers, result, request):
+        """Queue a POST request on this connection."""
+        
+        lines = ['POST %s HTTP/1.1' % path,
+                 'Host: %s' % self.key[1],
+                 'Content-Length: %d' % len(data)]
+        
+        for name, value in headers.items():
+            lines.append('%s: %s' % (name, value))
+        
+        self.outbuf   = '\r\n'.join(lines) + '\r\n\r\n' + data
+        self.written  = 0
+        self.parser   = ResponseParser()
+        self.pending  = (result, request)
+        self.deadline = request[3]
+    
+    def alive(self):
+        """Is the idle connection still open? Its socket turns readable once the server closes it."""
+        
+        try:
+            return not select.select([self.socket], [], [], 0)[0]
+        except (select.error, socket.error, ValueError):
+            return False
+    
+    def readable(self):
+        return True
+    
+    def writable(self):
+        if not self.connected:
+            return True
+        
+        if self.handshaking:
+            return self.want_write
+        
+        return bool(self.outbuf)
+    
+    def handle_connect(self):
+        if self.secure:
+            if hasattr(ssl, 'create_default_context'):
+                context     = ssl.create_default_context()
+                self.socket = context.wrap_socket(self.socket, server_hostname=self.hostname, do_handshake_on_connect=False)
+            else:
+                self.socket = ssl.wrap_socket(self.socket, do_handshake_on_connect=False)
+            
+            self.handshaking = True
+            self._handshake()
+    
+    def handle_write(self):
+        if self.handshaking:
+            self._handshake()
+            return
+        
+        try:
+            sent = self.socket.send(self.outbuf)
+        except ssl.SSLError, e:
+            if e.args[0] in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE):
+                return
+            raise
+        except socket.error, e:
+            if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+                return
+            raise
+        
+        self.outbuf   = self.outbuf[sent:]
+        self.written += sent
+    
+    def handle_read(self):
+        if self.handshaking:
+            self._handshake()
+            return
+        
+        while True:
+            try:
+                data = self.socket.recv(65536)
+            except ssl.SSLError, e:
+                if e.args[0] in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE):
+                    return
+                raise
+            except socket.error, e:
+                if e.args[0] in (errno.EWOULDBLOCK, errno.EAGAIN):
+                    return
+                raise
+            
+            if not data:
+                self.handle_close()
+                return
+            
+            if self.parser is None:
+                # Unsolicited data on an idle connection, it can't be reused
+                self.handle_close()
+                return
+            
+            if self.parser.feed(data):
+                self._complete()
+                return
+            
+            # SSL may hold decrypted bytes select() can't see
+            if not self.secure or not self.socket.pending():
+                return
+    
+    def handle_close(self):
+        pending      = self.pending
+        parser       = self.parser
+        self.pending = None
+        self.parser  = None
+        
+        self.close()
+        self.reactor._forget(self)
+        
+        if pending is None:
+            return
+        
+        result, request = pending
+        
+        if parser.finish():
+            result.set_result(self._body(parser))
+        elif self.requests and not self.written:
+            # The gateway closed a pooled keep-alive connection before it got any of the
+            # request, try once more on a fresh one. Once bytes went out the request may
+            # have been processed, resending it could charge twice.
+            self.reactor._dispatch(request, result, reuse=False)
+        else:
+            result.set_exception(ConnectionException('connection to %s closed before the response completed' % self.key[1]))
+    
+    def handle_error(self):
+        error        = sys.exc_info()[1]
+        pending      = self.pending
+        self.pending = None
+        self.parser  = None
+        
+        self.close()
+        self.reactor._forget(self)
+        
+        if pending is not None:
+            pending[0].set_exception(ConnectionException('request to %s failed: %s' % (self.key[1], error)))
+    
+    def expire(self):
+        """Fail the pending request with a timeout naming the phase it had got to."""
+        
+        result       = self.pending[0]
+        self.pending = None
+        self.parser  = None
+        
+        if not self.connected or self.handshaking:
+            phase = CONNECT
+        elif self.outbuf:
+            phase = SEND
+        else:
+            phase = READ
+        
+        self.close()
+        self.reactor._forget(self)
+        
+        result.set_exception(self.deadline.exceeded(phase, self.key[1]))
+    
+    def _handshake(self):
+        """Advance the non-blocking TLS handshake."""
+        
+        try:
+            self.socket.do_handshake()
+        except ssl.SSLError, e:
+            if e.args[0] == ssl.SSL_ERROR_WANT_READ:
+                self.want_write = False
+            elif e.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+                self.want_write = True
+            else:
+                raise
+        else:
+            self.handshaking = False
+    
+    def _complete(self):
+        """Hand the parsed response to the waiting result and return to the pool."""
+        
+        result, request = self.pending
+        parser          = self.parser
+        self.pending    = None
+        self.parser     = None
+        self.requests  += 1
+        
+        if parser.close:
+            self.close()
+            self.reactor._forget(self)
+        else:
+            self.reactor._release(self)
+        
+        try:
+            body = self._body(parser)
+        except ConnectionException, e:
+            result.set_exception(e)
+        else:
+            result.set_result(body)
+    
+    def _body(self, parser):
+        """Return the response body or raise on a non-200 status."""
+        
+        if parser.status != 200:
+            raise GatewayStatusException('%s returned HTTP %d %s' % (self.key[1], parser.status, parser.reason), parser.status)
+        
+        return parser.body
+
+class Reactor(object):
+    """Drive non-blocking gateway requests from a single event loop.
+    
+    Idle keep-alive connections are kept per endpoint host (up to
+    ``size`` each) and reused by later requests.
+    
+    """
+    
+    def __init__(self, size=10):
+        self.size       = size
+        self.map        = {}
+        self._idle      = {}
+        self._addresses = {}
+    
+    def request(self, endpoint, data, headers=None, deadline=None):
+        """POST data to the endpoint and return an AsyncResult for the response body."""
+        
+        result = AsyncResult(self)
+        self._dispatch((endpoint, data, headers or {}, deadline), result)
+        
+        return result
+    
+    def poll(self, timeout=0.0):
+        """Run a single iteration of the event loop, then fail the requests whose deadline has passed."""
+        
+        timed = [x for x in self.map.values() if x.pending is not None and x.deadline is not None]
+        
+        if timed:
+            timeout = min([timeout] + [x.deadline.remaining() for x in timed])
+        
+        if self.map:
+            asyncore.loop(timeout, map=self.map, count=1)
+        
+        for channel in timed:
+            if channel.pending is not None and channel.deadline.expired():
+                channel.expire()
+    
+    def run(self, *results):
+        """Run the event loop until the given results (or all requests) complete."""
+        
+        while self.map:
+            if results and not [x for x in results if not x.done()]:
+                break
+            
+            if not [x for x in self.map.values() if x.pending is not None]:
+                break
+            
+            self.poll(1.0)
+        
+        for result in results:
+            if not result.done():
+                result.set_exception(ConnectionException('the event loop stopped before the request completed'))
+        
+        return [x.result() for x in results]
+    
+    def close(self):
+        """Close every connection owned by the reactor."""
+        
+        for channel in self.map.values():
+            channel.close()
+        
+        self.map.clear()
+        self._idle.clear()
+        self._addresses.clear()
+    
+    def _dispatch(self, request, result, reuse=True):
+        """Send a request on an idle connection or a new one."""
+        
+        endpoint, data, headers, deadline = request
+        scheme, host, path                = endpoint
+        
+        if deadline is not None and deadline.expired():
+            result.set_exception(deadline.exceeded(CONNECT, host))
+            return
+        
+        channel = reuse and self._checkout(scheme, host)
+        
+        if not channel:
+            try:
+                channel = Channel(self, scheme, host, self._resolve(scheme, host))
+            except socket.error, e:
+                result.set_exception(ConnectionException('request to %s failed: %s' % (host, e)))
+                return
+        
+        channel.send_request(path, data, headers, result, request)
+    
+    def _checkout(self, scheme, host):
+        """Return an idle connection to the host still open, closing those the server closed."""
+        
+        idle = self._idle.get((scheme, host))
+        
+        while idle:
+            channel = idle.pop()
+            
+            if channel.alive():
+                return channel
+            
+            channel.close()
+        
+        return None
+    
+    def _resolve(self, scheme, host):
+        """Return the (family, sockaddr) of a host, looked up once and remembered."""
+        
+        address = self._addresses.get((scheme, host))
+        
+        if address is None:
+            hostname, port = split_host(scheme, host)
+            family, kind, protocol, name, sockaddr = socket.getaddrinfo(hostname, port, 0, socket.SOCK_STREAM)[0]
+            
+            address = self._addresses[(scheme, host)] = (family, sockaddr)
+        
+        return address
+    
+    def _release(self, channel):
+        """Keep a finished connection around for reuse."""
+        
+        idle = self._idle.setdefault(channel.key, [])
+        
+        if len(idle) < self.size:
+            idle.append(channel)
+        else:
+            channel.close()
+    
+    def _forget(self, channel):
+        """Drop a closed connection from the idle list."""
+        
+        idle = self._idle.get(channel.key, [])
+        
+        if channel in idle:
+            idle.remove(channel)
+
+# The reactor used by the adapters' *_async methods
+reactor = Reactor()
+
+def run(*results):
+    """Run the shared reactor until the given results complete and return their values."""
+    
+    return reactor.run(*results)
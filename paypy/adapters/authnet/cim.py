@@ -1,15 +1,20 @@
-import urllib2
+from lxml                                import etree as ET
 
-from lxml                          import etree as ET
+from paypy.adapters                      import *
+from paypy.adapters.authnet.connection   import deadline_for, ENDPOINT_XML_PRODUCTION, ENDPOINT_XML_TEST
+from paypy.adapters.authnet.transport    import pooled
+from paypy.adapters.authnet.asynchronous import reactor, AsyncResult
+from paypy.adapters.authnet.response     import XMLResult, ANET_NS, RETRY_CODES, text, texts, element, elements
+from paypy.exceptions.authnet            import CIMException
+from paypy.instrument                    import VALIDATE, SERIALIZE, PARSE
 
-from paypy.adapters                import *
-from paypy.exceptions.authnet      import CIMException
+from paypy.schemas.authnet.cim           import *
+from paypy.serializers.authnet.cim       import Serialize
+from paypy.schemas.authnet.cim           import ICim
 
-from paypy.schemas.authnet.cim     import *
-from paypy.serializers.authnet.cim import Serialize
-from paypy.schemas.authnet.cim     import ICim
+from paypy.adapters.authnet.aim          import TransactionResult
 
-from paypy.adapters.authnet.aim    import TransactionResult
+HEADERS = {'Content-Type' : 'text/xml'}
 
 PROFILE  = 'CustomerProfileRequest'
 PAYMENT  = 'CustomerPaymentProfileRequest'
@@ -31,48 +36,114 @@ CIM_REQUEST_ELEMENTS    = {'create'   : ('create%s' % PROFILE,
                                          'delete%s' % SHIPPING)
                           }
 
-class ProfileResult(Result):
+CIM_OPERATIONS          = {'create'   : ((IAuthnetProfileCreate,
+                                          IAuthnetProfileCreateBilling,
+                                          IAuthnetProfileCreateShipping,
+                                          IAuthnetProfileCreateTransaction),
+                                         'a creation request must conform to one of the creation interfaces'),
+                           'update'   : ((IAuthnetProfileUpdate,
+                                          IAuthnetProfileUpdateBilling,
+                                          IAuthnetProfileUpdateShipping,
+                                          IAuthnetProfileUpdateSplitTender),
+                                         'an update request must conform to one of the update interfaces'),
+                           'retrieve' : ((IAuthnetProfileRetrieveAll,
+                                          IAuthnetProfileRetrieve,
+                                          IAuthnetProfileRetrieveBilling,
+                                          IAuthnetProfileRetrieveShipping),
+                                         'a retrieval request must conform to one of the retrieval interfaces'),
+                           'remove'   : ((IAuthnetProfileDelete,
+                                          IAuthnetProfileDeleteBilling,
+                                          IAuthnetProfileDeleteShipping),
+                                         'a removal request must conform to one of the deletion interfaces')
+                          }
+
+# Requests that change a profile, so its cached retrievals are dropped
+INVALIDATING            = (IAuthnetProfileCreateBilling,
+                           IAuthnetProfileCreateShipping,
+                           IAuthnetProfileUpdate,
+                           IAuthnetProfileUpdateBilling,
+                           IAuthnetProfileUpdateShipping,
+                           IAuthnetProfileDelete,
+                           IAuthnetProfileDeleteBilling,
+                           IAuthnetProfileDeleteShipping)
+
+# Response fields, see paypy.adapters.authnet.response
+PROFILE_ID           = text('anet:customerProfileId')
+PROFILE_IDS          = texts('anet:ids/*')
+PAYMENT_ID           = text('anet:customerPaymentProfileId')
+PAYMENT_IDS          = texts('anet:customerPaymentProfileIdList/*')
+SHIPPING_ID          = text('anet:customerAddressId')
+SHIPPING_IDS         = texts('anet:customerShippingAddressIdList/*')
+VALIDATION           = text('anet:validationDirectResponse')
+VALIDATION_RESPONSES = texts('anet:validationDirectResponseList/*')
+DIRECT_RESPONSE      = text('anet:directResponse')
+
+CUSTOMER_PROFILE     = element('anet:profile')
+PAYMENT_PROFILE      = element('anet:paymentProfile')
+PAYMENT_PROFILES     = elements('anet:paymentProfiles')
+SHIPPING_ADDRESS     = element('anet:address')
+SHIPPING_ADDRESSES   = elements('anet:shipToList')
+BILL_TO              = element('anet:billTo')
+PAYMENT_METHOD       = element('anet:payment')
+CREDIT_CARD          = element('anet:creditCard')
+BANK_ACCOUNT         = element('anet:bankAccount')
+
+# (result key, field) pairs read from a customer profile, an address and a payment method
+CUSTOMER_FIELDS      = (('id',          text('anet:merchantCustomerId')),
+                        ('email',       text('anet:email')),
+                        ('description', text('anet:description')))
+
+ADDRESS_FIELDS       = (('firstname',   text('anet:firstName')),
+                        ('lastname',    text('anet:lastName')),
+                        ('company',     text('anet:company')),
+                        ('address',     text('anet:address')),
+                        ('city',        text('anet:city')),
+                        ('state',       text('anet:state')),
+                        ('zip',         text('anet:zip')),
+                        ('country',     text('anet:country')),
+                        ('phone',       text('anet:phoneNumber')),
+                        ('fax',         text('anet:faxNumber')))
+
+CARD_FIELDS          = (('number',      text('anet:cardNumber')),
+                        ('expiration',  text('anet:expirationDate')))
+
+BANK_FIELDS          = (('account',     text('anet:accountNumber')),
+                        ('routing',     text('anet:routingNumber')))
+
+CUSTOMER_TYPE        = text('anet:customerType')
+
+def _fields(parent, fields):
+    """Read a table of fields from an element into a dictionary, leaving out the missing ones."""
+    
+    values = {}
+    
+    for key, field in fields:
+        value = field(parent)
+        
+        if value is not None:
+            values[key] = value
+    
+    return values
+
+class ProfileResult(XMLResult):
     """Represent a profile result as an object."""
     
     def __init__(self, data):
         """Set the result items."""
         
-        ANET_XMLNS = ' xmlns="AnetApi/xml/v1/schema/AnetApiSchema.xsd"'
-        
-        raw       = data
-        data      = data.replace(ANET_XMLNS, '')
-        
-        self.root = ET.XML(data)
-        messages  = self.root.find('messages')
+        super(ProfileResult, self).__init__(data)
         
-        self.result_code = messages.find('resultCode').text
-        self.code        = messages.find('message/code').text
-        self.reason      = messages.find('message/text').text
-        self.profile_id  = None
-        self.raw         = raw
-        self.ref_id      = None
-        
-        profile_id       = self.root.find('customerProfileId')
-        
-        if profile_id is not None:
-            self.profile_id = profile_id.text
+        self.raw        = data
+        self.profile_id = PROFILE_ID(self.root)
         
         self._index = 0
-        
-        ref_id = self.root.find('refId')
-        
-        if ref_id:
-            self.ref_id = ref_id
     
-    def __str__(self):
-        """Calling str on the object will return the profile id or response reason."""
-        
-        return self.reason
-    
-    def __repr__(self):
-        """Object representation of the profile result object."""
+    def _extracted(self):
+        """Drop the response tree and body now the fields have been read, unless the class retains them."""
         
-        return '<%s at 0x%x %s>' % (self.__class__.__name__, abs(id(self)), self.result_code)
+        if not self.retain:
+            self.root = None
+            self.raw  = None
 
 class CreateProfileResult(ProfileResult):
     """Represent a profile creation result as an object."""
@@ -82,77 +153,51 @@ class CreateProfileResult(ProfileResult):
         super(CreateProfileResult, self).__init__(data)
         
         # Get all ids
-        if self.root.tag == 'getCustomerProfileIdsResponse':
-            ids = self.root.find('ids')
-            
-            if ids is not None:
-                self.profile_ids = [x.text for x in ids]
-            else:
-                self.profile_ids = []
+        if self.tag == 'getCustomerProfileIdsResponse':
+            self.profile_ids = PROFILE_IDS(self.root)
         
         # Grab the shipping and payment profile ids
-        if self.root.tag == 'createCustomerProfileResponse':
-            # Validation element?
-            validation_responses = self.root.find('validationDirectResponse')
-            
-            if validation_responses:
-                # Loop through them
-                self.validation = [TransactionResult(x.text, ',') for x in validation_responses]
-            else:
-                self.validation = []
-            
-            # If there are any payment profile id's, get them
-            payment_profiles = self.root.find('customerPaymentProfileIdList')
-            
-            if payment_profiles:
-                self.payment_ids = [x.text for x in payment_profiles]
-            else:
-                self.payment_ids = []
-            
-            # If there are any shipping profile id's, get them
-            shipping_profiles = self.root.find('customerShippingAddressIdList')
-            
-            if shipping_profiles:
-                self.shipping_ids = [x.text for x in shipping_profiles]
-            else:
-                self.shipping_ids = []
+        if self.tag == 'createCustomerProfileResponse':
+            self.validation   = [TransactionResult(x, ',') for x in VALIDATION_RESPONSES(self.root)]
+            self.payment_ids  = PAYMENT_IDS(self.root)
+            self.shipping_ids = SHIPPING_IDS(self.root)
         
         # Grab the created payment profile id
-        if self.root.tag == 'createCustomerPaymentProfileResponse':
-            # Validation element?
-            validation = self.root.find('validationDirectResponse')
+        if self.tag == 'createCustomerPaymentProfileResponse':
+            validation = VALIDATION(self.root)
             
             if validation is not None:
-                # Loop through them
-                self.validation = [TransactionResult(validation.text, ',')]
+                self.validation = [TransactionResult(validation, ',')]
             else:
                 self.validation = []
             
-            payment_profile = self.root.find('customerPaymentProfileId')
+            payment_profile = PAYMENT_ID(self.root)
             
             if payment_profile is not None:
-                self.payment_ids = [payment_profile.text]
+                self.payment_ids = [payment_profile]
             else:
                 self.payment_ids = []
         
         # Grab the created shipping id
-        if self.root.tag == 'createCustomerShippingAddressResponse':
-            shipping_profile = self.root.find('customerAddressId')
+        if self.tag == 'createCustomerShippingAddressResponse':
+            shipping_profile = SHIPPING_ID(self.root)
             
             if shipping_profile is not None:
-                self.shipping_ids = [shipping_profile.text]
+                self.shipping_ids = [shipping_profile]
             else:
                 self.shipping_ids = []
         
         # Return a transaction result object
-        if self.root.tag == 'createCustomerProfileTransactionResponse':
-            transaction = self.root.find('directResponse')
+        if self.tag == 'createCustomerProfileTransactionResponse':
+            transaction = DIRECT_RESPONSE(self.root)
             
             if transaction is not None:
-                self.transaction = TransactionResult(transaction.text)
+                self.transaction = TransactionResult(transaction)
             else:
                 self.transaction = None
         
+        self._extracted()
+    
     def __str__(self):
         """Calling str on the object will return the profile id or response reason."""
         
@@ -168,25 +213,29 @@ class UpdateProfileResult(ProfileResult):
         
         super(UpdateProfileResult, self).__init__(data)
         
-        if self.root.tag == 'updateCustomerPaymentProfileResponse':
+        if self.tag == 'updateCustomerPaymentProfileResponse':
             self.validation = None
-            validation      = self.root.find('validationDirectResponse')
+            validation      = VALIDATION(self.root)
             
             if validation is not None:
-                self.validation = TransactionResult(validation.text, ',')
+                self.validation = TransactionResult(validation, ',')
+        
+        self._extracted()
 
 class ValidatePaymentProfile(ProfileResult):
     """Represent a validation request as a result object."""
     
     def __init__(self, data):
         
-        super(UpdateProfileResult, self).__init__(data)
+        super(ValidatePaymentProfile, self).__init__(data)
         
         self.validation = None
-        validation      = self.root.find('directResponse')
+        validation      = DIRECT_RESPONSE(self.root)
         
         if validation:
-            self.validation = TransactionResult(validation.text)
+            self.validation = TransactionResult(validation)
+        
+        self._extracted()
 
 class RetrieveProfileResult(ProfileResult):
     """Represent a profile retrieval result as an object."""
@@ -198,71 +247,44 @@ class RetrieveProfileResult(ProfileResult):
         self.results = None
         
         # Get all ids
-        if self.root.tag == 'getCustomerProfileIdsResponse':
-            ids = self.root.find('ids')
-            
-            if ids is not None:
-                self.results = [x.text for x in ids]
-            else:
-                self.results = []
+        if self.tag == 'getCustomerProfileIdsResponse':
+            self.results = PROFILE_IDS(self.root)
         
         # Get a profile
-        if self.root.tag == 'getCustomerProfileResponse':
-            profile        = self.root.find('profile')
-            profile_id     = profile.find('customerProfileId').text
-            customer_id    = profile.find('merchantCustomerId')
-            customer_email = profile.find('email')
-            customer_desc  = profile.find('description')
-            
-            self.results = {'id'       : profile_id,
-                            'customer' : {},
-                            'billing'  : [],
-                            'shipping' : []}
-            
-            # Get the generic customer fields
-            if customer_id is not None:
-                self.results['customer']['id'] = customer_id.text
+        if self.tag == 'getCustomerProfileResponse':
+            profile = CUSTOMER_PROFILE(self.root)
             
-            if customer_email is not None:
-                self.results['customer']['email'] = customer_email.text
-            
-            if customer_desc is not None:
-                self.results['customer']['description'] = customer_desc.text
-            
-            payment_profiles  = profile.findall('paymentProfiles')
-            shipping_profiles = profile.findall('shipToList')
-            
-            for payment in payment_profiles:
-                self.results['billing'].append(self._billing(payment))
-            
-            for shipping in shipping_profiles:
-                self.results['shipping'].append(self._shipping(shipping))
+            self.results = {'id'       : PROFILE_ID(profile),
+                            'customer' : _fields(profile, CUSTOMER_FIELDS),
+                            'billing'  : [self._billing(x) for x in PAYMENT_PROFILES(profile)],
+                            'shipping' : [self._shipping(x) for x in SHIPPING_ADDRESSES(profile)]}
         
         # Get a customer payment profile
-        if self.root.tag == 'getCustomerPaymentProfileResponse':
-            self.results = {'billing' : self._billing(self.root.find('paymentProfile'))}
+        if self.tag == 'getCustomerPaymentProfileResponse':
+            self.results = {'billing' : self._billing(PAYMENT_PROFILE(self.root))}
         
         # Get a customer shipping profile
-        if self.root.tag == 'getCustomerShippingAddressResponse':
-            address = self.root.find('address')
+        if self.tag == 'getCustomerShippingAddressResponse':
+            address      = SHIPPING_ADDRESS(self.root)
             self.results = {'shipping' : self._shipping(address)}
             
-            shipping_id  = address.find('customerAddressId')
+            shipping_id  = SHIPPING_ID(address)
             
             if shipping_id is not None:
-                self.results['id'] = shipping_id.text
+                self.results['id'] = shipping_id
+        
+        self._extracted()
     
     def _billing(self, data):
         """Translate a given XML tree to a dictionary."""
         
-        bill_to       = data.find('billTo')
-        payment_id    = data.find('customerPaymentProfileId')
-        customer_type = data.find('customerType')
-        payment       = data.find('payment')
-        billing       = {'id' : payment_id.text}
+        bill_to       = BILL_TO(data)
+        customer_type = CUSTOMER_TYPE(data)
+        payment       = PAYMENT_METHOD(data)
+        billing       = {'id' : PAYMENT_ID(data)}
         
         if customer_type is not None:
-            billing['type']    = customer_type.text
+            billing['type']    = customer_type
         
         if bill_to is not None:
             billing['profile'] = self._shipping(bill_to)
@@ -271,67 +293,18 @@ class RetrieveProfileResult(ProfileResult):
             billing['payment'] = {}
             
             # Credit card or bank account?
-            card = payment.find('creditCard')
+            card = CREDIT_CARD(payment)
             if card is not None:
-                number     = card.find('cardNumber')
-                expiration = card.find('expirationDate')
-                
-                billing['payment']['card'] = {'number' : number.text, 'expiration' : expiration.text}
+                billing['payment']['card'] = _fields(card, CARD_FIELDS)
             else:
-                bank    = payment.find('bankAccount')
-                routing = bank.find('routingNumber')
-                account = bank.find('accountNumber')
-                
-                billing['payment']['bank'] = {'account' : account.text, 'routing' : routing.text}
+                billing['payment']['bank'] = _fields(BANK_ACCOUNT(payment), BANK_FIELDS)
         
         return billing
-        
+    
     def _shipping(self, data):
         """Translate a given XML tree to a dictionary."""
         
-        shipping    = {}
-        
-        firstname = data.find('firstName')
-        if firstname is not None:
-            shipping['firstname'] = firstname.text
-        
-        lastname  = data.find('lastName')
-        if lastname is not None:
-            shipping['lastname'] = lastname.text
-        
-        company   = data.find('company')
-        if company is not None:
-            shipping['company'] = company.text
-        
-        address   = data.find('address')
-        if address is not None:
-            shipping['address'] = address.text
-        
-        city      = data.find('city')
-        if city is not None:
-            shipping['city'] = city.text
-        
-        state     = data.find('state')
-        if state is not None:
-            shipping['state'] = state.text
-        
-        zipcode   = data.find('zip')
-        if zipcode is not None:
-            shipping['zip'] = zipcode.text
-        
-        country   = data.find('country')
-        if country is not None:
-            shipping['country'] = country.text
-        
-        phone     = data.find('phoneNumber')
-        if phone is not None:
-            shipping['phone'] = phone.text
-        
-        fax = data.find('faxNumber')
-        if fax is not None:
-            shipping['fax'] = fax.text
-        
-        return shipping
+        return _fields(data, ADDRESS_FIELDS)
     
     def __len__(self):
         """Return number of items fetched.
@@ -351,16 +324,16 @@ class RetrieveProfileResult(ProfileResult):
     def __getitem__(self, key):
         """Return an item from a given index."""
         
-        if self.root.tag == 'getCustomerProfileIdsResponse':
+        if self.tag == 'getCustomerProfileIdsResponse':
             if isinstance(key, int):
                 return self.results[key]
             else:
                 raise TypeError('list indices must be integers, not str')
-        elif self.root.tag == 'getCustomerProfileResponse':
+        elif self.tag == 'getCustomerProfileResponse':
             return self.results[key]
-        elif self.root.tag == 'getCustomerPaymentProfileResponse':
+        elif self.tag == 'getCustomerPaymentProfileResponse':
             return self.results[key]
-        elif self.root.tag == 'getCustomerShippingAddressResponse':
+        elif self.tag == 'getCustomerShippingAddressResponse':
             return self.results[key]
     
     def next(self):
@@ -379,95 +352,360 @@ class RetrieveProfileResult(ProfileResult):
         
         return self
 
+class ProfileIdStream(Result):
+    """Stream the profile ids of a getCustomerProfileIds response.
+    
+    The response body is fed to a pull parser chunk by chunk, so the
+    messages are available as soon as they have arrived and the ids
+    are yielded lazily as the rest of the body is read. Each parsed
+    element is cleared once its id has been yielded. The ids can only
+    be iterated over once.
+    
+    """
+    
+    MESSAGES = '{%s}messages' % ANET_NS
+    ID       = '{%s}numericString' % ANET_NS
+    
+    def __init__(self, chunks):
+        self.result_code = None
+        self.code        = None
+        self.reason      = None
+        
+        self._chunks   = iter(chunks)
+        self._parser   = ET.XMLPullParser(events=('end',), tag=(self.MESSAGES, self.ID))
+        self._elements = self._read()
+        
+        # The messages come before the ids
+        for node in self._elements:
+            if node.tag == self.MESSAGES:
+                self.result_code = node.findtext('{%s}resultCode' % ANET_NS)
+                self.code        = node.findtext('{%s}message/{%s}code' % (ANET_NS, ANET_NS))
+                self.reason      = node.findtext('{%s}message/{%s}text' % (ANET_NS, ANET_NS))
+                
+                node.clear()
+                break
+        else:
+            raise CIMException('the response does not contain any messages')
+    
+    def _read(self):
+        """Feed the body to the parser and yield the elements as they are completed."""
+        
+        for chunk in self._chunks:
+            self._parser.feed(chunk)
+            
+            for event, node in self._parser.read_events():
+                yield node
+        
+        self._parser.close()
+        
+        for event, node in self._parser.read_events():
+            yield node
+    
+    def retryable(self):
+        """Does the gateway ask for the request to be tried again?"""
+        
+        return self.code in RETRY_CODES
+    
+    def __iter__(self):
+        """Yield the profile ids as they are parsed."""
+        
+        for node in self._elements:
+            if node.tag != self.ID:
+                continue
+            
+            profile_id = node.text
+            
+            # Drop the element and the ones before it, the tree never holds more than one id
+            node.clear()
+            
+            while node.getprevious() is not None:
+                del node.getparent()[0]
+            
+            yield profile_id
+    
+    def __str__(self):
+        """Return the response reason."""
+        
+        return self.reason
+    
+    def __repr__(self):
+        """Object representation of the profile id stream."""
+        
+        return '<%s at 0x%x %s>' % (self.__class__.__name__, abs(id(self)), self.result_code)
+
 class RemoveProfileResult(ProfileResult):
     """Represent a profile removal result as an object."""
     
     def __init__(self, data):
         
         super(RemoveProfileResult, self).__init__(data)
+        
+        self._extracted()
 
 class CustomerProfile(Adapter):
     """Authorize.net CIM (Customer Information Manager) object adapter.
     
-    Represent an Authorize.net Customer record and provide methods for
-    creating, updating, retrieving, and deleting one.
+    Provide methods for creating, updating, retrieving, and deleting
+    Authorize.net Customer records, each given a CIM options schema, or
+    the one the adapter was created with.
+    
+    Retrievals are read through ``cache``, a paypy.cache.ProfileCache,
+    if one is given; creating, updating and removing through the adapter
+    invalidate the profile's cached retrievals.
     
     """
     
-    def __init__(self, options):
-        
-        ENDPOINT_XML_PRODUCTION = 'api.authorize.net/xml/v1/'
-        ENDPOINT_XML_TEST       = 'apitest.authorize.net/xml/v1/'
-        REQUEST_PATH            = 'request.api'
+    interface  = ICim
+    exception  = CIMException
+    serializer = Serialize
+    
+    def __init__(self, options=None, endpoint=None, retry=None, transport=None, instrument=None, cache=None, metrics=None):
+        self._bind(options)
+        
+        self.endpoint   = endpoint
+        self.retry      = retry
+        self.transport  = transport or pooled
+        self.instrument = instrument
+        self.cache      = cache
+        self.metrics    = metrics
+    
+    @classmethod
+    def schema(cls, credentials, request):
+        """Wrap a profile schema and merchant credentials in a CIM schema."""
         
-        if not ICim.providedBy(options):
-            raise ARBException('the options object must provide a valid schema interface')
+        if ICim.providedBy(request):
+            return request
         
-        self.options    = options
-        self.serialized = Serialize(options)
+        schema                = SCim()
+        schema.authentication = credentials
+        schema.profile        = request
         
-        testing = options.profile.testing
-        host    = ENDPOINT_XML_TEST if testing else ENDPOINT_XML_PRODUCTION
+        return schema
+    
+    @staticmethod
+    def endpoint_for(testing):
+        """Return the XML API endpoint for test or production requests."""
         
-        self.connection                         = urllib2.Request(url='https://' + host + REQUEST_PATH, headers={'Content-Type' : 'text/xml'})
+        return ENDPOINT_XML_TEST if testing else ENDPOINT_XML_PRODUCTION
     
-    def create(self):
+    def create(self, options=None, deadline=None):
         """Create a CIM record."""
         
         # Be sure we're calling create on the right schema
-        if not IAuthnetProfileCreate.providedBy(self.options.profile)         and \
-           not IAuthnetProfileCreateBilling.providedBy(self.options.profile)  and \
-           not IAuthnetProfileCreateShipping.providedBy(self.options.profile) and \
-           not IAuthnetProfileCreateTransaction.providedBy(self.options.profile):
-            
-            raise CIMException('a creation request must conform to one of the creation interfaces')
+        options = self._check('create', options)
         
-        return CreateProfileResult(self._request())
+        try:
+            return self._request('create', options, CreateProfileResult, deadline, idempotent=False)
+        finally:
+            self._invalidate(options)
     
-    def update(self):
+    def update(self, options=None, deadline=None):
         """Update a CIM record."""
         
-        if not IAuthnetProfileUpdate.providedBy(self.options.profile)         and \
-           not IAuthnetProfileUpdateBilling.providedBy(self.options.profile)  and \
-           not IAuthnetProfileUpdateShipping.providedBy(self.options.profile) and \
-           not IAuthnetProfileUpdateSplitTender.providedBy(self.options.profile):
-            
-            raise CIMException('an update request must conform to one of the update interfaces')
+        options = self._check('update', options)
         
-        return UpdateProfileResult(self._request())
+        try:
+            return self._request('update', options, UpdateProfileResult, deadline)
+        finally:
+            self._invalidate(options)
     
-    def retrieve(self):
-        """Retrieve a CIM record."""
+    def retrieve(self, options=None, stream=False, deadline=None):
+        """Retrieve a CIM record.
+        
+        A request for all of the profile ids can be streamed, this
+        returns a ProfileIdStream that yields the ids as the response
+        is read; a deadline then covers reading the whole stream.
         
-        if not IAuthnetProfileRetrieveAll.providedBy(self.options.profile)     and \
-           not IAuthnetProfileRetrieve.providedBy(self.options.profile)        and \
-           not IAuthnetProfileRetrieveBilling.providedBy(self.options.profile) and \
-           not IAuthnetProfileRetrieveShipping.providedBy(self.options.profile):
+        """
+        
+        options = self._check('retrieve', options)
+        
+        if stream:
+            if not IAuthnetProfileRetrieveAll.providedBy(options.profile):
+                raise CIMException('only a request for all profile ids can be streamed')
             
-            raise CIMException('a retrieval request must conform to one of the retrieval interfaces')
+            return self._request('retrieve', options, ProfileIdStream, deadline, stream=True)
+        
+        key = self.cache_key(options)
+        
+        if key is None:
+            return self._request('retrieve', options, RetrieveProfileResult, deadline)
+        
+        data = self.cache.get(key)
         
-        return RetrieveProfileResult(self._request())
+        if data is None:
+            generation = self.cache.generation(*key[:2])
+            
+            return self._request('retrieve', options, lambda data: self._retrieved(key, generation, data), deadline)
+        
+        return self._measured_cached(self.operation('retrieve'), self._endpoint(options), RetrieveProfileResult, data)
     
-    def remove(self):
+    def remove(self, options=None, deadline=None):
         """Remove a CIM record."""
         
-        if not IAuthnetProfileDelete.providedBy(self.options.profile)        and \
-           not IAuthnetProfileDeleteBilling.providedBy(self.options.profile) and \
-           not IAuthnetProfileDeleteShipping.providedBy(self.options.profile):
+        options = self._check('remove', options)
+        
+        try:
+            return self._request('remove', options, RemoveProfileResult, deadline)
+        finally:
+            self._invalidate(options)
+    
+    def create_async(self, options=None, deadline=None):
+        """Create a CIM record without blocking, return an AsyncResult."""
+        
+        options = self._check('create', options)
+        
+        return self._invalidating(options, self._request_async('create', options, CreateProfileResult, deadline))
+    
+    def update_async(self, options=None, deadline=None):
+        """Update a CIM record without blocking, return an AsyncResult."""
+        
+        options = self._check('update', options)
+        
+        return self._invalidating(options, self._request_async('update', options, UpdateProfileResult, deadline))
+    
+    def retrieve_async(self, options=None, deadline=None):
+        """Retrieve a CIM record without blocking, return an AsyncResult."""
+        
+        options = self._check('retrieve', options)
+        key     = self.cache_key(options)
+        
+        if key is None:
+            return self._request_async('retrieve', options, RetrieveProfileResult, deadline)
+        
+        data = self.cache.get(key)
+        
+        if data is None:
+            generation = self.cache.generation(*key[:2])
             
-            raise CIMException('a removal request must conform to one of the deletion interfaces')
+            return self._request_async('retrieve', options, lambda data: self._retrieved(key, generation, data), deadline)
+        
+        result = AsyncResult(reactor)
+        result.set_result(data)
         
-        return RemoveProfileResult(self._request())
+        return result.then(lambda data: self._measured_cached(self.operation('retrieve'), self._endpoint(options), RetrieveProfileResult, data))
     
-    def _request(self):
-        """Send the request to authorize.net."""
+    def remove_async(self, options=None, deadline=None):
+        """Remove a CIM record without blocking, return an AsyncResult."""
         
-        data = str(self.serialized)
+        options = self._check('remove', options)
         
-        self.connection.headers['Content-Length'] = str(len(data))
-        self.connection.data                      = data
+        return self._invalidating(options, self._request_async('remove', options, RemoveProfileResult, deadline))
+    
+    def cache_key(self, options=None):
+        """Return the cache key of a retrieval, or None if there is no cache or it retrieves every profile id."""
+        
+        options = self._options(options)
+        profile = options.profile
+        
+        if self.cache is None or IAuthnetProfileRetrieveAll.providedBy(profile):
+            return None
         
-        request   = urllib2.urlopen(self.connection)
-        result    = request.read()
+        return (self._scope(options), profile.id, getattr(profile, 'billing_id', None), getattr(profile, 'shipping_id', None))
+    
+    def _scope(self, options):
+        """The merchant and endpoint cache keys are scoped to."""
+        
+        return '%s %s://%s%s' % ((options.authentication.login,) + tuple(self._endpoint(options)))
+    
+    def _retrieved(self, key, generation, data):
+        """Parse a retrieval and cache it if it succeeded and the profile wasn't invalidated while it was sent."""
+        
+        result = RetrieveProfileResult(data)
+        
+        if result.result_code == 'Ok':
+            self.cache.set(key, data, generation)
         
         return result
+    
+    def _invalidate(self, options):
+        """Drop the cached retrievals of the profile a request changes."""
+        
+        profile = options.profile
+        
+        if self.cache is None:
+            return
+        
+        for interface in INVALIDATING:
+            if interface.providedBy(profile):
+                self.cache.invalidate(self._scope(options), profile.id)
+                return
+    
+    def _invalidating(self, options, result):
+        """Invalidate once an asynchronous request completes, successfully or not."""
+        
+        if self.cache is not None:
+            result.add_callback(lambda value: self._invalidate(options), lambda error: self._invalidate(options))
+        
+        return result
+    
+    def operation(self, name):
+        """The label of an operation's requests, e.g. cim.create."""
+        
+        return 'cim.' + name
+    
+    def code(self, result):
+        """Count results by their result code, Ok or Error."""
+        
+        return result.result_code
+    
+    def _check(self, operation, options):
+        """Be sure the profile schema conforms to one of the operation's interfaces, return the call's options schema."""
+        
+        options             = self._options(options)
+        interfaces, message = CIM_OPERATIONS[operation]
+        
+        if not self._timed(self.operation(operation), VALIDATE, self._conforms, interfaces, options.profile):
+            raise CIMException(message)
+        
+        return options
+    
+    def _conforms(self, interfaces, profile):
+        for interface in interfaces:
+            if interface.providedBy(profile):
+                return True
+        
+        return False
+    
+    def _endpoint(self, options):
+        """The configured endpoint, or the one the profile's testing flag picks."""
+        
+        return self.endpoint or self.endpoint_for(getattr(options.profile, 'testing', False))
+    
+    def _request(self, operation, options, parse, deadline=None, stream=False, idempotent=True):
+        """Send the request to authorize.net and parse the response, under the retry policy if there is one.
+        
+        A streamed response is parsed from its chunks as they are read;
+        connecting, the first chunk and the messages are read under the
+        retry policy, the rest as the result is consumed. A request that
+        isn't idempotent, e.g. a creation or a charge, is never retried.
+        
+        """
+        
+        operation = self.operation(operation)
+        endpoint  = self._endpoint(options)
+        data      = self._timed(operation, SERIALIZE, self._serialize, options)
+        deadline  = deadline_for(deadline)
+        
+        if stream:
+            send = lambda: self._exchange_stream(operation, self.transport.stream, endpoint, data, HEADERS, deadline=deadline)
+        else:
+            send = lambda: self._exchange(operation, self.transport.request, endpoint, data, HEADERS, None, deadline)
+        
+        parsed    = lambda body: self._timed(operation, PARSE, parse, body)
+        
+        if self.retry is None:
+            return self._measured(operation, endpoint, lambda: parsed(send()))
+        
+        return self._measured(operation, endpoint, self.retry.run, endpoint, send, parsed, idempotent=idempotent, deadline=deadline)
+    
+    def _request_async(self, operation, options, parse, deadline=None):
+        """Send the request to authorize.net without blocking, return an AsyncResult for the parsed response."""
+        
+        operation = self.operation(operation)
+        endpoint  = self._endpoint(options)
+        data      = self._timed(operation, SERIALIZE, self._serialize, options)
+        
+        send      = lambda: self._exchange_async(operation, self.transport.request_async, endpoint, data, HEADERS, deadline_for(deadline))
+        
+        return self._measured_async(operation, endpoint, lambda: send().then(lambda body: self._timed(operation, PARSE, parse, body)))
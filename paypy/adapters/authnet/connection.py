@@ -0,0 +1,435 @@
+"""Authorize.net Connection Pool
+
+Keep-alive HTTPS connections shared by the AIM, ARB and CIM adapters
+so a request doesn't pay for a fresh TCP and TLS handshake every time
+it talks to the gateway.
+
+A request may be given a Deadline, a time budget covering connecting,
+sending, reading and any retries; running out of it raises a
+TimeoutException naming the phase that did.
+
+"""
+
+import errno
+import httplib
+import select
+import socket
+import threading
+
+from paypy.exceptions.authnet import ConnectionException, GatewayStatusException, TimeoutException
+from paypy.instrument         import monotonic
+
+# Endpoints are (scheme, host, path) triples, the pool is keyed by scheme and host
+ENDPOINT_AIM_PRODUCTION = ('https', 'secure.authorize.net',  '/gateway/transact.dll')
+ENDPOINT_AIM_TEST       = ('https', 'test.authorize.net',    '/gateway/transact.dll')
+ENDPOINT_XML_PRODUCTION = ('https', 'api.authorize.net',     '/xml/v1/request.api')
+ENDPOINT_XML_TEST       = ('https', 'apitest.authorize.net', '/xml/v1/request.api')
+
+CONNECTION_CLASSES = {'http'  : httplib.HTTPConnection,
+                      'https' : httplib.HTTPSConnection}
+
+# Errors sending on a reused connection that mean the server closed it while it sat idle
+STALE_ERRNOS = (errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
+
+# The phases of a request a deadline can run out in
+CONNECT = 'connect'
+SEND    = 'send'
+READ    = 'read'
+
+class Deadline(object):
+    """A time budget of ``seconds`` for a request, retries included.
+    
+    ``connect`` and ``read`` optionally cap the timeout of connecting
+    and of each blocking send or read; the budget left caps them all.
+    The same deadline may be passed to several requests to bound them
+    together. It runs on a monotonic clock, so stepping the wall clock
+    doesn't move it.
+    
+    """
+    
+    def __init__(self, seconds, connect=None, read=None, clock=monotonic):
+        self.seconds = seconds
+        self.connect = connect
+        self.read    = read
+        self.clock   = clock
+        self.expires = clock() + seconds
+    
+    def remaining(self):
+        """Return the seconds left, never less than 0."""
+        
+        return max(self.expires - self.clock(), 0.0)
+    
+    def expired(self):
+        return self.clock() >= self.expires
+    
+    def timeout(self, phase, host):
+        """Return the socket timeout for a phase, raise TimeoutException if the budget is spent."""
+        
+        remaining = self.remaining()
+        
+        if remaining <= 0:
+            raise self.exceeded(phase, host)
+        
+        cap = self.connect if phase == CONNECT else self.read
+        
+        return remaining if cap is None else min(cap, remaining)
+    
+    def exceeded(self, phase, host):
+        """Return the TimeoutException for a phase that ran out of time."""
+        
+        return TimeoutException('%s to %s timed out with %.3fs of the %.3fs deadline left' % (phase, host, self.remaining(), self.seconds), phase)
+    
+    def __repr__(self):
+        return '<%s at 0x%x %.3fs of %.3fs left>' % (self.__class__.__name__, abs(id(self)), self.remaining(), self.seconds)
+
+def deadline_for(deadline):
+    """Return a Deadline for a number of seconds, or the Deadline (or None) given."""
+    
+    if deadline is None or isinstance(deadline, Deadline):
+        return deadline
+    
+    return Deadline(deadline)
+
+class PooledConnection(object):
+    """Wrap an HTTP(S) connection with the bookkeeping the pool needs."""
+    
+    def __init__(self, scheme, host):
+        self.key       = (scheme, host)
+        self.http      = CONNECTION_CLASSES[scheme](host)
+        self.requests  = 0
+        self.sent      = False
+        self.last_used = monotonic()
+    
+    def alive(self):
+        """Is the connection still open? A keep-alive socket readable while idle has been closed by the server."""
+        
+        sock = self.http.sock
+        
+        if sock is None:
+            return True
+        
+        try:
+            return not select.select([sock], [], [], 0)[0]
+        except (select.error, socket.error, ValueError):
+            return False
+    
+    def close(self):
+        """Close the underlying socket."""
+        
+        self.http.close()
+    
+    def __repr__(self):
+        return '<%s at 0x%x %s://%s (%d)>' % (self.__class__.__name__, abs(id(self)), self.key[0], self.key[1], self.requests)
+
+class ConnectionPool(object):
+    """Thread-safe pool of keep-alive connections keyed by endpoint host.
+    
+    A connection is checked out for the duration of a single request,
+    so the underlying httplib connection is never shared between
+    threads. Idle connections older than ``idle_timeout`` seconds or
+    closed by the server are discarded on checkout and connections are
+    retired once they have served ``max_requests`` requests.
+    
+    """
+    
+    def __init__(self, size=10, idle_timeout=30, max_requests=100):
+        self.size         = size
+        self.idle_timeout = idle_timeout
+        self.max_requests = max_requests
+        
+        self.hits     = 0
+        self.misses   = 0
+        self.discards = 0
+        
+        self._idle = {}
+        self._lock = threading.Lock()
+    
+    def request(self, endpoint, data, headers=None, timeout=None, deadline=None, trace=None):
+        """POST data to the given endpoint and return the response body.
+        
+        The optional timeout (in seconds) applies to connecting and to
+        each blocking socket operation. A Deadline bounds the request as
+        a whole instead. The time spent opening a new connection is
+        stored in ``trace``, a dict, under CONNECT if one is given.
+        
+        """
+        
+        connection, response = self._open(endpoint, data, headers, timeout, deadline, trace)
+        
+        try:
+            body = self._read(connection, response, deadline)
+        except TimeoutException:
+            connection.close()
+            raise
+        except (httplib.HTTPException, socket.error), e:
+            connection.close()
+            raise ConnectionException('reading the response from %s failed: %s' % (endpoint[1], e))
+        
+        self._finish(connection, response)
+        
+        return body
+    
+    def stream(self, endpoint, data, headers=None, timeout=None, chunk_size=16384, deadline=None, trace=None):
+        """POST data to the given endpoint and yield the response body in chunks.
+        
+        The connection goes back to the pool once the body has been read
+        to the end; it is closed instead if the generator is abandoned
+        part way through. A Deadline covers reading the whole body.
+        
+        """
+        
+        connection, response = self._open(endpoint, data, headers, timeout, deadline, trace)
+        
+        if response.status != 200:
+            response.read()
+            self._finish(connection, response)
+        
+        finished = False
+        
+        try:
+            while True:
+                try:
+                    chunk = self._timed(connection, deadline, READ, response.read, chunk_size)
+                except (httplib.HTTPException, socket.error), e:
+                    raise ConnectionException('reading the response from %s failed: %s' % (endpoint[1], e))
+                
+                if not chunk:
+                    break
+                
+                yield chunk
+            
+            finished = True
+        finally:
+            if not finished:
+                connection.close()
+        
+        self._finish(connection, response)
+    
+    def stats(self):
+        """Return the pool hit, miss and discard counters and the idle connection count."""
+        
+        self._lock.acquire()
+        try:
+            idle = sum([len(x) for x in self._idle.values()])
+        finally:
+            self._lock.release()
+        
+        return {'hits'     : self.hits,
+                'misses'   : self.misses,
+                'discards' : self.discards,
+                'idle'     : idle}
+    
+    def clear(self):
+        """Close every idle connection in the pool."""
+        
+        self._lock.acquire()
+        try:
+            idle       = self._idle
+            self._idle = {}
+        finally:
+            self._lock.release()
+        
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+    
+    def _open(self, endpoint, data, headers, timeout, deadline=None, trace=None):
+        """Send the request on a pooled connection and return the connection and unread response."""
+        
+        scheme, host, path = endpoint
+        connection         = self._acquire(scheme, host)
+        
+        try:
+            response = self._send(connection, path, data, headers or {}, timeout, deadline, trace)
+        except TimeoutException:
+            connection.close()
+            raise
+        except socket.error, e:
+            connection.close()
+            
+            # Sending on a pooled connection the gateway already hung up on, so it never got the
+            # request: try once more on a fresh one. Anything later may have reached the gateway
+            # and is left to the caller's retry policy, a silent resend could charge twice.
+            if not connection.requests or connection.sent or not self._stale(e):
+                raise ConnectionException('request to %s failed: %s' % (host, e))
+            
+            connection = PooledConnection(scheme, host)
+            
+            try:
+                response = self._send(connection, path, data, headers or {}, timeout, deadline, trace)
+            except TimeoutException:
+                connection.close()
+                raise
+            except (httplib.HTTPException, socket.error), e:
+                connection.close()
+                raise ConnectionException('request to %s failed: %s' % (host, e))
+        except httplib.HTTPException, e:
+            connection.close()
+            raise ConnectionException('request to %s failed: %s' % (host, e))
+        
+        return connection, response
+    
+    def _finish(self, connection, response):
+        """Release a connection whose response has been read, raise on a non-200 status."""
+        
+        connection.requests += 1
+        
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+        
+        if response.status != 200:
+            raise GatewayStatusException('%s returned HTTP %d %s' % (connection.key[1], response.status, response.reason), response.status)
+    
+    def _send(self, connection, path, data, headers, timeout, deadline=None, trace=None):
+        """Send the request on a connection and return the response object."""
+        
+        connection.sent = False
+        
+        if deadline is not None:
+            return self._send_within(connection, path, data, headers, deadline, trace)
+        
+        if timeout is None:
+            timeout = socket.getdefaulttimeout()
+        
+        # Applies to the connect of a new connection and to the socket of a pooled one
+        connection.http.timeout = timeout
+        
+        if connection.http.sock is not None:
+            connection.http.sock.settimeout(timeout)
+        elif trace is not None:
+            started = monotonic()
+            connection.http.connect()
+            trace[CONNECT] = monotonic() - started
+        
+        connection.http.request('POST', path, data, headers)
+        connection.sent = True
+        
+        return connection.http.getresponse()
+    
+    def _send_within(self, connection, path, data, headers, deadline, trace=None):
+        """Send the request with each phase's socket timeout cut to the deadline."""
+        
+        http = connection.http
+        
+        if http.sock is None:
+            http.timeout = deadline.timeout(CONNECT, connection.key[1])
+            started      = monotonic()
+            
+            self._timed(connection, deadline, CONNECT, http.connect)
+            
+            if trace is not None:
+                trace[CONNECT] = monotonic() - started
+        
+        self._timed(connection, deadline, SEND, http.request, 'POST', path, data, headers)
+        connection.sent = True
+        
+        return self._timed(connection, deadline, READ, http.getresponse)
+    
+    def _read(self, connection, response, deadline):
+        """Read the whole response body, in chunks if a deadline has to be kept."""
+        
+        if deadline is None:
+            return response.read()
+        
+        chunks = []
+        
+        while True:
+            chunk = self._timed(connection, deadline, READ, response.read, 16384)
+            
+            if not chunk:
+                return ''.join(chunks)
+            
+            chunks.append(chunk)
+    
+    def _timed(self, connection, deadline, phase, call, *args):
+        """Call with the socket timeout cut to what is left of the deadline, raise a timeout naming the phase."""
+        
+        if deadline is None:
+            return call(*args)
+        
+        host = connection.key[1]
+        
+        if connection.http.sock is not None:
+            connection.http.sock.settimeout(deadline.timeout(phase, host))
+        
+        try:
+            return call(*args)
+        except socket.timeout:
+            raise deadline.exceeded(phase, host)
+    
+    def _stale(self, error):
+        """Does the error mean the server closed an idle keep-alive connection?"""
+        
+        return getattr(error, 'errno', None) in STALE_ERRNOS
+    
+    def _acquire(self, scheme, host):
+        """Check out an idle connection for the host or open a new one."""
+        
+        now     = monotonic()
+        expired = []
+        
+        self._lock.acquire()
+        try:
+            idle = self._idle.get((scheme, host))
+            
+            while idle:
+                connection = idle.pop()
+                
+                if now - connection.last_used < self.idle_timeout and connection.alive():
+                    self.hits += 1
+                    break
+                
+                self.discards += 1
+                expired.append(connection)
+            else:
+                connection   = None
+                self.misses += 1
+        finally:
+            self._lock.release()
+        
+        for stale in expired:
+            stale.close()
+        
+        if connection is None:
+            connection = PooledConnection(scheme, host)
+        
+        return connection
+    
+    def _release(self, connection):
+        """Return a connection to the pool, or close it if it is retired or the pool is full."""
+        
+        if connection.requests >= self.max_requests:
+            connection.close()
+            return
+        
+        connection.last_used = monotonic()
+        
+        self._lock.acquire()
+        try:
+            idle = self._idle.setdefault(connection.key, [])
+            
+            if len(idle) < self.size:
+                idle.append(connection)
+                connection = None
+            else:
+                self.discards += 1
+        finally:
+            self._lock.release()
+        
+        if connection is not None:
+            connection.close()
+
+# The pool shared by all of the Authorize.net adapters
+pool = ConnectionPool()
+
+def configure(size=None, idle_timeout=None, max_requests=None):
+    """Tune the shared connection pool."""
+    
+    if size is not None:
+        pool.size = size
+    if idle_timeout is not None:
+        pool.idle_timeout = idle_timeout
+    if max_requests is not None:
+        pool.max_requests = max_requests
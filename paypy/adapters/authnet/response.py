@@ -0,0 +1,113 @@
+"""Authorize.net XML Response Parsing
+
+Shared by the ARB and CIM adapters. Responses are parsed once with
+the Authorize.net namespace left in place and fields are read with
+XPath expressions compiled when the module is imported.
+
+"""
+
+from lxml                     import etree as ET
+
+from paypy.adapters           import Result
+
+ANET_NS    = 'AnetApi/xml/v1/schema/AnetApiSchema.xsd'
+NAMESPACES = {'anet' : ANET_NS}
+
+def texts(path):
+    """Compile a path to an XPath returning the text of every matching element."""
+    
+    return ET.XPath('%s/text()' % path, namespaces=NAMESPACES, smart_strings=False)
+
+def text(path):
+    """Compile a path to a function returning the text of the first matching element, or None."""
+    
+    find = texts(path)
+    
+    def get(element):
+        values = find(element)
+        
+        if values:
+            return values[0]
+        
+        return None
+    
+    return get
+
+def element(path):
+    """Compile a path to a function returning the first matching element, or None."""
+    
+    find = ET.XPath(path, namespaces=NAMESPACES)
+    
+    def get(parent):
+        values = find(parent)
+        
+        if values:
+            return values[0]
+        
+        return None
+    
+    return get
+
+def elements(path):
+    """Compile a path to an XPath returning every matching element."""
+    
+    return ET.XPath(path, namespaces=NAMESPACES)
+
+def local_name(tag):
+    """Strip the namespace from an element tag."""
+    
+    return tag.rpartition('}')[2]
+
+RESULT_CODE  = text('anet:messages/anet:resultCode')
+MESSAGE_CODE = text('anet:messages/anet:message/anet:code')
+MESSAGE_TEXT = text('anet:messages/anet:message/anet:text')
+REF_ID       = text('anet:refId')
+
+# Message codes asking for the request to be tried again
+RETRY_CODES  = ('E00001',)
+
+class XMLResult(Result):
+    """Parse a response and read the fields every Authorize.net XML response has.
+    
+    A result keeps the parsed tree in ``root`` unless its class sets
+    ``retain`` to False, in which case the tree (and the raw body a
+    profile result keeps) is dropped once the result's fields have been
+    read, bounding the memory each result holds. Set it on a result
+    class, or on XMLResult for all of them.
+    
+    """
+    
+    # Keep the response tree and body once the fields have been read
+    retain = True
+    
+    def __init__(self, data):
+        """Set the result items."""
+        
+        self.root = ET.XML(data)
+        self.tag  = local_name(self.root.tag)
+        
+        self.result_code = RESULT_CODE(self.root)
+        self.code        = MESSAGE_CODE(self.root)
+        self.reason      = MESSAGE_TEXT(self.root)
+        self.ref_id      = REF_ID(self.root)
+    
+    def retryable(self):
+        """Does the gateway ask for the request to be tried again?"""
+        
+        return self.code in RETRY_CODES
+    
+    def _extracted(self):
+        """Drop the response tree now the fields have been read, unless the class retains it."""
+        
+        if not self.retain:
+            self.root = None
+    
+    def __str__(self):
+        """Return the response reason."""
+        
+        return self.reason
+    
+    def __repr__(self):
+        """Object representation of the result object."""
+        
+        return '<%s at 0x%x %s>' % (self.__class__.__name__, abs(id(self)), self.result_code)
@@ -0,0 +1,281 @@
+"""Authorize.net Retry Policy
+
+Retry requests that failed for reasons worth retrying, with capped
+exponential backoff and full jitter, behind a circuit breaker per
+gateway host so callers fail fast instead of piling onto a gateway
+that is down.
+
+Connection errors and timeouts, the HTTP statuses in RETRY_STATUSES
+and results whose ``retryable()`` is true (e.g. E00001) are retried;
+declines and validation errors are not. A request that isn't
+idempotent, an AIM charge without a duplicate window and invoice
+number or an ARB or CIM creation (profile transactions included), is
+never retried. Under a Deadline a retry is only made if its
+backoff leaves some of the budget to send it in.
+
+Only a response that parses closes the breaker. Transport and gateway
+errors, retried or not, and responses that fail to parse count
+against it; other errors raised before the gateway answered, e.g. a
+caller's, leave it alone.
+
+"""
+
+import logging
+import random
+import threading
+import time
+
+from paypy.exceptions.authnet import ConnectionException, GatewayStatusException, CircuitOpenException
+from paypy.instrument         import monotonic
+from paypy.metrics            import record
+
+log = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: throttled, or the gateway (or a proxy in front of it) failing
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Circuit breaker states
+CLOSED    = 'closed'
+OPEN      = 'open'
+HALF_OPEN = 'half-open'
+
+def retryable_error(error):
+    """Is the exception a transport or gateway failure worth retrying?"""
+    
+    if isinstance(error, CircuitOpenException):
+        return False
+    
+    if isinstance(error, GatewayStatusException):
+        return error.status in RETRY_STATUSES
+    
+    return isinstance(error, ConnectionException)
+
+def gateway_error(error):
+    """Is the exception a transport or gateway failure, as opposed to e.g. a caller's error?"""
+    
+    return isinstance(error, ConnectionException) and not isinstance(error, CircuitOpenException)
+
+def retryable_result(result):
+    """Does the gateway ask for the request to be tried again?"""
+    
+    retryable = getattr(result, 'retryable', None)
+    
+    return retryable is not None and retryable()
+
+class CircuitBreaker(object):
+    """Fail fast while a host keeps failing.
+    
+    ``threshold`` consecutive failures open the circuit. After
+    ``reset_timeout`` seconds a single trial request is let through
+    (half-open); its success closes the circuit and its failure opens
+    it again, while a trial ending without an answer lets another
+    through. State changes are recorded by ``metrics``, a
+    paypy.metrics.Recorder, if one is given.
+    
+    """
+    
+    def __init__(self, host, threshold=5, reset_timeout=30.0, clock=monotonic, metrics=None):
+        self.host          = host
+        self.threshold     = threshold
+        self.reset_timeout = reset_timeout
+        self.clock         = clock
+        self.metrics       = metrics
+        
+        self.state    = CLOSED
+        self.failures = 0
+        self.opened   = None
+        self.trial    = False
+        
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """May a request be sent now?"""
+        
+        self._lock.acquire()
+        try:
+            if self.state == CLOSED:
+                return True
+            
+            if self.state == OPEN and self.clock() - self.opened >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.trial = True
+                self._moved(OPEN)
+                return True
+            
+            if self.state == HALF_OPEN and not self.trial:
+                self.trial = True
+                return True
+            
+            if self.metrics is not None:
+                record(self.metrics.rejection, self.host)
+            
+            return False
+        finally:
+            self._lock.release()
+    
+    def success(self):
+        self._lock.acquire()
+        try:
+            previous      = self.state
+            self.state    = CLOSED
+            self.failures = 0
+            self.trial    = False
+            
+            self._moved(previous)
+        finally:
+            self._lock.release()
+    
+    def failure(self):
+        self._lock.acquire()
+        try:
+            previous       = self.state
+            self.failures += 1
+            self.trial     = False
+            
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                self.state  = OPEN
+                self.opened = self.clock()
+            
+            self._moved(previous)
+        finally:
+            self._lock.release()
+    
+    def release(self):
+        """A request ended without an answer from the gateway, let another trial through if it was one."""
+        
+        self._lock.acquire()
+        try:
+            self.trial = False
+        finally:
+            self._lock.release()
+    
+    def _moved(self, previous):
+        """Record a change from the previous state, if there was one."""
+        
+        if self.state == previous:
+            return
+        
+        if self.state == OPEN:
+            log.warning('circuit to %s opened after %d failures', self.host, self.failures)
+        
+        if self.metrics is not None:
+            record(self.metrics.transition, self.host, self.state)
+    
+    def __repr__(self):
+        return '<%s at 0x%x %s %s (%d)>' % (self.__class__.__name__, abs(id(self)), self.host, self.state, self.failures)
+
+class RetryPolicy(object):
+    """Send requests with retries and a circuit breaker per host.
+    
+    A request is tried at most ``attempts`` times. Before retry n (from
+    0) the caller sleeps a random time up to
+    ``min(max_delay, base_delay * 2 ** n)`` seconds. One policy can be
+    shared by many clients and threads, so they share the breakers.
+    Retries and breaker changes are recorded by ``metrics``, a
+    paypy.metrics.Recorder, if one is given.
+    
+    """
+    
+    def __init__(self, attempts=3, base_delay=0.1, max_delay=5.0, threshold=5, reset_timeout=30.0, clock=monotonic, sleep=time.sleep, random=random.random, metrics=None):
+        self.attempts      = attempts
+        self.base_delay    = base_delay
+        self.max_delay     = max_delay
+        self.threshold     = threshold
+        self.reset_timeout = reset_timeout
+        self.clock         = clock
+        self.sleep         = sleep
+        self.random        = random
+        self.metrics       = metrics
+        
+        self.retries = 0
+        
+        self._breakers = {}
+        self._lock     = threading.Lock()
+    
+    def breaker(self, host):
+        """Return the circuit breaker for a gateway host."""
+        
+        self._lock.acquire()
+        try:
+            breaker = self._breakers.get(host)
+            
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(host, self.threshold, self.reset_timeout, self.clock, self.metrics)
+            
+            return breaker
+        finally:
+            self._lock.release()
+    
+    def delay(self, attempt):
+        """Return the seconds to wait before retry ``attempt``."""
+        
+        return self.random() * min(self.max_delay, self.base_delay * 2 ** attempt)
+    
+    def run(self, endpoint, send, parse, idempotent=True, deadline=None):
+        """Return parse(send()), retrying failures the policy allows.
+        
+        Raises CircuitOpenException without sending while the
+        endpoint's breaker is open. Once the attempts run out, the
+        breaker opens or the deadline has no time left for another
+        backoff and attempt, the last exception is raised or the last
+        retryable result returned.
+        
+        """
+        
+        breaker  = self.breaker(endpoint[1])
+        attempts = self.attempts if idempotent else 1
+        attempt  = 0
+        
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenException('the circuit to %s is open after %d failures' % (endpoint[1], breaker.failures))
+            
+            last     = attempt + 1 >= attempts
+            delay    = self.delay(attempt)
+            answered = False
+            
+            try:
+                body     = send()
+                answered = True
+                result   = parse(body)
+            except Exception, e:
+                if not answered and not gateway_error(e):
+                    breaker.release()
+                    raise
+                
+                breaker.failure()
+                
+                if not retryable_error(e) or last or breaker.state == OPEN or self._spent(deadline, delay):
+                    raise
+            else:
+                if not retryable_result(result):
+                    breaker.success()
+                    return result
+                
+                breaker.failure()
+                
+                if last or breaker.state == OPEN or self._spent(deadline, delay):
+                    return result
+            
+            log.info('retrying a request to %s in %.3fs, attempt %d of %d', endpoint[1], delay, attempt + 2, attempts)
+            
+            self.sleep(delay)
+            
+            if self.metrics is not None:
+                record(self.metrics.retry, endpoint[1])
+            
+            self._lock.acquire()
+            try:
+                self.retries += 1
+            finally:
+                self._lock.release()
+            
+            attempt += 1
+    
+    def _spent(self, deadline, delay):
+        """Would a backoff of ``delay`` seconds use up what is left of the deadline?"""
+        
+        return deadline is not None and delay >= deadline.remaining()
+    
+    def __repr__(self):
+        return '<%s at 0x%x %d attempts>' % (self.__class__.__name__, abs(id(self)), self.attempts)
@@ -0,0 +1,777 @@
+"""Authorize.net Gateway Simulator
+
+A local stand-in for the Authorize.net gateway speaking the AIM
+name-value protocol and the ARB/CIM XML API, for load, latency and
+offline testing. Customer profiles and subscriptions are kept in
+memory for the life of the simulator.
+
+    simulator = Simulator(latency=uniform(0.02, 0.2), decline_rate=0.1)
+    simulator.start()
+    
+    client = PaymentClient(auth, endpoint=simulator.aim_endpoint)
+    
+    ...
+    
+    simulator.stop()
+
+It can also be run on its own, see ``--help``:
+
+    python -m paypy.adapters.authnet.simulator --port 8080 --latency lognormal:0.05,0.5
+
+"""
+
+import collections
+import copy
+import hashlib
+import itertools
+import math
+import optparse
+import random
+import string
+import sys
+import threading
+import time
+import urlparse
+import BaseHTTPServer
+import SocketServer
+
+from lxml                              import etree as ET
+
+from paypy.adapters.authnet.connection import ENDPOINT_AIM_TEST, ENDPOINT_XML_TEST
+from paypy.adapters.authnet.response   import ANET_NS, NAMESPACES, local_name
+
+AIM_PATH = ENDPOINT_AIM_TEST[2]
+XML_PATH = ENDPOINT_XML_TEST[2]
+
+# AIM outcomes: (response code, subcode, reason code, reason text)
+AIM_APPROVED = (1, 1, 1,  'This transaction has been approved.')
+AIM_DECLINED = (2, 1, 2,  'This transaction has been declined.')
+
+# Declined by the sandbox whatever the decline rate
+DECLINE_ZIP  = '46282'
+
+# XML outcomes: (result code, message code, message text)
+XML_OK        = ('Ok',    'I00001', 'Successful.')
+XML_DECLINED  = ('Error', 'E00027', 'The transaction was unsuccessful.')
+XML_NOT_FOUND = ('Error', 'E00040', 'The record cannot be found.')
+XML_INVALID   = ('Error', 'E00003', 'An error occurred while parsing the XML request.')
+
+# Request element -> handler method name
+XML_OPERATIONS = {'createCustomerProfileRequest'            : '_create_profile',
+                  'createCustomerPaymentProfileRequest'     : '_create_billing',
+                  'createCustomerShippingAddressRequest'    : '_create_shipping',
+                  'createCustomerProfileTransactionRequest' : '_create_transaction',
+                  'updateCustomerProfileRequest'            : '_update_profile',
+                  'updateCustomerPaymentProfileRequest'     : '_update_billing',
+                  'updateCustomerShippingAddressRequest'    : '_update_shipping',
+                  'updateSplitTenderGroupRequest'           : '_update_split_tender',
+                  'validateCustomerPaymentProfileRequest'   : '_validate',
+                  'getCustomerProfileIdsRequest'            : '_retrieve_ids',
+                  'getCustomerProfileRequest'               : '_retrieve_profile',
+                  'getCustomerPaymentProfileRequest'        : '_retrieve_billing',
+                  'getCustomerShippingAddressRequest'       : '_retrieve_shipping',
+                  'deleteCustomerProfileRequest'            : '_delete_profile',
+                  'deleteCustomerPaymentProfileRequest'     : '_delete_billing',
+                  'deleteCustomerShippingAddressRequest'    : '_delete_shipping',
+                  'ARBCreateSubscriptionRequest'            : '_create_subscription',
+                  'ARBUpdateSubscriptionRequest'            : '_update_subscription',
+                  'ARBGetSubscriptionStatusRequest'         : '_subscription_status',
+                  'ARBCancelSubscriptionRequest'            : '_cancel_subscription'}
+
+def constant(seconds):
+    """Latency distribution always taking the given number of seconds."""
+    
+    return lambda rng: seconds
+
+def uniform(low, high):
+    """Latency distribution uniform between two bounds in seconds."""
+    
+    return lambda rng: rng.uniform(low, high)
+
+def lognormal(median, sigma):
+    """Long-tailed latency distribution with the given median in seconds."""
+    
+    mu = math.log(median)
+    
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+def _tag(name):
+    return '{%s}%s' % (ANET_NS, name)
+
+def _sub(parent, name, text=None):
+    node      = ET.SubElement(parent, _tag(name))
+    node.text = text
+    
+    return node
+
+def _text(parent, path):
+    return parent.findtext(path, namespaces=NAMESPACES)
+
+def _mask(node):
+    """Mask payment details the way the gateway does when returning them."""
+    
+    for number in node.xpath('.//anet:cardNumber | .//anet:accountNumber', namespaces=NAMESPACES):
+        number.text = 'XXXX' + (number.text or '')[-4:]
+    
+    for expiration in node.iterfind('.//anet:expirationDate', NAMESPACES):
+        expiration.text = 'XXXX'
+    
+    for code in list(node.iterfind('.//anet:cardCode', NAMESPACES)):
+        code.getparent().remove(code)
+    
+    return node
+
+class SimulatorHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Hand each request to the server's simulator."""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    # Buffer each response into a single send, the status line and
+    # headers would otherwise wait out the client's delayed ACK
+    wbufsize = -1
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        
+        status, content_type, response = self.server.simulator.respond(self.path, body)
+        
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+    
+    def log_message(self, *args):
+        if self.server.simulator.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, *args)
+
+class SimulatorServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads      = True
+    allow_reuse_address = True
+
+class Simulator(object):
+    """Simulate the Authorize.net gateway.
+    
+    ``latency`` is a distribution (see constant, uniform and lognormal)
+    each response is delayed by. A ``decline_rate`` fraction of charges
+    and validations are declined, an ``error_rate`` fraction of requests
+    fail with HTTP 500 and a ``throttle_rate`` fraction with HTTP 503.
+    More than ``rate_limit`` requests in a second are answered with
+    HTTP 429. ``seed`` makes the outcomes repeatable.
+    
+    """
+    
+    def __init__(self, host='127.0.0.1', port=0, latency=None, decline_rate=0.0, error_rate=0.0, throttle_rate=0.0, rate_limit=None, md5_salt='', seed=None, verbose=False):
+        self.host          = host
+        self.port          = port
+        self.latency       = latency
+        self.decline_rate  = decline_rate
+        self.error_rate    = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit    = rate_limit
+        self.md5_salt      = md5_salt
+        self.verbose       = verbose
+        
+        self.random        = random.Random(seed)
+        self.counts        = collections.defaultdict(int)
+        self.profiles      = {}
+        self.subscriptions = {}
+        self.server        = None
+        
+        self._ids          = itertools.count(1000)
+        self._recent       = collections.deque()
+        self._lock         = threading.Lock()
+    
+    @property
+    def aim_endpoint(self):
+        """The endpoint to send AIM requests to."""
+        
+        return ('http', '%s:%d' % (self.host, self.port), AIM_PATH)
+    
+    @property
+    def xml_endpoint(self):
+        """The endpoint to send ARB and CIM requests to."""
+        
+        return ('http', '%s:%d' % (self.host, self.port), XML_PATH)
+    
+    def _bind(self):
+        self.server           = SimulatorServer((self.host, self.port), SimulatorHandler)
+        self.server.simulator = self
+        self.port             = self.server.server_port
+    
+    def start(self):
+        """Serve requests from a background thread."""
+        
+        self._bind()
+        
+        thread        = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        
+        return self
+    
+    def stop(self):
+        """Stop serving requests."""
+        
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+    
+    def serve_forever(self):
+        """Serve requests from the calling thread."""
+        
+        self._bind()
+        self.server.serve_forever()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+    
+    def respond(self, path, body):
+        """Return the (HTTP status, content type, body) answering a request."""
+        
+        self._lock.acquire()
+        try:
+            delay = self.latency(self.random) if self.latency else 0
+            fault = self._fault()
+        finally:
+            self._lock.release()
+        
+        if delay:
+            time.sleep(delay)
+        
+        if fault:
+            self._count(str(fault))
+            return fault, 'text/plain', ''
+        
+        if path == AIM_PATH:
+            return 200, 'text/plain', self._aim(body)
+        
+        if path == XML_PATH:
+            return 200, 'text/xml', self._xml(body)
+        
+        self._count('404')
+        return 404, 'text/plain', ''
+    
+    def _fault(self):
+        """Pick an HTTP error status for the next request, or None."""
+        
+        if self.rate_limit:
+            now = time.time()
+            
+            while self._recent and now - self._recent[0] >= 1:
+                self._recent.popleft()
+            
+            if len(self._recent) >= self.rate_limit:
+                return 429
+            
+            self._recent.append(now)
+        
+        if self.throttle_rate and self.random.random() < self.throttle_rate:
+            return 503
+        
+        if self.error_rate and self.random.random() < self.error_rate:
+            return 500
+        
+        return None
+    
+    def _count(self, outcome):
+        self._lock.acquire()
+        try:
+            self.counts[outcome] += 1
+        finally:
+            self._lock.release()
+    
+    def _next_id(self):
+        self._lock.acquire()
+        try:
+            return str(self._ids.next())
+        finally:
+            self._lock.release()
+    
+    def _declined(self, postal_code=None):
+        if postal_code == DECLINE_ZIP:
+            return True
+        
+        self._lock.acquire()
+        try:
+            return self.decline_rate and self.random.random() < self.decline_rate
+        finally:
+            self._lock.release()
+    
+    def _direct_response(self, fields, delimiter='|', encap_char=''):
+        """Build a delimited transaction response from the request fields, return (approved, response)."""
+        
+        declined = self._declined(fields.get('x_zip'))
+        outcome  = AIM_DECLINED if declined else AIM_APPROVED
+        
+        self._count('declined' if declined else 'approved')
+        
+        trans_id = '0' if declined else self._next_id()
+        amount   = fields.get('x_amount', '')
+        number   = fields.get('x_card_num', '')
+        response = [''] * 68
+        
+        response[0:4]   = [str(x) for x in outcome]
+        response[4]     = '' if declined else ''.join([self.random.choice(string.ascii_uppercase + string.digits) for x in range(6)])
+        response[5]     = 'Y'
+        response[6]     = trans_id
+        response[7]     = fields.get('x_invoice_num', '')
+        response[8]     = fields.get('x_description', '')
+        response[9]     = amount
+        response[10]    = fields.get('x_method', 'CC')
+        response[11]    = fields.get('x_type', 'AUTH_CAPTURE').lower()
+        response[12]    = fields.get('x_cust_id', '')
+        response[13:24] = [fields.get(x, '') for x in ('x_first_name', 'x_last_name', 'x_company', 'x_address', 'x_city', 'x_state', 'x_zip', 'x_country', 'x_phone', 'x_fax', 'x_email')]
+        response[24:32] = [fields.get('x_ship_to_%s' % x, '') for x in ('first_name', 'last_name', 'company', 'address', 'city', 'state', 'zip', 'country')]
+        response[37]    = hashlib.md5(''.join([self.md5_salt, fields.get('x_login', ''), trans_id, amount])).hexdigest().upper()
+        response[38]    = 'P'
+        response[40]    = 'XXXX' + number[-4:] if number else ''
+        response[41]    = 'Visa' if number.startswith('4') else ''
+        
+        return not declined, (encap_char + delimiter + encap_char).join(response).join([encap_char, encap_char])
+    
+    def _aim(self, body):
+        """Answer an AIM name-value request."""
+        
+        fields = dict(urlparse.parse_qsl(body, keep_blank_values=True))
+        
+        return self._direct_response(fields, fields.get('x_delim_char') or ',', fields.get('x_encap_char', ''))[1]
+    
+    def _xml(self, body):
+        """Answer an ARB or CIM XML request."""
+        
+        try:
+            request = ET.fromstring(body)
+        except ET.XMLSyntaxError:
+            request = None
+        
+        operation = local_name(request.tag) if request is not None else ''
+        handler   = XML_OPERATIONS.get(operation)
+        
+        response  = ET.Element(_tag(operation.replace('Request', 'Response') if handler else 'ErrorResponse'), nsmap={None : ANET_NS})
+        
+        if request is not None and _text(request, 'anet:refId') is not None:
+            _sub(response, 'refId', _text(request, 'anet:refId'))
+        
+        messages = _sub(response, 'messages')
+        outcome  = XML_INVALID
+        
+        if handler:
+            outcome = getattr(self, handler)(request, response)
+        
+        result_code, code, reason = outcome
+        
+        _sub(messages, 'resultCode', result_code)
+        message = _sub(messages, 'message')
+        _sub(message, 'code', code)
+        _sub(message, 'text', reason)
+        
+        self._count(code)
+        
+        return ET.tostring(response, xml_declaration=True, encoding='utf-8')
+    
+    def _payment_fields(self, request, payment=None, postal_code=None):
+        """Return the AIM fields describing a CIM charge or validation."""
+        
+        fields = {'x_login' : _text(request, 'anet:merchantAuthentication/anet:name') or ''}
+        
+        if postal_code:
+            fields['x_zip'] = postal_code
+        
+        if payment is not None:
+            fields['x_card_num'] = _text(payment, './/anet:cardNumber') or ''
+        
+        return fields
+    
+    def _validation(self, request, payment_profile):
+        """Return (approved, validation response) for a payment profile, or None if not validating."""
+        
+        if _text(request, 'anet:validationMode') not in ('testMode', 'liveMode'):
+            return None
+        
+        fields = self._payment_fields(request, payment_profile.find('anet:payment', NAMESPACES), _text(payment_profile, 'anet:billTo/anet:zip'))
+        
+        fields['x_type']   = 'AUTH_ONLY'
+        fields['x_amount'] = '0.00'
+        
+        # Validation responses are comma delimited, as the CIM adapter reads them
+        return self._direct_response(fields, ',')
+    
+    def _profile(self, request):
+        self._lock.acquire()
+        try:
+            return self.profiles.get(_text(request, 'anet:customerProfileId'))
+        finally:
+            self._lock.release()
+    
+    def _find(self, profile, tag, id_tag, id):
+        for node in profile.iterfind('anet:%s' % tag, NAMESPACES):
+            if _text(node, 'anet:%s' % id_tag) == id:
+                return node
+        
+        return None
+    
+    def _create_profile(self, request, response):
+        profile     = copy.deepcopy(request.find('anet:profile', NAMESPACES))
+        profile_id  = self._next_id()
+        payments    = profile.findall('anet:paymentProfiles', NAMESPACES)
+        addresses   = profile.findall('anet:shipToList', NAMESPACES)
+        validations = [self._validation(request, x) for x in payments]
+        
+        if validations and validations[0] is not None and not all([x[0] for x in validations]):
+            results = _sub(response, 'validationDirectResponseList')
+            
+            for approved, validation in validations:
+                _sub(results, 'string', validation)
+            
+            return XML_DECLINED
+        
+        _sub(profile, 'customerProfileId', profile_id)
+        _sub(response, 'customerProfileId', profile_id)
+        
+        payment_ids = _sub(response, 'customerPaymentProfileIdList')
+        for payment_profile in payments:
+            _sub(payment_ids, 'numericString', _sub(payment_profile, 'customerPaymentProfileId', self._next_id()).text)
+        
+        shipping_ids = _sub(response, 'customerShippingAddressIdList')
+        for address in addresses:
+            _sub(shipping_ids, 'numericString', _sub(address, 'customerAddressId', self._next_id()).text)
+        
+        if validations and validations[0] is not None:
+            results = _sub(response, 'validationDirectResponseList')
+            
+            for approved, validation in validations:
+                _sub(results, 'string', validation)
+        
+        self._lock.acquire()
+        try:
+            self.profiles[profile_id] = profile
+        finally:
+            self._lock.release()
+        
+        return XML_OK
+    
+    def _create_billing(self, request, response):
+        profile = self._profile(request)
+        
+        if profile is None:
+            return XML_NOT_FOUND
+        
+        payment_profile     = copy.deepcopy(request.find('anet:paymentProfile', NAMESPACES))
+        payment_profile.tag = _tag('paymentProfiles')
+        validation          = self._validation(request, payment_profile)
+        
+        if validation is not None:
+            _sub(response, 'validationDirectResponse', validation[1])
+            
+            if not validation[0]:
+                return XML_DECLINED
+        
+        _sub(response, 'customerPaymentProfileId', _sub(payment_profile, 'customerPaymentProfileId', self._next_id()).text)
+        profile.append(payment_profile)
+        
+        return XML_OK
+    
+    def _create_shipping(self, request, response):
+        profile = self._profile(request)
+        
+        if profile is None:
+            return XML_NOT_FOUND
+        
+        address     = copy.deepcopy(request.find('anet:address', NAMESPACES))
+        address.tag = _tag('shipToList')
+        
+        _sub(response, 'customerAddressId', _sub(address, 'customerAddressId', self._next_id()).text)
+        profile.append(address)
+        
+        return XML_OK
+    
+    def _create_transaction(self, request, response):
+        transaction = request.find('anet:transaction/*', NAMESPACES)
+        profile     = self._profile(transaction)
+        
+        if profile is None:
+            return XML_NOT_FOUND
+        
+        payment_profile = self._find(profile, 'paymentProfiles', 'customerPaymentProfileId', _text(transaction, 'anet:customerPaymentProfileId'))
+        
+        if payment_profile is None:
+            return XML_NOT_FOUND
+        
+        fields = self._payment_fields(request, payment_profile.find('anet:payment', NAMESPACES), _text(payment_profile, 'anet:billTo/anet:zip'))
+        
+        fields['x_type']        = {'profileTransAuthOnly'    : 'AUTH_ONLY',
+                                   'profileTransCaptureOnly' : 'CAPTURE_ONLY',
+                                   'profileTransRefund'      : 'CREDIT',
+                                   'profileTransVoid'        : 'VOID'}.get(local_name(transaction.tag), 'AUTH_CAPTURE')
+        fields['x_amount']      = _text(transaction, 'anet:amount') or ''
+        fields['x_invoice_num'] = _text(transaction, 'anet:order/anet:invoiceNumber') or ''
+        fields['x_description'] = _text(transaction, 'anet:order/anet:description') or ''
+        
+        approved, direct = self._direct_response(fields)
+        
+        _sub(response, 'directResponse', direct)
+        
+        return XML_OK if approved else XML_DECLINED
+    
+    def _update_profile(self, request, response):
+        update  = request.find('anet:profile', NAMESPACES)
+        profile = self._profile(update)
+        
+        if profile is None:
+            return XML_NOT_FOUND
+        
+        for name in ('merchantCustomerId', 'description', 'email'):
+            node = profile.find('anet:%s' % name, NAMESPACES)
+            
+            if node is not None:
+                profile.remove(node)
+            
+            value = _text(update, 'anet:%s' % name)
+            
+            if value is not None:
+                profile.insert(0, _sub(profile, name, value))
+        
+        return XML_OK
+    
+    def _replace(self, profile, node, tag, id_tag):
+        """Replace a stored payment profile or address with the updated one."""
+        
+        existing = self._find(profile, tag, id_tag, _text(node, 'anet:%s' % id_tag))
+        
+        if existing is None:
+            return False
+        
+        node     = copy.deepcopy(node)
+        node.tag = _tag(tag)
+        
+        profile.replace(existing, node)
+        
+        return True
+    
+    def _update_billing(self, request, response):
+        profile         = self._profile(request)
+        payment_profile = request.find('anet:paymentProfile', NAMESPACES)
+        
+        if profile is None or not self._replace(profile, payment_profile, 'paymentProfiles', 'customerPaymentProfileId'):
+            return XML_NOT_FOUND
+        
+        validation = self._validation(request, payment_profile)
+        
+        if validation is not None:
+            _sub(response, 'validationDirectResponse', validation[1])
+            
+            if not validation[0]:
+                return XML_DECLINED
+        
+        return XML_OK
+    
+    def _update_shipping(self, request, response):
+        profile = self._profile(request)
+        
+        if profile is None or not self._replace(profile, request.find('anet:address', NAMESPACES), 'shipToList', 'customerAddressId'):
+            return XML_NOT_FOUND
+        
+        return XML_OK
+    
+    def _update_split_tender(self, request, response):
+        return XML_OK
+    
+    def _validate(self, request, response):
+        profile = self._profile(request)
+        
+        if profile is None:
+            return XML_NOT_FOUND
+        
+        payment_profile = self._find(profile, 'paymentProfiles', 'customerPaymentProfileId', _text(request, 'anet:customerPaymentProfileId'))
+        
+        if payment_profile is None:
+            return XML_NOT_FOUND
+        
+        fields = self._payment_fields(request, payment_profile.find('anet:payment', NAMESPACES), _text(payment_profile, 'anet:billTo/anet:zip'))
+        
+        fields['x_type']   = 'AUTH_ONLY'
+        fields['x_amount'] = '0.00'
+        
+        approved, direct = self._direct_response(fields)
+        
+        _sub(response, 'directResponse', direct)
+        
+        return XML_OK if approved else XML_DECLINED
+    
+    def _retrieve_ids(self, request, response):
+        ids = _sub(response, 'ids')
+        
+        self._lock.acquire()
+        try:
+            profile_ids = sorted(self.profiles, key=int)
+        finally:
+            self._lock.release()
+        
+        for profile_id in profile_ids:
+            _sub(ids, 'numericString', profile_id)
+        
+        return XML_OK
+    
+    def _retrieve_profile(self, request, response):
+        profile = self._profile(request)
+        
+        if profile is None:
+            return XML_NOT_FOUND
+        
+        response.append(_mask(copy.deepcopy(profile)))
+        
+        return XML_OK
+    
+    def _retrieve_child(self, request, response, tag, id_tag, response_tag):
+        profile = self._profile(request)
+        
+        if profile is None:
+            return XML_NOT_FOUND
+        
+        node = self._find(profile, tag, id_tag, _text(request, 'anet:%s' % id_tag))
+        
+        if node is None:
+            return XML_NOT_FOUND
+        
+        node     = _mask(copy.deepcopy(node))
+        node.tag = _tag(response_tag)
+        
+        response.append(node)
+        
+        return XML_OK
+    
+    def _retrieve_billing(self, request, response):
+        return self._retrieve_child(request, response, 'paymentProfiles', 'customerPaymentProfileId', 'paymentProfile')
+    
+    def _retrieve_shipping(self, request, response):
+        return self._retrieve_child(request, response, 'shipToList', 'customerAddressId', 'address')
+    
+    def _delete_profile(self, request, response):
+        self._lock.acquire()
+        try:
+            profile = self.profiles.pop(_text(request, 'anet:customerProfileId'), None)
+        finally:
+            self._lock.release()
+        
+        return XML_OK if profile is not None else XML_NOT_FOUND
+    
+    def _delete_child(self, request, tag, id_tag):
+        profile = self._profile(request)
+        
+        if profile is None:
+            return XML_NOT_FOUND
+        
+        node = self._find(profile, tag, id_tag, _text(request, 'anet:%s' % id_tag))
+        
+        if node is None:
+            return XML_NOT_FOUND
+        
+        profile.remove(node)
+        
+        return XML_OK
+    
+    def _delete_billing(self, request, response):
+        return self._delete_child(request, 'paymentProfiles', 'customerPaymentProfileId')
+    
+    def _delete_shipping(self, request, response):
+        return self._delete_child(request, 'shipToList', 'customerAddressId')
+    
+    def _subscription(self, request, status=None):
+        """Return a subscription's status, setting it first if given, or None if it doesn't exist."""
+        
+        subscription_id = _text(request, 'anet:subscriptionId')
+        
+        self._lock.acquire()
+        try:
+            if subscription_id not in self.subscriptions:
+                return None
+            
+            if status is not None:
+                self.subscriptions[subscription_id] = status
+            
+            return self.subscriptions[subscription_id]
+        finally:
+            self._lock.release()
+    
+    def _create_subscription(self, request, response):
+        subscription_id = self._next_id()
+        
+        self._lock.acquire()
+        try:
+            self.subscriptions[subscription_id] = 'active'
+        finally:
+            self._lock.release()
+        
+        _sub(response, 'subscriptionId', subscription_id)
+        
+        return XML_OK
+    
+    def _update_subscription(self, request, response):
+        return XML_OK if self._subscription(request) is not None else XML_NOT_FOUND
+    
+    def _subscription_status(self, request, response):
+        status = self._subscription(request)
+        
+        if status is None:
+            return XML_NOT_FOUND
+        
+        _sub(response, 'status', status)
+        
+        return XML_OK
+    
+    def _cancel_subscription(self, request, response):
+        return XML_OK if self._subscription(request, 'canceled') is not None else XML_NOT_FOUND
+    
+    def __repr__(self):
+        return '<%s at 0x%x %s:%d>' % (self.__class__.__name__, abs(id(self)), self.host, self.port)
+
+def parse_latency(spec):
+    """Parse a latency distribution: seconds, constant:s, uniform:low,high or lognormal:median,sigma."""
+    
+    name, _, arguments = spec.rpartition(':')
+    distributions      = {'' : constant, 'constant' : constant, 'uniform' : uniform, 'lognormal' : lognormal}
+    
+    if name not in distributions:
+        raise ValueError('unknown latency distribution %r' % name)
+    
+    return distributions[name](*[float(x) for x in arguments.split(',')])
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options]', description='Run a local Authorize.net gateway simulator.')
+    
+    parser.add_option('--host',          default='127.0.0.1')
+    parser.add_option('--port',          default=8080, type='int')
+    parser.add_option('--latency',       default=None, help='seconds, constant:s, uniform:low,high or lognormal:median,sigma')
+    parser.add_option('--decline-rate',  default=0.0,  type='float', help='fraction of charges declined')
+    parser.add_option('--error-rate',    default=0.0,  type='float', help='fraction of requests failing with HTTP 500')
+    parser.add_option('--throttle-rate', default=0.0,  type='float', help='fraction of requests failing with HTTP 503')
+    parser.add_option('--rate-limit',    default=None, type='int',   help='requests per second before HTTP 429')
+    parser.add_option('--md5-salt',      default='')
+    parser.add_option('--seed',          default=None, type='int')
+    parser.add_option('--verbose',       default=False, action='store_true')
+    
+    options, arguments = parser.parse_args(argv)
+    
+    try:
+        latency = parse_latency(options.latency) if options.latency else None
+    except ValueError, e:
+        parser.error(str(e))
+    
+    simulator = Simulator(options.host, options.port, latency, options.decline_rate, options.error_rate,
+                          options.throttle_rate, options.rate_limit, options.md5_salt, options.seed, options.verbose)
+    
+    print 'AIM endpoint: http://%s:%d%s' % (options.host, options.port, AIM_PATH)
+    print 'XML endpoint: http://%s:%d%s' % (options.host, options.port, XML_PATH)
+    
+    try:
+        simulator.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
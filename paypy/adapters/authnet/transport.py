@@ -0,0 +1,317 @@
+"""Authorize.net Transports
+
+The transports the adapters send their requests through:
+
+    PooledTransport     keep-alive connections, the default
+    MemoryTransport     answers in-process, e.g. from the gateway
+                        simulator, for tests and benchmarks
+    RecordingTransport  records the exchanges made through another
+    ReplayTransport     answers with recorded exchanges
+    CassetteRecorder    appends the exchanges made through another to
+                        a cassette file, secrets redacted
+    CassetteTransport   answers from a cassette file
+
+A cassette is an append-only file starting with CASSETTE_MAGIC and
+holding one entry per exchange: a CASSETTE_ENTRY header (the request
+fingerprint and the endpoint, request and response lengths) followed by
+the endpoint as "scheme host path", the request and the response.
+
+"""
+
+import collections
+import cPickle
+import hashlib
+import mmap
+import os
+import struct
+import threading
+
+from paypy.adapters                      import Transport
+from paypy.adapters.authnet.asynchronous import AsyncResult, reactor
+from paypy.adapters.authnet.connection   import pool, READ
+from paypy.exceptions.authnet            import ConnectionException, GatewayStatusException
+from paypy.log                           import redact
+
+# The first bytes of every cassette file
+CASSETTE_MAGIC = 'PAYPYCS1'
+
+# An entry header: SHA-1 request fingerprint, endpoint, request and response lengths
+CASSETTE_ENTRY = struct.Struct('!20sHII')
+
+def _completed(call, *args):
+    """Return an already completed AsyncResult holding call(*args)."""
+    
+    result = AsyncResult(reactor)
+    
+    try:
+        result.set_result(call(*args))
+    except Exception, e:
+        result.set_exception(e)
+    
+    return result
+
+class PooledTransport(Transport):
+    """Send blocking requests through a ConnectionPool and asynchronous ones through a Reactor."""
+    
+    def __init__(self, pool=pool, reactor=reactor):
+        self.pool    = pool
+        self.reactor = reactor
+    
+    def request(self, endpoint, data, headers=None, timeout=None, deadline=None, trace=None):
+        return self.pool.request(endpoint, data, headers, timeout, deadline, trace)
+    
+    def stream(self, endpoint, data, headers=None, timeout=None, chunk_size=16384, deadline=None, trace=None):
+        return self.pool.stream(endpoint, data, headers, timeout, chunk_size, deadline, trace)
+    
+    def request_async(self, endpoint, data, headers=None, deadline=None):
+        return self.reactor.request(endpoint, data, headers, deadline)
+    
+    def __repr__(self):
+        return '<%s at 0x%x %r>' % (self.__class__.__name__, abs(id(self)), self.pool)
+
+class MemoryTransport(Transport):
+    """Answer requests in-process, without a socket.
+    
+    ``handler`` is called with the endpoint path and the request body
+    and returns the (HTTP status, content type, body) answer, like
+    Simulator.respond does.
+    
+    """
+    
+    def __init__(self, handler):
+        self.handler  = handler
+        self.requests = 0
+    
+    def request(self, endpoint, data, headers=None, timeout=None, deadline=None, trace=None):
+        if deadline is not None:
+            deadline.timeout(READ, endpoint[1])
+        
+        self.requests += 1
+        
+        status, content_type, body = self.handler(endpoint[2], data)
+        
+        if status != 200:
+            raise GatewayStatusException('%s returned HTTP %d' % (endpoint[1], status), status)
+        
+        return body
+    
+    def request_async(self, endpoint, data, headers=None, deadline=None):
+        return _completed(self.request, endpoint, data, headers, None, deadline)
+    
+    def __repr__(self):
+        return '<%s at 0x%x %d requests>' % (self.__class__.__name__, abs(id(self)), self.requests)
+
+class RecordingTransport(Transport):
+    """Record the (endpoint, request, response) exchanges made through another transport."""
+    
+    def __init__(self, transport=None):
+        self.transport = transport or pooled
+        self.exchanges = []
+        self._lock     = threading.Lock()
+    
+    def request(self, endpoint, data, headers=None, timeout=None, deadline=None, trace=None):
+        return self._record(endpoint, data, self.transport.request(endpoint, data, headers, timeout, deadline, trace))
+    
+    def request_async(self, endpoint, data, headers=None, deadline=None):
+        return self.transport.request_async(endpoint, data, headers, deadline).then(lambda body: self._record(endpoint, data, body))
+    
+    def save(self, path):
+        """Write the exchanges recorded so far to a file ReplayTransport.load reads."""
+        
+        f = open(path, 'wb')
+        try:
+            cPickle.dump(list(self.exchanges), f, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+    
+    def _record(self, endpoint, data, body):
+        self._lock.acquire()
+        try:
+            self.exchanges.append((tuple(endpoint), data, body))
+        finally:
+            self._lock.release()
+        
+        return body
+    
+    def __repr__(self):
+        return '<%s at 0x%x %d exchanges>' % (self.__class__.__name__, abs(id(self)), len(self.exchanges))
+
+class ReplayTransport(Transport):
+    """Answer requests with recorded responses, matched by endpoint and request body.
+    
+    The responses recorded for the same request are replayed in order,
+    the last one repeating once they run out.
+    
+    """
+    
+    def __init__(self, exchanges):
+        self._responses = collections.defaultdict(list)
+        self._replayed  = collections.defaultdict(int)
+        self._lock      = threading.Lock()
+        
+        for endpoint, data, body in exchanges:
+            self._responses[(tuple(endpoint), data)].append(body)
+    
+    @classmethod
+    def load(cls, path):
+        """Replay the exchanges RecordingTransport.save wrote to a file."""
+        
+        f = open(path, 'rb')
+        try:
+            return cls(cPickle.load(f))
+        finally:
+            f.close()
+    
+    def request(self, endpoint, data, headers=None, timeout=None, deadline=None, trace=None):
+        key = self._key(endpoint, data)
+        
+        self._lock.acquire()
+        try:
+            responses = self._responses.get(key)
+            
+            if not responses:
+                raise ConnectionException('no response to %s was recorded for the request' % endpoint[1])
+            
+            index               = self._replayed[key]
+            self._replayed[key] = index + 1
+        finally:
+            self._lock.release()
+        
+        return self._body(responses[min(index, len(responses) - 1)])
+    
+    def request_async(self, endpoint, data, headers=None, deadline=None):
+        return _completed(self.request, endpoint, data, headers, None, deadline)
+    
+    def _key(self, endpoint, data):
+        return (tuple(endpoint), data)
+    
+    def _body(self, response):
+        return response
+    
+    def __repr__(self):
+        return '<%s at 0x%x %d requests>' % (self.__class__.__name__, abs(id(self)), len(self._responses))
+
+def fingerprint(endpoint, data):
+    """Return the SHA-1 digest a cassette indexes a (redacted) request to an endpoint by."""
+    
+    return hashlib.sha1('%s %s %s\n%s' % (tuple(endpoint) + (data,))).digest()
+
+class CassetteRecorder(Transport):
+    """Append the exchanges made through another transport to a cassette file.
+    
+    Requests and responses are redacted with paypy.log.redact before
+    they are written, so a cassette can be recorded against production
+    and shared. Each entry is written in one call and flushed, so a
+    cassette can be replayed while it is still being recorded.
+    
+    """
+    
+    def __init__(self, path, transport=None):
+        self.path      = path
+        self.transport = transport or pooled
+        self.entries   = 0
+        
+        self._file = open(path, 'ab')
+        self._lock = threading.Lock()
+        
+        if self._file.tell() == 0:
+            self._file.write(CASSETTE_MAGIC)
+            self._file.flush()
+    
+    def request(self, endpoint, data, headers=None, timeout=None, deadline=None, trace=None):
+        return self._record(endpoint, data, self.transport.request(endpoint, data, headers, timeout, deadline, trace))
+    
+    def request_async(self, endpoint, data, headers=None, deadline=None):
+        return self.transport.request_async(endpoint, data, headers, deadline).then(lambda body: self._record(endpoint, data, body))
+    
+    def close(self):
+        self._file.close()
+    
+    def _record(self, endpoint, data, body):
+        location = '%s %s %s' % tuple(endpoint)
+        request  = redact(data)
+        response = redact(body)
+        entry    = CASSETTE_ENTRY.pack(fingerprint(endpoint, request), len(location), len(request), len(response))
+        
+        self._lock.acquire()
+        try:
+            self._file.write(entry + location + request + response)
+            self._file.flush()
+            
+            self.entries += 1
+        finally:
+            self._lock.release()
+        
+        return body
+    
+    def __repr__(self):
+        return '<%s at 0x%x %s %d entries>' % (self.__class__.__name__, abs(id(self)), self.path, self.entries)
+
+class CassetteTransport(ReplayTransport):
+    """Answer requests from a cassette file, read through mmap.
+    
+    The cassette is scanned once for its entry headers and each
+    request's fingerprint indexed to the offset of its response, which
+    is only read when replayed. Incoming requests are redacted the way
+    they were when recorded before they are fingerprinted, so requests
+    differing only in their secrets are answered alike.
+    
+    """
+    
+    def __init__(self, path):
+        ReplayTransport.__init__(self, ())
+        
+        self.path = path
+        
+        f = open(path, 'rb')
+        try:
+            if os.fstat(f.fileno()).st_size < len(CASSETTE_MAGIC) or f.read(len(CASSETTE_MAGIC)) != CASSETTE_MAGIC:
+                raise ConnectionException('%s is not a cassette' % path)
+            
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        
+        for key, location, request, response in self._scan():
+            self._responses[key].append(response)
+    
+    def entries(self):
+        """Yield the recorded (endpoint, request, response) exchanges in order."""
+        
+        for key, location, request, response in self._scan():
+            yield tuple(self._body(location).split(' ', 2)), self._body(request), self._body(response)
+    
+    def close(self):
+        self._map.close()
+    
+    def _scan(self):
+        """Yield each entry's fingerprint and the (offset, length) of its endpoint, request and response."""
+        
+        offset = len(CASSETTE_MAGIC)
+        size   = len(self._map)
+        
+        # A partly written last entry is left out
+        while offset + CASSETTE_ENTRY.size <= size:
+            key, location, request, response = CASSETTE_ENTRY.unpack_from(self._map, offset)
+            
+            start  = offset + CASSETTE_ENTRY.size
+            offset = start + location + request + response
+            
+            if offset > size:
+                break
+            
+            yield key, (start, location), (start + location, request), (start + location + request, response)
+    
+    def _key(self, endpoint, data):
+        return fingerprint(endpoint, redact(data))
+    
+    def _body(self, span):
+        offset, length = span
+        
+        return self._map[offset:offset + length]
+    
+    def __repr__(self):
+        return '<%s at 0x%x %s %d requests>' % (self.__class__.__name__, abs(id(self)), self.path, len(self._responses))
+
+# The transport adapters use unless they are given another
+pooled = PooledTransport()
@@ -1,12 +1,18 @@
-import urllib2
 import base64
 
-from paypy.adapters                import *
-from paypy.exceptions.google       import CheckoutException
+from paypy.adapters                    import *
+from paypy.adapters.authnet.connection import deadline_for
+from paypy.adapters.authnet.transport  import pooled
+from paypy.exceptions.google           import CheckoutException
+from paypy.instrument                  import SERIALIZE, PARSE
 
 from paypy.serializers.google.checkout import Serialize
 from paypy.schemas.google.checkout     import ICheckout
 
+# Endpoints are (scheme, host, path) triples, the merchant id is appended to the path
+ENDPOINT_CHECKOUT_PRODUCTION = ('https', 'checkout.google.com', '/api/checkout/v2/request/Merchant/')
+ENDPOINT_CHECKOUT_TEST       = ('https', 'sandbox.google.com',  '/api/checkout/v2/request/Merchant/')
+
 class TransactionResult(Result):
     """Represent a transaction result as an object."""
     
@@ -29,44 +35,46 @@ class TransactionResult(Result):
         return '<%s at 0x%x %s>' % (self.__class__.__name__, abs(id(self)), self.type)
 
 class Transaction(Adapter):
-    """Authorize.net AIM (Advanced Integration Method) transaction object adapter.
+    """Google Checkout transaction object adapter.
     
-    Represent an Authorize.net transaction and provide a method for
-    submission.
+    Submit Google Checkout transactions, each given to process() as a
+    Checkout options schema, or the one the adapter was created with.
     
     """
     
-    def __init__(self, options):
-        ENDPOINT_CHECKOUT_PRODUCTION = 'checkout.google.com/api/checkout/v2/request/Merchant/'
-        ENDPOINT_CHECKOUT_TEST       = 'sandbox.google.com/api/checkout/v2/request/Merchant/'
-        
-        if not ICheckout.providedBy(options):
-            raise CheckoutException('the options object must provide a valid schema interface')
-        
-        self.options    = options
-        self.serialized = Serialize(options)
+    interface  = ICheckout
+    exception  = CheckoutException
+    serializer = Serialize
+    
+    def __init__(self, options=None, endpoint=None, retry=None, transport=None, instrument=None, metrics=None):
+        self._bind(options)
         
-        testing = options.transaction.testing
-        host    = ENDPOINT_CHECKOUT_TEST if testing else ENDPOINT_CHECKOUT_PRODUCTION
+        self.endpoint   = endpoint
+        self.retry      = retry
+        self.transport  = transport or pooled
+        self.instrument = instrument
+        self.metrics    = metrics
+    
+    @staticmethod
+    def endpoint_for(testing):
+        """Return the Checkout merchant API URL for sandbox or production requests."""
         
-        # Create the connection object
-        self.connection = urllib2.Request(url='https://' + host + self.options.auth.merchant_id)
+        return ENDPOINT_CHECKOUT_TEST if testing else ENDPOINT_CHECKOUT_PRODUCTION
     
-    def process(self):
-        """Process the transaction and return a result."""
+    def process(self, options=None, timeout=None, deadline=None):
+        """Process a transaction and return a result."""
         
-        data = str(self.serialized)
+        options = self._options(options)
+        data    = self._timed('checkout.process', SERIALIZE, self._serialize, options)
         
-        self.connection.headers['Content-Length'] = str(len(data))
+        scheme, host, path = self.endpoint or self.endpoint_for(options.transaction.testing)
+        endpoint           = (scheme, host, path + options.auth.merchant_id)
         
         # We need to build the HTTP Basic Auth headers here
-        self.connection.headers['Content-Type']   = 'application/xml; charset=UTF-8'
-        self.connection.headers['Accept']         = 'application/xml; charset=UTF-8'
-        self.connection.headers['Authorization']  = base64.b64encode("%s:%s" % (self.options.auth.merchant_id, self.options.auth.merchant_key))
-        
-        self.connection.data                      = data
+        headers = {'Content-Type'  : 'application/xml; charset=UTF-8',
+                   'Accept'        : 'application/xml; charset=UTF-8',
+                   'Authorization' : base64.b64encode("%s:%s" % (options.auth.merchant_id, options.auth.merchant_key))}
         
-        request = urllib2.urlopen(self.connection)
-        result  = TransactionResult(request.read())
+        send = lambda: self._exchange('checkout.process', self.transport.request, endpoint, data, headers, timeout, deadline_for(deadline))
         
-        return result
+        return self._measured('checkout.process', endpoint, lambda: self._timed('checkout.process', PARSE, TransactionResult, send()))
@@ -0,0 +1,187 @@
+"""Batch Payment API
+
+Push many payment schemas through a gateway adapter with bounded
+concurrency, streaming the results back as they complete.
+
+"""
+
+import Queue
+import threading
+import time
+
+from paypy.exceptions.payment import PaymentException
+from paypy.instrument         import monotonic
+
+# HTTP statuses the gateway uses to tell us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+class BatchResult(object):
+    """The outcome of one schema in a batch."""
+    
+    __slots__ = ('index', 'schema', 'result', 'error')
+    
+    def __init__(self, index, schema, result=None, error=None):
+        self.index  = index
+        self.schema = schema
+        self.result = result
+        self.error  = error
+    
+    def ok(self):
+        """Did the request reach the gateway and return a result?"""
+        
+        return self.error is None
+    
+    def __repr__(self):
+        outcome = self.error if self.error is not None else self.result
+        
+        return '<%s at 0x%x %d %r>' % (self.__class__.__name__, abs(id(self)), self.index, outcome)
+
+class RateLimiter(object):
+    """Thread-safe pacer that spaces requests evenly at a global rate.
+    
+    A rate of None doesn't pace requests but still honours
+    ``backoff()`` when the gateway throttles us.
+    
+    """
+    
+    def __init__(self, rate=None, clock=monotonic, sleep=time.sleep):
+        self.rate  = rate
+        self.clock = clock
+        self.sleep = sleep
+        self._next = 0.0
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        """Block until the caller may send its next request."""
+        
+        self._lock.acquire()
+        try:
+            now   = self.clock()
+            start = max(self._next, now)
+            
+            if self.rate:
+                self._next = start + 1.0 / self.rate
+            else:
+                self._next = start
+        finally:
+            self._lock.release()
+        
+        if start > now:
+            self.sleep(start - now)
+    
+    def backoff(self, seconds):
+        """Hold every caller back for the given number of seconds."""
+        
+        self._lock.acquire()
+        try:
+            self._next = max(self._next, self.clock() + seconds)
+        finally:
+            self._lock.release()
+
+def process_many(schemas, concurrency=10, ordered=True, timeout=None, rate=None, window=None, throttle_delay=1.0, adapter='authnet', client=None, deadline=None):
+    """Process an iterable of payment schemas and yield a BatchResult for each.
+    
+    ``concurrency`` worker threads share the adapter's connection pool.
+    Results are yielded in submission order when ``ordered`` is true,
+    otherwise as soon as they complete. ``timeout`` is the per-request
+    socket timeout in seconds, ``deadline`` the time in seconds each
+    request has as a whole, and ``rate`` caps the requests per second
+    across all workers. No more than ``window`` schemas (twice the
+    concurrency by default) are pulled from the iterable and held at
+    once, whether queued, in flight or waiting to be yielded in order.
+    
+    A request the gateway throttles (HTTP 429 or 503) holds every worker
+    back for ``throttle_delay`` seconds. Failed requests are reported
+    through the result's ``error``; they are only retried if the
+    client has a retry policy.
+    
+    The schemas are processed through ``client``, a PaymentClient, or
+    one created for ``adapter`` if none is given.
+    
+    """
+    
+    from paypy.payment import PaymentClient
+    
+    if concurrency < 1:
+        raise PaymentException('concurrency must be at least 1')
+    
+    if client is None:
+        client = PaymentClient(None, adapter)
+    
+    window  = max(window or concurrency * 2, concurrency)
+    limiter = RateLimiter(rate)
+    tasks   = Queue.Queue()
+    done    = Queue.Queue()
+    
+    def worker():
+        while True:
+            task = tasks.get()
+            
+            if task is None:
+                return
+            
+            index, schema = task
+            
+            limiter.wait()
+            
+            try:
+                result = client.process(schema, timeout=timeout, deadline=deadline)
+            except Exception, e:
+                if getattr(e, 'status', None) in THROTTLE_STATUSES:
+                    limiter.backoff(throttle_delay)
+                
+                done.put(BatchResult(index, schema, error=e))
+            else:
+                done.put(BatchResult(index, schema, result=result))
+    
+    workers = [threading.Thread(target=worker) for x in range(concurrency)]
+    
+    for thread in workers:
+        thread.daemon = True
+        thread.start()
+    
+    iterator  = iter(schemas)
+    exhausted = False
+    submitted = 0
+    yielded   = 0
+    completed = {}
+    
+    try:
+        while True:
+            # Keep the window full
+            while not exhausted and submitted - yielded < window:
+                try:
+                    schema = iterator.next()
+                except StopIteration:
+                    exhausted = True
+                    break
+                
+                tasks.put((submitted, schema))
+                submitted += 1
+            
+            if exhausted and yielded == submitted:
+                break
+            
+            outcome = done.get()
+            
+            if not ordered:
+                yielded += 1
+                yield outcome
+                continue
+            
+            completed[outcome.index] = outcome
+            
+            while yielded in completed:
+                outcome  = completed.pop(yielded)
+                yielded += 1
+                yield outcome
+    finally:
+        # Abandoned early? Don't send what's still queued
+        while True:
+            try:
+                tasks.get_nowait()
+            except Queue.Empty:
+                break
+        
+        for thread in workers:
+            tasks.put(None)
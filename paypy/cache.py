@@ -0,0 +1,258 @@
+"""Profile Cache
+
+A read-through cache for customer profile retrievals. Responses are
+kept per (scope, profile id, payment profile id, shipping address id)
+key, the scope being the merchant login and gateway endpoint, for
+``ttl`` seconds in a local LRU of at most ``maxsize`` entries.
+
+A shared backend, e.g. an SQLite file several processes open, keeps
+the entries instead. The local LRU is then skipped by default: another
+process's invalidation can't reach it, so it would keep serving a
+stale copy until the entry expired. Writes through the adapter
+invalidate every entry of the profile they change, locally and in the
+backend, and a retrieval that was in flight meanwhile isn't cached:
+the adapter takes the profile's generation() before sending and set()
+drops a response from before an invalidation.
+
+"""
+
+import collections
+import sqlite3
+import threading
+import time
+
+def key_text(key):
+    """Return a cache key as text, the same for str and unicode, int and long parts."""
+    
+    return u'\x1f'.join([u'' if x is None else unicode(x) for x in key])
+
+class ProfileCache(object):
+    """Thread-safe TTL and LRU bounded cache of raw profile responses.
+    
+    ``local`` keeps entries in the local LRU even with a backend, in
+    front of it; keep the ``ttl`` short then, as other processes'
+    invalidations only reach the backend.
+    
+    """
+    
+    def __init__(self, maxsize=1024, ttl=300.0, backend=None, clock=time.time, local=None):
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self.backend = backend
+        self.clock   = clock
+        self.local   = backend is None if local is None else local
+        
+        self.hits        = 0
+        self.misses      = 0
+        self.evictions   = 0
+        self.expirations = 0
+        
+        self._entries     = collections.OrderedDict()
+        self._profiles    = {}
+        self._generations = {}
+        self._epoch       = 0
+        self._lock        = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached response for a key, or None."""
+        
+        now = self.clock()
+        
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None) if self.local else None
+            
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries[key] = entry
+                    self.hits         += 1
+                    
+                    return entry[1]
+                
+                self._forget(key)
+                self.expirations += 1
+        finally:
+            self._lock.release()
+        
+        entry = self.backend.get(key) if self.backend is not None else None
+        
+        self._lock.acquire()
+        try:
+            if entry is not None and entry[0] > now:
+                if self.local:
+                    self._store(key, entry)
+                
+                self.hits += 1
+                
+                return entry[1]
+            
+            self.misses += 1
+        finally:
+            self._lock.release()
+        
+        return None
+    
+    def generation(self, scope, profile_id):
+        """Return the profile's invalidation generation, which changes whenever its entries are invalidated."""
+        
+        self._lock.acquire()
+        try:
+            return self._epoch, self._generations.get((scope, profile_id), 0)
+        finally:
+            self._lock.release()
+    
+    def set(self, key, data, generation=None):
+        """Cache a response for ``ttl`` seconds, unless the profile was invalidated since ``generation``."""
+        
+        now   = self.clock()
+        entry = (now + self.ttl, data)
+        
+        self._lock.acquire()
+        try:
+            if generation is not None and generation != (self._epoch, self._generations.get(key[:2], 0)):
+                return
+            
+            if self.local:
+                self._store(key, entry)
+            
+            if self.backend is not None:
+                self.backend.set(key, entry[0], data, now)
+        finally:
+            self._lock.release()
+    
+    def invalidate(self, scope, profile_id):
+        """Drop every cached response for a profile."""
+        
+        profile = (scope, profile_id)
+        
+        self._lock.acquire()
+        try:
+            # Bounded: starting a new epoch changes every profile's generation
+            if profile not in self._generations and len(self._generations) >= self.maxsize:
+                self._generations.clear()
+                self._epoch += 1
+            
+            self._generations[profile] = self._generations.get(profile, 0) + 1
+            
+            for key in list(self._profiles.get(profile, ())):
+                self._entries.pop(key, None)
+                self._forget(key)
+        finally:
+            self._lock.release()
+        
+        if self.backend is not None:
+            self.backend.invalidate(scope, profile_id)
+    
+    def clear(self):
+        """Drop every locally cached response."""
+        
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+            self._profiles.clear()
+        finally:
+            self._lock.release()
+    
+    def stats(self):
+        """Return the hit, miss, eviction and expiration counters and the size."""
+        
+        return {'hits'        : self.hits,
+                'misses'      : self.misses,
+                'evictions'   : self.evictions,
+                'expirations' : self.expirations,
+                'size'        : len(self._entries)}
+    
+    def _store(self, key, entry):
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        self._profiles.setdefault(key[:2], set()).add(key)
+        
+        while len(self._entries) > self.maxsize:
+            oldest, entry = self._entries.popitem(last=False)
+            self._forget(oldest)
+            self.evictions += 1
+    
+    def _forget(self, key):
+        keys = self._profiles.get(key[:2])
+        
+        if keys is not None:
+            keys.discard(key)
+            
+            if not keys:
+                del self._profiles[key[:2]]
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def __repr__(self):
+        return '<%s at 0x%x %d/%d hits %d misses %d>' % (self.__class__.__name__, abs(id(self)), len(self._entries), self.maxsize, self.hits, self.misses)
+
+class SQLiteBackend(object):
+    """Share cached profile responses through an SQLite file.
+    
+    Each thread opens its own connection, so one backend can be used
+    by many threads, and any number of processes can open the same
+    file. Rows are keyed by the key's parts as text, see key_text().
+    Every write deletes the expired rows and, beyond ``maxsize`` rows,
+    the ones that expire first, i.e. the oldest.
+    
+    """
+    
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS profiles (scope TEXT, profile_id TEXT, key TEXT PRIMARY KEY, expires REAL, data BLOB)',
+              'CREATE INDEX IF NOT EXISTS profiles_profile ON profiles (scope, profile_id)',
+              'CREATE INDEX IF NOT EXISTS profiles_expires ON profiles (expires)')
+    
+    def __init__(self, path, timeout=5.0, maxsize=1024):
+        self.path    = path
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self._local  = threading.local()
+        
+        connection = self._connection()
+        
+        for statement in self.SCHEMA:
+            connection.execute(statement)
+        
+        connection.commit()
+    
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=self.timeout)
+        
+        return connection
+    
+    def get(self, key):
+        """Return the (expires, data) entry for a key, or None."""
+        
+        row = self._connection().execute('SELECT expires, data FROM profiles WHERE key = ?', (key_text(key),)).fetchone()
+        
+        if row is None:
+            return None
+        
+        return row[0], str(row[1])
+    
+    def set(self, key, expires, data, now=None):
+        """Store an entry, dropping the expired ones and the oldest beyond ``maxsize``."""
+        
+        connection = self._connection()
+        connection.execute('INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?)', (unicode(key[0]), unicode(key[1]), key_text(key), expires, sqlite3.Binary(data)))
+        connection.execute('DELETE FROM profiles WHERE expires <= ?', (time.time() if now is None else now,))
+        connection.execute('DELETE FROM profiles WHERE key IN (SELECT key FROM profiles ORDER BY expires DESC LIMIT -1 OFFSET ?)', (self.maxsize,))
+        connection.commit()
+    
+    def invalidate(self, scope, profile_id):
+        connection = self._connection()
+        connection.execute('DELETE FROM profiles WHERE scope = ? AND profile_id = ?', (unicode(scope), unicode(profile_id)))
+        connection.commit()
+    
+    def purge(self, now=None):
+        """Delete the expired entries."""
+        
+        connection = self._connection()
+        connection.execute('DELETE FROM profiles WHERE expires <= ?', (time.time() if now is None else now,))
+        connection.commit()
+    
+    def __repr__(self):
+        return '<%s at 0x%x %s>' % (self.__class__.__name__, abs(id(self)), self.path)
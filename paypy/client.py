@@ -0,0 +1,64 @@
+"""Gateway Clients
+
+A client resolves its adapter once and binds the merchant credentials
+and the gateway endpoint when it is created, so it can process any
+number of request schemas without repeating that work per request.
+
+A client creates one adapter, which holds only configuration, and
+gives it each call's request schema, so one client's blocking methods
+can be called from any number of threads. Its ``*_async`` methods
+share the reactor the transport sends through and belong to the
+thread running it.
+
+"""
+
+from paypy.registry import adapter_factory, instantiate
+
+class Client(object):
+    """Base client class.
+    
+    ``credentials`` is the gateway's merchant authentication schema and
+    is combined with each request schema by the adapter. ``testing``
+    pins every request to the test (True) or production (False)
+    endpoint and ``endpoint`` overrides it outright; by default each
+    request's own testing flag picks the endpoint. Requests are sent
+    under ``retry``, a retry policy, if one is given, through
+    ``transport`` rather than the adapter's default one, timed by
+    ``instrument``, a paypy.instrument.Instrument, and counted by
+    ``metrics``, a paypy.metrics.Recorder.
+    
+    """
+    
+    api       = None
+    exception = None
+    
+    def __init__(self, credentials, adapter='authnet', testing=None, endpoint=None, retry=None, transport=None, instrument=None, metrics=None):
+        self.factory     = adapter_factory(self.api, adapter, self.exception)
+        self.credentials = credentials
+        self.endpoint    = endpoint
+        self.retry       = retry
+        self.transport   = transport
+        self.instrument  = instrument
+        self.metrics     = metrics
+        
+        if endpoint is None and testing is not None:
+            self.endpoint = self.factory.endpoint_for(testing)
+        
+        self.adapter = instantiate(self.factory, None, **self.configuration())
+    
+    def configuration(self):
+        """Return the configuration the adapter is created with."""
+        
+        return {'endpoint'   : self.endpoint,
+                'retry'      : self.retry,
+                'transport'  : self.transport,
+                'instrument' : self.instrument,
+                'metrics'    : self.metrics}
+    
+    def schema(self, request):
+        """Return the options schema the adapter is given for a request schema, or a complete options schema."""
+        
+        return self.factory.schema(self.credentials, request)
+    
+    def __repr__(self):
+        return '<%s at 0x%x %s>' % (self.__class__.__name__, abs(id(self)), self.factory.__name__)
@@ -17,3 +17,27 @@ class CIMException(AuthnetException):
     """Authorize.net CIM base exception class."""
     
     pass
+
+class ConnectionException(AuthnetException):
+    """Authorize.net gateway connection exception class."""
+    
+    pass
+
+class GatewayStatusException(ConnectionException):
+    """The gateway answered with a non-200 HTTP status."""
+    
+    def __init__(self, message, status):
+        super(GatewayStatusException, self).__init__(message)
+        self.status = status
+
+class CircuitOpenException(ConnectionException):
+    """A request was refused without being sent because the gateway host keeps failing."""
+    
+    pass
+
+class TimeoutException(ConnectionException):
+    """A request ran out of time; ``phase`` says whether connecting, sending, reading or a retry backoff did."""
+    
+    def __init__(self, message, phase):
+        super(TimeoutException, self).__init__(message)
+        self.phase = phase
@@ -0,0 +1,10 @@
+class SchemaException(Exception):
+    """A schema record failed validation.
+    
+    ``errors`` lists each invalid field as a (dotted path, ValidationError) pair.
+    
+    """
+    
+    def __init__(self, errors):
+        super(SchemaException, self).__init__('; '.join(['%s: %s' % (path, error.doc()) for path, error in errors]))
+        self.errors = errors
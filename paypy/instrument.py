@@ -0,0 +1,178 @@
+"""Request Instrumentation
+
+Time the phases of the adapters' requests and hand the timings, with
+the payload sizes, to sinks. An adapter given an Instrument records:
+
+    validate   checking the schema fits the operation
+    serialize  serializing the request, with its size in bytes
+    connect    opening a new connection, DNS, TCP and TLS included
+    gateway    sending the request and reading the response, with the
+               response size; one per attempt under a retry policy. For
+               a streamed response, up to the first chunk
+    parse      parsing the response
+
+each labelled with the operation, e.g. ``aim.auth_capture`` or
+``cim.retrieve``. A sink is any callable taking (operation, phase,
+seconds, size); size is None where it doesn't apply. An adapter
+without an instrument skips all of this.
+
+"""
+
+import sys
+import threading
+import time
+
+# The phases of a request
+VALIDATE  = 'validate'
+SERIALIZE = 'serialize'
+CONNECT   = 'connect'
+GATEWAY   = 'gateway'
+PARSE     = 'parse'
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _monotonic():
+    """Return a monotonic clock, CLOCK_MONOTONIC on Linux and time.time elsewhere."""
+    
+    if not sys.platform.startswith('linux'):
+        return time.time
+    
+    try:
+        import ctypes
+        import ctypes.util
+        
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+        
+        clock_gettime = ctypes.CDLL(ctypes.util.find_library('rt') or 'libc.so.6').clock_gettime
+    except (ImportError, OSError, AttributeError):
+        return time.time
+    
+    # CLOCK_MONOTONIC
+    def monotonic():
+        spec = timespec()
+        clock_gettime(1, ctypes.byref(spec))
+        
+        return spec.tv_sec + spec.tv_nsec * 1e-9
+    
+    return monotonic
+
+monotonic = _monotonic()
+
+class Instrument(object):
+    """Hand phase timings to sinks, callables taking (operation, phase, seconds, size)."""
+    
+    def __init__(self, sinks=(), clock=monotonic):
+        self.sinks = list(sinks)
+        self.clock = clock
+    
+    def record(self, operation, phase, seconds, size=None):
+        for sink in self.sinks:
+            sink(operation, phase, seconds, size)
+    
+    def __repr__(self):
+        return '<%s at 0x%x %d sinks>' % (self.__class__.__name__, abs(id(self)), len(self.sinks))
+
+class Histogram(object):
+    """Count values into cumulative buckets, Prometheus style."""
+    
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+    
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts  = [0] * (len(buckets) + 1)
+        self.count   = 0
+        self.sum     = 0.0
+    
+    def record(self, value):
+        index = 0
+        
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        
+        self.counts[index] += 1
+        self.count         += 1
+        self.sum           += value
+    
+    def cumulative(self):
+        """Yield the (upper bound, count of values up to it) pairs, ending with +Inf."""
+        
+        total = 0
+        
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+    
+    def __repr__(self):
+        return '<%s at 0x%x %d values>' % (self.__class__.__name__, abs(id(self)), self.count)
+
+class HistogramRegistry(object):
+    """A sink keeping a latency Histogram and a byte count per operation and phase."""
+    
+    def __init__(self, buckets=BUCKETS):
+        self.buckets    = buckets
+        self.histograms = {}
+        self.sizes      = {}
+        
+        self._lock = threading.Lock()
+    
+    def __call__(self, operation, phase, seconds, size=None):
+        key = (operation, phase)
+        
+        self._lock.acquire()
+        try:
+            histogram = self.histograms.get(key)
+            
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            
+            histogram.record(seconds)
+            
+            if size is not None:
+                self.sizes[key] = self.sizes.get(key, 0) + size
+        finally:
+            self._lock.release()
+    
+    def histogram(self, operation, phase):
+        """Return the Histogram of a phase of an operation, or None."""
+        
+        return self.histograms.get((operation, phase))
+    
+    def __repr__(self):
+        return '<%s at 0x%x %d histograms>' % (self.__class__.__name__, abs(id(self)), len(self.histograms))
+
+def _value(value):
+    return '+Inf' if value == float('inf') else repr(value)
+
+def prometheus_text(registry, prefix='paypy'):
+    """Return a HistogramRegistry in the Prometheus text exposition format."""
+    
+    lines = ['# HELP %s_phase_seconds Time spent in each phase of a gateway request.' % prefix,
+             '# TYPE %s_phase_seconds histogram' % prefix]
+    
+    registry._lock.acquire()
+    try:
+        histograms = sorted(registry.histograms.items())
+        sizes      = sorted(registry.sizes.items())
+    finally:
+        registry._lock.release()
+    
+    for (operation, phase), histogram in histograms:
+        labels = 'operation="%s",phase="%s"' % (operation, phase)
+        
+        for bound, count in histogram.cumulative():
+            lines.append('%s_phase_seconds_bucket{%s,le="%s"} %d' % (prefix, labels, _value(bound), count))
+        
+        lines.append('%s_phase_seconds_sum{%s} %r' % (prefix, labels, histogram.sum))
+        lines.append('%s_phase_seconds_count{%s} %d' % (prefix, labels, histogram.count))
+    
+    lines.append('# HELP %s_phase_bytes_total Bytes serialized or received in each phase of a gateway request.' % prefix)
+    lines.append('# TYPE %s_phase_bytes_total counter' % prefix)
+    
+    for (operation, phase), size in sizes:
+        lines.append('%s_phase_bytes_total{operation="%s",phase="%s"} %d' % (prefix, operation, phase, size))
+    
+    return '\n'.join(lines) + '\n'
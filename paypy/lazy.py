@@ -0,0 +1,50 @@
+"""Lazy Imports
+
+Packages that re-export names from their submodules can defer importing
+those submodules until one of the names is first used. Python 2 modules
+have no ``__getattr__`` hook, so the package module is replaced in
+``sys.modules`` with a LazyModule that resolves the names on demand.
+
+"""
+
+import sys
+import types
+
+class LazyModule(types.ModuleType):
+    """Module proxy importing re-exported names on first access."""
+    
+    def __init__(self, module, attributes):
+        types.ModuleType.__init__(self, module.__name__, module.__doc__)
+        
+        self.__dict__.update(module.__dict__)
+        self.__dict__['__all__'] = sorted(attributes)
+        self.__dict__['_lazy']   = attributes
+        
+        # Keep the original module alive, discarding it clears its globals
+        self.__dict__['_module'] = module
+    
+    def __getattr__(self, name):
+        try:
+            submodule = self._lazy[name]
+        except KeyError:
+            raise AttributeError("'module' object has no attribute '%s'" % name)
+        
+        module = __import__('%s.%s' % (self.__name__, submodule), fromlist=[name])
+        value  = getattr(module, name)
+        
+        setattr(self, name, value)
+        
+        return value
+
+def lazy(name, attributes):
+    """Make a package import the names it re-exports only when they're first used.
+    
+    ``attributes`` maps each name to the submodule defining it. Call it
+    at the end of the package's ``__init__``.
+    
+    """
+    
+    module = sys.modules[name]
+    
+    if not isinstance(module, LazyModule):
+        sys.modules[name] = LazyModule(module, attributes)
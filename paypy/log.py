@@ -0,0 +1,122 @@
+"""Logging
+
+paypy logs through the standard logging module under the ``paypy``
+logger, which has a NullHandler so nothing is written until the
+application configures logging. The adapters log each request and
+response at DEBUG under ``paypy.adapters``; the payload is only
+redacted and the record only built when DEBUG is enabled, so disabled
+logging costs a level check.
+
+Records carry their fields in ``record.fields``, e.g. the operation,
+the gateway host and the redacted payload, which StructuredFormatter
+writes as ``key=value`` pairs. QueueHandler hands records to another
+handler on a background thread so a slow log file or socket never
+holds up a request.
+
+"""
+
+import logging
+import Queue
+import re
+import threading
+
+# Name-value (AIM) and XML (ARB, CIM) fields holding card, bank account or merchant secrets
+NVP_FIELDS = ('x_card_num', 'x_card_code', 'x_tran_key', 'x_bank_acct_num', 'x_bank_aba_code')
+XML_FIELDS = ('cardNumber', 'cardCode', 'transactionKey', 'accountNumber', 'routingNumber')
+
+# Fields whose last four digits are kept, so a card or account can still be told apart
+PARTIAL = ('x_card_num', 'x_bank_acct_num', 'cardNumber', 'accountNumber')
+
+# Both kinds of field in one pattern, so a payload is redacted in a single pass
+SECRETS = re.compile(r'(<(?:\w+:)?(%s)>)([^<]*)|((?:^|(?<=&))(%s)=)([^&]*)' % ('|'.join(XML_FIELDS), '|'.join(NVP_FIELDS)))
+
+def _mask(match):
+    if match.group(1) is not None:
+        prefix, name, value = match.group(1, 2, 3)
+    else:
+        prefix, name, value = match.group(4, 5, 6)
+    
+    if name in PARTIAL and len(value) > 4:
+        return prefix + 'X' * (len(value) - 4) + value[-4:]
+    
+    return prefix + 'X' * len(value)
+
+def redact(payload):
+    """Return a name-value or XML payload with its card, bank account and key fields masked."""
+    
+    return SECRETS.sub(_mask, payload)
+
+class StructuredFormatter(logging.Formatter):
+    """Format records as ``key=value`` pairs: time, level, logger, message and the record's fields."""
+    
+    def format(self, record):
+        pairs = [('time', self.formatTime(record)), ('level', record.levelname), ('logger', record.name), ('message', record.getMessage())]
+        
+        pairs.extend(sorted(getattr(record, 'fields', {}).items()))
+        
+        line = ' '.join(['%s=%s' % (key, self._value(value)) for key, value in pairs])
+        
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        
+        return line
+    
+    def _value(self, value):
+        value = value if isinstance(value, basestring) else str(value)
+        
+        if value and not re.search(r'[\s"=]', value):
+            return value
+        
+        return '"%s"' % value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class QueueHandler(logging.Handler):
+    """Hand records to ``handler`` on a background thread.
+    
+    emit() never blocks: once ``size`` records are waiting, further
+    records are dropped and counted in ``dropped``. close() writes the
+    records still queued and stops the thread.
+    
+    """
+    
+    def __init__(self, handler, size=10000):
+        logging.Handler.__init__(self)
+        
+        self.handler = handler
+        self.dropped = 0
+        
+        self._queue  = Queue.Queue(size)
+        self._thread = threading.Thread(target=self._run, name='paypy-log')
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def emit(self, record):
+        # Format the message now, its arguments may change once the caller goes on
+        record.msg  = record.getMessage()
+        record.args = None
+        
+        try:
+            self._queue.put_nowait(record)
+        except Queue.Full:
+            self.dropped += 1
+    
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        
+        self.handler.close()
+        logging.Handler.close(self)
+    
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            
+            if record is None:
+                break
+            
+            self.handler.handle(record)
+    
+    def __repr__(self):
+        return '<%s at 0x%x %r>' % (self.__class__.__name__, abs(id(self)), self.handler)
+
+logging.getLogger('paypy').addHandler(logging.NullHandler())
@@ -0,0 +1,329 @@
+"""Gateway Metrics
+
+Count the requests adapters send and how long they take, labelled by
+operation (e.g. ``aim.auth_capture`` or ``cim.retrieve``), gateway
+host and result code: the AIM transaction status, the ARB or CIM
+result code, or the exception's class name if the request failed. A
+retry policy given the same recorder counts its retries, circuit
+breaker transitions and the requests its open breakers rejected.
+
+Two recorders are provided:
+
+    Metrics  keeps the counts and latency histograms in-process,
+             prometheus_text exports them
+    Statsd   sends them to a statsd server, batched into UDP packets
+
+Either is given to an adapter, facade, client or RetryPolicy as
+``metrics``. Recording is best-effort: the adapters and retry policies
+record through record(), which logs and swallows a recorder's errors,
+so a metrics backend failing never fails a request the gateway
+answered.
+
+"""
+
+import collections
+import logging
+import socket
+import thread
+import threading
+
+from paypy.instrument import Histogram, BUCKETS, monotonic
+
+log = logging.getLogger(__name__)
+
+def record(call, *args):
+    """Call a recorder method, logging and swallowing any error it raises."""
+    
+    try:
+        call(*args)
+    except Exception:
+        log.warning('recording gateway metrics failed', exc_info=True)
+
+class Recorder(object):
+    """The interface adapters and retry policies record their traffic through."""
+    
+    clock = staticmethod(monotonic)
+    
+    def request(self, operation, host, code, seconds):
+        """Record a request to a host and the code it completed with."""
+        
+        raise NotImplementedError
+    
+    def retry(self, host):
+        """Record a request to a host being retried."""
+        
+        raise NotImplementedError
+    
+    def transition(self, host, state):
+        """Record a host's circuit breaker changing state."""
+        
+        raise NotImplementedError
+    
+    def rejection(self, host):
+        """Record a request an open circuit breaker didn't let through."""
+        
+        raise NotImplementedError
+
+class _Shard(object):
+    """The counters and histograms one thread records into."""
+    
+    __slots__ = ('counters', 'histograms')
+    
+    def __init__(self):
+        self.counters   = {}
+        self.histograms = {}
+
+class Metrics(Recorder):
+    """Keep request counts and latency histograms in-process.
+    
+    Every thread records into its own shard, so recording takes no
+    lock; reading the metrics sums the shards. A shard outlives its
+    thread and is reused by the next thread given the same id, so no
+    counts are lost and the shards are bounded by the threads alive
+    at once.
+    
+    """
+    
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        
+        self._shards = {}
+        self._lock   = threading.Lock()
+    
+    def request(self, operation, host, code, seconds):
+        shard = self._shard()
+        key   = ('requests', operation, host, code)
+        
+        shard.counters[key] = shard.counters.get(key, 0) + 1
+        
+        histogram = shard.histograms.get(key)
+        
+        if histogram is None:
+            histogram = shard.histograms[key] = Histogram(self.buckets)
+        
+        histogram.record(seconds)
+    
+    def retry(self, host):
+        self._count(('retries', host))
+    
+    def transition(self, host, state):
+        self._count(('transitions', host, state))
+    
+    def rejection(self, host):
+        self._count(('rejections', host))
+    
+    def counters(self):
+        """Return the counts summed over every thread, keyed by (kind, labels...)."""
+        
+        totals = {}
+        
+        for shard in self._snapshot():
+            for key, count in shard.counters.items():
+                totals[key] = totals.get(key, 0) + count
+        
+        return totals
+    
+    def histograms(self):
+        """Return the request latency histograms merged over every thread, keyed like the counters."""
+        
+        merged = {}
+        
+        for shard in self._snapshot():
+            for key, histogram in shard.histograms.items():
+                total = merged.get(key)
+                
+                if total is None:
+                    total = merged[key] = Histogram(self.buckets)
+                
+                total.counts = [x + y for x, y in zip(total.counts, histogram.counts)]
+                total.count += histogram.count
+                total.sum   += histogram.sum
+        
+        return merged
+    
+    def _count(self, key):
+        counters = self._shard().counters
+        
+        counters[key] = counters.get(key, 0) + 1
+    
+    def _shard(self):
+        """Return the calling thread's shard, creating it on the thread's first record."""
+        
+        ident = thread.get_ident()
+        shard = self._shards.get(ident)
+        
+        if shard is None:
+            self._lock.acquire()
+            try:
+                shard = self._shards[ident] = _Shard()
+            finally:
+                self._lock.release()
+        
+        return shard
+    
+    def _snapshot(self):
+        self._lock.acquire()
+        try:
+            return self._shards.values()
+        finally:
+            self._lock.release()
+    
+    def __repr__(self):
+        return '<%s at 0x%x %d shards>' % (self.__class__.__name__, abs(id(self)), len(self._shards))
+
+def _labels(**labels):
+    return ','.join(['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in sorted(labels.items())])
+
+def _value(value):
+    return '+Inf' if value == float('inf') else repr(value)
+
+def prometheus_text(metrics, prefix='paypy'):
+    """Return a Metrics registry in the Prometheus text exposition format."""
+    
+    counters = sorted(metrics.counters().items())
+    lines    = []
+    
+    lines.append('# HELP %s_requests_total Gateway requests by operation, host and result code.' % prefix)
+    lines.append('# TYPE %s_requests_total counter' % prefix)
+    
+    for (kind, operation, host, code), count in [x for x in counters if x[0][0] == 'requests']:
+        lines.append('%s_requests_total{%s} %d' % (prefix, _labels(operation=operation, endpoint=host, code=code), count))
+    
+    lines.append('# HELP %s_request_seconds Gateway request latency by operation, host and result code.' % prefix)
+    lines.append('# TYPE %s_request_seconds histogram' % prefix)
+    
+    for (kind, operation, host, code), histogram in sorted(metrics.histograms().items()):
+        labels = _labels(operation=operation, endpoint=host, code=code)
+        
+        for bound, count in histogram.cumulative():
+            lines.append('%s_request_seconds_bucket{%s,le="%s"} %d' % (prefix, labels, _value(bound), count))
+        
+        lines.append('%s_request_seconds_sum{%s} %r' % (prefix, labels, histogram.sum))
+        lines.append('%s_request_seconds_count{%s} %d' % (prefix, labels, histogram.count))
+    
+    lines.append('# HELP %s_retries_total Gateway requests retried by host.' % prefix)
+    lines.append('# TYPE %s_retries_total counter' % prefix)
+    
+    for (kind, host), count in [x for x in counters if x[0][0] == 'retries']:
+        lines.append('%s_retries_total{%s} %d' % (prefix, _labels(endpoint=host), count))
+    
+    lines.append('# HELP %s_breaker_transitions_total Circuit breaker state changes by host and new state.' % prefix)
+    lines.append('# TYPE %s_breaker_transitions_total counter' % prefix)
+    
+    for (kind, host, state), count in [x for x in counters if x[0][0] == 'transitions']:
+        lines.append('%s_breaker_transitions_total{%s} %d' % (prefix, _labels(endpoint=host, state=state), count))
+    
+    lines.append('# HELP %s_breaker_rejections_total Requests rejected by an open circuit breaker by host.' % prefix)
+    lines.append('# TYPE %s_breaker_rejections_total counter' % prefix)
+    
+    for (kind, host), count in [x for x in counters if x[0][0] == 'rejections']:
+        lines.append('%s_breaker_rejections_total{%s} %d' % (prefix, _labels(endpoint=host), count))
+    
+    return '\n'.join(lines) + '\n'
+
+class Statsd(Recorder):
+    """Send the metrics to a statsd server over UDP.
+    
+    Lines are queued and sent by a background thread, packed into
+    packets of at most ``packet_size`` bytes (the default fits an
+    Ethernet MTU), once ``batch`` of them are waiting or every
+    ``interval`` seconds, whichever comes first; flush() sends the
+    queue from the calling thread. Sending is best-effort: packets
+    that can't be sent are counted in ``errors`` and dropped, and
+    beyond ``queue_size`` waiting lines the oldest are dropped. Labels
+    are folded into the metric names, dots in them replaced, e.g.
+    ``paypy.requests.aim_auth_capture.secure_authorize_net.approved``.
+    
+    """
+    
+    def __init__(self, address=('127.0.0.1', 8125), prefix='paypy', batch=50, packet_size=1432, queue_size=10000, interval=1.0):
+        self.address     = address
+        self.prefix      = prefix
+        self.batch       = batch
+        self.packet_size = packet_size
+        self.interval    = interval
+        self.errors      = 0
+        
+        self._socket  = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._pending = collections.deque(maxlen=queue_size)
+        self._closed  = False
+        self._wake    = threading.Event()
+        self._thread  = threading.Thread(target=self._run, name='paypy-statsd')
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def request(self, operation, host, code, seconds):
+        name = self._name('requests', operation, host, code)
+        
+        self._send('%s:1|c' % name, '%s:%.3f|ms' % (name, seconds * 1000.0))
+    
+    def retry(self, host):
+        self._send('%s:1|c' % self._name('retries', host))
+    
+    def transition(self, host, state):
+        self._send('%s:1|c' % self._name('breaker', host, state))
+    
+    def rejection(self, host):
+        self._send('%s:1|c' % self._name('rejections', host))
+    
+    def flush(self):
+        """Send every queued line."""
+        
+        packet = []
+        size   = 0
+        
+        while True:
+            try:
+                line = self._pending.popleft()
+            except IndexError:
+                break
+            
+            if packet and size + len(line) + 1 > self.packet_size:
+                self._sendto(packet)
+                
+                packet = []
+                size   = 0
+            
+            packet.append(line)
+            size += len(line) + 1
+        
+        if packet:
+            self._sendto(packet)
+    
+    def close(self):
+        """Stop the background thread, send what is still queued and close the socket."""
+        
+        if self._thread.is_alive():
+            self._closed = True
+            self._wake.set()
+            self._thread.join()
+        
+        self.flush()
+        self._socket.close()
+    
+    def _name(self, *parts):
+        return '.'.join([self.prefix] + [str(x).replace('.', '_').replace(':', '_').replace('|', '_') for x in parts])
+    
+    def _send(self, *lines):
+        self._pending.extend(lines)
+        
+        if len(self._pending) >= self.batch:
+            self._wake.set()
+    
+    def _sendto(self, packet):
+        try:
+            self._socket.sendto('\n'.join(packet), self.address)
+        except socket.error, e:
+            self.errors += 1
+            log.debug('sending %d lines to statsd at %s:%d failed: %s', len(packet), self.address[0], self.address[1], e)
+    
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            
+            if not self._closed:
+                self.flush()
+    
+    def __repr__(self):
+        return '<%s at 0x%x %s:%d>' % (self.__class__.__name__, abs(id(self)), self.address[0], self.address[1])
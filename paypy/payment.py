@@ -6,31 +6,62 @@ gateway API's.
 """
 
 from paypy.exceptions.payment import PaymentException
-
-ADAPTERS = ('authnet', 'google', 'paypal')
+from paypy.batch              import process_many
+from paypy.client             import Client
+from paypy.registry           import adapter_factory, instantiate
 
 class Payment(object):
     """Instantiate with a given configuration and make a payment."""
     
-    def __init__(self, configuration, adapter='authnet'):
+    def __init__(self, configuration, adapter='authnet', endpoint=None, retry=None, transport=None, instrument=None, metrics=None):
+        
+        # Instantiate the driver with options, sending the requests
+        # somewhere else (e.g. a simulator) if an endpoint is given
+        factory      = adapter_factory('payment', adapter, PaymentException)
+        self.adapter = instantiate(factory, configuration, endpoint=endpoint, retry=retry, transport=transport, instrument=instrument, metrics=metrics)
+    
+    def process(self, timeout=None, deadline=None):
+        """Process a payment with the configured driver and options.
+        
+        ``deadline``, in seconds or a paypy.adapters.authnet.connection.Deadline,
+        bounds the whole call, connecting, reading and retries included.
         
-        # A adapter must be specified
-        if not adapter:
-            raise PaymentException('You must specify a gateway adapter')
+        """
         
-        adapter = adapter.lower()
+        return self.adapter.process(timeout=timeout, deadline=deadline)
+    
+    def process_async(self, deadline=None):
+        """Process a payment without blocking, return an AsyncResult."""
+        
+        return self.adapter.process_async(deadline=deadline)
+    
+    @staticmethod
+    def process_many(schemas, concurrency=10, ordered=True, timeout=None, rate=None, window=None, throttle_delay=1.0, adapter='authnet', deadline=None):
+        """Process many payments concurrently, yielding a BatchResult per schema.
         
-        # Is the driver allowed?
-        if adapter not in ADAPTERS:
-            raise PaymentException('The configured adapter is not supported')
+        See paypy.batch.process_many for the details.
         
-        # Lazy load
-        adapter_module = __import__('paypy.adapters.%s' % adapter, fromlist=['paypy.adapters'])
+        """
+        
+        return process_many(schemas, concurrency=concurrency, ordered=ordered, timeout=timeout, rate=rate, window=window, throttle_delay=throttle_delay, adapter=adapter, deadline=deadline)
+
+class PaymentClient(Client):
+    """Process many payments through one gateway with the credentials bound once."""
+    
+    api       = 'payment'
+    exception = PaymentException
+    
+    def process(self, request, timeout=None, deadline=None):
+        """Process a payment for a transaction schema."""
+        
+        return self.adapter.process(self.schema(request), timeout, deadline=deadline)
+    
+    def process_async(self, request, deadline=None):
+        """Process a payment without blocking, return an AsyncResult."""
         
-        # Instantiate the driver with options
-        self.adapter   = adapter_module.Transaction(configuration)
+        return self.adapter.process_async(self.schema(request), deadline=deadline)
     
-    def process(self):
-        """Process a payment with the configured driver and options."""
+    def process_many(self, requests, concurrency=10, ordered=True, timeout=None, rate=None, window=None, throttle_delay=1.0, deadline=None):
+        """Process many payments concurrently, yielding a BatchResult per schema."""
         
-        return self.adapter.process()
+        return process_many(requests, concurrency=concurrency, ordered=ordered, timeout=timeout, rate=rate, window=window, throttle_delay=throttle_delay, client=self, deadline=deadline)
@@ -6,46 +6,116 @@ multiple different API services.
 """
 
 from paypy.exceptions.profile import ProfileException
-
-ADAPTERS = ('authnet')
+from paypy.client             import Client
+from paypy.registry           import adapter_factory, instantiate
 
 class Profile(object):
     """Instantiate with a given configuration and provide profile management methods."""
     
-    def __init__(self, configuration, adapter='authnet'):
+    def __init__(self, configuration, adapter='authnet', endpoint=None, cache=None, retry=None, transport=None, instrument=None, metrics=None):
+        
+        # Instantiate the driver with options, sending the requests
+        # somewhere else (e.g. a simulator) if an endpoint is given and
+        # reading retrievals through a paypy.cache.ProfileCache
+        factory      = adapter_factory('profile', adapter, ProfileException)
+        self.adapter = instantiate(factory, configuration, endpoint=endpoint, retry=retry, transport=transport, instrument=instrument, cache=cache, metrics=metrics)
+    
+    def create(self, deadline=None):
+        """Process a create request."""
+        
+        return self.adapter.create(deadline=deadline)
+    
+    def update(self, deadline=None):
+        """Process an update request."""
+        
+        return self.adapter.update(deadline=deadline)
+    
+    def retrieve(self, stream=False, deadline=None):
+        """Process a retrieval request, optionally streaming the results."""
         
-        # A adapter must be specified
-        if not adapter:
-            raise ProfileException('You must specify a gateway adapter')
+        return self.adapter.retrieve(stream=stream, deadline=deadline)
+    
+    def remove(self, deadline=None):
+        """Process a removal request."""
         
-        adapter = adapter.lower()
+        return self.adapter.remove(deadline=deadline)
+    
+    def create_async(self, deadline=None):
+        """Process a create request without blocking, return an AsyncResult."""
         
-        # Is the driver allowed?
-        if adapter not in ADAPTERS:
-            raise ProfileException('The configured adapter is not supported')
+        return self.adapter.create_async(deadline=deadline)
+    
+    def update_async(self, deadline=None):
+        """Process an update request without blocking, return an AsyncResult."""
         
-        # Lazy load
-        adapter_module = __import__('paypy.adapters.%s' % adapter, fromlist=['paypy.adapters'])
+        return self.adapter.update_async(deadline=deadline)
+    
+    def retrieve_async(self, deadline=None):
+        """Process a retrieval request without blocking, return an AsyncResult."""
         
-        # Instantiate the driver with options
-        self.adapter   = adapter_module.CustomerProfile(configuration)
+        return self.adapter.retrieve_async(deadline=deadline)
     
-    def create(self):
+    def remove_async(self, deadline=None):
+        """Process a removal request without blocking, return an AsyncResult."""
+        
+        return self.adapter.remove_async(deadline=deadline)
+
+class ProfileClient(Client):
+    """Manage many customer profiles through one gateway with the credentials bound once.
+    
+    Retrievals are read through ``cache``, a paypy.cache.ProfileCache,
+    if one is given; writes through the client invalidate it.
+    
+    """
+    
+    api       = 'profile'
+    exception = ProfileException
+    
+    def __init__(self, credentials, adapter='authnet', testing=None, endpoint=None, cache=None, retry=None, transport=None, instrument=None, metrics=None):
+        self.cache = cache
+        super(ProfileClient, self).__init__(credentials, adapter, testing, endpoint, retry, transport, instrument, metrics)
+    
+    def configuration(self):
+        """Return the configuration the adapter is created with, the cache included."""
+        
+        return dict(super(ProfileClient, self).configuration(), cache=self.cache)
+    
+    def create(self, request, deadline=None):
         """Process a create request."""
         
-        return self.adapter.create()
+        return self.adapter.create(self.schema(request), deadline=deadline)
     
-    def update(self):
+    def update(self, request, deadline=None):
         """Process an update request."""
         
-        return self.adapter.update()
+        return self.adapter.update(self.schema(request), deadline=deadline)
     
-    def retrieve(self):
-        """Process a retrieval request."""
+    def retrieve(self, request, stream=False, deadline=None):
+        """Process a retrieval request, optionally streaming the results."""
         
-        return self.adapter.retrieve()
+        return self.adapter.retrieve(self.schema(request), stream, deadline=deadline)
     
-    def remove(self):
+    def remove(self, request, deadline=None):
         """Process a removal request."""
         
-        return self.adapter.remove()
+        return self.adapter.remove(self.schema(request), deadline=deadline)
+    
+    def create_async(self, request, deadline=None):
+        """Process a create request without blocking, return an AsyncResult."""
+        
+        return self.adapter.create_async(self.schema(request), deadline=deadline)
+    
+    def update_async(self, request, deadline=None):
+        """Process an update request without blocking, return an AsyncResult."""
+        
+        return self.adapter.update_async(self.schema(request), deadline=deadline)
+    
+    def retrieve_async(self, request, deadline=None):
+        """Process a retrieval request without blocking, return an AsyncResult."""
+        
+        return self.adapter.retrieve_async(self.schema(request), deadline=deadline)
+    
+    def remove_async(self, request, deadline=None):
+        """Process a removal request without blocking, return an AsyncResult."""
+        
+        return self.adapter.remove_async(self.schema(request), deadline=deadline)
@@ -0,0 +1,96 @@
+"""Adapter Registry
+
+Map an API (payment, profile or subscription) and a gateway name to the
+adapter class implementing it. A gateway's adapter module is imported
+the first time it is resolved and the class is cached from then on.
+
+"""
+
+import threading
+
+# Built-in adapters: (api, gateway) -> (module, class name)
+ADAPTERS = {('payment',      'authnet') : ('paypy.adapters.authnet.aim',     'Transaction'),
+            ('payment',      'google')  : ('paypy.adapters.google.checkout', 'Transaction'),
+            ('profile',      'authnet') : ('paypy.adapters.authnet.cim',     'CustomerProfile'),
+            ('subscription', 'authnet') : ('paypy.adapters.authnet.arb',     'RecurringTransaction')}
+
+class AdapterRegistry(object):
+    """Thread-safe registry of adapter factories."""
+    
+    def __init__(self, adapters=None):
+        self._factories = dict(adapters or {})
+        self._resolved  = {}
+        self._lock      = threading.Lock()
+    
+    def register(self, api, gateway, factory):
+        """Register an adapter class, or a (module, class name) pair to import lazily."""
+        
+        key = (api, gateway.lower())
+        
+        self._lock.acquire()
+        try:
+            self._factories[key] = factory
+            self._resolved.pop(key, None)
+        finally:
+            self._lock.release()
+    
+    def resolve(self, api, gateway):
+        """Return the adapter class for the API and gateway, raise KeyError if there is none."""
+        
+        key = (api, gateway.lower())
+        
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+        
+        self._lock.acquire()
+        try:
+            factory = self._factories[key]
+        finally:
+            self._lock.release()
+        
+        # Lazy load
+        if isinstance(factory, tuple):
+            module, name = factory
+            factory      = getattr(__import__(module, fromlist=[name]), name)
+        
+        self._resolved[key] = factory
+        
+        return factory
+    
+    def gateways(self, api):
+        """Return the names of the gateways registered for an API."""
+        
+        return sorted([gateway for kind, gateway in self._factories if kind == api])
+
+# The registry the facades and clients resolve adapters from
+registry = AdapterRegistry(ADAPTERS)
+
+def register(api, gateway, factory):
+    """Register an adapter with the shared registry."""
+    
+    registry.register(api, gateway, factory)
+
+def instantiate(factory, options, **config):
+    """Create an adapter with its configuration and the options schema its calls default to, if any.
+    
+    Only the configuration actually given (an endpoint, a retry policy,
+    a cache) is passed on, so registered adapters that take none still
+    work.
+    
+    """
+    
+    return factory(options, **dict([(k, v) for k, v in config.items() if v is not None]))
+
+def adapter_factory(api, gateway, exception):
+    """Resolve an adapter class, raising the given facade exception if the gateway isn't supported."""
+    
+    # A adapter must be specified
+    if not gateway:
+        raise exception('You must specify a gateway adapter')
+    
+    try:
+        return registry.resolve(api, gateway)
+    except KeyError:
+        raise exception('The configured adapter is not supported')
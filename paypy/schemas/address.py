@@ -4,8 +4,11 @@ from zope.interface            import Interface, implements
 from zope.schema               import TextLine
 from zope.schema.fieldproperty import FieldProperty
 
+from paypy.schemas.base        import Schema, compact
+
 ALPHA = re.compile(r'^[\w\_\-\.,\(\)\[\]\s]+$', re.IGNORECASE | re.UNICODE)
 ADDR  = re.compile(r'^[\w\_\-\#\.\/,\;\:\'\"\s]+$', re.IGNORECASE | re.UNICODE)
+PHONE = re.compile(r'^[0-9()-.,\s]+$')
 
 class IAddress(Interface):
     """Defines an interface for address types."""
@@ -18,10 +21,10 @@ class IAddress(Interface):
     state       = TextLine(title=u'State',        description=u'State of residence',   required=False, constraint=ALPHA.match, max_length=800)
     country     = TextLine(title=u'Country',      description=u'Country of residence', required=False, constraint=ALPHA.match, max_length=1000)
     postal_code = TextLine(title=u'Postal Code',  description=u'Postal code',          required=False, constraint=ALPHA.match, max_length=100)
-    phone       = TextLine(title=u'Phone Number', description=u'Phone number',         required=False, constraint=re.compile(r'^[0-9()-.,\s]+$').match, max_length=25)
-    fax         = TextLine(title=u'Fax Number',   description=u'Fax number',           required=False, constraint=re.compile(r'^[0-9()-.,\s]+$').match, max_length=25)
+    phone       = TextLine(title=u'Phone Number', description=u'Phone number',         required=False, constraint=PHONE.match, max_length=25)
+    fax         = TextLine(title=u'Fax Number',   description=u'Fax number',           required=False, constraint=PHONE.match, max_length=25)
 
-class SAddress(object):
+class SAddress(Schema):
     """Reifier of an address schema object."""
     
     implements(IAddress)
@@ -46,3 +49,6 @@ class SAddress(object):
             rep += self.lastname  + ' '
         
         return '<%s at 0x%x; %s>' % (self.__class__.__name__, abs(id(self)), rep)
+
+# Slotted variant for holding many records at once, see paypy.schemas.base.compact
+CAddress = compact(SAddress)
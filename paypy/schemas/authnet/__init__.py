@@ -8,9 +8,12 @@ from zope.interface            import Interface, implements
 from zope.schema               import TextLine, Object, Choice, Int, List, Bool
 from zope.schema.fieldproperty import FieldProperty
 
+from paypy.schemas.base        import Schema, compact
+
 NUMERIC    = re.compile(r'^[0-9]+$')
 ALPHA      = re.compile(r'^[\w\-.,\s]+$', re.IGNORECASE | re.UNICODE)
 CURRENCY   = re.compile(r'^[0-9]+.[0-9][0-9]$')
+IP         = re.compile(r'^[0-9./]+$')
 
 # Merchant authentication schema
 class IMerchantAuthentication(Interface):
@@ -19,7 +22,7 @@ class IMerchantAuthentication(Interface):
     login          = TextLine(title=u'Login ID', description=u'The merchant\'s unique API Login ID', required=True, max_length=20)
     key            = TextLine(title=u'Transaction Key', description=u'The merchant\'s unique Transaction Key', required=True, max_length=16) # tran_key
 
-class SMerchantAuthentication(object):
+class SMerchantAuthentication(Schema):
     """Reifier for an Authorize.net merchant authentication object."""
     
     implements(IMerchantAuthentication)
@@ -43,7 +46,7 @@ class IItem(Interface):
     name        = TextLine(title=u'Name', description=u'Name of item', required=False, max_length=31)
     description = TextLine(title=u'Description', description=u'Description of item', required=False, max_length=255)
 
-class SItem(object):
+class SItem(Schema):
     implements(IItem)
     
     amount      = FieldProperty(IItem['amount'])
@@ -79,7 +82,7 @@ class ILineItem(Interface):
     price = TextLine(title=u'Unit Price', description=u'Cost of an item per unit excluding tax, freight, and duty.', required=False, constraint=CURRENCY.match, max_length=15)
     taxable = Bool(title=u'Taxable', description=u'Indicates whether the item is subject to tax', required=False, default=False)
 
-class SLineItem(object):
+class SLineItem(Schema):
     implements(ILineItem)
     
     id          = FieldProperty(ILineItem['id'])
@@ -109,7 +112,7 @@ class IAuthnetTransaction(ITransaction):
     shipping       = Object(title=u'Shipping Address', description=u'The customer\'s shipping address', schema=IShipping,   required=False)
     
     customer_id                     = TextLine(title=u'Customer ID', description=u'The unique identifier to represent the customer associated with the transaction.', required=False, constraint=ALPHA.match, max_length=20) # cust_id
-    customer_ip                     = TextLine(title=u'Customer IP', description=u'The IP address of the customer initiating the transaction. If this value is not passed, it will default to 255.255.255.255.', required=False, constraint=re.compile('^[0-9./]+$').match, max_length=15) # customer_ip
+    customer_ip                     = TextLine(title=u'Customer IP', description=u'The IP address of the customer initiating the transaction. If this value is not passed, it will default to 255.255.255.255.', required=False, constraint=IP.match, max_length=15) # customer_ip
     customer_email                  = Bool(title=u'Customer Email', description=u'Indicates whether an email receipt should be sent to the customer.', required=False)   # email_customer
     email                           = TextLine(title=u'Email', description=u'The email address to which the customer\'s copy of the email receipt is sent when Email Receipts is configured in the Merchant Interface. The email is sent to the customer only if the email address format is valid.', required=False, max_length=255)
     description                     = TextLine(title=u'Description', description=u'The description must be created dynamically on the merchant server or provided on a per- transaction basis. The payment gateway does not perform this function.', required=False, constraint=ALPHA.match, max_length=255)
@@ -191,3 +194,10 @@ class SAuthnetTransaction(STransaction):
             rep = self.amount
         
         return '<%s at 0x%x; %s>' % (self.__class__.__name__, abs(id(self)), rep)
+
+# Slotted variants for holding many records at once, see paypy.schemas.base.compact
+CTax                = compact(STax)
+CDuty               = compact(SDuty)
+CFreight            = compact(SFreight)
+CLineItem           = compact(SLineItem)
+CAuthnetTransaction = compact(SAuthnetTransaction)
@@ -3,13 +3,15 @@ from zope.interface            import Interface, implements
 from zope.schema               import Object
 from zope.schema.fieldproperty import FieldProperty
 
+from paypy.schemas.base        import Schema
+
 class IAim(Interface):
     """Represents an AIM interface."""
     
     authentication = Object(title=u'Merchant Authentication',   description=u'Represents merchant authentication values.', schema=IMerchantAuthentication, required=True)
     transaction    = Object(title=u'Authorize.net Transaction', description=u'Represents an authorize.net transaction',    schema=IAuthnetTransaction,     required=True)
     
-class SAim(object):
+class SAim(Schema):
     """Reifier of an aim schema object."""
     
     implements(IAim)
@@ -8,6 +8,8 @@ from zope.interface            import Interface, implements
 from zope.schema               import Object, TextLine, Int, Choice, Datetime
 from zope.schema.fieldproperty import FieldProperty
 
+from paypy.schemas.base        import Schema
+
 ALPHA      = re.compile(r'^[\w\-.,\s]+$', re.IGNORECASE | re.UNICODE)
 CURRENCY   = re.compile(r'^[0-9]+.[0-9][0-9]$')
 
@@ -24,7 +26,7 @@ class IArb(Interface):
     authentication = Object(title=u'Merchant Authentication',   description=u'Represents merchant authentication values.', schema=IMerchantAuthentication, required=True)
     subscription   = Object(title=u'Authorize.net Recurring Billing', description=u'Represents an authorize.net recurring billing request', schema=IAuthnetSubscription, required=True)
     
-class SArb(object):
+class SArb(Schema):
     """Reifier of an aim schema object."""
     
     implements(IArb)
@@ -44,7 +46,7 @@ class ISchedule(Interface):
     cycles       = Int(title=u'Total Occurrences',   description=u'Number of billing occurrences or payments for the subscription.', min=1, max=9999, required=True, default=9999)
     trial_cycles = Int(title=u'Trial Occurrences',   description=u'Number of billing occurrences or payments in the trial period.', min=1, max=99, required=False)
 
-class SSchedule(object):
+class SSchedule(Schema):
     """Reifier for an ARB Schedule block object."""
     
     implements(ISchedule)
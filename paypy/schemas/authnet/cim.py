@@ -8,6 +8,8 @@ from zope.interface            import Interface, implements
 from zope.schema               import Object, TextLine, Int, Choice, List
 from zope.schema.fieldproperty import FieldProperty
 
+from paypy.schemas.base        import Schema, compact
+
 ALPHA      = re.compile(r'^[\w\-.,\s]+$', re.IGNORECASE | re.UNICODE)
 CURRENCY   = re.compile(r'^[0-9]+.[0-9][0-9]$')
 
@@ -19,10 +21,12 @@ class SBillingList(billing.SBilling):
     
     payment = FieldProperty(IBillingList['payment'])
 
+CBillingList = compact(SBillingList)
+
 # Parent profile interfaces (for schema validation primarily)
 class IAuthnetProfile(Interface):
     pass
-class SAuthnetProfile(object):
+class SAuthnetProfile(Schema):
     implements(IAuthnetProfile)
 
 # Main CIM container
@@ -32,7 +36,7 @@ class ICim(Interface):
     authentication = Object(title=u'Merchant Authentication',   description=u'Represents merchant authentication values.', schema=IMerchantAuthentication, required=True)
     profile        = Object(title=u'Authorize.net CIM', description=u'Represents an authorize.net CIM request', schema=IAuthnetProfile, required=True)
     
-class SCim(object):
+class SCim(Schema):
     """Reifier of an CIM schema object."""
     
     implements(ICim)
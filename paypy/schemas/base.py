@@ -0,0 +1,335 @@
+"""Schema Base
+
+Every schema reifier derives from Schema, which adds ``from_mapping``
+(and its alias ``from_dict``): build a schema object from a mapping of
+field names to values in one pass, validating the whole record against
+the same zope.schema fields the FieldProperty attributes use and
+reporting every error at once.
+
+The fields are compiled once per class into fast checks; a value
+failing its fast check is handed to the zope field, so the errors
+raised are zope's own. Nested schemas and lists of them may be given
+as mappings too.
+
+``compact`` makes a slotted variant of a reifier, providing the same
+interfaces but without a per-instance ``__dict__``, for holding many
+records at once.
+
+"""
+
+import datetime
+
+from zope.interface            import implementedBy, classImplements
+from zope.schema               import TextLine, Bool, Int, Choice, Datetime, Object, List
+from zope.schema.interfaces    import ValidationError, RequiredMissing
+from zope.schema.fieldproperty import FieldProperty
+
+from paypy.exceptions.schema   import SchemaException
+
+class UnknownField(ValidationError):
+    __doc__ = 'Unknown field'
+
+class UnknownSchema(ValidationError):
+    __doc__ = 'Cannot tell which schema to build from the fields given'
+
+_compiled = {}
+_concrete = {}
+
+def _fast_check(field):
+    """Return a predicate that accepts the values a field certainly accepts, or None."""
+    
+    kind = type(field)
+    
+    if kind is TextLine:
+        low, high, constraint = field.min_length or 0, field.max_length, field.constraint
+        
+        if high is None:
+            return lambda value: type(value) is unicode and low <= len(value) and constraint(value)
+        
+        return lambda value: type(value) is unicode and low <= len(value) <= high and constraint(value)
+    
+    if kind is Bool:
+        return lambda value: value is True or value is False
+    
+    if kind is Int:
+        low, high = field.min, field.max
+        return lambda value: type(value) in (int, long) and (low is None or value >= low) and (high is None or value <= high)
+    
+    if kind is Choice and field.vocabulary is not None:
+        values = frozenset([term.value for term in field.vocabulary])
+        
+        def check(value):
+            try:
+                return value in values
+            except TypeError:
+                return False
+        
+        return check
+    
+    if kind is Datetime and field.min is None and field.max is None:
+        return lambda value: isinstance(value, datetime.datetime)
+    
+    return None
+
+def compile_fields(cls):
+    """Return a class's {name : (field, fast check)} table and its required field names."""
+    
+    try:
+        return _compiled[cls]
+    except KeyError:
+        pass
+    
+    fields   = {}
+    required = []
+    
+    for klass in reversed(cls.__mro__):
+        for name, value in vars(klass).items():
+            if isinstance(value, FieldProperty):
+                field        = value._FieldProperty__field
+                fields[name] = (field, _fast_check(field))
+    
+    for name, (field, check) in fields.items():
+        if field.required and field.default is None:
+            required.append(name)
+    
+    _compiled[cls] = fields, tuple(required)
+    
+    return _compiled[cls]
+
+def _schemas(cls=None):
+    """Yield every Schema subclass."""
+    
+    for subclass in (cls or Schema).__subclasses__():
+        yield subclass
+        
+        for schema in _schemas(subclass):
+            yield schema
+
+def concrete(interface, mapping, compact=False):
+    """Return the schema class to build for an interface from a mapping.
+    
+    That is the only implementing class whose fields cover the
+    mapping's keys or, if there are several (or none), the one declaring
+    exactly that interface. Compact classes are preferred if ``compact``
+    is set, and left out otherwise. Return None if there is no such class.
+    
+    """
+    
+    keys = frozenset(mapping)
+    key  = (interface, keys, compact)
+    
+    try:
+        return _concrete[key]
+    except KeyError:
+        pass
+    
+    implementers = [x for x in _schemas() if interface.implementedBy(x) and (compact or not x.compact)]
+    implementers = [x for x in implementers if x.compact == compact] or implementers
+    candidates   = [x for x in implementers if keys <= frozenset(compile_fields(x)[0])] or implementers
+    
+    if len(candidates) > 1:
+        candidates = [x for x in candidates if implementedBy(x).declared[:1] == (interface,)]
+    
+    _concrete[key] = candidates[0] if len(candidates) == 1 else None
+    
+    return _concrete[key]
+
+def _build_nested(interface, mapping, path, errors, compact):
+    cls = concrete(interface, mapping, compact)
+    
+    if cls is None:
+        errors.append((path, UnknownSchema(interface.__name__, sorted(mapping))))
+        return mapping
+    
+    return build(cls, mapping, path, errors)
+
+def _is_nested(field, value):
+    """Is the value a nested schema, or a list of them, given as mappings?"""
+    
+    if isinstance(field, Object):
+        return isinstance(value, dict)
+    
+    return isinstance(field, List) and isinstance(field.value_type, Object) and isinstance(value, list) and bool([x for x in value if isinstance(x, dict)])
+
+def _nested(field, value, path, errors, compact):
+    """Build and validate a nested schema, or a list of them, given as mappings."""
+    
+    if isinstance(field, Object):
+        return _build_nested(field.schema, value, path, errors, compact)
+    
+    items = []
+    
+    for index, item in enumerate(value):
+        item_path = '%s[%d]' % (path, index)
+        
+        if isinstance(item, dict):
+            items.append(_build_nested(field.value_type.schema, item, item_path, errors, compact))
+            continue
+        
+        try:
+            field.value_type.validate(item)
+        except ValidationError, e:
+            errors.append((item_path, e))
+        
+        items.append(item)
+    
+    if (field.min_length is not None and len(items) < field.min_length) or (field.max_length is not None and len(items) > field.max_length):
+        try:
+            field.validate(items)
+        except ValidationError, e:
+            errors.append((path, e))
+    
+    return items
+
+def build(cls, mapping, path='', errors=None):
+    """Build and validate a schema object from a mapping, collecting errors as (path, exception) pairs."""
+    
+    fields, required = compile_fields(cls)
+    collect          = errors is None
+    errors           = [] if collect else errors
+    values           = {}
+    prefix           = path + '.' if path else ''
+    
+    for name, value in mapping.iteritems():
+        try:
+            field, check = fields[name]
+        except KeyError:
+            errors.append((prefix + name, UnknownField(name)))
+            continue
+        
+        if check is not None and check(value):
+            pass
+        
+        elif _is_nested(field, value):
+            value = _nested(field, value, prefix + name, errors, cls.compact)
+        
+        else:
+            try:
+                field.validate(value)
+            except ValidationError, e:
+                errors.append((prefix + name, e))
+        
+        values[name] = value
+    
+    for name in required:
+        if name not in mapping:
+            errors.append((prefix + name, RequiredMissing(name)))
+    
+    if collect and errors:
+        raise SchemaException(errors)
+    
+    return cls._make(values)
+
+class Schema(object):
+    """Base class of the schema reifiers."""
+    
+    __slots__ = ()
+    compact   = False
+    
+    @classmethod
+    def _make(cls, values):
+        """Return an instance holding already validated values."""
+        
+        instance = cls()
+        instance.__dict__.update(values)
+        
+        return instance
+    
+    @classmethod
+    def from_mapping(cls, mapping):
+        """Build a schema object from a mapping of field names to values, raise SchemaException listing every invalid field."""
+        
+        return build(cls, mapping)
+    
+    from_dict = from_mapping
+
+class SlotProperty(object):
+    """A FieldProperty keeping its value in a slot rather than the instance ``__dict__``."""
+    
+    __slots__ = ('field', 'check', 'slot')
+    
+    def __init__(self, field, check, slot):
+        self.field = field
+        self.check = check
+        self.slot  = slot
+    
+    def __get__(self, inst, klass):
+        if inst is None:
+            return self
+        
+        try:
+            return self.slot.__get__(inst, klass)
+        except AttributeError:
+            return self.field.default
+    
+    def __set__(self, inst, value):
+        if self.check is None or not self.check(value):
+            self.field.bind(inst).validate(value)
+        
+        self.slot.__set__(inst, value)
+
+class CompactSchema(Schema):
+    """Base class of the compact schemas made by ``compact``."""
+    
+    __slots__ = ()
+    compact   = True
+    _slots    = {}
+    
+    @classmethod
+    def _make(cls, values):
+        instance = cls()
+        slots    = cls._slots
+        
+        for name, value in values.iteritems():
+            slots[name].__set__(instance, value)
+        
+        return instance
+    
+    def __getstate__(self):
+        state = {}
+        
+        for name, slot in self._slots.iteritems():
+            try:
+                state[name] = slot.__get__(self, type(self))
+            except AttributeError:
+                pass
+        
+        return state
+    
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            self._slots[name].__set__(self, value)
+    
+    def __repr__(self):
+        return '<%s at 0x%x>' % (self.__class__.__name__, abs(id(self)))
+
+def compact(cls, name=None):
+    """Make a slotted variant of a schema reifier.
+    
+    The variant provides the same interfaces and validates each field
+    as it is set, but keeps its values in ``__slots__``. It is named
+    after the reifier with a C in place of the S (SBilling -> CBilling)
+    unless ``name`` is given.
+    
+    """
+    
+    fields, required = compile_fields(cls)
+    names            = sorted(fields)
+    namespace        = {'__slots__'  : tuple(['_' + x for x in names]),
+                        '__module__' : cls.__module__,
+                        '__doc__'    : 'Compact variant of %s.' % cls.__name__}
+    
+    klass        = type(name or 'C' + cls.__name__[1:], (CompactSchema,), namespace)
+    klass._slots = dict([(x, getattr(klass, '_' + x)) for x in names])
+    
+    for x in names:
+        field, check = fields[x]
+        setattr(klass, x, SlotProperty(field, check, klass._slots[x]))
+    
+    declared = implementedBy(cls).declared
+    
+    classImplements(klass, *declared + tuple([x for x in implementedBy(cls).interfaces() if x not in declared]))
+    
+    _compiled[klass] = fields, required
+    
+    return klass
@@ -4,6 +4,8 @@ from zope.interface            import implements
 from zope.schema               import Choice
 from zope.schema.fieldproperty import FieldProperty
 
+from paypy.schemas.base        import compact
+
 class IBilling(IAddress):
     """Defines an interface for billing profile types.
     
@@ -25,3 +27,6 @@ class SBilling(SAddress):
     
     def __repr__(self):
         return super(SBilling, self).__repr__()
+
+# Slotted variant for holding many records at once, see paypy.schemas.base.compact
+CBilling = compact(SBilling)
@@ -4,13 +4,17 @@ from zope.interface            import Interface, implements
 from zope.schema               import TextLine, Choice, Datetime
 from zope.schema.fieldproperty import FieldProperty
 
+from paypy.schemas.base        import Schema, compact
+
+PAN = re.compile(r'^[0-9X]+$')
+
 class IPayment(Interface):
     pass
 
 class ICreditCard(IPayment):
     """Defines an interface for credit card payment types."""
     
-    number     = TextLine(title=u'Credit Card PAN',             description=u'A valid credit card number',          required=True, constraint=re.compile('^[0-9X]+$').match, min_length=4, max_length=16)
+    number     = TextLine(title=u'Credit Card PAN',             description=u'A valid credit card number',          required=True, constraint=PAN.match, min_length=4, max_length=16)
     expiration = Datetime(title=u'Credit Card Expiration Date', description=u'A valid credit card expiration date', required=True)
     ccv        = TextLine(title=u'Card Code Validation',        description=u'A credit card, card code validation', required=False)
     type       = Choice(title=u'Credit Card Type',              description=u'A valid credit type',                 required=False, values=(u'visa', u'mastercard', u'discover', u'amex', u'jcb', u'dinersclubs'))
@@ -25,7 +29,7 @@ class IBank(IPayment):
     account_type    = Choice(title=u'Account Type',          description=u'Bank account type',                  required=False, values=(u'checking', u'savings', u'businessChecking'))
     echeck_type     = Choice(title=u'EChek Type',            description=u'ECheck Type',                        required=False, values=(u'CCD', u'PPD', u'TEL', u'WEB'))
 
-class SCreditCard(object):
+class SCreditCard(Schema):
     """Reifier of a credit card schema object."""
     
     implements(ICreditCard)
@@ -38,7 +42,7 @@ class SCreditCard(object):
     def __repr__(self):
         return '<%s at 0x%x; %s %s>' % (self.__class__.__name__, abs(id(self)), self.number, self.expiration.strftime('%m/%Y'))
 
-class SBank(object):
+class SBank(Schema):
     """Reifier of a bank schema object."""
     
     implements(IBank)
@@ -52,3 +56,7 @@ class SBank(object):
     
     def __repr__(self):
         return '<%s at 0x%x; %s %s>' % (self.__class__.__name__, abs(id(self)), self.routing_number, self.account_number)
+
+# Slotted variants for holding many records at once, see paypy.schemas.base.compact
+CCreditCard = compact(SCreditCard)
+CBank       = compact(SBank)
@@ -1,5 +1,7 @@
-from address        import IAddress, SAddress
-from zope.interface import implements
+from address            import IAddress, SAddress
+from zope.interface     import implements
+
+from paypy.schemas.base import compact
 
 class IShipping(IAddress):
     """Defines an interface for shipping profile types.
@@ -21,3 +23,6 @@ class SShipping(SAddress):
     
     def __repr__(self):
         return super(SShipping, self).__repr__()
+
+# Slotted variant for holding many records at once, see paypy.schemas.base.compact
+CShipping = compact(SShipping)
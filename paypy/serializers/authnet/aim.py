@@ -2,10 +2,140 @@ import urllib
 
 from paypy.schemas.authnet.aim import SAim
 
+# Sources a field is read from, see Serialize._sources
+AUTHENTICATION = 0
+TRANSACTION    = 1
+BILLING        = 2
+SHIPPING       = 3
+PAYMENT        = 4
+
+# Emission rules: REQUIRED fields are sent unless they are None, OPTIONAL fields only when truthy
+REQUIRED = True
+OPTIONAL = False
+
 class SerializeException(Exception):
     """Serializer exception class."""
     pass
 
+def _text(value):
+    """Percent-encode a field value exactly once."""
+    
+    if isinstance(value, unicode):
+        value = value.encode('UTF-8')
+    
+    return urllib.quote_plus(str(value))
+
+def _flag(value):
+    """Booleans are sent as TRUE or FALSE."""
+    
+    return str(value).upper()
+
+def _expiration(value):
+    return _text(value.strftime('%m/%Y'))
+
+def _item(value):
+    """Delimited name, description and amount for the tax, duty and freight fields."""
+    
+    return '<|>'.join([_text(x) for x in (value.name or '', value.description or '', value.amount or '')])
+
+def _line_item(value):
+    items = [value.id or '', value.name or '', value.description or '', value.quantity, value.price or '', _flag(value.taxable)]
+    
+    return '<|>'.join([_text(x) for x in items])
+
+# The name-value mapping: (request parameter, source, schema attribute, encoder, emission rule)
+AIM_FIELDS = (('x_login',                           AUTHENTICATION, 'login',                           _text,       REQUIRED),
+              ('x_tran_key',                        AUTHENTICATION, 'key',                             _text,       REQUIRED),
+              ('x_type',                            TRANSACTION,    'type',                            _text,       REQUIRED),
+              ('x_amount',                          TRANSACTION,    'amount',                          _text,       REQUIRED),
+              ('x_version',                         TRANSACTION,    'version',                         _text,       REQUIRED),
+              ('x_method',                          TRANSACTION,    'method',                          _text,       REQUIRED),
+              ('x_delim_char',                      TRANSACTION,    'delim_char',                      _text,       REQUIRED),
+              ('x_delim_data',                      TRANSACTION,    'delim_data',                      _flag,       REQUIRED),
+              ('x_url',                             TRANSACTION,    'url',                             _text,       REQUIRED),
+              ('x_relay_response',                  TRANSACTION,    'relay_response',                  _flag,       REQUIRED),
+              ('x_card_num',                        PAYMENT,        'number',                          _text,       REQUIRED),
+              ('x_exp_date',                        PAYMENT,        'expiration',                      _expiration, REQUIRED),
+              ('x_card_code',                       PAYMENT,        'ccv',                             _text,       OPTIONAL),
+              ('x_first_name',                      BILLING,        'firstname',                       _text,       OPTIONAL),
+              ('x_last_name',                       BILLING,        'lastname',                        _text,       OPTIONAL),
+              ('x_company',                         BILLING,        'company',                         _text,       OPTIONAL),
+              ('x_address',                         BILLING,        'address',                         _text,       OPTIONAL),
+              ('x_city',                            BILLING,        'city',                            _text,       OPTIONAL),
+              ('x_state',                           BILLING,        'state',                           _text,       OPTIONAL),
+              ('x_zip',                             BILLING,        'postal_code',                     _text,       OPTIONAL),
+              ('x_country',                         BILLING,        'country',                         _text,       OPTIONAL),
+              ('x_phone',                           BILLING,        'phone',                           _text,       OPTIONAL),
+              ('x_fax',                             BILLING,        'fax',                             _text,       OPTIONAL),
+              ('x_ship_to_first_name',              SHIPPING,       'firstname',                       _text,       OPTIONAL),
+              ('x_ship_to_last_name',               SHIPPING,       'lastname',                        _text,       OPTIONAL),
+              ('x_ship_to_company',                 SHIPPING,       'company',                         _text,       OPTIONAL),
+              ('x_ship_to_address',                 SHIPPING,       'address',                         _text,       OPTIONAL),
+              ('x_ship_to_city',                    SHIPPING,       'city',                            _text,       OPTIONAL),
+              ('x_ship_to_state',                   SHIPPING,       'state',                           _text,       OPTIONAL),
+              ('x_ship_to_zip',                     SHIPPING,       'postal_code',                     _text,       OPTIONAL),
+              ('x_ship_to_country',                 SHIPPING,       'country',                         _text,       OPTIONAL),
+              ('x_ship_to_phone',                   SHIPPING,       'phone',                           _text,       OPTIONAL),
+              ('x_ship_to_fax',                     SHIPPING,       'fax',                             _text,       OPTIONAL),
+              ('x_cust_id',                         TRANSACTION,    'customer_id',                     _text,       OPTIONAL),
+              ('x_customer_ip',                     TRANSACTION,    'customer_ip',                     _text,       OPTIONAL),
+              ('x_email_customer',                  TRANSACTION,    'customer_email',                  _flag,       OPTIONAL),
+              ('x_email',                           TRANSACTION,    'email',                           _text,       OPTIONAL),
+              ('x_description',                     TRANSACTION,    'description',                     _text,       OPTIONAL),
+              ('x_merchant_email',                  TRANSACTION,    'merchant_email',                  _text,       OPTIONAL),
+              ('x_allow_partial_auth',              TRANSACTION,    'allow_partial_auth',              _text,       OPTIONAL),
+              ('x_auth_code',                       TRANSACTION,    'auth_code',                       _text,       OPTIONAL),
+              ('x_authentication_indicator',        TRANSACTION,    'authentication_indicator',        _text,       OPTIONAL),
+              ('x_cardholder_authentication_value', TRANSACTION,    'cardholder_authentication_value', _text,       OPTIONAL),
+              ('x_duplicate_window',                TRANSACTION,    'duplicate_window',                _text,       OPTIONAL),
+              ('x_encap_char',                      TRANSACTION,    'encap_char',                      _text,       OPTIONAL),
+              ('x_footer_email_receipt',            TRANSACTION,    'footer_email_receipt',            _text,       OPTIONAL),
+              ('x_header_email_receipt',            TRANSACTION,    'header_email_receipt',            _text,       OPTIONAL),
+              ('x_invoice_num',                     TRANSACTION,    'invoice',                         _text,       OPTIONAL),
+              ('x_po_num',                          TRANSACTION,    'po',                              _text,       OPTIONAL),
+              ('x_split_tender_id',                 TRANSACTION,    'split_tender_id',                 _text,       OPTIONAL),
+              ('x_tax_exempt',                      TRANSACTION,    'tax_exempt',                      _flag,       OPTIONAL),
+              ('x_recurring_billing',               TRANSACTION,    'recurring_billing',               _flag,       OPTIONAL),
+              ('x_test_request',                    TRANSACTION,    'test_request',                    _flag,       OPTIONAL),
+              ('x_trans_id',                        TRANSACTION,    'transaction_id',                  _text,       OPTIONAL),
+              ('x_duty',                            TRANSACTION,    'duty',                            _item,       OPTIONAL),
+              ('x_tax',                             TRANSACTION,    'tax',                             _item,       OPTIONAL),
+              ('x_freight',                         TRANSACTION,    'freight',                         _item,       OPTIONAL))
+
+# Repeated parameters: (request parameter, transaction attribute, encoder)
+AIM_REPEATED_FIELDS = (('x_line_items', 'line_item', _line_item),)
+
+_compiled = {}
+
+def compile_fields(cls):
+    """Compile the field table for a transaction schema class.
+    
+    Fields the class doesn't define are dropped and each row is reduced
+    to a (source, attribute, encoded prefix, encoder, rule) tuple so
+    serializing is a single pass over the table.
+    
+    """
+    
+    encoder = _compiled.get(cls)
+    
+    if encoder is None:
+        fields   = []
+        repeated = []
+        
+        for parameter, source, attribute, function, rule in AIM_FIELDS:
+            if source == TRANSACTION and not hasattr(cls, attribute):
+                continue
+            
+            fields.append((source, attribute, parameter + '=', function, rule))
+        
+        for parameter, attribute, function in AIM_REPEATED_FIELDS:
+            if hasattr(cls, attribute):
+                repeated.append((attribute, parameter + '=', function))
+        
+        encoder = _compiled[cls] = (tuple(fields), tuple(repeated))
+    
+    return encoder
+
 class Serialize(object):
     """Serializer for schema -> string."""
     
@@ -17,149 +147,40 @@ class Serialize(object):
         self.schema = schema
         self.result = self._to_string(schema)
     
+    def _sources(self, schema):
+        """The objects the field table reads from, indexed by source."""
+        
+        trans = schema.transaction
+        
+        return (schema.authentication, trans, trans.billing, trans.shipping, trans.payment)
+    
     def _to_string(self, schema):
         """Map a schema object to a valid authnet transaction string."""
         
-        # We'll make it into a dictionary so we can just urlencode it
-        trans          = schema.transaction
-        authentication = {'x_login'          : schema.authentication.login, 'x_tran_key' : schema.authentication.key}
-        transaction    = {'x_type'           : trans.type,
-                          'x_amount'         : trans.amount,
-                          'x_version'        : trans.version,
-                          'x_method'         : trans.method,
-                          'x_delim_char'     : trans.delim_char,
-                          'x_delim_data'     : str(trans.delim_data).upper(),
-                          'x_url'            : trans.url,
-                          'x_relay_response' : str(trans.relay_response).upper(),
-                          'x_card_num'       : trans.payment.number,
-                          'x_exp_date'       : trans.payment.expiration.strftime('%m/%Y')}
+        fields, repeated = compile_fields(type(schema.transaction))
+        sources          = self._sources(schema)
+        buffer           = []
+        append           = buffer.append
         
-        # Create the billing fields
-        if trans.billing:
-            billto = trans.billing
+        for source, attribute, prefix, function, rule in fields:
+            obj = sources[source]
             
-            if billto.firstname:
-                transaction['x_first_name'] = urllib.quote(billto.firstname.encode("UTF-8"))
-            if billto.lastname:
-                transaction['x_last_name']  = urllib.quote(billto.lastname.encode("UTF-8"))
-            if billto.company:
-                transaction['x_company']    = urllib.quote(billto.company.encode("UTF-8"))
-            if billto.address:
-                transaction['x_address']    = urllib.quote(billto.address.encode("UTF-8"))
-            if billto.city:
-                transaction['x_city']       = urllib.quote(billto.city.encode("UTF-8"))
-            if billto.state:
-                transaction['x_state']      = urllib.quote(billto.state.encode("UTF-8"))
-            if billto.postal_code:
-                transaction['x_zip']        = billto.postal_code
-            if billto.country:
-                transaction['x_country']    = urllib.quote(billto.country.encode("UTF-8"))
-            if billto.phone:
-                transaction['x_phone']      = billto.phone
-            if billto.fax:
-                transaction['x_fax']        = billto.fax
-        
-        # Create any shipping fields
-        if trans.shipping:
-            shipto = trans.shipping
+            if obj is None:
+                continue
             
-            if shipto.firstname:
-                transaction['x_ship_to_first_name'] = urllib.quote(shipto.firstname.encode("UTF-8"))
-            if shipto.lastname:
-                transaction['x_ship_to_last_name']  = urllib.quote(shipto.lastname.encode("UTF-8"))
-            if shipto.company:
-                transaction['x_ship_to_company']    = urllib.quote(shipto.company.encode("UTF-8"))
-            if shipto.address:
-                transaction['x_ship_to_address']    = urllib.quote(shipto.address.encode("UTF-8"))
-            if shipto.city:
-                transaction['x_ship_to_city']       = urllib.quote(shipto.city.encode("UTF-8"))
-            if shipto.state:
-                transaction['x_ship_to_state']      = urllib.quote(shipto.state.encode("UTF-8"))
-            if shipto.postal_code:
-                transaction['x_ship_to_zip']        = shipto.postal_code
-            if shipto.country:
-                transaction['x_ship_to_country']    = urllib.quote(shipto.country.encode("UTF-8"))
-            if shipto.phone:
-                transaction['x_ship_to_phone']      = shipto.phone
-            if shipto.fax:
-                transaction['x_ship_to_fax']        = shipto.fax
-        
-        # Miscellaneous fields
-        if trans.payment.ccv:
-            transaction['x_card_code']          = trans.payment.ccv
-        if trans.customer_id:
-            transaction['x_cust_id']            = trans.customer_id
-        if trans.customer_ip:
-            transaction['x_customer_ip']        = trans.customer_ip
-        if trans.customer_email:
-            transaction['x_email_customer']     = str(trans.customer_email).upper()
-        if trans.email:
-            transaction['x_email']              = urllib.quote(trans.email)
-        if trans.description:
-            transaction['x_description']        = trans.description
-        if trans.merchant_email:
-            transaction['x_merchant_email']     = trans.merchant_email
-        if trans.allow_partial_auth:
-            transaction['x_allow_partial_auth'] = trans.allow_partial_auth
-        if trans.auth_code:
-            transaction['x_auth_code']          = trans.auth_code
-        if trans.authentication_indicator:
-            transaction['x_authentication_indicator'] = trans.authentication_indicator
-        if trans.cardholder_authentication_value:
-            transaction['x_cardholder_authentication_value'] = trans.cardholder_authentication_value
-        if trans.duplicate_window:
-            transaction['x_duplicate_window']     = trans.duplicate_window
-        if trans.encap_char:
-            transaction['x_encap_char']           = trans.encap_char
-        if trans.footer_email_receipt:
-            transaction['x_footer_email_receipt'] = trans.footer_email_receipt
-        if trans.header_email_receipt:
-            transaction['x_header_email_receipt'] = trans.header_email_receipt
-        if trans.invoice:
-            transaction['x_invoice_num']          = trans.invoice
-        if trans.po:
-            transaction['x_po_num']               = trans.po
-        if trans.split_tender_id:
-            transaction['x_split_tender_id']      = trans.split_tender_id
-        if trans.tax_exempt:
-            transaction['x_tax_exempt']           = str(trans.tax_exempt).upper()
-        if trans.recurring_billing:
-            transaction['x_recurring_billing']    = str(trans.recurring_billing).upper()
-        if trans.test_request:
-            transaction['x_test_request']         = str(trans.test_request).upper()
-        if trans.transaction_id:
-            transaction['x_trans_id']             = trans.transaction_id
-        
-        transaction.update(authentication)
-        encoded = urllib.urlencode(transaction)
-        
-        # Map the line_item, this is after encoding it because duplicate keys in a dict aren't allowed
-        if trans.line_item:
-            line_items = []
-            for item in trans.line_item:
-                items = [item.id, item.name, item.description, item.quantity, item.price, str(item.taxable).upper()]
-                line_items.append('<|>'.join([str(x) for x in items]))
+            value = getattr(obj, attribute, None)
             
-            if line_items:
-                encoded += '&x_line_items=' + '&x_line_items='.join(line_items)
-        
-        # Map the duty field
-        if trans.duty:
-            duty     = [trans.duty.name, trans.duty.description, trans.duty.amount]
-            encoded += '&x_duty=' + '<|>'.join([str(x) for x in duty])
-        
-        # Map the tax field
-        if trans.tax:
-            tax      = [trans.tax.name, trans.tax.description, trans.tax.amount]
-            encoded += '&x_tax=' + '<|>'.join([str(x) for x in tax])
-        
-        # Map the tax field
-        if trans.freight:
-            freight  = [trans.freight.name, trans.freight.description, trans.freight.amount]
-            encoded += '&x_freight=' + '<|>'.join([str(x) for x in freight])
+            if value is None or (rule is OPTIONAL and not value):
+                continue
+            
+            append(prefix + function(value))
         
-        return encoded
+        # Duplicate keys, so these are emitted once per item
+        for attribute, prefix, function in repeated:
+            for value in getattr(schema.transaction, attribute) or ():
+                append(prefix + function(value))
         
+        return '&'.join(buffer)
     
     def __str__(self):
         """Return the serialized schema."""
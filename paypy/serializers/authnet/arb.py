@@ -1,12 +1,30 @@
-from lxml                      import etree as ET
-from paypy.schemas.authnet.arb import SArb, IAuthnetSubscriptionCreate, IAuthnetSubscriptionUpdate, IAuthnetSubscriptionStatus, IAuthnetSubscriptionCancel
-from paypy.schemas.payment     import ICreditCard, IBank
+from lxml                               import etree as ET
+from paypy.schemas.authnet.arb          import SArb, IAuthnetSubscriptionCreate, IAuthnetSubscriptionUpdate, IAuthnetSubscriptionStatus, IAuthnetSubscriptionCancel
+from paypy.schemas.payment              import ICreditCard, IBank
+from paypy.serializers.authnet.elements import request_root, find_operation, append_fields
 
 ARB_REQUEST_ELEMENTS    = {'create' : 'ARBCreateSubscriptionRequest',
                            'update' : 'ARBUpdateSubscriptionRequest',
                            'status' : 'ARBGetSubscriptionStatusRequest',
                            'cancel' : 'ARBCancelSubscriptionRequest'}
 
+# Operation dispatch: (schema interface, request element, builds a subscription element?)
+ARB_BUILDERS            = ((IAuthnetSubscriptionCreate, ARB_REQUEST_ELEMENTS['create'], True),
+                           (IAuthnetSubscriptionUpdate, ARB_REQUEST_ELEMENTS['update'], True),
+                           (IAuthnetSubscriptionStatus, ARB_REQUEST_ELEMENTS['status'], False),
+                           (IAuthnetSubscriptionCancel, ARB_REQUEST_ELEMENTS['cancel'], False))
+
+ADDRESS_FIELDS          = (('firstName', 'firstname'),
+                           ('lastName',  'lastname'),
+                           ('company',   'company'),
+                           ('address',   'address'),
+                           ('city',      'city'),
+                           ('state',     'state'),
+                           ('zip',       'postal_code'),
+                           ('country',   'country'))
+
+_builders = {}
+
 class SerializeException(Exception):
     """Serializer exception class."""
     pass
@@ -27,22 +45,7 @@ class Serialize(object):
         
         address = ET.SubElement(parent, tag)
         
-        if schema.firstname:
-            ET.SubElement(address, 'firstName').text = schema.firstname
-        if schema.lastname:
-            ET.SubElement(address, 'lastName').text  = schema.lastname
-        if schema.company:
-            ET.SubElement(address, 'company').text   = schema.company
-        if schema.address:
-            ET.SubElement(address, 'address').text   = schema.address
-        if schema.city:
-            ET.SubElement(address, 'city').text      = schema.city
-        if schema.state:
-            ET.SubElement(address, 'state').text     = schema.state
-        if schema.postal_code:
-            ET.SubElement(address, 'zip').text       = schema.postal_code
-        if schema.country:
-            ET.SubElement(address, 'country').text   = schema.country
+        append_fields(address, schema, ADDRESS_FIELDS, truthy=True)
         
         return address
     
@@ -50,26 +53,15 @@ class Serialize(object):
         """Map a schema object to a valid authnet ARB request XML document."""
         
         trans     = schema.subscription
-        auth      = schema.authentication
+        operation = find_operation(ARB_BUILDERS, _builders, trans)
         
-        if IAuthnetSubscriptionCreate.providedBy(trans):
-            operation = ARB_REQUEST_ELEMENTS['create']
-        elif IAuthnetSubscriptionUpdate.providedBy(trans):
-            operation = ARB_REQUEST_ELEMENTS['update']
-        elif IAuthnetSubscriptionStatus.providedBy(trans):
-            operation = ARB_REQUEST_ELEMENTS['status']
-        elif IAuthnetSubscriptionCancel.providedBy(trans):
-            operation = ARB_REQUEST_ELEMENTS['cancel']
-        else:
+        if operation is None:
             raise SerializeException('the subscription object provided is not supported')
         
-        # Build the document root elementp
-        root = ET.Element(operation, xmlns='AnetApi/xml/v1/schema/AnetApiSchema.xsd')
+        interface, element, subscribe = operation
         
-        # Merchant authentication element
-        authentication = ET.SubElement(root, 'merchantAuthentication')
-        ET.SubElement(authentication, 'name').text           = auth.login
-        ET.SubElement(authentication, 'transactionKey').text = auth.key
+        # Copy the document root and merchant authentication
+        root = request_root(element, schema.authentication)
         
         # Set the reference ID
         if trans.ref_id is not None:
@@ -80,7 +72,7 @@ class Serialize(object):
             ET.SubElement(root, 'subscriptionId').text = str(trans.id)
         
         # If we are running anything but a Cancel or Status operation, we need to fill out the request
-        if operation not in ('ARBCancelSubscriptionRequest', 'ARBGetSubscriptionStatusRequest'):
+        if subscribe:
             subscription = ET.SubElement(root, 'subscription')
             
             # Do we have a name for this subscription?
@@ -102,17 +94,16 @@ class Serialize(object):
                 
                 # If a trial, build the element
                 if sched.trial_cycles is not None:
-                    sched.cycles + sched.trial_cycles
                     ET.SubElement(schedule, 'trialOccurrences').text = str(sched.trial_cycles)
-                
+            
             # Build the charge amount element
             if trans.amount is not None:
                 ET.SubElement(subscription, 'amount').text = trans.amount
-                
+            
             # Build the trial amount
             if trans.trial_amount is not None:
                 ET.SubElement(subscription, 'trialAmount').text = trans.trial_amount
-                
+            
             # Build the payment element
             if trans.payment is not None:
                 if ICreditCard.providedBy(trans.payment):
@@ -123,11 +114,11 @@ class Serialize(object):
                     ET.SubElement(credit, 'expirationDate').text = trans.payment.expiration.strftime('%Y-%m')
                     
                     if trans.payment.ccv is not None:
-                        ET.SubElement(credit, 'cardCode').text = trans.payment.code
-                    
+                        ET.SubElement(credit, 'cardCode').text = trans.payment.ccv
+                
                 elif IBank.providedBy(trans.payment):
                     payment = ET.SubElement(subscription, 'payment')
-                    account = ET.SubElement(subscription, 'bankAccount')
+                    account = ET.SubElement(payment, 'bankAccount')
                     
                     ET.SubElement(account, 'accountType').text   = trans.payment.account_type
                     ET.SubElement(account, 'routingNumber').text = trans.payment.routing_number
@@ -148,7 +139,7 @@ class Serialize(object):
                     order = ET.SubElement(subscription, 'order')
                 
                 ET.SubElement(order, 'description').text   = trans.description
-
+            
             # Build the customer and bill to elements
             customer = False
             
@@ -1,6 +1,7 @@
-from lxml                      import etree as ET
-from paypy.schemas.authnet.cim import *
-from paypy.schemas.payment     import ICreditCard, IBank
+from lxml                               import etree as ET
+from paypy.schemas.authnet.cim          import *
+from paypy.schemas.payment              import ICreditCard, IBank
+from paypy.serializers.authnet.elements import request_root, find_operation, append_fields
 
 PROFILE  = 'CustomerProfileRequest'
 PAYMENT  = 'CustomerPaymentProfileRequest'
@@ -22,6 +23,80 @@ CIM_REQUEST_ELEMENTS    = {'create'   : ('create%s' % PROFILE,
                                          'delete%s' % SHIPPING)
                           }
 
+# Operation dispatch: (schema interface, request element, builder method)
+CIM_BUILDERS            = ((IAuthnetProfileCreate,            'create%s' % PROFILE,                      '_create_profile'),
+                           (IAuthnetProfileCreateBilling,     'create%s' % PAYMENT,                      '_create_billing'),
+                           (IAuthnetProfileCreateShipping,    'create%s' % SHIPPING,                     '_create_shipping'),
+                           (IAuthnetProfileCreateTransaction, 'createCustomerProfileTransactionRequest', '_create_transaction'),
+                           (IAuthnetProfileUpdate,            'update%s' % PROFILE,                      '_update_profile'),
+                           (IAuthnetProfileUpdateBilling,     'update%s' % PAYMENT,                      '_update_billing'),
+                           (IAuthnetProfileUpdateShipping,    'update%s' % SHIPPING,                     '_update_shipping'),
+                           (IAuthnetProfileUpdateSplitTender, 'updateSplitTenderGroupRequest',           '_update_split_tender'),
+                           (IAuthnetProfileRetrieveAll,       'getCustomerProfileIdsRequest',            None),
+                           (IAuthnetProfileRetrieve,          'get%s' % PROFILE,                         '_profile_id'),
+                           (IAuthnetProfileRetrieveBilling,   'get%s' % PAYMENT,                         '_billing_id'),
+                           (IAuthnetProfileRetrieveShipping,  'get%s' % SHIPPING,                        '_shipping_id'),
+                           (IAuthnetProfileDelete,            'delete%s' % PROFILE,                      '_profile_id'),
+                           (IAuthnetProfileDeleteBilling,     'delete%s' % PAYMENT,                      '_billing_id'),
+                           (IAuthnetProfileDeleteShipping,    'delete%s' % SHIPPING,                     '_shipping_id'),
+                           (IAuthnetProfileValidate,          'validateCustomerPaymentProfileRequest',   '_validate'))
+
+# Profile transaction elements by transaction type
+TRANSACTION_ELEMENTS    = {'AUTH_ONLY'          : 'profileTransAuthOnly',
+                           'AUTH_CAPTURE'       : 'profileTransAuthCapture',
+                           'CAPTURE_ONLY'       : 'profileTransCaptureOnly',
+                           'CREDIT'             : 'profileTransRefund',
+                           'PRIOR_AUTH_CAPTURE' : 'profileTransPriorAuthCapture',
+                           'VOID'               : 'profileTransVoid'}
+
+# Field tables: (element, schema attribute)
+PROFILE_FIELDS          = (('merchantCustomerId', 'customer_id'),
+                           ('description',        'description'),
+                           ('email',              'email'))
+
+ADDRESS_FIELDS          = (('firstName',   'firstname'),
+                           ('lastName',    'lastname'),
+                           ('company',     'company'),
+                           ('address',     'address'),
+                           ('city',        'city'),
+                           ('state',       'state'),
+                           ('zip',         'postal_code'),
+                           ('country',     'country'),
+                           ('phoneNumber', 'phone'),
+                           ('faxNumber',   'fax'))
+
+ORDER_FIELDS            = (('invoiceNumber',       'invoice'),
+                           ('description',         'description'),
+                           ('purchaseOrderNumber', 'po'))
+
+# Note, we use "freight" but authorize.net wants it "shipping"
+ITEM_ELEMENTS           = (('tax',      'tax'),
+                           ('shipping', 'freight'),
+                           ('duty',     'duty'))
+
+# Name-value pairs sent with a profile transaction: (parameter, transaction attribute)
+EXTRA_OPTIONS           = (('x_version',                         'version'),
+                           ('x_delim_char',                      'delim_char'),
+                           ('x_delim_data',                      'delim_data'),
+                           ('x_relay_response',                  'relay_response'),
+                           ('x_cust_id',                         'customer_id'),
+                           ('x_customer_ip',                     'customer_ip'),
+                           ('x_email_customer',                  'customer_email'),
+                           ('x_email',                           'email'),
+                           ('x_description',                     'description'),
+                           ('x_merchant_email',                  'merchant_email'),
+                           ('x_allow_partial_auth',              'allow_partial_auth'),
+                           ('x_auth_code',                       'auth_code'),
+                           ('x_authentication_indicator',        'authentication_indicator'),
+                           ('x_cardholder_authentication_value', 'cardholder_authentication_value'),
+                           ('x_duplicate_window',                'duplicate_window'),
+                           ('x_encap_char',                      'encap_char'),
+                           ('x_footer_email_receipt',            'footer_email_receipt'),
+                           ('x_header_email_receipt',            'header_email_receipt'),
+                           ('x_url',                             'url'))
+
+_builders = {}
+
 class SerializeException(Exception):
     """Serializer exception class."""
     pass
@@ -42,29 +117,53 @@ class Serialize(object):
         
         address = ET.SubElement(parent, tag)
         
-        if schema.firstname is not None:
-            ET.SubElement(address, 'firstName').text = schema.firstname
-        if schema.lastname is not None:
-            ET.SubElement(address, 'lastName').text  = schema.lastname
-        if schema.company is not None:
-            ET.SubElement(address, 'company').text   = schema.company
-        if schema.address is not None:
-            ET.SubElement(address, 'address').text   = schema.address
-        if schema.city is not None:
-            ET.SubElement(address, 'city').text      = schema.city
-        if schema.state is not None:
-            ET.SubElement(address, 'state').text     = schema.state
-        if schema.postal_code is not None:
-            ET.SubElement(address, 'zip').text       = schema.postal_code
-        if schema.country is not None:
-            ET.SubElement(address, 'country').text   = schema.country
-        if schema.phone is not None:
-            ET.SubElement(address, 'phoneNumber').text = schema.phone
-        if schema.fax is not None:
-            ET.SubElement(address, 'faxNumber').text   = schema.fax
+        append_fields(address, schema, ADDRESS_FIELDS)
         
         return address
     
+    def _prototype_payment(self, parent, payment):
+        """A pseudo macro function for producing a credit card or bank account element."""
+        
+        if ICreditCard.providedBy(payment):
+            # Credit card payment type
+            creditcard = ET.SubElement(parent, 'creditCard')
+            
+            ET.SubElement(creditcard, 'cardNumber').text     = payment.number
+            ET.SubElement(creditcard, 'expirationDate').text = payment.expiration.strftime('%Y-%m')
+            
+            ccv = payment.ccv
+            
+            if ccv is not None:
+                ET.SubElement(creditcard, 'cardCode').text   = ccv
+        elif IBank.providedBy(payment):
+            # Bank account payment type
+            bank = ET.SubElement(parent, 'bankAccount')
+            
+            append_fields(bank, payment, (('accountType',   'account_type'),
+                                          ('routingNumber', 'routing_number'),
+                                          ('accountNumber', 'account_number'),
+                                          ('nameOnAccount', 'name_on_account'),
+                                          ('echeckType',    'echeck_type'),
+                                          ('bankName',      'name')))
+        else:
+            raise SerializeException('%s is not a supported payment type' % payment.__class__.__name__)
+    
+    def _prototype_payment_profile(self, root, trans):
+        """A pseudo macro function for producing a payment profile element."""
+        
+        ET.SubElement(root, 'customerProfileId').text = str(trans.id)
+        
+        payment_profile = ET.SubElement(root, 'paymentProfile')
+        billing         = trans.billing
+        
+        if billing is not None:
+            ET.SubElement(payment_profile, 'customerType').text = billing.entity_type
+            self._prototype_address(payment_profile, billing, 'billTo')
+        
+        self._prototype_payment(ET.SubElement(payment_profile, 'payment'), trans.payment)
+        
+        return payment_profile
+    
     def _prototype_transaction(self, root, parent, transaction, tag):
         """A pseudo macro function for producing a transaction element."""
         
@@ -72,406 +171,215 @@ class Serialize(object):
         tranny   = transaction.transaction
         
         # Build out rest of transaction body
-        if tranny.amount is not None:
-            ET.SubElement(transact, 'amount').text = tranny.amount
+        amount = tranny.amount
         
-        # Taxes! Yay!
-        if tranny.tax is not None:
-            tax = ET.SubElement(transact, 'tax')
-            
-            ET.SubElement(tax, 'amount').text      = tranny.tax.amount
-            ET.SubElement(tax, 'name').text        = tranny.tax.name
-            ET.SubElement(tax, 'description').text = tranny.tax.description
-        
-        # Shipping...Freight...Authorize.net can't make up their minds!
-        if tranny.freight is not None:
-            # Note, we use "freight" but authorize.net wants it "shipping"
-            freight = ET.SubElement(transact, 'shipping')
-            
-            ET.SubElement(freight, 'amount').text      = tranny.freight.amount
-            ET.SubElement(freight, 'name').text        = tranny.freight.name
-            ET.SubElement(freight, 'description').text = tranny.freight.description
+        if amount is not None:
+            ET.SubElement(transact, 'amount').text = amount
         
-        # Duty...don't buy it at the airport!
-        if tranny.duty is not None:
-            duty = ET.SubElement(transact, 'duty')
+        # Taxes, shipping and duty
+        for element, attribute in ITEM_ELEMENTS:
+            item = getattr(tranny, attribute)
             
-            ET.SubElement(duty, 'amount').text      = tranny.duty.amount
-            ET.SubElement(duty, 'name').text        = tranny.duty.name
-            ET.SubElement(duty, 'description').text = tranny.duty.description
-        
-        # We can have multiple line items...
-        if tranny.line_item is not None:
-            for line_item in tranny.line_item:
-                oh_yes = ET.SubElement(transact, 'lineItems')
+            if item is not None:
+                node = ET.SubElement(transact, element)
                 
-                ET.SubElement(oh_yes, 'itemId').text      = line_item.id
-                ET.SubElement(oh_yes, 'name').text        = line_item.name
-                ET.SubElement(oh_yes, 'description').text = line_item.description
-                ET.SubElement(oh_yes, 'quantity').text    = str(line_item.quantity)
-                ET.SubElement(oh_yes, 'unitPrice').text   = line_item.price
-                ET.SubElement(oh_yes, 'taxable').text     = str(line_item.taxable).lower()
+                ET.SubElement(node, 'amount').text      = item.amount
+                ET.SubElement(node, 'name').text        = item.name
+                ET.SubElement(node, 'description').text = item.description
         
+        # We can have multiple line items...
+        for line_item in tranny.line_item or ():
+            oh_yes = ET.SubElement(transact, 'lineItems')
+            
+            ET.SubElement(oh_yes, 'itemId').text      = line_item.id
+            ET.SubElement(oh_yes, 'name').text        = line_item.name
+            ET.SubElement(oh_yes, 'description').text = line_item.description
+            ET.SubElement(oh_yes, 'quantity').text    = str(line_item.quantity)
+            ET.SubElement(oh_yes, 'unitPrice').text   = line_item.price
+            ET.SubElement(oh_yes, 'taxable').text     = str(line_item.taxable).lower()
         
         # Profile ID's and transaction ID's
-        if transaction.id is not None:
-            ET.SubElement(transact, 'customerProfileId').text = str(transaction.id)
-        if transaction.billing_id is not None:
-            ET.SubElement(transact, 'customerPaymentProfileId').text = str(transaction.billing_id)
-        if transaction.shipping_id is not None:
-            ET.SubElement(transact, 'customerShippingAddressId').text = str(transaction.shipping_id)
-        if tranny.transaction_id is not None:
-            ET.SubElement(transact, 'transId').text = tranny.transaction_id
+        for element, value in (('customerProfileId',         transaction.id),
+                               ('customerPaymentProfileId',  transaction.billing_id),
+                               ('customerShippingAddressId', transaction.shipping_id)):
+            if value is not None:
+                ET.SubElement(transact, element).text = str(value)
+        
+        transaction_id = tranny.transaction_id
+        
+        if transaction_id is not None:
+            ET.SubElement(transact, 'transId').text = transaction_id
         
         # If we have any data on the user
-        order = False
-        
-        if tranny.invoice is not None:
-            order = ET.SubElement(transact, 'order')
-            ET.SubElement(order, 'invoiceNumber').text = tranny.invoice
-        if tranny.description is not None:
-            if not order:
-                order = ET.SubElement(transact, 'order')
-            ET.SubElement(order, 'description').text = tranny.description
-        if tranny.po is not None:
-            if not order:
-                order = ET.SubElement(transact, 'order')
-            ET.SubElement(order, 'purchaseOrderNumber').text = tranny.po
+        order = [(element, getattr(tranny, attribute)) for element, attribute in ORDER_FIELDS]
+        order = [x for x in order if x[1] is not None]
+        
+        if order:
+            node = ET.SubElement(transact, 'order')
+            
+            for element, value in order:
+                ET.SubElement(node, element).text = value
         
         # Tax exemption and miscellany
-        if tranny.tax_exempt is not None:
-            ET.SubElement(transact, 'taxExempt').text = tranny.tax_exempt
-        if tranny.recurring_billing is not None:
-            ET.SubElement(transact, 'recurringBilling').text = str(tranny.recurring_billing).upper()
-        if tranny.split_tender_id is not None:
-            ET.SubElement(transact, 'splitTenderId').text = tranny.split_tender_id
-        if tranny.ccv is not None:
-            ET.SubElement(transact, 'cardCode').text = tranny.ccv
+        tax_exempt        = tranny.tax_exempt
+        recurring_billing = tranny.recurring_billing
+        
+        if tax_exempt is not None:
+            ET.SubElement(transact, 'taxExempt').text = str(tax_exempt).lower()
+        if recurring_billing is not None:
+            ET.SubElement(transact, 'recurringBilling').text = str(recurring_billing).upper()
+        
+        append_fields(transact, tranny, (('splitTenderId', 'split_tender_id'),
+                                         ('cardCode',      'ccv')))
         
         # Extra options...
         extra_options = []
         
-        if tranny.version is not None:
-            extra_options.append('x_version=%s' % tranny.version)
-        if tranny.delim_char is not None:
-            extra_options.append('x_delim_char=%s' % tranny.delim_char)
-        if tranny.delim_data is not None:
-            extra_options.append('x_delim_data=%s' % tranny.delim_data)
-        if tranny.relay_response is not None:
-            extra_options.append('x_relay_response=%s' % tranny.relay_response)
-        if tranny.customer_id is not None:
-            extra_options.append('x_cust_id=%s' % tranny.customer_id)
-        if tranny.customer_ip is not None:
-            extra_options.append('x_customer_ip=%s' % tranny.customer_ip)
-        if tranny.customer_email is not None:
-            extra_options.append('x_email_customer=%s' % tranny.customer_email)
-        if tranny.email is not None:
-            extra_options.append('x_email=%s' % tranny.email)
-        if tranny.description is not None:
-            extra_options.append('x_description=%s' % tranny.description)
-        if tranny.merchant_email is not None:
-            extra_options.append('x_merchant_email=%s' % tranny.merchant_email)
-        if tranny.allow_partial_auth is not None:
-            extra_options.append('x_allow_partial_auth=%s' % tranny.allow_partial_auth)
-        if tranny.auth_code is not None:
-            extra_options.append('x_auth_code=%s' % tranny.auth_code)
-        if tranny.authentication_indicator is not None:
-            extra_options.append('x_authentication_indicator=%s' % tranny.authentication_indicator)
-        if tranny.cardholder_authentication_value is not None:
-            extra_options.append('x_cardholder_authentication_value=%s' % tranny.cardholder_authentication_value)
-        if tranny.duplicate_window is not None:
-            extra_options.append('x_duplicate_window=%s' % tranny.duplicate_window)
-        if tranny.encap_char is not None:
-            extra_options.append('x_encap_char=%s' % tranny.encap_char)
-        if tranny.footer_email_receipt is not None:
-            extra_options.append('x_footer_email_receipt=%s' % tranny.footer_email_receipt)
-        if tranny.header_email_receipt is not None:
-            extra_options.appen('x_header_email_receipt=%s' % tranny.header_email_receipt)
-        if tranny.url is not None:
-            extra_options.append('x_url=%s' % tranny.url)
-        
-        if extra_options is not None:
-            extra      = ET.SubElement(root, 'extraOptions')
-            extra.text = ET.CDATA('&'.join(extra_options))
-    
-    def _to_xml(self, schema):
-        """Map a schema object to a valid authnet ARB request XML document."""
+        for parameter, attribute in EXTRA_OPTIONS:
+            value = getattr(tranny, attribute)
+            
+            if value is not None:
+                extra_options.append('%s=%s' % (parameter, value))
         
-        trans     = schema.profile
-        auth      = schema.authentication
-        
-        if IAuthnetProfileCreate.providedBy(trans):
-            operation = 'create' + PROFILE
-        elif IAuthnetProfileCreateBilling.providedBy(trans):
-            operation = 'create' + PAYMENT
-        elif IAuthnetProfileCreateShipping.providedBy(trans):
-            operation = 'create' + SHIPPING
-        elif IAuthnetProfileCreateTransaction.providedBy(trans):
-            operation = 'createCustomerProfileTransactionRequest'
-        elif IAuthnetProfileUpdate.providedBy(trans):
-            operation = 'update' + PROFILE
-        elif IAuthnetProfileUpdateBilling.providedBy(trans):
-            operation = 'update' + PAYMENT
-        elif IAuthnetProfileUpdateShipping.providedBy(trans):
-            operation = 'update' + SHIPPING
-        elif IAuthnetProfileUpdateSplitTender.providedBy(trans):
-            operation = 'updateSplitTenderGroupRequest'
-        elif IAuthnetProfileRetrieveAll.providedBy(trans):
-            operation = 'getCustomerProfileIdsRequest'
-        elif IAuthnetProfileRetrieve.providedBy(trans):
-            operation = 'get' + PROFILE
-        elif IAuthnetProfileRetrieveBilling.providedBy(trans):
-            operation = 'get' + PAYMENT
-        elif IAuthnetProfileRetrieveShipping.providedBy(trans):
-            operation = 'get' + SHIPPING
-        elif IAuthnetProfileDelete.providedBy(trans):
-            operation = 'delete' + PROFILE
-        elif IAuthnetProfileDeleteBilling.providedBy(trans):
-            operation = 'delete' + PAYMENT
-        elif IAuthnetProfileDeleteShipping.providedBy(trans):
-            operation = 'delete' + SHIPPING
-        elif IAuthnetProfileValidate.providedBy(trans):
-            operation = 'validateCustomerPaymentProfileRequest'
-        else:
-            raise SerializeException('the subscription object provided is not supported')
+        extra      = ET.SubElement(root, 'extraOptions')
+        extra.text = ET.CDATA('&'.join(extra_options))
+    
+    def _create_profile(self, root, trans):
+        """Create a brand new customer profile."""
         
-        # Build the document root elementp
-        root = ET.Element(operation, xmlns='AnetApi/xml/v1/schema/AnetApiSchema.xsd')
+        profile = ET.SubElement(root, 'profile')
         
-        # Merchant authentication element
-        authentication = ET.SubElement(root, 'merchantAuthentication')
-        ET.SubElement(authentication, 'name').text           = auth.login
-        ET.SubElement(authentication, 'transactionKey').text = auth.key
+        append_fields(profile, trans, PROFILE_FIELDS)
         
-        # Set the reference ID
-        if hasattr(trans, 'ref_id') and (trans.ref_id is not None):
-            ET.SubElement(root, 'refId').text = trans.ref_id
-        
-        # Now we start having fun - this shit is messay!
-        if operation in CIM_REQUEST_ELEMENTS['create']:
-            # Creation request
-            if IAuthnetProfileCreate.providedBy(trans):
-                # Create a brand new customer profile
-                profile  = ET.SubElement(root, 'profile')
-                
-                if trans.customer_id is not None:
-                    ET.SubElement(profile, 'merchantCustomerId').text = trans.customer_id
-                if trans.description is not None:
-                    ET.SubElement(profile, 'description').text = trans.description
-                if trans.email is not None:
-                    ET.SubElement(profile, 'email').text = trans.email
-                
-                # Do we have a billing object schema?
-                if trans.billing is not None:
-                    billing_list = trans.billing
-                    
-                    # We can have multiple ones...
-                    for billing in billing_list:
-                        billing_profile = ET.SubElement(profile, 'paymentProfiles')
-                        if billing.entity_type is not None:
-                            ET.SubElement(billing_profile, 'customerType').text = billing.entity_type
-                        # Since a default is specified in the schema, entity type will exist
-                        if len(billing.__dict__) > 1:
-                            self._prototype_address(billing_profile, billing, 'billTo')
-                         
-                        if billing.payment is not None:
-                            payment_profile = ET.SubElement(billing_profile, 'payment')
-                            payment = billing.payment
-                            
-                            if ICreditCard.providedBy(payment):
-                                # Credit card payment type
-                                creditcard = ET.SubElement(payment_profile, 'creditCard')
-                                ET.SubElement(creditcard, 'cardNumber').text     = payment.number
-                                ET.SubElement(creditcard, 'expirationDate').text = payment.expiration.strftime('%Y-%m')
-                                if payment.ccv is not None:
-                                    ET.SubElement(creditcard, 'cardCode').text   = payment.ccv
-                            elif IBank.providedBy(payment):
-                                # Bank account payment type
-                                bank = ET.SubElement(payment_profile, 'bankAccount')
-                                
-                                if payment.account_type is not None:
-                                    ET.SubElement(bank, 'accountType').text = payment.account_type
-                                
-                                ET.SubElement(bank, 'routingNumber').text = payment.routing_number
-                                ET.SubElement(bank, 'accountNumber').text = payment.account_number
-                                ET.SubElement(bank, 'nameOnAccount').text = payment.name_on_account
-                                
-                                if payment.echeck_type is not None:
-                                    ET.SubElement(bank, 'echeckType').text = payment.echeck_type
-                                if payment.name is not None:
-                                    ET.SubElement(bank, 'bankName').text = payment.name
-                            else:
-                                raise CIMException('%s is not a supported payment type' % payment.__name__)
-                
-                if trans.validation is not None:
-                    ET.SubElement(root, 'validationMode').text = trans.validation
-                    
-                if trans.shipping is not None:
-                    shipping_list = trans.shipping
-                    
-                    # We can have multiple ones...
-                    for shipping in shipping_list:
-                        self._prototype_address(profile, shipping, 'shipToList')
-                
-            elif IAuthnetProfileCreateBilling.providedBy(trans):
-                # Add a new billing profile to a customer profile
-                ET.SubElement(root, 'customerProfileId').text = str(trans.id)
-                
-                payment_profile = ET.SubElement(root, 'paymentProfile')
-                
-                ET.SubElement(payment_profile, 'customerType').text = trans.billing.entity_type
-                
-                if trans.billing is not None:
-                    self._prototype_address(payment_profile, trans.billing, 'billTo')
-                payment = trans.payment
-                
-                if ICreditCard.providedBy(payment):
-                    # Credit card payment type
-                    pymnt      = ET.SubElement(payment_profile, 'payment')
-                    creditcard = ET.SubElement(pymnt, 'creditCard')
-                    ET.SubElement(creditcard, 'cardNumber').text     = payment.number
-                    ET.SubElement(creditcard, 'expirationDate').text = payment.expiration.strftime('%Y-%m')
-                    if payment.ccv is not None:
-                        ET.SubElement(creditcard, 'cardCode').text   = payment.ccv
-                elif IBank.providedBy(payment):
-                    # Bank account payment type
-                    bank = ET.SubElement(payment_profile, 'bankAccount')
-                    
-                    if payment.account_type is not None:
-                        ET.SubElement(bank, 'accountType').text = payment.account_type
-                    
-                    ET.SubElement(bank, 'routingNumber').text = payment.routing_number
-                    ET.SubElement(bank, 'accountNumber').text = payment.account_number
-                    ET.SubElement(bank, 'nameOnAccount').text = payment.name_on_account
-                    
-                    if payment.echeck_type is not None:
-                        ET.SubElement(bank, 'echeckType').text = payment.echeck_type
-                    if payment.name is not None:
-                        ET.SubElement(bank, 'bankName').text = payment.name
-                else:
-                    raise CIMException('%s is not a supported payment type' % payment.__name__)
-            elif IAuthnetProfileCreateTransaction.providedBy(trans):
-                # Let's create a transaction!
-                type     = trans.transaction.type
-                transact = ET.SubElement(root, 'transaction')
-                
-                if type == 'AUTH_ONLY':
-                    self._prototype_transaction(root, transact, trans, 'profileTransAuthOnly')
-                elif type == 'AUTH_CAPTURE':
-                    self._prototype_transaction(root, transact, trans, 'profileTransAuthCapture')
-                elif type == 'CAPTURE_ONLY':
-                    self._prototype_transaction(root, transact, trans, 'profileTransCaptureOnly')
-                elif type == 'CREDIT':
-                    self._prototype_transaction(root, transact, trans, 'profileTransRefund')
-                elif type == 'PRIOR_AUTH_CAPTURE':
-                    self._prototype_transaction(root, transact, trans, 'profileTransPriorAuthCapture')
-                elif type == 'VOID':
-                    self._prototype_transaction(root, transact, trans, 'profileTransVoid')
-                
-            elif IAuthnetProfileCreateShipping.providedBy(trans):
-                # Add a new shipping profile to a customer profile
-                ET.SubElement(root, 'customerProfileId').text = str(trans.id)
-                self._prototype_address(root, trans.shipping, 'address')
-        elif operation in CIM_REQUEST_ELEMENTS['update']:
-            # Update profile
-            if IAuthnetProfileUpdate.providedBy(trans):
-                profile = ET.SubElement(root, 'profile')
-                
-                if trans.customer_id is not None:
-                    ET.SubElement(profile, 'merchantCustomerId').text = trans.customer_id
-                if trans.description is not None:
-                    ET.SubElement(profile, 'description').text = trans.description
-                if trans.email is not None:
-                    ET.SubElement(profile, 'email').text = trans.email
-                
-                ET.SubElement(profile, 'customerProfileId').text = str(trans.id)
+        # We can have multiple billing profiles...
+        for billing in trans.billing or ():
+            billing_profile = ET.SubElement(profile, 'paymentProfiles')
             
-            # Update billing profile
-            elif IAuthnetProfileUpdateBilling.providedBy(trans):
-                ET.SubElement(root, 'customerProfileId').text = str(trans.id)
-                
-                payment_profile = ET.SubElement(root, 'paymentProfile')
-                
-                ET.SubElement(payment_profile, 'customerType').text = trans.billing.entity_type
-                
-                if trans.billing is not None:
-                    self._prototype_address(payment_profile, trans.billing, 'billTo')
-                
-                payment = trans.payment
-                
-                if ICreditCard.providedBy(payment):
-                    # Credit card payment type
-                    pymnt      = ET.SubElement(payment_profile, 'payment')
-                    creditcard = ET.SubElement(pymnt, 'creditCard')
-                    ET.SubElement(creditcard, 'cardNumber').text     = payment.number
-                    ET.SubElement(creditcard, 'expirationDate').text = payment.expiration.strftime('%Y-%m')
-                    if payment.ccv is not None:
-                        ET.SubElement(creditcard, 'cardCode').text   = payment.ccv
-                elif IBank.providedBy(payment):
-                    # Bank account payment type
-                    bank = ET.SubElement(payment_profile, 'bankAccount')
-                    
-                    if payment.account_type is not None:
-                        ET.SubElement(bank, 'accountType').text = payment.account_type
-                    
-                    ET.SubElement(bank, 'routingNumber').text = payment.routing_number
-                    ET.SubElement(bank, 'accountNumber').text = payment.account_number
-                    ET.SubElement(bank, 'nameOnAccount').text = payment.name_on_account
-                    
-                    if payment.echeck_type is not None:
-                        ET.SubElement(bank, 'echeckType').text = payment.echeck_type
-                    if payment.name is not None:
-                        ET.SubElement(bank, 'bankName').text = payment.name
-                
-                ET.SubElement(payment_profile, 'customerPaymentProfileId').text = str(trans.billing_id)
-                
-                if trans.validation is not None:
-                    ET.SubElement(root, 'validationMode').text = trans.validation
+            if billing.entity_type is not None:
+                ET.SubElement(billing_profile, 'customerType').text = billing.entity_type
             
-            # Update shipping profile
-            elif IAuthnetProfileUpdateShipping.providedBy(trans):
-                ET.SubElement(root, 'customerProfileId').text = str(trans.id)
-                address = self._prototype_address(root, trans.shipping, 'address')
-                
-                ET.SubElement(address, 'customerAddressId').text = str(trans.shipping_id)
+            # Only send a billing address if any of its fields are set
+            if [x for x in ADDRESS_FIELDS if getattr(billing, x[1]) is not None]:
+                self._prototype_address(billing_profile, billing, 'billTo')
             
-            # Update split tender
-            elif IAuthnetProfileUpdateSplitTender.providedBy(trans):
-                ET.SubElement(root, 'splitTenderId').text     = str(trans.split_tender_id)
-                ET.SubElement(root, 'splitTenderStatus').text = trans.split_tender_status
-                
-        elif (operation in CIM_REQUEST_ELEMENTS['retrieve']) or (operation in CIM_REQUEST_ELEMENTS['delete']):
-            # Retrieval or deletion request
-            if operation != 'getCustomerProfileIdsRequest':
-                # Get all ID's doesn't need any other elements appended, the others do...
-                if IAuthnetProfileRetrieve.providedBy(trans):
-                    ET.SubElement(root, 'customerProfileId').text = str(trans.id)
-                elif IAuthnetProfileRetrieveBilling.providedBy(trans):
-                    ET.SubElement(root, 'customerProfileId').text = str(trans.id)
-                    ET.SubElement(root, 'customerPaymentProfileId').text = str(trans.billing_id)
-                elif IAuthnetProfileRetrieveShipping.providedBy(trans):
-                    ET.SubElement(root, 'customerProfileId').text = str(trans.id)
-                    ET.SubElement(root, 'customerAddressId').text = str(trans.shipping_id)
-                elif IAuthnetProfileDelete.providedBy(trans):
-                    ET.SubElement(root, 'customerProfileId').text = str(trans.id)
-                elif IAuthnetProfileDeleteBilling.providedBy(trans):
-                    ET.SubElement(root, 'customerProfileId').text        = str(trans.id)
-                    ET.SubElement(root, 'customerPaymentProfileId').text = str(trans.billing_id)
-                elif IAuthnetProfileDeleteShipping.providedBy(trans):
-                    ET.SubElement(root, 'customerProfileId').text = str(trans.id)
-                    ET.SubElement(root, 'customerAddressId').text = str(trans.shipping_id)
-        
-        elif operation == 'validateCustomerPaymentProfileRequest':
-            ET.SubElement(root, 'customerProfileId').text        = str(trans.id)
-            ET.SubElement(root, 'customerPaymentProfileId').text = str(trans.billing_id)
+            payment = billing.payment
             
-            if trans.shipping_id is not None:
-                ET.SubElement(root, 'customerShippingAddressId').text = str(tras.shipping_id)
-            if trans.validation is not None:
-                ET.SubElement(root, 'validationMode').text = trans.validation
+            if payment is not None:
+                self._prototype_payment(ET.SubElement(billing_profile, 'payment'), payment)
+        
+        if trans.validation is not None:
+            ET.SubElement(root, 'validationMode').text = trans.validation
+        
+        # ...and multiple shipping profiles
+        for shipping in trans.shipping or ():
+            self._prototype_address(profile, shipping, 'shipToList')
     
-        return ET.tostring(root, encoding='UTF-8')
+    def _create_billing(self, root, trans):
+        """Add a new billing profile to a customer profile."""
+        
+        self._prototype_payment_profile(root, trans)
+    
+    def _create_shipping(self, root, trans):
+        """Add a new shipping profile to a customer profile."""
+        
+        ET.SubElement(root, 'customerProfileId').text = str(trans.id)
+        self._prototype_address(root, trans.shipping, 'address')
+    
+    def _create_transaction(self, root, trans):
+        """Let's create a transaction!"""
+        
+        transact = ET.SubElement(root, 'transaction')
+        tag      = TRANSACTION_ELEMENTS.get(trans.transaction.type)
+        
+        if tag is not None:
+            self._prototype_transaction(root, transact, trans, tag)
+    
+    def _update_profile(self, root, trans):
+        """Update a customer profile."""
+        
+        profile = ET.SubElement(root, 'profile')
+        
+        append_fields(profile, trans, PROFILE_FIELDS)
+        
+        ET.SubElement(profile, 'customerProfileId').text = str(trans.id)
+    
+    def _update_billing(self, root, trans):
+        """Update a billing profile."""
+        
+        payment_profile = self._prototype_payment_profile(root, trans)
+        
+        ET.SubElement(payment_profile, 'customerPaymentProfileId').text = str(trans.billing_id)
+        
+        if trans.validation is not None:
+            ET.SubElement(root, 'validationMode').text = trans.validation
+    
+    def _update_shipping(self, root, trans):
+        """Update a shipping profile."""
+        
+        ET.SubElement(root, 'customerProfileId').text = str(trans.id)
+        address = self._prototype_address(root, trans.shipping, 'address')
         
+        ET.SubElement(address, 'customerAddressId').text = str(trans.shipping_id)
+    
+    def _update_split_tender(self, root, trans):
+        """Update a split tender group."""
+        
+        ET.SubElement(root, 'splitTenderId').text     = str(trans.split_tender_id)
+        ET.SubElement(root, 'splitTenderStatus').text = trans.split_tender_status
+    
+    def _profile_id(self, root, trans):
+        """Retrieve or delete a customer profile."""
+        
+        ET.SubElement(root, 'customerProfileId').text = str(trans.id)
+    
+    def _billing_id(self, root, trans):
+        """Retrieve or delete a billing profile."""
+        
+        ET.SubElement(root, 'customerProfileId').text        = str(trans.id)
+        ET.SubElement(root, 'customerPaymentProfileId').text = str(trans.billing_id)
+    
+    def _shipping_id(self, root, trans):
+        """Retrieve or delete a shipping profile."""
+        
+        ET.SubElement(root, 'customerProfileId').text = str(trans.id)
+        ET.SubElement(root, 'customerAddressId').text = str(trans.shipping_id)
+    
+    def _validate(self, root, trans):
+        """Validate a billing profile."""
+        
+        self._billing_id(root, trans)
+        
+        if trans.shipping_id is not None:
+            ET.SubElement(root, 'customerShippingAddressId').text = str(trans.shipping_id)
+        if trans.validation is not None:
+            ET.SubElement(root, 'validationMode').text = trans.validation
+    
+    def _to_xml(self, schema):
+        """Map a schema object to a valid authnet CIM request XML document."""
+        
+        trans     = schema.profile
+        operation = find_operation(CIM_BUILDERS, _builders, trans)
+        
+        if operation is None:
+            raise SerializeException('the subscription object provided is not supported')
+        
+        interface, element, builder = operation
+        
+        # Copy the document root and merchant authentication
+        root = request_root(element, schema.authentication)
+        
+        # Set the reference ID
+        ref_id = getattr(trans, 'ref_id', None)
+        
+        if ref_id is not None:
+            ET.SubElement(root, 'refId').text = ref_id
+        
+        # Get all ID's doesn't need any other elements appended, the others do...
+        if builder is not None:
+            getattr(self, builder)(root, trans)
+        
+        return ET.tostring(root, encoding='UTF-8')
+    
     def __str__(self):
         """Return the serialized schema."""
         
@@ -0,0 +1,79 @@
+"""Authorize.net XML Request Building
+
+Helpers shared by the ARB and CIM serializers: request documents are
+copied from a skeleton built once per operation, operations are looked
+up once per schema class and repetitive elements are filled in from
+field tables.
+
+"""
+
+import copy
+
+from lxml import etree as ET
+
+ANET_XMLNS = 'AnetApi/xml/v1/schema/AnetApiSchema.xsd'
+
+_skeletons = {}
+
+def request_root(operation, authentication):
+    """Return a new request document with the merchant authentication filled in."""
+    
+    skeleton = _skeletons.get(operation)
+    
+    if skeleton is None:
+        skeleton = ET.Element(operation, xmlns=ANET_XMLNS)
+        merchant = ET.SubElement(skeleton, 'merchantAuthentication')
+        
+        ET.SubElement(merchant, 'name')
+        ET.SubElement(merchant, 'transactionKey')
+        
+        _skeletons[operation] = skeleton
+    
+    root     = copy.deepcopy(skeleton)
+    merchant = root[0]
+    
+    merchant[0].text = authentication.login
+    merchant[1].text = authentication.key
+    
+    return root
+
+def find_operation(table, cache, schema):
+    """Return the first table row whose interface the schema provides, or None.
+    
+    Interfaces are declared on the schema classes, so the lookup is
+    memoised per class and a request costs a single dictionary lookup.
+    
+    """
+    
+    cls = type(schema)
+    
+    try:
+        return cache[cls]
+    except KeyError:
+        pass
+    
+    for row in table:
+        if row[0].providedBy(schema):
+            break
+    else:
+        row = None
+    
+    cache[cls] = row
+    
+    return row
+
+def append_fields(parent, schema, fields, truthy=False):
+    """Append an element for each (tag, attribute) pair the schema has a value for.
+    
+    Values are sent unless they are None, or only when they are truthy
+    if ``truthy`` is set.
+    
+    """
+    
+    for tag, attribute in fields:
+        value = getattr(schema, attribute)
+        
+        if value is None or (truthy and not value):
+            continue
+        
+        ET.SubElement(parent, tag).text = value
@@ -6,46 +6,101 @@ recurring payment gateway API's.
 """
 
 from paypy.exceptions.subscription import SubscriptionException
-
-ADAPTERS = ('authnet')
+from paypy.client                  import Client
+from paypy.registry                import adapter_factory, instantiate
 
 class Subscription(object):
     """Instantiate with a given configuration."""
     
-    def __init__(self, configuration, adapter='authnet'):
+    def __init__(self, configuration, adapter='authnet', endpoint=None, retry=None, transport=None, instrument=None, metrics=None):
         
-        # A adapter must be specified
-        if not adapter:
-            raise SubscriptionException('You must specify a gateway adapter')
+        # Instantiate the driver with options, sending the requests
+        # somewhere else (e.g. a simulator) if an endpoint is given
+        factory      = adapter_factory('subscription', adapter, SubscriptionException)
+        self.adapter = instantiate(factory, configuration, endpoint=endpoint, retry=retry, transport=transport, instrument=instrument, metrics=metrics)
+    
+    def create(self, deadline=None):
+        """Submit a subscription with the configured driver and options."""
         
-        adapter = adapter.lower()
+        return self.adapter.create(deadline=deadline)
+    
+    def update(self, deadline=None):
+        """Update a given subscription with the configured driver and options."""
         
-        # Is the driver allowed?
-        if adapter not in ADAPTERS:
-            raise SubscriptionException('The configured adapter is not supported')
+        return self.adapter.update(deadline=deadline)
+    
+    def status(self, deadline=None):
+        """Retrieve the status of a subscription."""
         
-        # Lazy load
-        adapter_module = __import__('paypy.adapters.%s' % adapter, fromlist=['paypy.adapters'])
+        return self.adapter.status(deadline=deadline)
+    
+    def cancel(self, deadline=None):
+        """Cancel a given subscription."""
         
-        # Instantiate the driver with options
-        self.adapter   = adapter_module.RecurringTransaction(configuration)
+        return self.adapter.cancel(deadline=deadline)
     
-    def create(self):
-        """Submit a subscription with the configured driver and options."""
+    def create_async(self, deadline=None):
+        """Submit a subscription without blocking, return an AsyncResult."""
         
-        return self.adapter.create()
+        return self.adapter.create_async(deadline=deadline)
     
-    def update(self):
-        """Update a given subscription with the configured driver and options."""
+    def update_async(self, deadline=None):
+        """Update a given subscription without blocking, return an AsyncResult."""
         
-        return self.adapter.update()
+        return self.adapter.update_async(deadline=deadline)
     
-    def status(self):
+    def status_async(self, deadline=None):
+        """Retrieve the status of a subscription without blocking, return an AsyncResult."""
+        
+        return self.adapter.status_async(deadline=deadline)
+    
+    def cancel_async(self, deadline=None):
+        """Cancel a given subscription without blocking, return an AsyncResult."""
+        
+        return self.adapter.cancel_async(deadline=deadline)
+
+class SubscriptionClient(Client):
+    """Manage many subscriptions through one gateway with the credentials bound once."""
+    
+    api       = 'subscription'
+    exception = SubscriptionException
+    
+    def create(self, request, deadline=None):
+        """Submit a subscription."""
+        
+        return self.adapter.create(self.schema(request), deadline=deadline)
+    
+    def update(self, request, deadline=None):
+        """Update a given subscription."""
+        
+        return self.adapter.update(self.schema(request), deadline=deadline)
+    
+    def status(self, request, deadline=None):
         """Retrieve the status of a subscription."""
         
-        return self.adapter.status()
+        return self.adapter.status(self.schema(request), deadline=deadline)
     
-    def cancel(self):
+    def cancel(self, request, deadline=None):
         """Cancel a given subscription."""
         
-        return self.adapter.cancel()
+        return self.adapter.cancel(self.schema(request), deadline=deadline)
+    
+    def create_async(self, request, deadline=None):
+        """Submit a subscription without blocking, return an AsyncResult."""
+        
+        return self.adapter.create_async(self.schema(request), deadline=deadline)
+    
+    def update_async(self, request, deadline=None):
+        """Update a given subscription without blocking, return an AsyncResult."""
+        
+        return self.adapter.update_async(self.schema(request), deadline=deadline)
+    
+    def status_async(self, request, deadline=None):
+        """Retrieve the status of a subscription without blocking, return an AsyncResult."""
+        
+        return self.adapter.status_async(self.schema(request), deadline=deadline)
+    
+    def cancel_async(self, request, deadline=None):
+        """Cancel a given subscription without blocking, return an AsyncResult."""
+        
+        return self.adapter.cancel_async(self.schema(request), deadline=deadline)
@@ -0,0 +1,174 @@
+import datetime
+import socket
+import threading
+import time
+import BaseHTTPServer
+import SocketServer
+
+from unittest                            import TestCase, SkipTest
+from paypy.adapters.authnet.aim          import Transaction
+from paypy.adapters.authnet.asynchronous import Reactor, reactor
+from paypy.exceptions.authnet            import ConnectionException
+from paypy.schemas.payment               import SCreditCard
+from paypy.schemas.authnet               import SAuthnetTransaction, SMerchantAuthentication
+from paypy.schemas.authnet.aim           import SAim
+
+DIRECT_RESPONSE = '|'.join(['1', '1', '1', 'This transaction has been approved.', 'AB12CD', 'Y', '2149186775', '423', '', '10.00', 'CC', 'auth_capture', '23'] + [''] * 32)
+
+class SlowHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answer every request with an approved AIM response after a short delay."""
+    
+    protocol_version = 'HTTP/1.1'
+    received         = []
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        
+        self.received.append(body)
+        time.sleep(0.2)
+        
+        # Hang up without answering
+        if body == 'drop':
+            self.close_connection = 1
+            return
+        
+        if body == 'chunked':
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write('4\r\nchun\r\n3\r\nked\r\n0\r\n\r\n')
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(DIRECT_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(DIRECT_RESPONSE)
+    
+    def log_message(self, *args):
+        pass
+
+class ThreadedServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class ThreadedServer6(ThreadedServer):
+    address_family = socket.AF_INET6
+
+class TestAsynchronous(TestCase):
+    """Test the non-blocking transport against a local server."""
+    
+    def setUp(self):
+        SlowHandler.received = []
+        
+        self.server = ThreadedServer(('127.0.0.1', 0), SlowHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        
+        self.endpoint = ('http', '127.0.0.1:%d' % self.server.server_port, '/')
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def test_concurrent(self):
+        """Requests are in flight at the same time on a single thread."""
+        
+        loop    = Reactor()
+        started = time.time()
+        results = [loop.request(self.endpoint, 'charge %d' % x) for x in range(20)]
+        bodies  = loop.run(*results)
+        elapsed = time.time() - started
+        
+        assert bodies == [DIRECT_RESPONSE] * 20
+        assert elapsed < 2.0, 'Expected the requests to overlap, took %.2fs' % elapsed
+        
+        # The connections are kept alive for the next batch
+        assert loop.map, 'Expected idle keep-alive connections'
+        
+        loop.close()
+    
+    def test_chunked(self):
+        """Chunked response bodies are decoded."""
+        
+        loop = Reactor()
+        
+        assert loop.request(self.endpoint, 'chunked').result() == 'chunked'
+        
+        loop.close()
+    
+    def test_connection_refused(self):
+        """A failed connection completes the result with a connection exception."""
+        
+        loop     = Reactor()
+        listener = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), SlowHandler)
+        port     = listener.server_port
+        listener.server_close()
+        
+        result = loop.request(('http', '127.0.0.1:%d' % port, '/'), 'charge')
+        
+        self.assertRaises(ConnectionException, result.result)
+        
+        assert loop.map == {}, 'Expected the failed connection closed, got %r' % loop.map
+    
+    def test_no_resend(self):
+        """A request written to a reused connection is failed, not sent again, when the connection closes."""
+        
+        loop = Reactor()
+        
+        loop.request(self.endpoint, 'charge').result()
+        
+        self.assertRaises(ConnectionException, loop.request(self.endpoint, 'drop').result)
+        
+        assert SlowHandler.received == ['charge', 'drop']
+        
+        loop.close()
+    
+    def test_ipv6(self):
+        """Hosts are resolved to whichever address family they have."""
+        
+        try:
+            server = ThreadedServer6(('::1', 0), SlowHandler)
+        except socket.error:
+            raise SkipTest('IPv6 is not available')
+        
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        
+        loop = Reactor()
+        
+        try:
+            assert loop.request(('http', '[::1]:%d' % server.server_port, '/'), 'charge').result() == DIRECT_RESPONSE
+        finally:
+            loop.close()
+            server.shutdown()
+            server.server_close()
+    
+    def test_transaction(self):
+        """The AIM adapter parses the asynchronous response into a result object."""
+        
+        cc            = SCreditCard()
+        cc.number     = u'4111111111111111'
+        cc.expiration = datetime.datetime.strptime('2014-04-01', '%Y-%m-%d')
+        
+        trans         = SAuthnetTransaction()
+        trans.testing = True
+        trans.amount  = u'10.00'
+        trans.payment = cc
+        
+        auth       = SMerchantAuthentication()
+        auth.key   = u'auth_key'
+        auth.login = u'auth_login'
+        
+        aim                = SAim()
+        aim.transaction    = trans
+        aim.authentication = auth
+        
+        adapter = Transaction(aim, endpoint=self.endpoint)
+        
+        result = adapter.process_async().result()
+        
+        assert result.code == 1
+        assert result.transaction_id == '2149186775'
+        
+        reactor.close()
@@ -0,0 +1,169 @@
+import datetime
+import threading
+import time
+import BaseHTTPServer
+import SocketServer
+
+from unittest                          import TestCase
+from paypy.payment                     import Payment
+from paypy.batch                       import RateLimiter
+from paypy.adapters.authnet            import aim
+from paypy.adapters.authnet.connection import pool
+from paypy.schemas.payment             import SCreditCard
+from paypy.schemas.authnet             import SAuthnetTransaction, SMerchantAuthentication
+from paypy.schemas.authnet.aim         import SAim
+
+class GatewayHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Approve every charge, echoing the invoice number back after a delay.
+    
+    Invoice numbers starting with "slow" take longer than the rest and
+    "throttle" is answered with HTTP 503.
+    
+    """
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def do_POST(self):
+        body    = self.rfile.read(int(self.headers['Content-Length']))
+        fields  = dict([x.split('=', 1) for x in body.split('&') if '=' in x])
+        invoice = fields.get('x_invoice_num', '')
+        
+        time.sleep(0.3 if invoice.startswith('slow') else 0.05)
+        
+        if invoice == 'throttle':
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        
+        response = '|'.join(['1', '1', '1', 'This transaction has been approved.', 'AB12CD', 'Y', '2149186775', invoice] + [''] * 37)
+        
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+    
+    def log_message(self, *args):
+        pass
+
+class ThreadedServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+def charge(invoice):
+    """Build an AIM schema for a test charge."""
+    
+    cc            = SCreditCard()
+    cc.number     = u'4111111111111111'
+    cc.expiration = datetime.datetime.strptime('2014-04-01', '%Y-%m-%d')
+    
+    trans         = SAuthnetTransaction()
+    trans.testing = True
+    trans.amount  = u'10.00'
+    trans.payment = cc
+    trans.invoice = invoice
+    
+    auth       = SMerchantAuthentication()
+    auth.key   = u'auth_key'
+    auth.login = u'auth_login'
+    
+    schema                = SAim()
+    schema.transaction    = trans
+    schema.authentication = auth
+    
+    return schema
+
+class TestBatch(TestCase):
+    """Test the bulk charge engine against a local gateway."""
+    
+    def setUp(self):
+        self.server = ThreadedServer(('127.0.0.1', 0), GatewayHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        
+        self.endpoint         = aim.ENDPOINT_AIM_TEST
+        aim.ENDPOINT_AIM_TEST = ('http', '127.0.0.1:%d' % self.server.server_port, '/')
+    
+    def tearDown(self):
+        aim.ENDPOINT_AIM_TEST = self.endpoint
+        pool.clear()
+        
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def test_ordered(self):
+        """Results come back in submission order."""
+        
+        invoices = [u'slow1', u'2', u'3', u'slow4', u'5']
+        results  = list(Payment.process_many([charge(x) for x in invoices], concurrency=3))
+        
+        assert [x.index for x in results] == range(5)
+        assert [x.result.invoice_id for x in results] == invoices
+    
+    def test_unordered(self):
+        """Results come back as they complete."""
+        
+        invoices = [u'slow1', u'2', u'3']
+        results  = list(Payment.process_many([charge(x) for x in invoices], concurrency=3, ordered=False))
+        
+        assert results[-1].result.invoice_id == 'slow1', 'Expected the slow charge last, got %r' % results
+    
+    def test_window(self):
+        """Only a bounded window of schemas is pulled from the iterable."""
+        
+        pulled = []
+        
+        def schemas():
+            for x in range(20):
+                pulled.append(x)
+                yield charge(unicode(x))
+        
+        for outcome in Payment.process_many(schemas(), concurrency=2, window=4):
+            assert len(pulled) - outcome.index <= 4, 'Pulled %d schemas ahead of %d' % (len(pulled), outcome.index)
+        
+        assert len(pulled) == 20
+    
+    def test_rate(self):
+        """The global rate limit spaces out requests."""
+        
+        started = time.time()
+        results = list(Payment.process_many([charge(unicode(x)) for x in range(6)], concurrency=6, rate=10))
+        
+        assert time.time() - started >= 0.5
+        assert len([x for x in results if x.ok()]) == 6
+    
+    def test_errors(self):
+        """Failures are reported on the result instead of stopping the batch."""
+        
+        results = list(Payment.process_many([charge(u'throttle'), charge(u'2')], concurrency=1, timeout=5))
+        
+        assert not results[0].ok()
+        assert results[0].error.status == 503
+        assert results[1].ok()
+    
+    def test_throttle_delay(self):
+        """A throttled request holds the workers back for throttle_delay seconds."""
+        
+        started = time.time()
+        results = list(Payment.process_many([charge(u'throttle'), charge(u'2')], concurrency=1, throttle_delay=0.3))
+        
+        assert time.time() - started >= 0.3
+        assert [x.ok() for x in results] == [False, True]
+
+class TestRateLimiter(TestCase):
+    """Test the pacing on an injected clock."""
+    
+    def test_pacing(self):
+        """Requests are spaced 1 / rate seconds apart and a backoff holds them all back."""
+        
+        now    = [100.0]
+        sleeps = []
+        
+        limiter = RateLimiter(rate=10, clock=lambda: now[0], sleep=sleeps.append)
+        
+        limiter.wait()
+        limiter.wait()
+        limiter.backoff(2.0)
+        limiter.wait()
+        
+        assert [round(x, 3) for x in sleeps] == [0.1, 2.0]
@@ -0,0 +1,136 @@
+import pickle
+import sys
+
+from unittest                          import TestCase
+from benchmarks                        import harness, load, memory
+from benchmarks.histogram              import Histogram
+from paypy.adapters.authnet.connection import pool
+from paypy.adapters.authnet.simulator  import Simulator, constant
+
+class TestHarness(TestCase):
+    """Test the benchmark harness."""
+    
+    def test_measure(self):
+        """Loops are calibrated and timed functions report their own timing."""
+        
+        result = harness.measure(lambda: None, repeat=3, min_time=0.01)
+        
+        assert result['loops'] > 1
+        assert result['best'] <= result['median']
+        
+        result = harness.measure(harness.timed(lambda: 2.0), repeat=3)
+        
+        assert result['best'] == 2.0 and result['loops'] == 1
+    
+    def test_run(self):
+        """Benchmarks are selected by pattern."""
+        
+        document = harness.run('parsing.transaction_result', repeat=1, min_time=0.01)
+        
+        assert document['results'].keys() == ['parsing.transaction_result']
+    
+    def test_compare(self):
+        """Changes beyond the threshold are flagged."""
+        
+        baseline = {'results' : {'a' : {'best' : 1.0}, 'b' : {'best' : 1.0}, 'c' : {'best' : 1.0}, 'd' : {'best' : 1.0}}}
+        current  = {'results' : {'a' : {'best' : 1.5}, 'b' : {'best' : 0.5}, 'c' : {'best' : 1.05}}}
+        
+        assert [(x[0], x[4]) for x in harness.compare(baseline, current)] == [('a', 'slower'), ('b', 'faster'), ('c', '')]
+
+class TestMemory(TestCase):
+    """Test the memory benchmark."""
+    
+    def test_deep_size(self):
+        """Shared objects are counted once and classes not at all."""
+        
+        value = u'x' * 100
+        
+        assert memory.deep_size([value, value]) == memory.deep_size([value]) + memory.deep_size([None, None]) - memory.deep_size([None])
+        assert memory.deep_size([Histogram, memory]) == sys.getsizeof([Histogram, memory])
+    
+    def test_compact(self):
+        """Compact schemas hold less than the reifiers."""
+        
+        sizes = memory.measure(10)
+        
+        assert sizes['compact'] < sizes['reifier'] / 2
+    
+    def test_operations(self):
+        """Results releasing their documents hold less than results retaining them."""
+        
+        operation = memory.replayed(dict(memory.OPERATIONS)['cim.retrieve_10'])
+        retained  = memory.retained(operation, 50)
+        
+        memory.XMLResult.retain = False
+        try:
+            released = memory.retained(operation, 50)
+        finally:
+            memory.XMLResult.retain = True
+        
+        assert 0 < released < retained / 2
+    
+    def test_allocated(self):
+        """An operation's peak allocation covers the document it parses."""
+        
+        small = memory.allocated(memory.replayed(dict(memory.OPERATIONS)['cim.retrieve_1']), 5)
+        large = memory.allocated(memory.replayed(dict(memory.OPERATIONS)['cim.retrieve_100']), 5)
+        
+        assert 0 < small < large
+
+class TestHistogram(TestCase):
+    """Test the latency histogram."""
+    
+    def test_percentiles(self):
+        """Percentiles are within the bucket precision."""
+        
+        histogram = Histogram()
+        
+        for value in range(1, 100001):
+            histogram.record(value)
+        
+        for percent, expected in ((50, 50000), (99, 99000), (99.9, 99900)):
+            assert abs(histogram.percentile(percent) - expected) <= expected / 128.0
+        
+        assert histogram.percentile(100) == 100000
+    
+    def test_merge(self):
+        """Histograms survive pickling and merge."""
+        
+        first, second = Histogram(), Histogram()
+        
+        first.record(10)
+        second.record(5000, 3)
+        
+        merged = pickle.loads(pickle.dumps(first)).merge(second)
+        
+        assert len(merged) == 4 and merged.min == 10 and merged.max == 5000
+        assert merged.percentile(25) == 10
+
+class TestLoad(TestCase):
+    """Test the open-loop load generator."""
+    
+    def test_plan(self):
+        """Schedules cover the duration at the target rate."""
+        
+        requests = load.plan(100, 2, [('charge', 3), ('profile', 1)], 'fixed', seed=1)
+        
+        assert len(requests) == 199
+        assert 100 < len([x for x in requests if x[1] == 'charge']) < 180
+    
+    def test_latency_includes_queueing(self):
+        """Latency is measured from the scheduled start, so a saturated pool shows up."""
+        
+        simulator = Simulator(latency=constant(0.05)).start()
+        endpoints = {'aim' : simulator.aim_endpoint, 'xml' : simulator.xml_endpoint}
+        
+        try:
+            report = load.run(100, 0.5, [('charge', 1)], endpoints, 'threads', 'fixed', concurrency=1)
+        finally:
+            pool.clear()
+            simulator.stop()
+        
+        stats = report['stats']['charge']
+        
+        assert len(stats.latency) == 49 and not stats.errors
+        assert stats.service.percentile(99) < 100000
+        assert stats.latency.percentile(99) > 1000000
@@ -0,0 +1,286 @@
+import os
+import shutil
+import tempfile
+
+from unittest                          import TestCase
+from paypy.cache                       import ProfileCache, SQLiteBackend
+from paypy.metrics                     import Metrics
+from paypy.profile                     import ProfileClient
+from paypy.adapters.authnet.connection import pool
+from paypy.adapters.authnet.simulator  import Simulator
+from paypy.exceptions.authnet          import GatewayStatusException
+from paypy.schemas.authnet.cim         import *
+from tests.test_simulator              import credentials, credit_card
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+class TestProfileCache(TestCase):
+    """Test the TTL and LRU bounds, invalidation and the shared backend."""
+    
+    def setUp(self):
+        self.clock = Clock()
+        self.tmp   = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+    
+    def test_ttl(self):
+        """Entries expire after ttl seconds."""
+        
+        cache = ProfileCache(ttl=10, clock=self.clock)
+        cache.set(('scope', 1, None, None), 'data')
+        
+        assert cache.get(('scope', 1, None, None)) == 'data'
+        
+        self.clock.now += 11
+        
+        assert cache.get(('scope', 1, None, None)) is None
+        assert cache.stats() == {'hits' : 1, 'misses' : 1, 'evictions' : 0, 'expirations' : 1, 'size' : 0}
+    
+    def test_lru(self):
+        """The least recently used entry is evicted first."""
+        
+        cache = ProfileCache(maxsize=2, clock=self.clock)
+        
+        for x in range(3):
+            cache.set(('scope', x, None, None), str(x))
+            cache.get(('scope', 0, None, None))
+        
+        assert cache.get(('scope', 0, None, None)) == '0'
+        assert cache.get(('scope', 1, None, None)) is None
+        assert cache.get(('scope', 2, None, None)) == '2'
+        assert cache.evictions == 1 and len(cache) == 2
+    
+    def test_invalidate(self):
+        """Invalidating a profile drops its payment profile and shipping address entries too."""
+        
+        cache = ProfileCache(clock=self.clock)
+        
+        for key in [('scope', 1, None, None), ('scope', 1, 3000, None), ('scope', 1, None, 2000), ('scope', 2, None, None), ('other', 1, None, None)]:
+            cache.set(key, 'data')
+        
+        cache.invalidate('scope', 1)
+        
+        assert sorted(cache._entries) == [('other', 1, None, None), ('scope', 2, None, None)]
+    
+    def test_backend(self):
+        """Caches sharing an SQLite backend see each other's entries and invalidations."""
+        
+        path = os.path.join(self.tmp, 'profiles.db')
+        one  = ProfileCache(clock=self.clock, backend=SQLiteBackend(path))
+        two  = ProfileCache(clock=self.clock, backend=SQLiteBackend(path))
+        key  = (u'scope', 1, 3000, None)
+        
+        one.set(key, '<xml/>')
+        
+        assert two.get(key) == '<xml/>'
+        
+        one.invalidate(u'scope', 1)
+        two.clear()
+        
+        assert two.get(key) is None
+    
+    def test_shared(self):
+        """With a backend nothing is kept locally, so another process's invalidation is seen at once."""
+        
+        path  = os.path.join(self.tmp, 'profiles.db')
+        one   = ProfileCache(clock=self.clock, backend=SQLiteBackend(path))
+        two   = ProfileCache(clock=self.clock, backend=SQLiteBackend(path))
+        local = ProfileCache(clock=self.clock, backend=SQLiteBackend(path), local=True)
+        key   = (u'scope', 1, None, None)
+        
+        one.set(key, '<xml/>')
+        
+        assert two.get(key) == '<xml/>' and local.get(key) == '<xml/>'
+        
+        one.invalidate(u'scope', 1)
+        
+        assert two.get(key) is None and len(two) == 0
+        assert local.get(key) == '<xml/>'
+    
+    def test_backend_keys(self):
+        """Backend rows are found whatever the string and integer types of the key's parts."""
+        
+        backend = SQLiteBackend(os.path.join(self.tmp, 'profiles.db'))
+        
+        backend.set((u'scope', 1L, 3000, None), 2000.0, '<xml/>', 1000.0)
+        
+        assert backend.get(('scope', 1, 3000L, None)) == (2000.0, '<xml/>')
+        assert backend.get(('scope', u'1', u'3000', None)) == (2000.0, '<xml/>')
+        assert backend.get(('scope', 1, None, 3000)) is None
+        
+        backend.invalidate('scope', 1L)
+        
+        assert backend.get((u'scope', 1, 3000, None)) is None
+    
+    def test_backend_bounds(self):
+        """Backend writes drop the expired rows and the oldest beyond maxsize."""
+        
+        backend = SQLiteBackend(os.path.join(self.tmp, 'profiles.db'), maxsize=2)
+        
+        for x in range(4):
+            backend.set(('scope', x, None, None), 1010.0 + x, str(x), 1000.0)
+        
+        assert [backend.get(('scope', x, None, None)) for x in range(4)] == [None, None, (1012.0, '2'), (1013.0, '3')]
+        
+        backend.set(('scope', 4, None, None), 1100.0, '4', 1012.5)
+        
+        assert [backend.get(('scope', x, None, None)) for x in range(2, 5)] == [None, (1013.0, '3'), (1100.0, '4')]
+    
+    def test_generation(self):
+        """A response read before its profile was invalidated isn't cached."""
+        
+        cache      = ProfileCache(clock=self.clock, backend=SQLiteBackend(os.path.join(self.tmp, 'profiles.db')))
+        key        = (u'scope', 1, None, None)
+        generation = cache.generation(u'scope', 1)
+        
+        cache.invalidate(u'scope', 1)
+        cache.set(key, '<old/>', generation)
+        
+        assert cache.get(key) is None
+        
+        cache.set(key, '<new/>', cache.generation(u'scope', 1))
+        
+        assert cache.get(key) == '<new/>'
+    
+    def test_generation_bounds(self):
+        """Generations are kept for at most maxsize profiles, a new epoch invalidating the rest."""
+        
+        cache      = ProfileCache(maxsize=2, clock=self.clock)
+        generation = cache.generation('scope', 1)
+        
+        cache.invalidate('scope', 2)
+        cache.invalidate('scope', 3)
+        
+        assert generation == cache.generation('scope', 1)
+        
+        cache.invalidate('scope', 4)
+        
+        assert generation != cache.generation('scope', 1) and len(cache._generations) == 1
+
+class TestCachedClient(TestCase):
+    """Test a profile client reading through a cache."""
+    
+    def setUp(self):
+        self.simulator = Simulator(seed=1).start()
+        self.cache     = ProfileCache()
+        self.client    = ProfileClient(credentials(), endpoint=self.simulator.xml_endpoint, cache=self.cache)
+        
+        bill         = SBillingList()
+        bill.payment = credit_card()
+        
+        profile             = SAuthnetProfileCreate()
+        profile.customer_id = u'24'
+        profile.email       = u'richard@example.com'
+        profile.billing     = [bill]
+        
+        created         = self.client.create(profile)
+        self.profile_id = int(str(created))
+        self.billing_id = int(created.payment_ids[0])
+    
+    def tearDown(self):
+        pool.clear()
+        self.simulator.stop()
+    
+    def retrieve(self):
+        request    = SAuthnetProfileRetrieve()
+        request.id = self.profile_id
+        
+        return self.client.retrieve(request).results
+    
+    def test_read_through(self):
+        """Repeated retrievals are answered from the cache."""
+        
+        assert self.retrieve()['customer']['email'] == u'richard@example.com'
+        
+        self.simulator.error_rate = 1.0
+        
+        assert self.retrieve()['customer']['email'] == u'richard@example.com'
+        assert (self.cache.hits, self.cache.misses) == (1, 1)
+        
+        self.assertRaises(GatewayStatusException, self.client.retrieve, SAuthnetProfileRetrieveAll())
+    
+    def test_write_invalidates(self):
+        """Updating or removing a profile through the client drops its cached retrievals."""
+        
+        request            = SAuthnetProfileRetrieveBilling()
+        request.id         = self.profile_id
+        request.billing_id = self.billing_id
+        
+        self.retrieve()
+        self.client.retrieve(request)
+        
+        update       = SAuthnetProfileUpdate()
+        update.id    = self.profile_id
+        update.email = u'branson@example.com'
+        
+        self.client.update(update)
+        
+        assert len(self.cache) == 0
+        assert self.retrieve()['customer']['email'] == u'branson@example.com'
+        
+        remove    = SAuthnetProfileDelete()
+        remove.id = self.profile_id
+        
+        self.client.remove(remove)
+        
+        assert len(self.cache) == 0
+    
+    def test_write_in_flight(self):
+        """A retrieval answered before an update but returning after it isn't cached."""
+        
+        simulator = self.simulator
+        respond   = simulator.respond
+        
+        update       = SAuthnetProfileUpdate()
+        update.id    = self.profile_id
+        update.email = u'branson@example.com'
+        
+        def racing(path, body):
+            answer = respond(path, body)
+            
+            if 'getCustomerProfileRequest' in body:
+                simulator.respond = respond
+                self.client.update(update)
+            
+            return answer
+        
+        simulator.respond = racing
+        
+        assert self.retrieve()['customer']['email'] == u'richard@example.com'
+        assert len(self.cache) == 0
+        assert self.retrieve()['customer']['email'] == u'branson@example.com'
+    
+    def test_async(self):
+        """Asynchronous retrievals read through the cache too."""
+        
+        request    = SAuthnetProfileRetrieve()
+        request.id = self.profile_id
+        
+        first  = self.client.retrieve_async(request).result()
+        second = self.client.retrieve_async(request).result()
+        
+        assert first.results == second.results
+        assert (self.cache.hits, self.cache.misses) == (1, 1)
+    
+    def test_metrics(self):
+        """Retrievals answered from the cache are counted under their own code."""
+        
+        metrics = Metrics()
+        client  = ProfileClient(credentials(), endpoint=self.simulator.xml_endpoint, cache=self.cache, metrics=metrics)
+        
+        request    = SAuthnetProfileRetrieve()
+        request.id = self.profile_id
+        
+        client.retrieve(request)
+        client.retrieve(request)
+        client.retrieve_async(request).result()
+        
+        counts = dict([(key[3], count) for key, count in metrics.counters().items() if key[:2] == ('requests', 'cim.retrieve')])
+        
+        assert counts == {'Ok' : 1, 'cached' : 2}
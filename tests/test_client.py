@@ -0,0 +1,130 @@
+import subprocess
+import sys
+import threading
+
+from unittest                          import TestCase
+from paypy.client                      import Client
+from paypy.payment                     import Payment, PaymentClient
+from paypy.registry                    import AdapterRegistry, ADAPTERS, registry
+from paypy.adapters.authnet            import aim
+from paypy.adapters.authnet.connection import pool
+from paypy.exceptions.payment          import PaymentException
+from paypy.schemas.authnet             import SMerchantAuthentication
+from tests.test_batch                  import GatewayHandler, ThreadedServer, charge
+
+class TestRegistry(TestCase):
+    """Test adapter resolution."""
+    
+    def test_resolve(self):
+        """Adapter classes are imported once and cached."""
+        
+        adapters = AdapterRegistry(ADAPTERS)
+        
+        assert adapters.resolve('payment', 'AuthNet') is aim.Transaction
+        assert adapters.resolve('payment', 'authnet') is adapters.resolve('payment', 'authnet')
+        assert adapters.gateways('payment') == ['authnet', 'google']
+    
+    def test_register(self):
+        """A registered adapter replaces any resolved one."""
+        
+        class Stub(object):
+            pass
+        
+        adapters = AdapterRegistry(ADAPTERS)
+        adapters.resolve('payment', 'authnet')
+        adapters.register('payment', 'authnet', Stub)
+        
+        assert adapters.resolve('payment', 'authnet') is Stub
+        assert registry.resolve('payment', 'authnet') is aim.Transaction
+    
+    def test_unsupported(self):
+        """Unknown gateways raise the facade's exception."""
+        
+        self.assertRaises(PaymentException, Payment, None, 'paypal')
+        self.assertRaises(PaymentException, Payment, None, None)
+        self.assertRaises(PaymentException, PaymentClient, None, 'paypal')
+    
+    def test_lazy(self):
+        """Resolving the AIM adapter leaves the XML adapters and lxml unimported."""
+        
+        script = ("import sys; from paypy.payment import PaymentClient; PaymentClient(None); "
+                  "import paypy.adapters.authnet as authnet; "
+                  "print sorted(x for x in ('lxml', 'paypy.adapters.authnet.arb', 'paypy.adapters.authnet.cim') if x in sys.modules), "
+                  "authnet.CustomerProfile.__name__")
+        
+        assert subprocess.check_output([sys.executable, '-c', script]).strip() == '[] CustomerProfile'
+
+class TestPaymentClient(TestCase):
+    """Test a client against a local gateway."""
+    
+    def setUp(self):
+        self.server = ThreadedServer(('127.0.0.1', 0), GatewayHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        
+        auth       = SMerchantAuthentication()
+        auth.key   = u'auth_key'
+        auth.login = u'auth_login'
+        
+        self.client = PaymentClient(auth, endpoint=('http', '127.0.0.1:%d' % self.server.server_port, '/'))
+    
+    def tearDown(self):
+        pool.clear()
+        
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def test_process(self):
+        """Transaction schemas are combined with the bound credentials."""
+        
+        result = self.client.process(charge(u'1').transaction)
+        
+        assert result.status == 'approved'
+        assert result.invoice_id == '1'
+    
+    def test_process_many(self):
+        """Batches run through the client's endpoint."""
+        
+        results = list(self.client.process_many([charge(unicode(x)).transaction for x in range(3)], concurrency=2))
+        
+        assert [x.result.invoice_id for x in results] == ['0', '1', '2']
+    
+    def test_threads(self):
+        """One client and its one adapter serve many threads at once."""
+        
+        adapter = self.client.adapter
+        schema  = self.client.schema(charge(u'7').transaction)
+        results = {}
+        
+        def work(index):
+            results[index] = (self.client.process(charge(unicode(index)).transaction).invoice_id, adapter.process(schema).invoice_id)
+        
+        threads = [threading.Thread(target=work, args=(x,)) for x in range(8)]
+        
+        for thread in threads:
+            thread.start()
+        
+        for thread in threads:
+            thread.join()
+        
+        assert results == dict([(x, (str(x), '7')) for x in range(8)])
+    
+    def test_shared(self):
+        """The client's adapter is created once and bound to no schema."""
+        
+        adapter = self.client.adapter
+        
+        self.client.process(charge(u'1').transaction)
+        self.client.process(charge(u'2').transaction)
+        
+        assert self.client.adapter is adapter and adapter.options is None
+        self.assertRaises(aim.AIMException, adapter.process)
+        self.assertRaises(aim.AIMException, adapter.process, charge(u'3').transaction)
+    
+    def test_endpoint(self):
+        """The testing flag pins the endpoint."""
+        
+        assert PaymentClient(None, testing=True).endpoint == aim.ENDPOINT_AIM_TEST
+        assert PaymentClient(None, testing=False).endpoint == aim.ENDPOINT_AIM_PRODUCTION
+        assert PaymentClient(None).endpoint is None
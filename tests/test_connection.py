@@ -0,0 +1,152 @@
+import threading
+import time
+import BaseHTTPServer
+
+from unittest                          import TestCase
+from paypy.adapters.authnet.connection import ConnectionPool
+from paypy.exceptions.authnet          import ConnectionException
+
+class EchoHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Echo the request body back over a keep-alive connection."""
+    
+    protocol_version = 'HTTP/1.1'
+    received         = []
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        
+        self.received.append(body)
+        
+        # Hang up without answering, or answer and then hang up
+        if body == 'drop':
+            self.close_connection = 1
+            return
+        
+        status = 500 if body == 'fail' else 200
+        
+        if body == 'close':
+            self.close_connection = 1
+        
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+class QuietServer(BaseHTTPServer.HTTPServer):
+    """Don't report the connections an abandoned stream resets."""
+    
+    def handle_error(self, request, client_address):
+        pass
+
+class TestConnectionPool(TestCase):
+    """Test the keep-alive connection pool against a local server."""
+    
+    def setUp(self):
+        EchoHandler.received = []
+        
+        self.server = QuietServer(('127.0.0.1', 0), EchoHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        
+        self.endpoint = ('http', '127.0.0.1:%d' % self.server.server_port, '/')
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def test_reuse(self):
+        """Connections are returned to the pool and reused."""
+        
+        pool = ConnectionPool(size=2)
+        
+        for x in range(5):
+            assert pool.request(self.endpoint, 'charge %d' % x) == 'charge %d' % x
+        
+        stats = pool.stats()
+        assert stats['misses'] == 1, 'Expected a single new connection, got %r' % stats
+        assert stats['hits'] == 4,   'Expected four pooled connections, got %r' % stats
+        assert stats['idle'] == 1
+        
+        pool.clear()
+        assert pool.stats()['idle'] == 0
+    
+    def test_max_requests(self):
+        """Connections are retired after serving max_requests requests."""
+        
+        pool = ConnectionPool(max_requests=2)
+        
+        for x in range(4):
+            pool.request(self.endpoint, 'charge')
+        
+        stats = pool.stats()
+        assert stats['misses'] == 2, 'Expected a new connection every two requests, got %r' % stats
+    
+    def test_idle_timeout(self):
+        """Connections idle longer than idle_timeout are discarded."""
+        
+        pool = ConnectionPool(idle_timeout=0)
+        
+        pool.request(self.endpoint, 'charge')
+        pool.request(self.endpoint, 'charge')
+        
+        stats = pool.stats()
+        assert stats['misses'] == 2
+        assert stats['discards'] == 1
+    
+    def test_http_error(self):
+        """A non-200 response raises a connection exception."""
+        
+        pool = ConnectionPool()
+        
+        self.assertRaises(ConnectionException, pool.request, self.endpoint, 'fail')
+    
+    def test_stream(self):
+        """Streamed bodies are read in chunks and the connection is reused afterwards."""
+        
+        pool = ConnectionPool()
+        
+        chunks = list(pool.stream(self.endpoint, 'a' * 100, chunk_size=30))
+        
+        assert [len(x) for x in chunks] == [30, 30, 30, 10]
+        assert pool.stats()['idle'] == 1
+        
+        # An abandoned stream closes its connection instead
+        stream = pool.stream(self.endpoint, 'a' * 100, chunk_size=30)
+        stream.next()
+        stream.close()
+        
+        assert pool.stats()['idle'] == 0
+        
+        pool.clear()
+    
+    def test_closed(self):
+        """Connections the server closed while idle are discarded on checkout, not written to."""
+        
+        pool = ConnectionPool()
+        
+        pool.request(self.endpoint, 'close')
+        
+        for x in range(50):
+            if not pool._idle.values()[0][0].alive():
+                break
+            time.sleep(0.01)
+        
+        assert pool.request(self.endpoint, 'charge') == 'charge'
+        
+        stats = pool.stats()
+        assert stats['misses'] == 2 and stats['discards'] == 1, 'Expected the closed connection discarded, got %r' % stats
+    
+    def test_no_resend(self):
+        """A request that reached the server is not sent again when its reused connection fails."""
+        
+        pool = ConnectionPool()
+        
+        pool.request(self.endpoint, 'charge')
+        
+        self.assertRaises(ConnectionException, pool.request, self.endpoint, 'drop')
+        
+        assert EchoHandler.received == ['charge', 'drop']
@@ -0,0 +1,133 @@
+import time
+
+from unittest                            import TestCase
+from paypy.payment                       import Payment, PaymentClient
+from paypy.profile                       import ProfileClient
+from paypy.adapters.authnet.asynchronous import reactor
+from paypy.adapters.authnet.connection   import pool, Deadline, deadline_for, CONNECT, READ
+from paypy.adapters.authnet.retry        import RetryPolicy
+from paypy.adapters.authnet.simulator    import Simulator, constant
+from paypy.exceptions.authnet            import ConnectionException, TimeoutException
+from paypy.schemas.authnet.cim           import SAuthnetProfileRetrieve
+from tests.test_batch                    import charge
+from tests.test_cache                    import Clock
+from tests.test_simulator                import credentials
+
+class TestDeadline(TestCase):
+    """Test the deadline's budget and phase timeouts."""
+    
+    def setUp(self):
+        self.clock = Clock()
+    
+    def test_timeouts(self):
+        """Phase timeouts are capped by the budget left."""
+        
+        deadline = Deadline(2.0, connect=0.5, read=1.5, clock=self.clock)
+        
+        assert deadline.timeout(CONNECT, 'gateway') == 0.5
+        assert deadline.timeout(READ, 'gateway') == 1.5
+        
+        self.clock.now += 1.0
+        
+        assert deadline.remaining() == 1.0
+        assert deadline.timeout(READ, 'gateway') == 1.0
+    
+    def test_exceeded(self):
+        """A spent budget raises a timeout naming the phase."""
+        
+        deadline = Deadline(1.0, clock=self.clock)
+        
+        self.clock.now += 1.5
+        
+        assert deadline.expired() and deadline.remaining() == 0.0
+        
+        try:
+            deadline.timeout(READ, 'gateway')
+        except TimeoutException, e:
+            assert e.phase == READ
+            assert str(e).startswith('read to gateway timed out')
+        else:
+            self.fail('no TimeoutException raised')
+    
+    def test_deadline_for(self):
+        """Seconds start a new deadline, a Deadline is shared as is."""
+        
+        deadline = Deadline(1.0)
+        
+        assert deadline_for(None) is None
+        assert deadline_for(deadline) is deadline
+        assert isinstance(deadline_for(0.5), Deadline)
+
+class TestGatewayDeadlines(TestCase):
+    """Test deadlines on requests to a slow simulated gateway."""
+    
+    def setUp(self):
+        self.simulator = Simulator(seed=5, latency=constant(0.3)).start()
+    
+    def tearDown(self):
+        pool.clear()
+        reactor.close()
+        self.simulator.stop()
+    
+    def assertTimeout(self, phase, call, *args, **kwargs):
+        start = time.time()
+        
+        try:
+            call(*args, **kwargs)
+        except TimeoutException, e:
+            assert e.phase == phase, e.phase
+        else:
+            self.fail('no TimeoutException raised')
+        
+        return time.time() - start
+    
+    def test_read(self):
+        """A response slower than the deadline times out reading."""
+        
+        payment = Payment(charge(u'42'), endpoint=self.simulator.aim_endpoint)
+        
+        assert self.assertTimeout(READ, payment.process, deadline=0.1) < 0.25
+        
+        # The timed out connection was dropped, the next request is fine
+        assert payment.process(deadline=1.0).status == 'approved'
+    
+    def test_connect(self):
+        """A deadline spent before the request starts times out connecting."""
+        
+        payment = Payment(charge(u'42'), endpoint=self.simulator.aim_endpoint)
+        
+        self.assertTimeout(CONNECT, payment.process, deadline=Deadline(0.0))
+    
+    def test_xml(self):
+        """Profile requests keep their deadline too."""
+        
+        client     = ProfileClient(credentials(), endpoint=self.simulator.xml_endpoint)
+        request    = SAuthnetProfileRetrieve()
+        request.id = 1000
+        
+        self.assertTimeout(READ, client.retrieve, request, deadline=0.1)
+    
+    def test_async(self):
+        """The reactor fails a request once its deadline passes."""
+        
+        payment = Payment(charge(u'42'), endpoint=self.simulator.aim_endpoint)
+        
+        assert self.assertTimeout(READ, payment.process_async(deadline=0.1).result) < 0.25
+    
+    def test_retries(self):
+        """Retries stop once their backoff would outlast the deadline."""
+        
+        self.simulator.latency    = constant(0.05)
+        self.simulator.error_rate = 1.0
+        
+        policy = RetryPolicy(attempts=20, base_delay=0.05, max_delay=0.05, threshold=100, random=lambda: 1.0)
+        client = PaymentClient(None, endpoint=self.simulator.aim_endpoint, retry=policy)
+        trans  = charge(u'42')
+        start  = time.time()
+        
+        trans.transaction.duplicate_window = 120
+        
+        self.assertRaises(ConnectionException, client.process, trans, deadline=0.5)
+        
+        assert time.time() - start < 0.5
+        assert 1 < self.simulator.counts['500'] < 20
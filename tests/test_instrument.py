@@ -0,0 +1,125 @@
+from unittest                          import TestCase
+from paypy.payment                     import Payment
+from paypy.profile                     import ProfileClient
+from paypy.subscription                import SubscriptionClient
+from paypy.instrument                  import Instrument, HistogramRegistry, Histogram, prometheus_text, monotonic
+from paypy.adapters.authnet.connection import pool
+from paypy.adapters.authnet.simulator  import Simulator
+from paypy.adapters.authnet.transport  import MemoryTransport
+from paypy.schemas.authnet.arb         import SAuthnetSubscriptionStatus
+from paypy.schemas.authnet.cim         import SAuthnetProfileCreate, SAuthnetProfileRetrieveAll
+from tests.test_batch                  import charge
+from tests.test_simulator              import credentials
+
+class TestInstrument(TestCase):
+    """Test the phases adapters record and the sinks."""
+    
+    def setUp(self):
+        self.events     = []
+        self.registry   = HistogramRegistry()
+        self.instrument = Instrument([lambda *event: self.events.append(event), self.registry])
+        self.transport  = MemoryTransport(Simulator(seed=1).respond)
+    
+    def phases(self):
+        return [(operation, phase) for operation, phase, seconds, size in self.events]
+    
+    def test_aim(self):
+        """A charge records its serialize, gateway and parse phases with the payload sizes."""
+        
+        Payment(charge(u'42'), transport=self.transport, instrument=self.instrument).process()
+        
+        assert self.phases() == [('aim.auth_capture', 'serialize'), ('aim.auth_capture', 'gateway'), ('aim.auth_capture', 'parse')]
+        assert self.events[0][3] > 0 and self.events[1][3] > 0 and self.events[2][3] is None
+        assert min([x[2] for x in self.events]) >= 0
+    
+    def test_xml(self):
+        """ARB and CIM operations record their validation too."""
+        
+        profiles = ProfileClient(credentials(), transport=self.transport, instrument=self.instrument)
+        profile  = SAuthnetProfileCreate()
+        
+        profile.customer_id = u'24'
+        profile.email       = u'richard@example.com'
+        
+        profiles.create(profile)
+        
+        status    = SAuthnetSubscriptionStatus()
+        status.id = u'1'
+        
+        SubscriptionClient(credentials(), transport=self.transport, instrument=self.instrument).status(status)
+        
+        assert self.phases() == [('cim.create', x) for x in ('validate', 'serialize', 'gateway', 'parse')] + [('arb.status', x) for x in ('validate', 'serialize', 'gateway', 'parse')]
+    
+    def test_connect(self):
+        """Opening a connection is recorded, reusing one isn't."""
+        
+        simulator = Simulator(seed=1).start()
+        
+        try:
+            pool.clear()
+            
+            payment = Payment(charge(u'42'), endpoint=simulator.aim_endpoint, instrument=self.instrument)
+            payment.process()
+            payment.process()
+        finally:
+            pool.clear()
+            simulator.stop()
+        
+        assert self.phases().count(('aim.auth_capture', 'connect')) == 1
+        assert self.phases().count(('aim.auth_capture', 'gateway')) == 2
+    
+    def test_stream(self):
+        """A streamed retrieval records connecting and waiting for the first chunk."""
+        
+        simulator = Simulator(seed=1).start()
+        
+        try:
+            pool.clear()
+            
+            client = ProfileClient(credentials(), endpoint=simulator.xml_endpoint, instrument=self.instrument)
+            
+            assert list(client.retrieve(SAuthnetProfileRetrieveAll(), stream=True)) == []
+        finally:
+            pool.clear()
+            simulator.stop()
+        
+        assert self.phases() == [('cim.retrieve', x) for x in ('validate', 'serialize', 'connect', 'gateway', 'parse')]
+    
+    def test_async(self):
+        """Asynchronous requests record their phases when they complete."""
+        
+        Payment(charge(u'42'), transport=self.transport, instrument=self.instrument).process_async().result()
+        
+        assert self.phases() == [('aim.auth_capture', 'serialize'), ('aim.auth_capture', 'gateway'), ('aim.auth_capture', 'parse')]
+    
+    def test_prometheus(self):
+        """The registry is exported in the Prometheus text format."""
+        
+        Payment(charge(u'42'), transport=self.transport, instrument=self.instrument).process()
+        
+        text = prometheus_text(self.registry)
+        
+        assert 'paypy_phase_seconds_bucket{operation="aim.auth_capture",phase="gateway",le="+Inf"} 1\n' in text
+        assert 'paypy_phase_seconds_count{operation="aim.auth_capture",phase="parse"} 1\n' in text
+        assert 'paypy_phase_bytes_total{operation="aim.auth_capture",phase="serialize"} %d\n' % self.events[0][3] in text
+
+class TestHistogram(TestCase):
+    """Test the cumulative histogram and the clock."""
+    
+    def test_buckets(self):
+        """Values count towards every bucket they fit in."""
+        
+        histogram = Histogram((0.1, 1.0))
+        
+        for value in (0.05, 0.1, 0.5, 5.0):
+            histogram.record(value)
+        
+        assert list(histogram.cumulative()) == [(0.1, 2), (1.0, 3), (float('inf'), 4)]
+        assert histogram.count == 4 and histogram.sum == 5.65
+    
+    def test_monotonic(self):
+        """The clock never goes back."""
+        
+        values = [monotonic() for x in range(100)]
+        
+        assert values == sorted(values)
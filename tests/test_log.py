@@ -0,0 +1,116 @@
+import logging
+import threading
+
+from unittest                         import TestCase
+from paypy.payment                    import Payment
+from paypy.log                        import redact, StructuredFormatter, QueueHandler
+from paypy.adapters.authnet.simulator import Simulator
+from paypy.adapters.authnet.transport import MemoryTransport
+from tests.test_batch                 import charge
+
+class Records(logging.Handler):
+    """Keep the records handled, optionally waiting for an event before each."""
+    
+    def __init__(self, wait=None):
+        logging.Handler.__init__(self)
+        
+        self.records = []
+        self.wait    = wait
+    
+    def emit(self, record):
+        if self.wait is not None:
+            self.wait.wait()
+        
+        self.records.append(record)
+
+class TestRedact(TestCase):
+    """Test masking secrets in request payloads."""
+    
+    def test_nvp(self):
+        """Name-value fields are masked, card numbers keeping their last four digits."""
+        
+        payload = 'x_login=login&x_tran_key=auth_key&x_card_num=4111111111111111&x_card_code=123&xx_card_num=1&x_amount=1.00'
+        
+        assert redact(payload) == 'x_login=login&x_tran_key=XXXXXXXX&x_card_num=XXXXXXXXXXXX1111&x_card_code=XXX&xx_card_num=1&x_amount=1.00'
+    
+    def test_xml(self):
+        """XML elements are masked, prefixed or not."""
+        
+        payload = ('<merchantAuthentication><name>login</name><transactionKey>auth_key</transactionKey></merchantAuthentication>'
+                   '<creditCard><cardNumber>4111111111111111</cardNumber><cardCode>123</cardCode></creditCard>'
+                   '<anet:bankAccount><anet:routingNumber>123456789</anet:routingNumber><anet:accountNumber>9876543210</anet:accountNumber></anet:bankAccount>')
+        
+        assert redact(payload) == ('<merchantAuthentication><name>login</name><transactionKey>XXXXXXXX</transactionKey></merchantAuthentication>'
+                                   '<creditCard><cardNumber>XXXXXXXXXXXX1111</cardNumber><cardCode>XXX</cardCode></creditCard>'
+                                   '<anet:bankAccount><anet:routingNumber>XXXXXXXXX</anet:routingNumber><anet:accountNumber>XXXXXX3210</anet:accountNumber></anet:bankAccount>')
+
+class TestAdapterLogging(TestCase):
+    """Test the adapters' request logging."""
+    
+    def setUp(self):
+        self.logger  = logging.getLogger('paypy.adapters')
+        self.handler = Records()
+        self.payment = Payment(charge(u'42'), transport=MemoryTransport(Simulator(seed=1).respond))
+        
+        self.logger.addHandler(self.handler)
+    
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.logger.setLevel(logging.NOTSET)
+    
+    def test_debug(self):
+        """At DEBUG requests and responses are logged with their fields, redacted."""
+        
+        self.logger.setLevel(logging.DEBUG)
+        
+        self.payment.process()
+        self.payment.process_async().result()
+        
+        records = self.handler.records
+        
+        assert [x.getMessage() for x in records] == ['request', 'response'] * 2
+        assert records[0].fields['operation'] == 'aim.auth_capture'
+        assert records[0].fields['endpoint'] == 'test.authorize.net'
+        assert 'x_card_num=XXXXXXXXXXXX1111' in records[0].fields['payload']
+        assert '4111111111111111' not in ''.join([x.fields['payload'] for x in records])
+    
+    def test_disabled(self):
+        """Above DEBUG nothing is logged."""
+        
+        self.logger.setLevel(logging.INFO)
+        
+        self.payment.process()
+        
+        assert self.handler.records == []
+
+class TestHandlers(TestCase):
+    """Test the structured formatter and the queue handler."""
+    
+    def record(self, message, **fields):
+        record        = logging.LogRecord('paypy.adapters', logging.DEBUG, __file__, 1, message, (), None)
+        record.fields = fields
+        
+        return record
+    
+    def test_format(self):
+        """Fields are written as key=value pairs, quoted where needed."""
+        
+        line = StructuredFormatter().format(self.record('request', operation='aim.auth_capture', payload='a=1&b=2'))
+        
+        assert line.endswith(' level=DEBUG logger=paypy.adapters message=request operation=aim.auth_capture payload="a=1&b=2"')
+    
+    def test_queue(self):
+        """Records are handled on another thread, dropped rather than waited on once the queue is full."""
+        
+        event   = threading.Event()
+        records = Records(event)
+        handler = QueueHandler(records, size=2)
+        
+        for x in range(5):
+            handler.handle(self.record('request %d' % x))
+        
+        event.set()
+        handler.close()
+        
+        assert 2 <= handler.dropped <= 3
+        assert [x.getMessage() for x in records.records] == ['request %d' % x for x in range(5 - handler.dropped)]
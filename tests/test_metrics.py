@@ -0,0 +1,205 @@
+import socket
+import threading
+
+from unittest                         import TestCase
+from paypy.payment                    import PaymentClient
+from paypy.profile                    import ProfileClient
+from paypy.metrics                    import Recorder, Metrics, Statsd, prometheus_text
+from paypy.adapters.authnet.retry     import RetryPolicy, OPEN, HALF_OPEN, CLOSED
+from paypy.adapters.authnet.simulator import Simulator
+from paypy.adapters.authnet.transport import MemoryTransport
+from paypy.exceptions.authnet         import GatewayStatusException, CircuitOpenException
+from paypy.schemas.authnet.cim        import SAuthnetProfileCreate
+from tests.test_batch                 import charge
+from tests.test_cache                 import Clock
+from tests.test_retry                 import Result
+from tests.test_simulator             import credentials
+
+HOST = 'test.authorize.net'
+
+class TestMetrics(TestCase):
+    """Test counting gateway requests, retries and breaker changes."""
+    
+    def setUp(self):
+        self.metrics   = Metrics()
+        self.simulator = Simulator(seed=1)
+        self.client    = PaymentClient(None, transport=MemoryTransport(self.simulator.respond), metrics=self.metrics)
+    
+    def requests(self):
+        return dict([(key[1:], count) for key, count in self.metrics.counters().items() if key[0] == 'requests'])
+    
+    def test_requests(self):
+        """Requests are counted by operation, host and result code, blocking or not."""
+        
+        results = [self.client.process(charge(unicode(x))) for x in range(5)]
+        results.append(self.client.process_async(charge(u'5')).result())
+        
+        statuses = [x.status for x in results]
+        counts   = self.requests()
+        
+        for status in set(statuses):
+            assert counts[('aim.auth_capture', HOST, status)] == statuses.count(status)
+        
+        assert sum([x.count for x in self.metrics.histograms().values()]) == 6
+    
+    def test_xml(self):
+        """ARB and CIM requests are counted by their result code."""
+        
+        profile             = SAuthnetProfileCreate()
+        profile.customer_id = u'24'
+        profile.email       = u'richard@example.com'
+        
+        ProfileClient(credentials(), transport=MemoryTransport(self.simulator.respond), metrics=self.metrics).create(profile)
+        
+        assert self.requests() == {('cim.create', 'api.authorize.net', 'Ok') : 1}
+    
+    def test_failures(self):
+        """Failed requests are counted by the exception's class."""
+        
+        self.simulator.error_rate = 1.0
+        
+        self.assertRaises(GatewayStatusException, self.client.process, charge(u'1'))
+        
+        assert self.requests() == {('aim.auth_capture', HOST, 'GatewayStatusException') : 1}
+    
+    def test_retries(self):
+        """A retry policy counts its retries, breaker changes and rejections."""
+        
+        clock  = Clock()
+        policy = RetryPolicy(attempts=3, threshold=2, reset_timeout=10, clock=clock, sleep=lambda x: None, metrics=self.metrics)
+        
+        def send(outcomes):
+            return policy.run(('https', HOST, '/'), outcomes.pop, lambda x: x)
+        
+        send([Result(True), Result(True)])
+        
+        self.assertRaises(CircuitOpenException, send, [Result(False)])
+        
+        clock.now += 10
+        
+        send([Result(False)])
+        
+        counters = self.metrics.counters()
+        
+        assert counters[('retries', HOST)] == 1
+        assert counters[('rejections', HOST)] == 1
+        assert [counters[('transitions', HOST, x)] for x in (OPEN, HALF_OPEN, CLOSED)] == [1, 1, 1]
+    
+    def test_threads(self):
+        """Counts recorded by many threads at once add up."""
+        
+        def record():
+            for x in range(1000):
+                self.metrics.request('aim.auth_capture', HOST, 'approved', 0.001)
+                self.metrics.retry(HOST)
+        
+        threads = [threading.Thread(target=record) for x in range(8)]
+        
+        for thread in threads:
+            thread.start()
+        
+        for thread in threads:
+            thread.join()
+        
+        counters = self.metrics.counters()
+        
+        assert counters[('requests', 'aim.auth_capture', HOST, 'approved')] == 8000
+        assert counters[('retries', HOST)] == 8000
+        assert self.metrics.histograms()[('requests', 'aim.auth_capture', HOST, 'approved')].count == 8000
+    
+    def test_prometheus(self):
+        """The counts and histograms are exported in the Prometheus text format."""
+        
+        self.metrics.request('aim.auth_capture', HOST, 'approved', 0.2)
+        self.metrics.retry(HOST)
+        self.metrics.transition(HOST, OPEN)
+        
+        text = prometheus_text(self.metrics)
+        
+        assert 'paypy_requests_total{code="approved",endpoint="%s",operation="aim.auth_capture"} 1\n' % HOST in text
+        assert 'paypy_request_seconds_bucket{code="approved",endpoint="%s",operation="aim.auth_capture",le="0.25"} 1\n' % HOST in text
+        assert 'paypy_request_seconds_bucket{code="approved",endpoint="%s",operation="aim.auth_capture",le="0.1"} 0\n' % HOST in text
+        assert 'paypy_retries_total{endpoint="%s"} 1\n' % HOST in text
+        assert 'paypy_breaker_transitions_total{endpoint="%s",state="open"} 1\n' % HOST in text
+
+class Broken(Recorder):
+    """A recorder whose backend is down."""
+    
+    def request(self, operation, host, code, seconds):
+        raise socket.error('statsd is down')
+    
+    retry = transition = rejection = request
+
+class TestBestEffort(TestCase):
+    """Test that a failing recorder never fails a request."""
+    
+    def test_broken(self):
+        """Requests, retries and breaker changes go through when recording them raises."""
+        
+        simulator = Simulator(seed=1)
+        policy    = RetryPolicy(attempts=2, threshold=1, sleep=lambda x: None, metrics=Broken())
+        client    = PaymentClient(None, transport=MemoryTransport(simulator.respond), retry=policy, metrics=Broken())
+        
+        assert client.process(charge(u'1')).status is not None
+        assert client.process_async(charge(u'2')).result().status is not None
+        
+        simulator.error_rate = 1.0
+        
+        self.assertRaises(GatewayStatusException, client.process, charge(u'3'))
+        self.assertRaises(CircuitOpenException, client.process, charge(u'4'))
+
+class TestStatsd(TestCase):
+    """Test sending the metrics to statsd in batches."""
+    
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.settimeout(1.0)
+    
+    def tearDown(self):
+        self.server.close()
+    
+    def test_batches(self):
+        """Lines are sent once a batch is waiting, packed into packets that fit."""
+        
+        statsd = Statsd(self.server.getsockname(), batch=4, packet_size=100, interval=60)
+        
+        statsd.retry(HOST)
+        statsd.rejection(HOST)
+        statsd.request('aim.auth_capture', HOST, 'approved', 0.0125)
+        
+        packets = [self.server.recv(2048) for x in range(3)]
+        lines   = '\n'.join(packets).split('\n')
+        
+        assert max([len(x) for x in packets]) <= 100
+        assert lines == ['paypy.retries.test_authorize_net:1|c',
+                         'paypy.rejections.test_authorize_net:1|c',
+                         'paypy.requests.aim_auth_capture.test_authorize_net.approved:1|c',
+                         'paypy.requests.aim_auth_capture.test_authorize_net.approved:12.500|ms']
+        
+        statsd.transition(HOST, OPEN)
+        statsd.close()
+        
+        assert self.server.recv(2048) == 'paypy.breaker.test_authorize_net.open:1|c'
+    
+    def test_interval(self):
+        """Lines short of a batch are sent every interval seconds."""
+        
+        statsd = Statsd(self.server.getsockname(), batch=50, interval=0.05)
+        
+        statsd.retry(HOST)
+        
+        assert self.server.recv(2048) == 'paypy.retries.test_authorize_net:1|c'
+        
+        statsd.close()
+    
+    def test_errors(self):
+        """Packets that can't be sent are counted and dropped."""
+        
+        statsd = Statsd(self.server.getsockname(), batch=1)
+        statsd._socket.close()
+        
+        statsd.request('aim.auth_capture', HOST, 'approved', 0.0125)
+        statsd.close()
+        
+        assert statsd.errors == 1
@@ -0,0 +1,192 @@
+import pickle
+
+from unittest                   import TestCase
+from benchmarks.parsing         import profile_fields_find, profile_fields_xpath
+from paypy.adapters.authnet.aim import TransactionResult
+from paypy.adapters.authnet.arb import RecurringTransactionResult
+from paypy.adapters.authnet.cim import ProfileIdStream, CreateProfileResult, RetrieveProfileResult
+
+FIELDS = ['1', '1', '1', 'This transaction has been approved.', 'AB12CD', 'Y', '2149186775', '423', 'A description, with a comma', '10.00', 'CC', 'auth_capture', '23'] + [''] * 23 + ['S42', 'B8A1', '', '2', 'XXXX1111', 'Visa', '', '', '']
+
+class TestTransactionResult(TestCase):
+    """Test the AIM response parser."""
+    
+    def test_fields(self):
+        """Named fields are decoded from the response."""
+        
+        result = TransactionResult('|'.join(FIELDS))
+        
+        assert result.code == 1
+        assert result.status == 'approved'
+        assert result.reason_code == 1
+        assert result.transaction_id == '2149186775'
+        assert result.description == 'A description, with a comma'
+        assert result.po_number == 'S42'
+        assert result.card_type == 'Visa'
+        assert result.firstname is None
+        assert result.balance is None
+        assert int(result) == 1
+        assert str(result) == 'This transaction has been approved.'
+        assert len(result.response) == 45
+    
+    def test_comma(self):
+        """CIM validation responses are comma delimited."""
+        
+        fields = [x.replace(',', '') for x in FIELDS]
+        result = TransactionResult(','.join(fields), ',')
+        
+        assert result.code == 1
+        assert result.po_number == 'S42'
+    
+    def test_encapsulated(self):
+        """Encapsulated fields can contain the delimiter."""
+        
+        result = TransactionResult('"' + '","'.join(FIELDS) + '"\n', ',', '"')
+        
+        assert result.code == 1
+        assert result.description == 'A description, with a comma'
+        assert result.card_type == 'Visa'
+        assert result.balance is None
+    
+    def test_short(self):
+        """Fields missing from a truncated response are None."""
+        
+        result = TransactionResult('3|1|13|The merchant login ID or password is invalid or the account is inactive.')
+        
+        assert result.status == 'error'
+        assert result.reason_code == 13
+        assert result.transaction_id is None
+    
+    def test_decoded_once(self):
+        """A field is decoded on its first access only."""
+        
+        calls  = []
+        result = TransactionResult('|'.join(FIELDS))
+        
+        class Counted(str):
+            def __int__(self):
+                calls.append(self)
+                return int(str(self))
+        
+        result.response = (Counted('1'),) + result.response[1:]
+        
+        assert result.code == result.code == 1
+        assert result.status == 'approved'
+        assert len(calls) == 1
+    
+    def test_compact(self):
+        """Results don't carry an instance dictionary and survive pickling."""
+        
+        result = TransactionResult('|'.join(FIELDS))
+        
+        assert not hasattr(result, '__dict__')
+        assert pickle.loads(pickle.dumps(result)).transaction_id == '2149186775'
+        assert pickle.loads(pickle.dumps(result, 2)).transaction_id == '2149186775'
+
+PROFILE_IDS = '<?xml version="1.0" encoding="utf-8"?><getCustomerProfileIdsResponse xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns="AnetApi/xml/v1/schema/AnetApiSchema.xsd"><messages><resultCode>Ok</resultCode><message><code>I00001</code><text>Successful.</text></message></messages><ids>%s</ids></getCustomerProfileIdsResponse>'
+
+class TestProfileIdStream(TestCase):
+    """Test the streaming profile id parser."""
+    
+    def test_stream(self):
+        """Ids are parsed from a body split at arbitrary points."""
+        
+        body   = PROFILE_IDS % ''.join(['<numericString>%d</numericString>' % x for x in range(1000)])
+        chunks = [body[x:x + 7] for x in range(0, len(body), 7)]
+        result = ProfileIdStream(chunks)
+        
+        assert result.result_code == 'Ok'
+        assert result.code == 'I00001'
+        assert str(result) == 'Successful.'
+        assert list(result) == [str(x) for x in range(1000)]
+    
+    def test_lazy(self):
+        """The body is only read as far as the ids that have been consumed."""
+        
+        read = []
+        
+        def chunks():
+            yield PROFILE_IDS.split('<ids>')[0] + '<ids>'
+            
+            for x in range(100):
+                read.append(x)
+                yield '<numericString>%d</numericString>' % x
+            
+            yield '</ids></getCustomerProfileIdsResponse>'
+        
+        ids = iter(ProfileIdStream(chunks()))
+        
+        assert ids.next() == '0'
+        assert len(read) <= 2
+    
+    def test_empty(self):
+        """A response without ids streams nothing."""
+        
+        result = ProfileIdStream([PROFILE_IDS.replace('<ids>%s</ids>', '')])
+        
+        assert list(result) == []
+
+ANET_RESPONSE = '<?xml version="1.0" encoding="utf-8"?><%(tag)s xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns="AnetApi/xml/v1/schema/AnetApiSchema.xsd"><messages><resultCode>Ok</resultCode><message><code>I00001</code><text>Successful.</text></message></messages>%(body)s</%(tag)s>'
+
+CUSTOMER_PROFILE = ANET_RESPONSE % {'tag'  : 'getCustomerProfileResponse',
+                                    'body' : '<profile><merchantCustomerId>23</merchantCustomerId><email>jane@example.com</email><customerProfileId>10000</customerProfileId>'
+                                             '<paymentProfiles><customerType>individual</customerType><billTo><firstName>Billy</firstName><lastName>Joel</lastName><zip>92009</zip></billTo>'
+                                             '<customerPaymentProfileId>20000</customerPaymentProfileId><payment><creditCard><cardNumber>XXXX1111</cardNumber><expirationDate>XXXX</expirationDate></creditCard></payment></paymentProfiles>'
+                                             '<shipToList><firstName>Jane</firstName><city>Encinitas</city><customerAddressId>30000</customerAddressId></shipToList></profile>'}
+
+class TestXMLResults(TestCase):
+    """Test the namespace-aware ARB and CIM result parsers."""
+    
+    def test_subscription(self):
+        """Subscription results read the messages and subscription fields."""
+        
+        created = RecurringTransactionResult(ANET_RESPONSE % {'tag' : 'ARBCreateSubscriptionResponse', 'body' : '<subscriptionId>100748</subscriptionId>'})
+        status  = RecurringTransactionResult(ANET_RESPONSE % {'tag' : 'ARBGetSubscriptionStatusResponse', 'body' : '<status>active</status>'})
+        
+        assert created.result_code == 'Ok'
+        assert created.code == 'I00001'
+        assert str(created) == '100748'
+        assert status.status == 'Active'
+    
+    def test_create_profile(self):
+        """Profile creation results read the created ids."""
+        
+        body   = '<customerProfileId>10000</customerProfileId><customerPaymentProfileIdList><numericString>20000</numericString><numericString>20001</numericString></customerPaymentProfileIdList><customerShippingAddressIdList />'
+        result = CreateProfileResult(ANET_RESPONSE % {'tag' : 'createCustomerProfileResponse', 'body' : body})
+        
+        assert str(result) == '10000'
+        assert result.payment_ids == ['20000', '20001']
+        assert result.shipping_ids == []
+        assert result.validation == []
+    
+    def test_retrieve_profile(self):
+        """A retrieved profile is translated to dictionaries."""
+        
+        result = RetrieveProfileResult(CUSTOMER_PROFILE)
+        
+        assert result['id'] == '10000'
+        assert result['customer'] == {'id' : '23', 'email' : 'jane@example.com'}
+        assert result['billing'] == [{'id'      : '20000',
+                                      'type'    : 'individual',
+                                      'profile' : {'firstname' : 'Billy', 'lastname' : 'Joel', 'zip' : '92009'},
+                                      'payment' : {'card' : {'number' : 'XXXX1111', 'expiration' : 'XXXX'}}}]
+        assert result['shipping'] == [{'firstname' : 'Jane', 'city' : 'Encinitas'}]
+    
+    def test_released(self):
+        """Results of a class not retaining documents drop the tree and body once their fields are read."""
+        
+        class Released(RetrieveProfileResult):
+            retain = False
+        
+        retained = RetrieveProfileResult(CUSTOMER_PROFILE)
+        released = Released(CUSTOMER_PROFILE)
+        
+        assert retained.root is not None and retained.raw == CUSTOMER_PROFILE
+        assert released.root is None and released.raw is None
+        assert released.results == retained.results and released.result_code == 'Ok'
+    
+    def test_namespaced(self):
+        """The precompiled, namespaced XPath reads the same fields as rewriting the namespace out and using find()."""
+        
+        assert profile_fields_xpath(CUSTOMER_PROFILE) == profile_fields_find(CUSTOMER_PROFILE)
+        assert profile_fields_xpath(CUSTOMER_PROFILE)[3:] == ('10000', '23', 'jane@example.com', '20000', 'Jane')
@@ -0,0 +1,238 @@
+from unittest                          import TestCase
+from paypy.payment                     import PaymentClient
+from paypy.profile                     import ProfileClient
+from paypy.subscription                import SubscriptionClient
+from paypy.adapters.authnet.aim        import TransactionResult
+from paypy.adapters.authnet.connection import pool
+from paypy.adapters.authnet.response   import XMLResult
+from paypy.adapters.authnet.retry      import RetryPolicy, CircuitBreaker, OPEN, HALF_OPEN, CLOSED
+from paypy.adapters.authnet.simulator  import Simulator
+from paypy.adapters.authnet.transport  import MemoryTransport
+from paypy.exceptions.authnet          import ConnectionException, GatewayStatusException, CircuitOpenException, TimeoutException
+from paypy.schemas.authnet.arb         import SAuthnetSubscriptionCreate, SSchedule
+from paypy.schemas.authnet.cim         import SAuthnetProfileCreate, SAuthnetProfileRetrieve, SAuthnetProfileRetrieveAll
+from paypy.schemas.billing             import SBilling
+from tests.test_batch                  import charge
+from tests.test_cache                  import Clock
+from tests.test_simulator              import credentials, credit_card
+
+class Result(object):
+    def __init__(self, retry):
+        self.retry = retry
+    
+    def retryable(self):
+        return self.retry
+
+class TestRetryPolicy(TestCase):
+    """Test retry classification, backoff and the circuit breaker."""
+    
+    def setUp(self):
+        self.clock  = Clock()
+        self.sleeps = []
+        self.policy = RetryPolicy(attempts=4, base_delay=0.1, max_delay=0.3, threshold=3, reset_timeout=10, clock=self.clock, sleep=self.sleeps.append, random=lambda: 1.0)
+    
+    def send(self, outcomes, idempotent=True):
+        outcomes = list(outcomes)
+        
+        def send():
+            outcome = outcomes.pop(0)
+            
+            if isinstance(outcome, Exception):
+                raise outcome
+            
+            return outcome
+        
+        return self.policy.run(('https', 'gateway', '/'), send, lambda x: x, idempotent)
+    
+    def test_backoff(self):
+        """Retryable failures are retried after capped exponential delays."""
+        
+        self.policy.threshold = 10
+        
+        result = self.send([ConnectionException('timed out'), GatewayStatusException('busy', 503), Result(True), Result(False)])
+        
+        assert not result.retryable()
+        assert self.sleeps == [0.1, 0.2, 0.3]
+        assert self.policy.retries == 3
+    
+    def test_not_retried(self):
+        """Declines, other statuses and requests that aren't idempotent are not retried."""
+        
+        assert self.send([Result(False), Result(True)]).retry is False
+        self.assertRaises(GatewayStatusException, self.send, [GatewayStatusException('not found', 404), Result(False)])
+        self.assertRaises(ConnectionException, self.send, [ConnectionException('reset'), Result(False)], idempotent=False)
+        assert self.sleeps == []
+    
+    def test_attempts(self):
+        """The last failure is raised once the attempts run out."""
+        
+        self.policy.threshold = 10
+        
+        self.assertRaises(ConnectionException, self.send, [ConnectionException(str(x)) for x in range(4)])
+        assert len(self.sleeps) == 3
+    
+    def test_breaker(self):
+        """An open circuit fails fast until a trial request succeeds."""
+        
+        self.assertRaises(ConnectionException, self.send, [ConnectionException(str(x)) for x in range(4)])
+        
+        breaker = self.policy.breaker('gateway')
+        
+        assert breaker.state == OPEN and len(self.sleeps) == 2
+        self.assertRaises(CircuitOpenException, self.send, [Result(False)])
+        
+        self.clock.now += 10
+        
+        assert self.send([Result(False)]).retry is False
+        assert breaker.state == CLOSED
+    
+    def test_breaker_outcomes(self):
+        """Gateway errors and unparsable responses count against the breaker, caller errors don't."""
+        
+        breaker = self.policy.breaker('gateway')
+        
+        self.assertRaises(GatewayStatusException, self.send, [GatewayStatusException('not found', 404)])
+        self.assertRaises(ValueError, self.policy.run, ('https', 'gateway', '/'), lambda: 'garbage', int)
+        
+        assert breaker.failures == 2
+        
+        self.assertRaises(KeyError, self.send, [KeyError('caller')])
+        
+        assert breaker.failures == 2 and breaker.state == CLOSED
+        
+        self.assertRaises(GatewayStatusException, self.send, [GatewayStatusException('not found', 404)])
+        
+        assert breaker.state == OPEN
+        
+        self.clock.now += 10
+        
+        self.assertRaises(KeyError, self.send, [KeyError('caller')])
+        
+        assert breaker.state == HALF_OPEN and breaker.allow() and not breaker.allow()
+    
+    def test_half_open(self):
+        """A failed trial request opens the circuit again."""
+        
+        breaker = CircuitBreaker('gateway', threshold=1, reset_timeout=10, clock=self.clock)
+        breaker.failure()
+        
+        self.clock.now += 10
+        
+        assert breaker.allow() and breaker.state == HALF_OPEN
+        assert not breaker.allow()
+        
+        breaker.failure()
+        
+        assert breaker.state == OPEN and not breaker.allow()
+
+class TestClassification(TestCase):
+    """Test which gateway results ask for a retry."""
+    
+    def test_aim(self):
+        """Processing errors are retryable, declines and other errors are not."""
+        
+        assert TransactionResult('3|1|19|An error occurred during processing.' + '|' * 67).retryable()
+        assert not TransactionResult('3|1|6|The credit card number is invalid.' + '|' * 67).retryable()
+        assert not TransactionResult('2|1|2|This transaction has been declined.' + '|' * 67).retryable()
+    
+    def test_xml(self):
+        """E00001 is retryable."""
+        
+        response = '<ErrorResponse xmlns="AnetApi/xml/v1/schema/AnetApiSchema.xsd"><messages><resultCode>Error</resultCode><message><code>%s</code><text></text></message></messages></ErrorResponse>'
+        
+        assert XMLResult(response % 'E00001').retryable()
+        assert not XMLResult(response % 'E00027').retryable()
+
+class TestRetryingClients(TestCase):
+    """Test clients sending under a retry policy against the simulator."""
+    
+    def setUp(self):
+        self.simulator = Simulator(seed=3).start()
+        self.policy    = RetryPolicy(attempts=20, base_delay=0.001, threshold=100)
+    
+    def tearDown(self):
+        pool.clear()
+        self.simulator.stop()
+    
+    def test_idempotent(self):
+        """A charge with a duplicate window and invoice number is retried through gateway errors."""
+        
+        self.simulator.error_rate = 0.5
+        
+        client = PaymentClient(None, endpoint=self.simulator.aim_endpoint, retry=self.policy)
+        trans  = charge(u'42')
+        
+        trans.transaction.duplicate_window = 120
+        
+        for x in range(5):
+            assert client.process(trans).status == 'approved'
+        
+        assert self.policy.retries == self.simulator.counts['500'] > 0
+    
+    def test_not_idempotent(self):
+        """A charge without a duplicate window is sent once."""
+        
+        self.simulator.error_rate = 1.0
+        
+        client = PaymentClient(None, endpoint=self.simulator.aim_endpoint, retry=self.policy)
+        
+        self.assertRaises(GatewayStatusException, client.process, charge(u'42'))
+        assert self.simulator.counts['500'] == 1
+    
+    def test_xml(self):
+        """Profile requests are retried and share the breaker of their host."""
+        
+        self.simulator.error_rate = 1.0
+        self.policy.threshold     = 3
+        
+        client     = ProfileClient(credentials(), endpoint=self.simulator.xml_endpoint, retry=self.policy)
+        request    = SAuthnetProfileRetrieve()
+        request.id = 1000
+        
+        self.assertRaises(GatewayStatusException, client.retrieve, request)
+        self.assertRaises(CircuitOpenException, client.retrieve, request)
+        assert self.simulator.counts['500'] == 3
+    
+    def test_stream(self):
+        """Streamed retrievals are sent under the policy and its breaker too."""
+        
+        self.simulator.error_rate = 1.0
+        self.policy.threshold     = 3
+        
+        client = ProfileClient(credentials(), endpoint=self.simulator.xml_endpoint, retry=self.policy)
+        
+        self.assertRaises(GatewayStatusException, client.retrieve, SAuthnetProfileRetrieveAll(), True)
+        self.assertRaises(CircuitOpenException, client.retrieve, SAuthnetProfileRetrieveAll(), True)
+        assert self.simulator.counts['500'] == 3
+    
+    def test_creations(self):
+        """Subscriptions and profiles created before a timeout aren't created again."""
+        
+        simulator = Simulator(seed=3)
+        sent      = []
+        
+        def answered(path, body):
+            sent.append(body)
+            simulator.respond(path, body)
+            raise TimeoutException('timed out reading the answer', 'read')
+        
+        transport = MemoryTransport(answered)
+        
+        sub          = SAuthnetSubscriptionCreate()
+        sub.amount   = u'10.00'
+        sub.payment  = credit_card()
+        sub.billing  = SBilling()
+        sub.schedule = SSchedule()
+        
+        client = SubscriptionClient(credentials(), transport=transport, retry=self.policy)
+        
+        self.assertRaises(TimeoutException, client.create, sub)
+        assert len(sent) == len(simulator.subscriptions) == 1
+        
+        profile             = SAuthnetProfileCreate()
+        profile.customer_id = u'24'
+        
+        client = ProfileClient(credentials(), transport=transport, retry=self.policy)
+        
+        self.assertRaises(TimeoutException, client.create, profile)
+        assert len(sent) - 1 == len(simulator.profiles) == 1
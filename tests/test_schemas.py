@@ -0,0 +1,135 @@
+import datetime
+import pickle
+
+from unittest                  import TestCase
+from zope.schema.interfaces    import RequiredMissing, ConstraintNotSatisfied, WrongType
+from benchmarks                import fixtures
+from paypy.exceptions.schema   import SchemaException
+from paypy.schemas.base        import UnknownField, UnknownSchema
+from paypy.schemas.payment     import SCreditCard, SBank, CCreditCard
+from paypy.schemas.billing     import SBilling, IBilling, CBilling
+from paypy.schemas.authnet     import SAuthnetTransaction, IAuthnetTransaction, CAuthnetTransaction
+from paypy.schemas.authnet.aim import SAim
+from paypy.schemas.authnet.cim import SCim, SBillingList, SAuthnetProfileCreate, CBillingList
+from paypy.serializers.authnet import aim, cim
+
+class TestFromMapping(TestCase):
+    """Test building schemas in bulk from mappings."""
+    
+    def errors(self, cls, mapping):
+        try:
+            cls.from_mapping(mapping)
+        except SchemaException, e:
+            return dict([(path, type(error)) for path, error in e.errors])
+        
+        self.fail('no SchemaException raised')
+    
+    def test_equivalent(self):
+        """A schema built from a mapping serializes like one built field by field."""
+        
+        assert str(aim.Serialize(SAim.from_mapping(fixtures.aim_mapping()))) == str(aim.Serialize(fixtures.aim()))
+        assert str(cim.Serialize(SCim.from_dict(fixtures.profile_create_mapping(2)))) == str(cim.Serialize(fixtures.profile_create(2)))
+    
+    def test_nested(self):
+        """Nested mappings are built into the schema class their fields fit."""
+        
+        schema  = SCim.from_mapping(fixtures.profile_create_mapping(2))
+        billing = schema.profile.billing
+        
+        assert type(schema.profile) is SAuthnetProfileCreate
+        assert [type(x) for x in billing] == [SBillingList, SBillingList]
+        assert type(billing[0].payment) is SCreditCard
+        
+        trans = SAuthnetTransaction.from_mapping({'payment' : {'account_number' : u'123456789', 'routing_number' : u'123456789', 'name_on_account' : u'Richard Branson'},
+                                                  'billing' : fixtures.ADDRESS})
+        
+        assert type(trans.payment) is SBank
+        assert type(trans.billing) is SBilling
+        assert trans.type == 'AUTH_CAPTURE'
+    
+    def test_all_errors(self):
+        """Every invalid field is reported at once, by its dotted path."""
+        
+        mapping = fixtures.aim_mapping()
+        
+        del mapping['authentication']['login']
+        mapping['transaction']['amount']            = u'ten'
+        mapping['transaction']['delim_data']        = 'yes'
+        mapping['transaction']['bogus']             = 1
+        mapping['transaction']['payment']['number'] = u'x'
+        
+        self.assertEqual(self.errors(SAim, mapping), {'authentication.login'       : RequiredMissing,
+                                                      'transaction.amount'         : ConstraintNotSatisfied,
+                                                      'transaction.delim_data'     : WrongType,
+                                                      'transaction.bogus'          : UnknownField,
+                                                      'transaction.payment.number' : ConstraintNotSatisfied})
+    
+    def test_list_errors(self):
+        """Errors in list items carry the item's index."""
+        
+        mapping = fixtures.profile_create_mapping(2)
+        
+        mapping['profile']['billing'][1]['payment']['expiration'] = '2018-04'
+        mapping['profile']['shipping'][0]                         = {'planet' : u'Mars'}
+        
+        self.assertEqual(self.errors(SCim, mapping), {'profile.billing[1].payment.expiration' : WrongType,
+                                                      'profile.shipping[0].planet'            : UnknownField})
+    
+    def test_unknown_schema(self):
+        """A nested mapping that fits no schema class is an error."""
+        
+        mapping = {'payment' : {'number' : u'4111111111111111', 'expiration' : datetime.datetime(2018, 4, 1), 'routing_number' : u'123456789'}}
+        
+        self.assertEqual(self.errors(SAuthnetTransaction, mapping), {'payment' : UnknownSchema})
+
+class TestCompact(TestCase):
+    """Test the slotted schema variants."""
+    
+    def test_interfaces(self):
+        """Compact schemas provide the reifier's interfaces and have no instance dict."""
+        
+        trans = CAuthnetTransaction()
+        
+        assert IAuthnetTransaction.providedBy(trans)
+        assert IBilling.providedBy(CBilling())
+        assert not hasattr(trans, '__dict__')
+        assert trans.type == 'AUTH_CAPTURE'
+        assert trans.amount is None
+    
+    def test_validation(self):
+        """Fields are validated as they are set."""
+        
+        trans        = CAuthnetTransaction()
+        trans.amount = u'10.00'
+        
+        self.assertRaises(ConstraintNotSatisfied, setattr, trans, 'amount', u'ten')
+        self.assertRaises(WrongType, setattr, trans, 'delim_data', 'yes')
+        assert trans.amount == u'10.00'
+    
+    def test_serialize(self):
+        """The serializers accept compact schemas unchanged."""
+        
+        schema             = fixtures.aim()
+        schema.transaction = CAuthnetTransaction.from_mapping(fixtures.aim_mapping()['transaction'])
+        
+        assert type(schema.transaction.billing) is CBilling
+        assert type(schema.transaction.payment) is CCreditCard
+        assert str(aim.Serialize(schema)) == str(aim.Serialize(fixtures.aim()))
+        
+        schema = fixtures.profile_create(2)
+        
+        schema.profile.billing = [CBillingList.from_mapping(x) for x in fixtures.profile_create_mapping(2)['profile']['billing']]
+        
+        assert str(cim.Serialize(schema)) == str(cim.Serialize(fixtures.profile_create(2)))
+    
+    def test_pickle(self):
+        """Compact schemas pickle with every protocol."""
+        
+        trans = CAuthnetTransaction.from_mapping(fixtures.aim_mapping()['transaction'])
+        
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            copy = pickle.loads(pickle.dumps(trans, protocol))
+            
+            assert copy.billing.firstname == u'Richard'
+            assert copy.payment.expiration == trans.payment.expiration
+            assert copy.invoice == u'423'
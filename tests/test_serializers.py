@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+import cgi
+import datetime
+
+from lxml                               import etree as ET
+
+from unittest                           import TestCase
+from paypy.schemas.payment              import SCreditCard, SBank
+from paypy.schemas.billing              import SBilling
+from paypy.schemas.shipping             import SShipping
+from paypy.schemas.authnet              import SAuthnetTransaction, SMerchantAuthentication, STax, SDuty, SFreight, SLineItem
+from paypy.schemas.authnet.aim          import SAim
+from paypy.schemas.authnet.arb          import SArb, SAuthnetSubscriptionUpdate
+from paypy.schemas.authnet.cim          import SCim, SAuthnetProfile, SAuthnetProfileCreateTransaction, IAuthnetProfileCreateTransaction
+from paypy.serializers.authnet          import cim
+from paypy.serializers.authnet.aim      import Serialize
+from paypy.serializers.authnet.arb      import Serialize as ArbSerialize
+from paypy.serializers.authnet.cim      import Serialize as CimSerialize, SerializeException
+from paypy.serializers.authnet.elements import ANET_XMLNS
+
+# The wire output of the original AIM serializer for aim_schema(), one
+# parameter per entry. The original percent-encoded x_address,
+# x_ship_to_address and x_email twice, those three entries hold the
+# correct single encoding instead.
+AIM_GOLDEN = ['x_address=48+Notty+Road',
+              'x_allow_partial_auth=True',
+              'x_amount=10.00',
+              'x_card_code=123',
+              'x_card_num=4111111111111111',
+              'x_city=Carlsbad',
+              'x_company=Acme',
+              'x_country=USA',
+              'x_cust_id=23',
+              'x_customer_ip=127.0.0.1',
+              'x_delim_char=%7C',
+              'x_delim_data=TRUE',
+              'x_description=Transaction+description',
+              'x_duplicate_window=120',
+              'x_duty=Import<|>Duty<|>1.00',
+              'x_email=jane%40example.com',
+              'x_email_customer=TRUE',
+              'x_encap_char=%22',
+              'x_exp_date=04%2F2014',
+              'x_fax=858-887-5153',
+              'x_first_name=Billy',
+              'x_freight=UPS<|>Ground<|>4.00',
+              'x_header_email_receipt=Thanks',
+              'x_invoice_num=423',
+              'x_last_name=Joel',
+              'x_line_items=SD553<|>Balloon<|>Red<|>5<|>22.00<|>TRUE',
+              'x_line_items=SD555<|>Shovel<|>Blue<|>2<|>3.50<|>FALSE',
+              'x_login=auth_login',
+              'x_merchant_email=shop%40example.com',
+              'x_method=CC',
+              'x_phone=%28858%29+887-5152',
+              'x_po_num=S42',
+              'x_recurring_billing=TRUE',
+              'x_relay_response=FALSE',
+              'x_ship_to_address=1+Main+St.',
+              'x_ship_to_city=Encinitas',
+              'x_ship_to_country=USA',
+              'x_ship_to_first_name=Jane',
+              'x_ship_to_last_name=Doe',
+              'x_ship_to_phone=858-111-2222',
+              'x_ship_to_state=CA',
+              'x_ship_to_zip=92024',
+              'x_state=California',
+              'x_tax=Sales<|>CA<|>0.80',
+              'x_test_request=TRUE',
+              'x_tran_key=auth_key',
+              'x_type=AUTH_CAPTURE',
+              'x_url=FALSE',
+              'x_version=3.1',
+              'x_zip=92009']
+
+def aim_schema():
+    """Build an AIM schema that exercises every section of the serializer."""
+    
+    cc            = SCreditCard()
+    cc.number     = u'4111111111111111'
+    cc.expiration = datetime.datetime(2014, 4, 1)
+    cc.ccv        = u'123'
+    
+    billto             = SBilling()
+    billto.firstname   = u'Billy'
+    billto.lastname    = u'Joel'
+    billto.company     = u'Acme'
+    billto.address     = u'48 Notty Road'
+    billto.city        = u'Carlsbad'
+    billto.state       = u'California'
+    billto.postal_code = u'92009'
+    billto.country     = u'USA'
+    billto.phone       = u'(858) 887-5152'
+    billto.fax         = u'858-887-5153'
+    
+    shipto             = SShipping()
+    shipto.firstname   = u'Jane'
+    shipto.lastname    = u'Doe'
+    shipto.address     = u'1 Main St.'
+    shipto.city        = u'Encinitas'
+    shipto.state       = u'CA'
+    shipto.postal_code = u'92024'
+    shipto.country     = u'USA'
+    shipto.phone       = u'858-111-2222'
+    
+    tax             = STax()
+    tax.name        = u'Sales'
+    tax.description = u'CA'
+    tax.amount      = u'0.80'
+    
+    duty             = SDuty()
+    duty.name        = u'Import'
+    duty.description = u'Duty'
+    duty.amount      = u'1.00'
+    
+    freight             = SFreight()
+    freight.name        = u'UPS'
+    freight.description = u'Ground'
+    freight.amount      = u'4.00'
+    
+    lineitem1             = SLineItem()
+    lineitem1.id          = u'SD553'
+    lineitem1.name        = u'Balloon'
+    lineitem1.description = u'Red'
+    lineitem1.quantity    = 5
+    lineitem1.price       = u'22.00'
+    lineitem1.taxable     = True
+    
+    lineitem2             = SLineItem()
+    lineitem2.id          = u'SD555'
+    lineitem2.name        = u'Shovel'
+    lineitem2.description = u'Blue'
+    lineitem2.quantity    = 2
+    lineitem2.price       = u'3.50'
+    
+    trans                      = SAuthnetTransaction()
+    trans.testing              = True
+    trans.amount               = u'10.00'
+    trans.payment              = cc
+    trans.billing              = billto
+    trans.shipping             = shipto
+    trans.customer_id          = u'23'
+    trans.customer_ip          = u'127.0.0.1'
+    trans.customer_email       = True
+    trans.email                = u'jane@example.com'
+    trans.description          = u'Transaction description'
+    trans.invoice              = u'423'
+    trans.po                   = u'S42'
+    trans.duplicate_window     = 120
+    trans.encap_char           = u'"'
+    trans.merchant_email       = u'shop@example.com'
+    trans.tax_exempt           = False
+    trans.recurring_billing    = True
+    trans.test_request         = True
+    trans.header_email_receipt = u'Thanks'
+    trans.allow_partial_auth   = 'True'
+    trans.tax                  = tax
+    trans.duty                 = duty
+    trans.freight              = freight
+    trans.line_item            = [lineitem1, lineitem2]
+    
+    auth       = SMerchantAuthentication()
+    auth.login = u'auth_login'
+    auth.key   = u'auth_key'
+    
+    aim                = SAim()
+    aim.transaction    = trans
+    aim.authentication = auth
+    
+    return aim
+
+class TestAimSerializer(TestCase):
+    """Test the AIM name-value serializer."""
+    
+    def test_golden(self):
+        """The wire output matches the original serializer's."""
+        
+        output = str(Serialize(aim_schema())).split('&')
+        
+        self.assertEqual(sorted(output), AIM_GOLDEN)
+    
+    def test_single_encoding(self):
+        """Non-ASCII and reserved characters are percent-encoded exactly once."""
+        
+        schema = aim_schema()
+        schema.transaction.billing.firstname = u'José'
+        schema.transaction.billing.address   = u'1 Rue #5'
+        
+        fields = dict(cgi.parse_qsl(str(Serialize(schema))))
+        
+        assert fields['x_first_name'].decode('UTF-8') == u'José'
+        assert fields['x_address'] == '1 Rue #5'
+    
+    def test_optional_sections(self):
+        """Missing billing, shipping and item sections are left out."""
+        
+        schema = aim_schema()
+        trans  = schema.transaction
+        
+        trans.billing   = None
+        trans.shipping  = None
+        trans.tax       = None
+        trans.line_item = None
+        
+        names = [x.split('=')[0] for x in str(Serialize(schema)).split('&')]
+        
+        assert 'x_first_name' not in names
+        assert 'x_ship_to_first_name' not in names
+        assert 'x_tax' not in names
+        assert 'x_line_items' not in names
+        assert 'x_duty' in names
+
+class TestXmlSerializers(TestCase):
+    """Test the table-driven ARB and CIM request builders."""
+    
+    def transaction(self):
+        """Build a CIM profile transaction."""
+        
+        tax             = STax()
+        tax.name        = u'Sales'
+        tax.description = u'CA'
+        tax.amount      = u'0.80'
+        
+        trans                   = SAuthnetTransaction()
+        trans.type              = 'AUTH_ONLY'
+        trans.amount            = u'10.00'
+        trans.tax               = tax
+        trans.invoice           = u'423'
+        trans.recurring_billing = True
+        
+        profile             = SAuthnetProfileCreateTransaction()
+        profile.id          = 10
+        profile.billing_id  = 20
+        profile.transaction = trans
+        
+        auth       = SMerchantAuthentication()
+        auth.login = u'auth_login'
+        auth.key   = u'auth_key'
+        
+        cim                = SCim()
+        cim.profile        = profile
+        cim.authentication = auth
+        
+        return cim
+    
+    def test_transaction(self):
+        """A profile transaction request is built from the skeleton and field tables."""
+        
+        expected = ('<createCustomerProfileTransactionRequest xmlns="AnetApi/xml/v1/schema/AnetApiSchema.xsd">'
+                    '<merchantAuthentication><name>auth_login</name><transactionKey>auth_key</transactionKey></merchantAuthentication>'
+                    '<transaction><profileTransAuthOnly><amount>10.00</amount><tax><amount>0.80</amount><name>Sales</name><description>CA</description></tax>'
+                    '<customerProfileId>10</customerProfileId><customerPaymentProfileId>20</customerPaymentProfileId>'
+                    '<order><invoiceNumber>423</invoiceNumber></order><recurringBilling>TRUE</recurringBilling></profileTransAuthOnly></transaction>'
+                    '<extraOptions><![CDATA[x_version=3.1&x_delim_char=|&x_delim_data=True&x_relay_response=False&x_url=FALSE]]></extraOptions>'
+                    '</createCustomerProfileTransactionRequest>')
+        
+        first  = str(CimSerialize(self.transaction()))
+        second = str(CimSerialize(self.transaction()))
+        
+        assert first == expected
+        assert first == second, 'Expected the skeleton to be copied, not shared'
+    
+    def test_dispatch(self):
+        """The operation is looked up once per schema class."""
+        
+        CimSerialize(self.transaction())
+        
+        assert cim._builders[SAuthnetProfileCreateTransaction][0] is IAuthnetProfileCreateTransaction
+        
+        schema         = self.transaction()
+        schema.profile = SAuthnetProfile()
+        
+        self.assertRaises(SerializeException, CimSerialize, schema)
+    
+    def test_bank_account(self):
+        """Bank accounts are sent inside the payment element."""
+        
+        bank                 = SBank()
+        bank.name_on_account = u'Richard M Branson'
+        bank.account_number  = u'829330184383'
+        bank.routing_number  = u'122400724'
+        
+        subscription         = SAuthnetSubscriptionUpdate()
+        subscription.id      = u'5'
+        subscription.payment = bank
+        
+        arb                = SArb()
+        arb.subscription   = subscription
+        arb.authentication = self.transaction().authentication
+        
+        payment = ET.XML(str(ArbSerialize(arb))).find('{%s}subscription/{%s}payment' % (ANET_XMLNS, ANET_XMLNS))
+        
+        assert payment[0].tag == '{%s}bankAccount' % ANET_XMLNS
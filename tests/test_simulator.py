@@ -0,0 +1,168 @@
+import datetime
+
+from unittest                          import TestCase
+from paypy.payment                     import Payment, PaymentClient
+from paypy.profile                     import ProfileClient
+from paypy.subscription                import SubscriptionClient
+from paypy.adapters.authnet.connection import pool
+from paypy.adapters.authnet.simulator  import Simulator, constant, parse_latency
+from paypy.exceptions.authnet          import GatewayStatusException
+from paypy.schemas.payment             import SCreditCard
+from paypy.schemas.billing             import SBilling
+from paypy.schemas.shipping            import SShipping
+from paypy.schemas.authnet             import SMerchantAuthentication, SAuthnetTransaction
+from paypy.schemas.authnet.arb         import SSchedule, SAuthnetSubscriptionCreate, SAuthnetSubscriptionStatus, SAuthnetSubscriptionCancel
+from paypy.schemas.authnet.cim         import *
+from tests.test_batch                  import charge
+
+def credentials():
+    auth       = SMerchantAuthentication()
+    auth.key   = u'auth_key'
+    auth.login = u'auth_login'
+    
+    return auth
+
+def credit_card():
+    cc            = SCreditCard()
+    cc.number     = u'4111111111111111'
+    cc.expiration = datetime.datetime.strptime('2014-04-01', '%Y-%m-%d')
+    
+    return cc
+
+class TestSimulator(TestCase):
+    """Test the adapters against the gateway simulator."""
+    
+    def setUp(self):
+        self.simulator = Simulator(seed=1).start()
+    
+    def tearDown(self):
+        pool.clear()
+        self.simulator.stop()
+    
+    def test_aim(self):
+        """Charges are approved and echo the request."""
+        
+        result = Payment(charge(u'42'), endpoint=self.simulator.aim_endpoint).process()
+        
+        assert result.status == 'approved'
+        assert result.invoice_id == '42'
+        assert result.amount == '10.00'
+        assert result.account_number == 'XXXX1111'
+        assert result.validate('auth_login', '')
+    
+    def test_declines(self):
+        """The decline rate declines charges."""
+        
+        self.simulator.decline_rate = 1.0
+        
+        result = Payment(charge(u'42'), endpoint=self.simulator.aim_endpoint).process()
+        
+        assert result.status == 'declined'
+        assert self.simulator.counts['declined'] == 1
+    
+    def test_throttle(self):
+        """Throttled requests fail with HTTP 503."""
+        
+        self.simulator.throttle_rate = 1.0
+        
+        try:
+            Payment(charge(u'42'), endpoint=self.simulator.aim_endpoint).process()
+        except GatewayStatusException, e:
+            assert e.status == 503
+        else:
+            self.fail('Expected a GatewayStatusException')
+    
+    def test_rate_limit(self):
+        """Requests over the rate limit fail with HTTP 429."""
+        
+        self.simulator.rate_limit = 2
+        
+        client   = PaymentClient(credentials(), endpoint=self.simulator.aim_endpoint)
+        outcomes = list(client.process_many([charge(unicode(x)).transaction for x in range(3)], concurrency=1))
+        
+        assert [x.ok() for x in outcomes] == [True, True, False]
+        assert outcomes[2].error.status == 429
+    
+    def test_cim(self):
+        """Profiles are kept between requests."""
+        
+        client = ProfileClient(credentials(), endpoint=self.simulator.xml_endpoint)
+        
+        bill             = SBillingList()
+        bill.firstname   = u'Richard'
+        bill.lastname    = u'Branson'
+        bill.postal_code = u'92009'
+        bill.payment     = credit_card()
+        
+        ship           = SShipping()
+        ship.firstname = u'Richard'
+        ship.address   = u'91 North Ridge'
+        
+        profile             = SAuthnetProfileCreate()
+        profile.customer_id = u'24'
+        profile.email       = u'richard@example.com'
+        profile.billing     = [bill]
+        profile.shipping    = [ship]
+        profile.validation  = u'testMode'
+        
+        created = client.create(profile)
+        
+        assert created.code == 'I00001', created.reason
+        assert len(created.payment_ids) == 1 and len(created.shipping_ids) == 1
+        assert created.validation[0].status == 'approved'
+        
+        request    = SAuthnetProfileRetrieve()
+        request.id = int(str(created))
+        
+        retrieved = client.retrieve(request).results
+        
+        assert retrieved['id'] == str(created)
+        assert retrieved['customer']['email'] == u'richard@example.com'
+        assert retrieved['billing'][0]['payment']['card']['number'] == 'XXXX1111'
+        assert retrieved['shipping'][0]['address'] == u'91 North Ridge'
+        
+        assert list(client.retrieve(SAuthnetProfileRetrieveAll(), stream=True)) == [str(created)]
+        
+        request    = SAuthnetProfileDelete()
+        request.id = int(str(created))
+        
+        assert client.remove(request).code == 'I00001'
+        assert client.remove(request).code == 'E00040'
+    
+    def test_arb(self):
+        """Subscriptions can be created, queried and canceled."""
+        
+        client = SubscriptionClient(credentials(), endpoint=self.simulator.xml_endpoint)
+        
+        billto           = SBilling()
+        billto.firstname = u'Richard'
+        billto.lastname  = u'Branson'
+        
+        sub          = SAuthnetSubscriptionCreate()
+        sub.amount   = u'10.00'
+        sub.payment  = credit_card()
+        sub.billing  = billto
+        sub.schedule = SSchedule()
+        
+        created = client.create(sub)
+        
+        assert created.code == 'I00001', created.reason
+        
+        status    = SAuthnetSubscriptionStatus()
+        status.id = unicode(created.subscription_id)
+        
+        assert client.status(status).status == 'Active'
+        
+        cancel    = SAuthnetSubscriptionCancel()
+        cancel.id = unicode(created.subscription_id)
+        
+        client.cancel(cancel)
+        
+        assert client.status(status).status == 'Canceled'
+    
+    def test_latency(self):
+        """Latency distributions are parsed from their command line form."""
+        
+        assert parse_latency('0.5')(None) == 0.5
+        assert 0.1 <= parse_latency('uniform:0.1,0.2')(self.simulator.random) <= 0.2
+        self.assertRaises(ValueError, parse_latency, 'poisson:1')
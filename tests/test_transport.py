@@ -0,0 +1,143 @@
+import os
+import tempfile
+
+from unittest                         import TestCase
+from paypy.payment                    import Payment, PaymentClient
+from paypy.profile                    import ProfileClient
+from paypy.adapters.authnet.transport import MemoryTransport, RecordingTransport, ReplayTransport, CassetteRecorder, CassetteTransport
+from paypy.adapters.authnet.simulator import Simulator
+from paypy.exceptions.authnet         import ConnectionException, GatewayStatusException
+from paypy.schemas.authnet.cim        import SAuthnetProfileCreate, SAuthnetProfileRetrieve
+from tests.test_batch                 import charge
+from tests.test_simulator             import credentials
+
+class TestMemoryTransport(TestCase):
+    """Test adapters answered in-process by the simulator."""
+    
+    def setUp(self):
+        self.simulator = Simulator(seed=1)
+        self.transport = MemoryTransport(self.simulator.respond)
+    
+    def test_aim(self):
+        """Charges go through the handler, blocking or not."""
+        
+        payment = Payment(charge(u'42'), transport=self.transport)
+        
+        assert payment.process().invoice_id == '42'
+        assert payment.process_async().result().status == 'approved'
+        assert self.transport.requests == 2
+    
+    def test_status(self):
+        """A non-200 answer raises GatewayStatusException."""
+        
+        self.simulator.error_rate = 1.0
+        
+        self.assertRaises(GatewayStatusException, PaymentClient(None, transport=self.transport).process, charge(u'42'))
+    
+    def test_xml(self):
+        """Profile requests go through the client's transport."""
+        
+        client              = ProfileClient(credentials(), transport=self.transport)
+        profile             = SAuthnetProfileCreate()
+        profile.customer_id = u'24'
+        profile.email       = u'richard@example.com'
+        
+        request    = SAuthnetProfileRetrieve()
+        request.id = int(str(client.create(profile)))
+        
+        assert client.retrieve(request).result_code == 'Ok'
+
+class TestRecordReplay(TestCase):
+    """Test recording exchanges and replaying them."""
+    
+    def setUp(self):
+        self.recorder = RecordingTransport(MemoryTransport(Simulator(seed=1).respond))
+        self.path     = tempfile.mktemp()
+    
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+    
+    def test_replay(self):
+        """Recorded requests are answered with their recorded responses, in order."""
+        
+        client = PaymentClient(None, transport=self.recorder)
+        first  = client.process(charge(u'1'))
+        second = client.process(charge(u'1'))
+        
+        assert len(self.recorder.exchanges) == 2
+        
+        self.recorder.save(self.path)
+        
+        client = PaymentClient(None, transport=ReplayTransport.load(self.path))
+        
+        assert client.process(charge(u'1')).transaction_id == first.transaction_id
+        assert client.process(charge(u'1')).transaction_id == second.transaction_id
+        assert client.process(charge(u'1')).transaction_id == second.transaction_id
+        
+        self.assertRaises(ConnectionException, client.process, charge(u'2'))
+
+class TestCassette(TestCase):
+    """Test recording exchanges to a cassette file and replaying them."""
+    
+    def setUp(self):
+        self.path     = tempfile.mktemp()
+        self.recorder = CassetteRecorder(self.path, MemoryTransport(Simulator(seed=1).respond))
+        self.recorded = PaymentClient(None, transport=self.recorder).process(charge(u'1'))
+        
+        self.recorder.close()
+    
+    def tearDown(self):
+        os.remove(self.path)
+    
+    def test_replay(self):
+        """Recorded requests are answered from the cassette, requests differing only in secrets alike."""
+        
+        cassette = CassetteTransport(self.path)
+        client   = PaymentClient(None, transport=cassette)
+        trans    = charge(u'1')
+        
+        trans.transaction.payment.number = u'4222222222221111'
+        
+        assert client.process(charge(u'1')).transaction_id == self.recorded.transaction_id
+        assert client.process(trans).transaction_id == self.recorded.transaction_id
+        assert client.process_async(charge(u'1')).result().transaction_id == self.recorded.transaction_id
+        
+        self.assertRaises(ConnectionException, client.process, charge(u'2'))
+        
+        cassette.close()
+    
+    def test_redacted(self):
+        """Card numbers and keys are not written to the cassette."""
+        
+        data = open(self.path, 'rb').read()
+        
+        assert '4111111111111111' not in data and 'auth_key' not in data
+        assert 'x_card_num=XXXXXXXXXXXX1111' in data
+    
+    def test_append(self):
+        """Recording appends to a cassette, a partly written last entry is left out."""
+        
+        recorder = CassetteRecorder(self.path, MemoryTransport(Simulator(seed=2).respond))
+        PaymentClient(None, transport=recorder).process(charge(u'2'))
+        recorder.close()
+        
+        f = open(self.path, 'ab')
+        f.write('\x00' * 10)
+        f.close()
+        
+        cassette = CassetteTransport(self.path)
+        entries  = list(cassette.entries())
+        
+        assert len(entries) == 2
+        assert entries[0][0] == ('https', 'test.authorize.net', '/gateway/transact.dll')
+        assert 'x_invoice_num=2' in entries[1][1]
+        
+        cassette.close()
+    
+    def test_not_cassette(self):
+        """Any other file is refused."""
+        
+        open(self.path, 'wb').write('not a cassette')
+        
+        self.assertRaises(ConnectionException, CassetteTransport, self.path)